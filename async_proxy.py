@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+"""
+Asyncio engine for the streaming hot path
+An ASGI app that serves /stream.m3u8, nested playlists and /proxy/<url> itself, on one event
+loop with a non-blocking upstream client, and hands every other path to the
+Flask app. A segment download is a coroutine, not a thread, so one process
+holds thousands of them; memory is bounded by the segment cache budget and a
+cap on concurrent upstream fetches.
+"""
+
+import asyncio
+import json
+import time
+import urllib.parse
+from collections import OrderedDict
+
+try:
+    import httpx
+    import uvicorn
+    from werkzeug.http import parse_range_header
+    ASYNC_PROXY_AVAILABLE = True
+except ImportError:
+    ASYNC_PROXY_AVAILABLE = False
+
+# Runs the Flask app beside the loop; uvicorn's built-in bridge is deprecated
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    try:
+        from uvicorn.middleware.wsgi import WSGIMiddleware
+    except ImportError:
+        WSGIMiddleware = None
+
+import upstream_client
+from hls_playlist import PLAYLIST_PREFIX
+from referer_cache import build_headers
+from playlist_cache import FRESHNESS_FRACTION, MAX_PLAYLISTS, make_entry, parse_target_duration
+from segment_cache import (DEFAULT_MAX_BYTES, DEFAULT_TARGET_DURATION, TTL_TARGET_DURATIONS,
+                           FETCH_CHUNK_SIZE, HEADER_WAIT_TIMEOUT, slice_chunks)
+
+MAX_UPSTREAM_CONNECTIONS = 512   # Open upstream connections across all origins
+MAX_KEEPALIVE_CONNECTIONS = 64   # Idle keep-alive connections kept for reuse
+MAX_CONCURRENT_FETCHES = 128     # Segments downloading at once (each buffers up to one segment)
+WSGI_WORKERS = 16                # Threads serving the Flask API beside the loop
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, OPTIONS'),
+    (b'access-control-allow-headers', b'*'),
+]
+
+
+class AsyncSegmentEntry:
+    """One cached (or in-flight) segment body shared by every viewer coroutine"""
+
+    def __init__(self, url, ttl):
+        self.url = url
+        self.ttl = ttl
+        self.created = time.time()
+        self.status_code = None
+        self.content_type = None
+        self.content_length = None
+        self.error = None
+        self.complete = False
+        self.cached = False  # True once counted against the cache's byte budget
+        self._chunks = []
+        self._offsets = []  # Byte offset where each chunk starts
+        self._size = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def size(self):
+        return self._size
+
+    def expired(self, now=None):
+        return (now or time.time()) - self.created > self.ttl
+
+    def _notify(self):
+        # Wake everyone waiting on the current event; later waiters get a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ---------- Writer side (upstream fetch task) ----------
+
+    def set_headers(self, status_code, content_type, content_length=None):
+        self.status_code = status_code
+        self.content_type = content_type
+        self.content_length = content_length
+        self._notify()
+
+    def append(self, chunk):
+        self._chunks.append(chunk)
+        self._offsets.append(self._size)
+        self._size += len(chunk)
+        self._notify()
+
+    def finish(self, error=None):
+        self.error = error
+        self.complete = True
+        self._notify()
+
+    # ---------- Reader side (one per viewer) ----------
+
+    async def wait_headers(self, timeout=HEADER_WAIT_TIMEOUT):
+        """Wait until upstream status is known; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.status_code is None and not self.complete:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self._wait(remaining):
+                return False
+        return True
+
+    async def wait_complete(self, timeout=HEADER_WAIT_TIMEOUT):
+        """Wait until the whole body is in; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while not self.complete:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self._wait(remaining):
+                return False
+        return True
+
+    async def iter_chunks(self, timeout=HEADER_WAIT_TIMEOUT):
+        """Yield the body as it arrives, from the first byte, for any number of readers"""
+        async for piece in self.iter_range(0, None, timeout):
+            yield piece
+
+    async def iter_range(self, start=0, stop=None, timeout=HEADER_WAIT_TIMEOUT):
+        """Yield bytes [start, stop) of the body (stop=None: to the end) as they arrive"""
+        position = start
+        while stop is None or position < stop:
+            available = self._size if stop is None else min(self._size, stop)
+            pieces = slice_chunks(self._chunks, self._offsets, position, available)
+            if pieces:
+                for piece in pieces:
+                    position += len(piece)
+                    yield piece
+                continue
+            if self.complete:
+                if self.error:
+                    raise IOError(f"Upstream segment fetch failed: {self.error}")
+                return
+            if not await self._wait(timeout):
+                raise IOError("Timed out waiting for upstream segment data")
+
+
+class AsyncSegmentCache:
+    """Event-loop twin of SegmentCache: LRU byte budget, TTL and single-flight fetches"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, target_duration=DEFAULT_TARGET_DURATION,
+                 max_concurrent_fetches=MAX_CONCURRENT_FETCHES, on_fetched=None):
+        self.max_bytes = max_bytes
+        self.target_duration = target_duration
+        self.on_fetched = on_fetched   # Same hook as SegmentCache.on_fetched
+        self._entries = OrderedDict()  # url -> AsyncSegmentEntry (completed and in-flight)
+        self._bytes = 0                # Bytes held by completed entries
+        self._fetch_slots = asyncio.Semaphore(max_concurrent_fetches)
+        self._tasks = set()            # Keep fill tasks referenced until they finish
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def ttl(self):
+        return self.target_duration * TTL_TARGET_DURATIONS
+
+    def set_target_duration(self, seconds):
+        """Update the TTL basis from a playlist's #EXT-X-TARGETDURATION"""
+        if seconds and seconds > 0:
+            self.target_duration = seconds
+
+    def get_or_fetch(self, url, open_stream):
+        """Return (entry, state) for url, starting at most one upstream fetch.
+
+        open_stream(url) is a coroutine returning an open streamed httpx
+        response (or raising). state is 'HIT', 'COALESCED' or 'MISS', as in
+        SegmentCache.get_or_fetch.
+        """
+        entry = self._entries.get(url)
+        if entry is not None and entry.complete and (
+                entry.error or entry.status_code != 200 or entry.expired()):
+            self._remove(url)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(url)
+            if entry.complete:
+                self.hits += 1
+                return entry, 'HIT'
+            self.coalesced += 1
+            return entry, 'COALESCED'
+
+        entry = AsyncSegmentEntry(url, self.ttl)
+        self._entries[url] = entry
+        self.misses += 1
+        task = asyncio.get_running_loop().create_task(self._fill(entry, open_stream))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return entry, 'MISS'
+
+    async def _fill(self, entry, open_stream):
+        """Download one segment into its entry; at most max_concurrent_fetches run at once"""
+        async with self._fetch_slots:
+            response = None
+            started = time.time()
+            ttfb = None
+            try:
+                response = await open_stream(entry.url)
+                ttfb = time.time() - started
+                content_length = response.headers.get('content-length')
+                if response.headers.get('content-encoding', 'identity') != 'identity':
+                    content_length = None  # Length of the compressed body, not what we relay
+                entry.set_headers(response.status_code,
+                                  response.headers.get('content-type', 'video/mp2t'),
+                                  int(content_length) if content_length and content_length.isdigit()
+                                  else None)
+                # Kept at 64 KB: each send is buffered per viewer transport until
+                # drained, so bigger chunks cost memory per connection here
+                async for chunk in response.aiter_bytes(FETCH_CHUNK_SIZE):
+                    if chunk:
+                        entry.append(chunk)
+                entry.finish()
+            except Exception as e:
+                entry.finish(error=str(e)[:200] or type(e).__name__)
+            finally:
+                if response is not None:
+                    await response.aclose()
+
+        if self.on_fetched is not None:
+            self.on_fetched(entry.url, entry.status_code, ttfb, time.time() - started,
+                            entry.size, entry.error)
+
+        if self._entries.get(entry.url) is not entry:
+            return
+        if entry.error or entry.status_code != 200 or entry.size > self.max_bytes:
+            # Don't keep failures or anything that can't fit; next request refetches
+            self._remove(entry.url)
+            return
+        entry.cached = True
+        self._bytes += entry.size
+        self._evict()
+
+    def _remove(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None and entry.cached:
+            entry.cached = False
+            self._bytes -= entry.size
+        return entry
+
+    def _evict(self):
+        """Drop expired entries, then least-recently-used ones, until under budget"""
+        now = time.time()
+        for url in [u for u, e in self._entries.items() if e.complete and e.expired(now)]:
+            self._remove(url)
+            self.evictions += 1
+        while self._bytes > self.max_bytes:
+            victim = next((u for u, e in self._entries.items() if e.cached), None)
+            if victim is None:
+                break
+            self._remove(victim)
+            self.evictions += 1
+
+    def stats(self):
+        in_flight = sum(1 for e in self._entries.values() if not e.complete)
+        return {
+            'entries': len(self._entries) - in_flight,
+            'in_flight': in_flight,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions
+        }
+
+
+class AsyncPlaylistCache:
+    """Event-loop twin of PlaylistCache: one upstream fetch per freshness window"""
+
+    def __init__(self, freshness_fraction=FRESHNESS_FRACTION, max_playlists=MAX_PLAYLISTS):
+        self.freshness_fraction = freshness_fraction
+        self.max_playlists = max_playlists
+        self._entries = OrderedDict()  # url -> PlaylistEntry
+        self._url_locks = {}           # url -> asyncio.Lock, so only one viewer refetches
+        self.hits = 0
+        self.refreshes = 0
+
+    async def get(self, url, fetch_rewritten):
+        """Return a fresh PlaylistEntry; fetch_rewritten(url) is a coroutine returning text"""
+        entry = self._entries.get(url)
+        if entry is not None and entry.is_fresh():
+            self.hits += 1
+            return entry
+
+        lock = self._url_locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry.is_fresh():
+                self.hits += 1
+                return entry
+
+            entry = make_entry(url, await fetch_rewritten(url), self.freshness_fraction)
+            self.refreshes += 1
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_playlists:
+                old_url, _ = self._entries.popitem(last=False)
+                self._url_locks.pop(old_url, None)
+            return entry
+
+    def stats(self):
+        return {
+            'playlists': len(self._entries),
+            'hits': self.hits,
+            'refreshes': self.refreshes
+        }
+
+
+class AsyncProxyEngine:
+    """ASGI app: async /stream.m3u8, /s/<id>/stream.m3u8, /playlist/<url> and /proxy/<url>;
+    the rest to WSGI.
+
+    The Flask module keeps owning stream state, so it is passed in as callables:
+    get_stream_url(stream_id) returns the upstream playlist URL for a session
+    (stream_id None: the default stream) or None, get_referer_hints(stream_id)
+    optionally returns referers to try for it, ensure_stream_url() is the
+    blocking extractor run in a thread when the default stream has no URL yet,
+    and rewrite_playlist(content, playlist_url, stream_id) rewrites its URIs.
+    on_playlist_error(stream_id, error), if given, hears about failed playlist
+    fetches (an expired token, say); fail_over(stream_id, error) may switch the
+    stream to another channel and return its URL (blocking, run in a thread);
+    splice_playlist(stream_id, text, url) returns the (text, etag) to serve,
+    or with text None the last one served, so a channel switch stays one
+    continuous playlist. on_segment_fetched is the segment cache's on_fetched
+    hook (per-fetch timings for channel quality).
+    Keys and init maps (/key/, /init/) are rare, small requests and stay on
+    the Flask side so both engines share one key cache.
+    Playlists and segments come from the engine's own caches, not the Flask
+    pull loops, so LL-HLS blocking reloads, the DVR and recordings (which tap
+    those loops) are not available beside it; the server refuses them.
+    The channel warmer's segment prefetch fills the Flask cache, so it is
+    skipped beside the engine (its playlist probes still run).
+    """
+
+    def __init__(self, wsgi_app, get_stream_url, rewrite_playlist, referer_cache,
+                 ensure_stream_url=None, get_referer_hints=None, on_playlist_error=None,
+                 fail_over=None, splice_playlist=None, on_segment_fetched=None,
+                 max_bytes=DEFAULT_MAX_BYTES, max_concurrent_fetches=MAX_CONCURRENT_FETCHES):
+        if not ASYNC_PROXY_AVAILABLE:
+            raise RuntimeError("Async proxy needs httpx and uvicorn (pip install httpx uvicorn)")
+        self.get_stream_url = get_stream_url
+        self.ensure_stream_url = ensure_stream_url
+        self.get_referer_hints = get_referer_hints
+        self.on_playlist_error = on_playlist_error
+        self.fail_over = fail_over
+        self.splice_playlist = splice_playlist
+        self.on_segment_fetched = on_segment_fetched
+        self.rewrite_playlist = rewrite_playlist
+        self.referer_cache = referer_cache
+        self.max_bytes = max_bytes
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=WSGI_WORKERS) if wsgi_app else None
+        self.client = None
+        self.segments = None
+        self.playlists = None
+        self.active_requests = 0
+
+    def _ensure_started(self):
+        # Loop-bound objects are created on the serving loop, not at import time
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                verify=False,
+                timeout=httpx.Timeout(upstream_client.READ_TIMEOUT,
+                                      connect=upstream_client.CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=MAX_UPSTREAM_CONNECTIONS,
+                                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+            )
+            self.segments = AsyncSegmentCache(self.max_bytes,
+                                              max_concurrent_fetches=self.max_concurrent_fetches,
+                                              on_fetched=self.on_segment_fetched)
+            self.playlists = AsyncPlaylistCache()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def stats(self):
+        if self.client is None:
+            return {'started': False}
+        return {
+            'started': True,
+            'active_requests': self.active_requests,
+            'segment_cache': self.segments.stats(),
+            'playlist_cache': self.playlists.stats()
+        }
+
+    # ---------- Upstream ----------
+
+    async def open_upstream(self, url, hints=None):
+        """Streamed GET with the learned referer first; same rules as RefererCache.fetch"""
+        learned = self.referer_cache.get(url)
+        response = None
+        last_error = None
+
+        for referer in self.referer_cache.candidates(url, hints):
+            try:
+                if response is not None:
+                    await response.aclose()
+                request = self.client.build_request('GET', url, headers=build_headers(referer))
+                response = await self.client.send(request, stream=True, follow_redirects=True)
+            except httpx.HTTPError as e:
+                response = None
+                last_error = e
+                continue
+
+            # Learning or forgetting a referer writes it to disk: kept off the event loop,
+            # and the common case (the learned referer worked again) writes nothing
+            if response.status_code in (200, 206):
+                if referer != learned:
+                    await asyncio.to_thread(self.referer_cache.record_success, url, referer)
+                return response
+
+            if response.status_code == 403 and referer == learned:
+                await asyncio.to_thread(self.referer_cache.invalidate, url)
+            last_error = f"HTTP {response.status_code} with referer {referer}"
+
+        if response is not None:
+            return response
+        raise IOError(f"Failed to fetch with any referer. Last error: {last_error}")
+
+    async def fetch_playlist(self, playlist_url, hints=None):
+        """(text, final URL) of an upstream playlist"""
+        response = await self.open_upstream(playlist_url, hints)
+        try:
+            if response.status_code != 200:
+                raise IOError(f"Failed to fetch stream: HTTP {response.status_code}")
+            content = (await response.aread()).decode('utf-8', errors='replace')
+        finally:
+            await response.aclose()
+        return content, str(response.url)
+
+    async def fetch_rewritten_playlist(self, playlist_url, hints=None, stream_id=None):
+        content, final_url = await self.fetch_playlist(playlist_url, hints)
+
+        # Cached segments live for a few target durations
+        self.segments.set_target_duration(parse_target_duration(content))
+        return self.rewrite_playlist(content, final_url, stream_id)
+
+    # ---------- ASGI ----------
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        self._ensure_started()
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            path = scope['path']
+            if path == '/stream.m3u8':
+                await self._counted(self._serve_playlist(scope, send))
+                return
+            if path.startswith('/s/') and path.endswith('/stream.m3u8'):
+                stream_id = path[len('/s/'):-len('/stream.m3u8')]
+                if stream_id and '/' not in stream_id:
+                    await self._counted(self._serve_playlist(scope, send, stream_id))
+                    return
+            if path.startswith('/proxy/'):
+                await self._counted(self._serve_proxy(scope, receive, send))
+                return
+            if path.startswith(PLAYLIST_PREFIX):
+                await self._counted(self._serve_nested_playlist(scope, send))
+                return
+
+        if self.wsgi is None:
+            await _send_json(send, 404, '{"error": "Not found"}')
+            return
+        await self.wsgi(scope, receive, send)
+
+    async def _counted(self, coro):
+        self.active_requests += 1
+        try:
+            await coro
+        finally:
+            self.active_requests -= 1
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._ensure_started()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _serve_playlist(self, scope, send, stream_id=None):
+        url = self.get_stream_url(stream_id)
+        if stream_id is not None and not url:
+            await _send_json(send, 404, _json_error(f"Unknown or expired stream: {stream_id}"))
+            return
+        if not url and self.ensure_stream_url:
+            url = await asyncio.to_thread(self.ensure_stream_url)
+        if not url:
+            await _send_json(send, 500, '{"error": "No stream URL available"}')
+            return
+        hints = self.get_referer_hints(stream_id) if self.get_referer_hints else None
+
+        try:
+            entry = await self._get_playlist(url, hints, stream_id)
+        except Exception as e:
+            if self.on_playlist_error:
+                self.on_playlist_error(stream_id, e)
+            entry = None
+            # Dead channel: the stream switches to its next one (blocking, so in a thread)
+            next_url = await asyncio.to_thread(self.fail_over, stream_id, e) if self.fail_over else None
+            if next_url:
+                url = next_url
+                hints = self.get_referer_hints(stream_id) if self.get_referer_hints else None
+                try:
+                    entry = await self._get_playlist(url, hints, stream_id)
+                except Exception as next_error:
+                    e = next_error
+            if entry is None:
+                # Keep the player on what it already has; it polls again and we retry
+                last = self.splice_playlist(stream_id, None, None) if self.splice_playlist else None
+                if last is None:
+                    await _send_json(send, 500, _json_error(e))
+                    return
+                text, etag = last
+
+        if entry is not None:
+            if self.splice_playlist:
+                text, etag = self.splice_playlist(stream_id, entry.body, url)
+            else:
+                text, etag = entry.body, entry.etag
+
+        headers = CORS_HEADERS + [
+            (b'access-control-expose-headers', b'ETag'),
+            (b'cache-control', b'no-cache'),
+            (b'etag', etag.encode()),
+        ]
+        # Playlist hasn't changed since the player's last poll
+        if etag in _header(scope, b'if-none-match'):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        body = text.encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers + [
+            (b'content-type', b'application/vnd.apple.mpegurl'),
+            (b'content-length', str(len(body)).encode()),
+        ]})
+        await send({'type': 'http.response.body',
+                    'body': b'' if scope['method'] == 'HEAD' else body})
+
+    def _get_playlist(self, url, hints, stream_id=None):
+        return self.playlists.get(
+            url, lambda playlist_url: self.fetch_rewritten_playlist(playlist_url, hints, stream_id))
+
+    async def _serve_nested_playlist(self, scope, send):
+        # Nested playlists (variants, renditions) change on every reload - fetch and
+        # rewrite them so their segments, keys and maps come back through us too
+        decoded_url = _proxied_url(scope, PLAYLIST_PREFIX)
+        query = urllib.parse.parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        stream_id = query.get('stream', [None])[0]
+        hints = self.get_referer_hints(stream_id) if self.get_referer_hints and stream_id else None
+        try:
+            content, final_url = await self.fetch_playlist(decoded_url, hints)
+            body = self.rewrite_playlist(content, final_url, stream_id).encode('utf-8')
+        except Exception as e:
+            await _send_json(send, 500, _json_error(e))
+            return
+        await send({'type': 'http.response.start', 'status': 200, 'headers': CORS_HEADERS + [
+            (b'cache-control', b'no-cache'),
+            (b'content-type', b'application/vnd.apple.mpegurl'),
+            (b'content-length', str(len(body)).encode()),
+        ]})
+        await send({'type': 'http.response.body',
+                    'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def _serve_proxy(self, scope, receive, send):
+        decoded_url = _proxied_url(scope, '/proxy/')
+
+        # Segments come from the shared cache; concurrent misses share one upstream fetch
+        entry, cache_state = self.segments.get_or_fetch(decoded_url, self.open_upstream)
+        if not await entry.wait_headers():
+            await _send_json(send, 500, '{"error": "Timed out waiting for upstream segment"}')
+            return
+        if entry.status_code not in (200, 206):
+            await _send_json(send, 500, _json_error(
+                f"Failed to fetch segment with any referer. Last error: "
+                f"{entry.error or f'HTTP {entry.status_code}'}"))
+            return
+
+        status = entry.status_code
+        headers = CORS_HEADERS + [
+            (b'content-type', entry.content_type.encode('latin-1')),
+            (b'x-cache', cache_state.encode()),
+            (b'accept-ranges', b'bytes'),
+            (b'access-control-expose-headers', b'Content-Length, Content-Range'),
+        ]
+        length = entry.size if entry.complete else entry.content_length
+        start, stop = 0, None
+
+        # Byte-range requests (Safari native HLS, VLC) are answered from the cached body
+        byte_range = parse_range_header(_header(scope, b'range') or None)
+        if byte_range is not None and status == 200:
+            if length is None:
+                # Chunked upstream still arriving - the total is needed for Content-Range
+                if not await entry.wait_complete() or entry.error:
+                    await _send_json(send, 500, _json_error(
+                        f"Upstream segment fetch failed: {entry.error or 'timed out'}"))
+                    return
+                length = entry.size
+            span = byte_range.range_for_length(length)
+            if span is None:
+                await send({'type': 'http.response.start', 'status': 416, 'headers': headers + [
+                    (b'content-range', f'bytes */{length}'.encode())]})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            start, stop = span
+            status = 206
+            headers.append((b'content-range', f'bytes {start}-{stop - 1}/{length}'.encode()))
+            headers.append((b'content-length', str(stop - start).encode()))
+        elif length is not None:
+            headers.append((b'content-length', str(length).encode()))
+
+        # An upstream failure mid-body propagates so the server drops the connection
+        # instead of ending a truncated segment cleanly
+        disconnected = asyncio.get_running_loop().create_task(_wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if scope['method'] != 'HEAD':
+                async for chunk in entry.iter_range(start, stop):
+                    if disconnected.done():
+                        return  # Viewer went away; the shared fetch carries on for others
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+
+
+def _proxied_url(scope, prefix):
+    # raw_path keeps the %-encoding the playlist rewrite put there (some servers
+    # leave the query string on it; the upstream URL's own '?' is encoded)
+    raw_path = (scope.get('raw_path') or scope['path'].encode()).partition(b'?')[0]
+    return urllib.parse.unquote(raw_path.decode('latin-1')[len(prefix):])
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def _json_error(error):
+    return json.dumps({'error': str(error)})
+
+
+async def _send_json(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')] + CORS_HEADERS})
+    await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def serve(engine, host='0.0.0.0', port=8080):
+    """Run the engine under uvicorn (blocks)"""
+    uvicorn.run(engine, host=host, port=port, log_level='warning',
+                backlog=4096, timeout_keep_alive=30)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Event-driven .m3u8 capture for Playwright extractions
+The Playwright extractors loaded every ad, image and font on a player page,
+then sat through fixed waits (2 s after load, 1 s per popup closed, 3 s at
+the end) even when the stream's playlist had been requested long before.
+A capture routes the browser context instead: images, fonts, stylesheets
+and media, and requests to known ad/popup networks, are aborted, popups are
+closed as soon as they open, and the first .m3u8 request (or playlist
+response) resolves a Future. The extraction waits on that Future, so it
+returns, and its page is closed, as soon as the player asks for its
+manifest.
+"""
+
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+from m3u8_scan import find_m3u8
+
+STREAM_WAIT_MS = 15000   # How long a page gets to request a playlist
+NUDGE_AFTER_MS = 2000    # Without a playlist by then, hide overlays and click the player
+POLL_MS = 100            # Event pumping interval (the sync API only dispatches inside calls)
+
+BLOCKED_RESOURCE_TYPES = frozenset(['image', 'media', 'font', 'stylesheet', 'texttrack', 'manifest'])
+AD_DOMAINS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'google-analytics.com',
+    'googletagmanager.com', 'googletagservices.com', 'adservice.google.com', 'amazon-adsystem.com',
+    'popads.net', 'popcash.net', 'propellerads.com', 'adsterra.com', 'adsterratech.com',
+    'exoclick.com', 'exosrv.com', 'juicyads.com', 'hilltopads.net', 'onclickads.net',
+    'onclkds.com', 'adcash.com', 'a-ads.com', 'mgid.com', 'taboola.com', 'outbrain.com',
+    'revcontent.com', 'histats.com', 'adnxs.com', 'clickadu.com', 'trafficjunky.net',
+    'yandex.ru', 'mc.yandex.ru', 'scorecardresearch.com', 'quantserve.com', 'facebook.net',
+)
+PLAYLIST_CONTENT_TYPES = ('mpegurl',)   # application/vnd.apple.mpegurl, application/x-mpegURL
+BODY_CONTENT_TYPES = ('json', 'javascript', 'text')
+
+OVERLAY_SCRIPT = """
+    document.querySelectorAll('#localpp, *[id*="overlay"], *[id*="popup"]').forEach(el => {
+        el.style.display = 'none';
+    });
+"""
+
+
+def is_ad_host(host):
+    host = (host or '').lower()
+    return any(host == domain or host.endswith('.' + domain) for domain in AD_DOMAINS)
+
+
+class M3u8Capture:
+    """Routes a browser context for stream capture and collects .m3u8 hits.
+
+    Hits are dicts: url, referer, headers, source ('request', 'response',
+    'body' or 'page'). found is a Future resolved with the first request or
+    playlist response hit; body and page hits are only fallbacks."""
+
+    def __init__(self, context, block_types=BLOCKED_RESOURCE_TYPES, block_ads=True,
+                 max_popups=15, log_prefix='[Capture]'):
+        self.context = context
+        self.block_types = block_types
+        self.block_ads = block_ads
+        self.max_popups = max_popups
+        self.log_prefix = log_prefix
+        self.hits = []
+        self.found = Future()
+        self.stats = {'blocked': 0, 'popups_closed': 0}
+        context.route('**/*', self._route)
+
+    def new_page(self):
+        page = self.context.new_page()
+        page.on('response', self._on_response)
+        page.on('popup', self._on_popup)
+        return page
+
+    def _route(self, route):
+        request = route.request
+        url = request.url
+        try:
+            if '.m3u8' in url.lower():
+                self._hit(url, request.headers, 'request')
+                route.continue_()
+            elif request.resource_type in self.block_types or (
+                    self.block_ads and is_ad_host(urlparse(url).hostname)):
+                self.stats['blocked'] += 1
+                route.abort()
+            else:
+                route.continue_()
+        except Exception:
+            pass   # The page was closed under the request
+
+    def _on_popup(self, page):
+        if self.stats['popups_closed'] >= self.max_popups:
+            return
+        try:
+            page.close()
+            self.stats['popups_closed'] += 1
+        except Exception:
+            pass
+
+    def _on_response(self, response):
+        try:
+            if response.status != 200:
+                return
+            content_type = response.headers.get('content-type', '').lower()
+            if any(kind in content_type for kind in PLAYLIST_CONTENT_TYPES):
+                self._hit(response.url, response.request.headers, 'response')
+            elif (response.request.resource_type in ('xhr', 'fetch')
+                    and any(kind in content_type for kind in BODY_CONTENT_TYPES)):
+                for url in find_m3u8(response.text(), base_url=response.url):
+                    self._hit(url, response.request.headers, 'body')
+        except Exception:
+            pass   # Page closed, body evicted, ...
+
+    def _hit(self, url, headers, source):
+        if is_ad_host(urlparse(url).hostname) or any(hit['url'] == url for hit in self.hits):
+            return
+        hit = {'url': url, 'referer': headers.get('referer', ''), 'headers': dict(headers), 'source': source}
+        self.hits.append(hit)
+        print(f"{self.log_prefix} ✓ .m3u8 {source}: {url[:80]}")
+        if source in ('request', 'response') and not self.found.done():
+            self.found.set_result(hit)
+
+    def wait(self, page, timeout_ms=STREAM_WAIT_MS, nudge_after_ms=NUDGE_AFTER_MS):
+        """Wait until a playlist is requested (returns its hit) or timeout_ms pass (None).
+        Overlays are hidden and the player clicked once if nothing came by nudge_after_ms."""
+        waited = 0
+        nudged = False
+        while not self.found.done() and waited < timeout_ms:
+            if not nudged and waited >= nudge_after_ms:
+                nudged = True
+                nudge_player(page)
+                continue
+            try:
+                page.wait_for_timeout(POLL_MS)
+            except Exception:
+                break   # Page or browser gone
+            waited += POLL_MS
+        return self.found.result() if self.found.done() else None
+
+    def scan_content(self, page):
+        """Fallback when nothing was requested: .m3u8 URLs in the page's HTML"""
+        try:
+            for url in find_m3u8(page.content(), base_url=page.url):
+                self._hit(url, {'referer': page.url}, 'page')
+        except Exception:
+            pass
+
+    def results(self):
+        """Hits, network ones first"""
+        network = [hit for hit in self.hits if hit['source'] in ('request', 'response')]
+        return network + [hit for hit in self.hits if hit not in network]
+
+
+def nudge_player(page):
+    """Hide popup overlays and click the player, for players that wait for a click"""
+    try:
+        page.evaluate(OVERLAY_SCRIPT)
+        for selector in ('video', '[class*="play"]', 'iframe'):
+            element = page.query_selector(selector)
+            if element:
+                element.click(timeout=1000)
+                break
+    except Exception:
+        pass
+
+
+def capture_m3u8(context, url, timeout=30000, stream_wait=STREAM_WAIT_MS, referer=None,
+                 max_popups=15, log_prefix='[Capture]'):
+    """Load url in context and return its .m3u8 hits (see M3u8Capture), as soon as
+    the first playlist is requested. timeout bounds the navigation (ms)."""
+    capture = M3u8Capture(context, max_popups=max_popups, log_prefix=log_prefix)
+    page = capture.new_page()
+    if referer:
+        page.set_extra_http_headers({'Referer': referer})
+    try:
+        page.goto(url, wait_until='commit', timeout=timeout)
+        loaded = True
+    except Exception as e:
+        loaded = False
+        if not capture.found.done():
+            print(f"{log_prefix} ⚠ Navigation failed: {str(e)[:80]}")
+    if loaded and capture.wait(page, stream_wait) is None:
+        capture.scan_content(page)
+    try:
+        page.close()
+    except Exception:
+        pass
+    return capture.results()
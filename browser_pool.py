@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Pool of long-lived headless browsers for Playwright extraction
+Every Playwright extraction used to start the Playwright driver and launch
+Chromium, use it for one page, and close it again, so resolving ten
+channels cost ten browser launches. Browsers now stay up between
+extractions: each runs on its own worker thread (the sync API only works on
+the thread that started it), and every job gets a fresh context (cookies,
+popups) in a browser that is already running. Jobs wait in a bounded queue,
+a browser that lost its connection is relaunched before the next job, and
+browsers are recycled after a number of jobs or when the browser processes
+grow past a memory limit.
+"""
+
+import os
+import threading
+from collections import deque
+
+try:
+    from playwright.sync_api import sync_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+MAX_BROWSERS = 2        # Browsers (worker threads) running extractions at once
+MAX_QUEUED = 32         # Extractions waiting for a browser before new ones are refused
+MAX_USES = 50           # Extractions a browser serves before it is relaunched
+MAX_MEMORY_MB = 1500    # Resident memory of all browser processes that triggers a relaunch
+IDLE_TIMEOUT = 300      # Seconds an idle browser is kept running
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+
+class PoolBusy(Exception):
+    """The queue of extractions waiting for a browser is full"""
+
+
+class ChromiumBrowser:
+    """A Playwright driver and the headless Chromium it launched (used from one thread only)"""
+
+    def __init__(self, headless=True):
+        self._playwright = sync_playwright().start()
+        try:
+            self.browser = self._playwright.chromium.launch(headless=headless)
+        except Exception:
+            self._playwright.stop()
+            raise
+
+    def is_connected(self):
+        return self.browser.is_connected()
+
+    def new_context(self, **options):
+        return self.browser.new_context(**options)
+
+    def close(self):
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+        try:
+            self._playwright.stop()
+        except Exception:
+            pass
+
+
+def launch_chromium():
+    """Default launcher for BrowserPool"""
+    return ChromiumBrowser(headless=True)
+
+
+def _children(pid):
+    """Pids of the direct children of pid (Linux /proc)"""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        return []
+
+
+def browser_memory_mb(root_pid=None):
+    """Resident memory (MB) of every process descending from this one: the
+    Playwright driver and the browsers it launched. 0 where /proc isn't available."""
+    pending = _children(root_pid or os.getpid())
+    total_pages = 0
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total_pages += int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        pending.extend(_children(pid))
+    return total_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024) if total_pages else 0
+
+
+class _Job:
+    """One task waiting for (or running in) a browser"""
+
+    def __init__(self, task, context_options):
+        self.task = task
+        self.context_options = context_options
+        self.done = threading.Event()
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+
+class BrowserPool:
+    """Runs task(context) calls on a bounded set of reused browsers"""
+
+    def __init__(self, launch=launch_chromium, max_browsers=MAX_BROWSERS, max_queued=MAX_QUEUED,
+                 max_uses=MAX_USES, max_memory_mb=MAX_MEMORY_MB, idle_timeout=IDLE_TIMEOUT,
+                 context_options=None, memory_usage=browser_memory_mb):
+        self.launch = launch
+        self.max_browsers = max_browsers
+        self.max_queued = max_queued
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.idle_timeout = idle_timeout
+        self.context_options = context_options if context_options is not None else {'user_agent': USER_AGENT}
+        self.memory_usage = memory_usage
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._workers = 0
+        self._idle = 0
+        self._closed = False
+        self._stats = {'jobs': 0, 'failures': 0, 'rejected': 0, 'timeouts': 0,
+                       'launches': 0, 'launch_failures': 0, 'recycled': 0, 'unhealthy': 0}
+
+    def run(self, task, timeout=None, **context_options):
+        """Call task(context) in a new browser context (closed afterwards) and return its
+        result, or raise what it raised. context_options override the pool's (user_agent, ...).
+        Raises PoolBusy when the queue is full, TimeoutError if no result within timeout."""
+        options = dict(self.context_options)
+        options.update(context_options)
+        job = _Job(task, options)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("browser pool is shut down")
+            if len(self._jobs) >= self.max_queued:
+                self._stats['rejected'] += 1
+                raise PoolBusy(f"{len(self._jobs)} extractions already waiting for a browser")
+            self._jobs.append(job)
+            if self._idle < len(self._jobs) and self._workers < self.max_browsers:
+                self._workers += 1
+                threading.Thread(target=self._work, daemon=True, name='browser-pool').start()
+            self._cond.notify()
+        if not job.done.wait(timeout):
+            with self._cond:
+                job.cancelled = True   # Dropped if still queued; a running job finishes unobserved
+                self._stats['timeouts'] += 1
+            raise TimeoutError(f"no browser result within {timeout}s")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _next_job(self):
+        """The next job to run, or None (the worker's slot given up) when idle
+        for idle_timeout or shut down"""
+        with self._cond:
+            while not self._jobs:
+                if self._closed:
+                    self._workers -= 1
+                    return None
+                self._idle += 1
+                woken = self._cond.wait(self.idle_timeout)
+                self._idle -= 1
+                if not woken and not self._jobs:
+                    self._workers -= 1
+                    return None
+            return self._jobs.popleft()
+
+    def _work(self):
+        """Worker thread: owns one browser, relaunched when unhealthy or worn out"""
+        browser = None
+        uses = 0
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+                if job.cancelled:
+                    continue
+                if browser is not None and not self._healthy(browser):
+                    print(f"[BrowserPool] Browser disconnected, relaunching")
+                    self._count('unhealthy')
+                    self._close(browser)
+                    browser = None
+                if browser is None:
+                    try:
+                        browser = self.launch()
+                    except Exception as e:
+                        print(f"[BrowserPool] ✗ Browser launch failed: {e}")
+                        self._count('launch_failures')
+                        job.error = e
+                        job.done.set()
+                        continue
+                    self._count('launches')
+                    uses = 0
+                self._run_job(browser, job)
+                uses += 1
+                if uses >= self.max_uses or self._over_memory():
+                    self._count('recycled')
+                    self._close(browser)
+                    browser = None
+        finally:
+            if browser is not None:
+                self._close(browser)
+
+    def _run_job(self, browser, job):
+        context = None
+        try:
+            context = browser.new_context(**job.context_options)
+            job.result = job.task(context)
+        except Exception as e:
+            job.error = e
+        finally:
+            if context is not None:
+                try:
+                    context.close()
+                except Exception:
+                    pass
+        self._count('failures' if job.error is not None else 'jobs')
+        job.done.set()
+
+    def _healthy(self, browser):
+        try:
+            return browser.is_connected()
+        except Exception:
+            return False
+
+    def _over_memory(self):
+        if not self.max_memory_mb or self.memory_usage is None:
+            return False
+        try:
+            return self.memory_usage() > self.max_memory_mb
+        except Exception:
+            return False
+
+    def _close(self, browser):
+        try:
+            browser.close()
+        except Exception:
+            pass
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def shutdown(self):
+        """Stop the idle workers (closing their browsers); running jobs finish first"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({'browsers': self._workers, 'idle': self._idle, 'queued': len(self._jobs),
+                          'max_browsers': self.max_browsers})
+        return stats
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool():
+    """Process-wide pool for the standalone extraction scripts"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserPool()
+        return _shared_pool
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Live channel quality from what the proxy actually relays
+Every upstream segment fetch reports its time to first byte, how fast it came
+in relative to its playback duration, and whether it failed; every playlist
+fetch reports whether the playlist advanced. These are kept as rolling EWMAs
+per channel and folded into a 0-100 score, so channel selection prefers the
+stream that keeps up rather than the first one that answered.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+ALPHA = 0.2                 # EWMA weight of each new sample
+TARGET_REALTIME = 2.0       # Segments downloading at 2x playback speed or better score full marks
+TTFB_SCALE = 0.5            # Seconds of time-to-first-byte that halve the latency score
+NEUTRAL_SCORE = 50.0        # Channels with no samples rank as this
+MAX_CHANNELS = 512
+MAX_SEGMENT_OWNERS = 8192   # Segment/variant URL -> channel, from the playlists that listed them
+
+
+def channel_key(url):
+    """Identity of a channel across token refreshes: its URL without the query string"""
+    return (url or '').split('?', 1)[0]
+
+
+def _ewma(current, sample):
+    return sample if current is None else current + ALPHA * (sample - current)
+
+
+class ChannelStats:
+    """Rolling delivery metrics for one channel"""
+
+    def __init__(self, key):
+        self.key = key
+        self.ttfb = None            # Seconds until upstream headers
+        self.realtime = None        # Playback duration / download time (>1 keeps up)
+        self.error_rate = 0.0       # EWMA of failed fetches (0..1)
+        self.staleness = None       # Time since the playlist last advanced, in target durations
+        self.segments = 0
+        self.errors = 0
+        self.last_sample = time.time()
+
+    def score(self):
+        speed = 0.5 if self.realtime is None else min(self.realtime / TARGET_REALTIME, 1.0)
+        latency = 0.5 if self.ttfb is None else 1 / (1 + self.ttfb / TTFB_SCALE)
+        fresh = 1.0 if self.staleness is None else 1 / (1 + max(self.staleness - 1, 0))
+        return round(100 * (0.5 * speed + 0.2 * latency + 0.3 * fresh) * (1 - self.error_rate), 1)
+
+    def info(self):
+        return {
+            'score': self.score(),
+            'ttfb_ms': round(self.ttfb * 1000) if self.ttfb is not None else None,
+            'realtime': round(self.realtime, 2) if self.realtime is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'staleness': round(self.staleness, 2) if self.staleness is not None else None,
+            'segments': self.segments,
+            'errors': self.errors
+        }
+
+
+class QualityTracker:
+    """Per-channel ChannelStats fed by playlist and segment fetches"""
+
+    def __init__(self, max_channels=MAX_CHANNELS):
+        self.max_channels = max_channels
+        self._channels = OrderedDict()     # channel key -> ChannelStats
+        self._owners = OrderedDict()       # segment / variant URL -> (channel key, duration)
+        self._playlists = {}               # playlist key -> (last sequence, when it last advanced)
+        self._lock = threading.Lock()
+
+    def _stats(self, key):
+        stats = self._channels.get(key)
+        if stats is None:
+            stats = self._channels[key] = ChannelStats(key)
+            while len(self._channels) > self.max_channels:
+                old_key, _ = self._channels.popitem(last=False)
+                self._playlists.pop(old_key, None)
+        else:
+            self._channels.move_to_end(key)
+        stats.last_sample = time.time()
+        return stats
+
+    def _own(self, url, key, duration=None):
+        self._owners[url] = (key, duration)
+        self._owners.move_to_end(url)
+        while len(self._owners) > MAX_SEGMENT_OWNERS:
+            self._owners.popitem(last=False)
+
+    def _owner_key(self, url):
+        owner = self._owners.get(url)
+        return owner[0] if owner else channel_key(url)
+
+    # ---------- Samples ----------
+
+    def record_playlist(self, playlist_url, playlist):
+        """A fetched playlist (hls_playlist.Playlist): remember which channel its
+        segments and variants belong to, and whether it advanced since last time"""
+        now = time.time()
+        with self._lock:
+            key = self._owner_key(playlist_url)
+            if playlist.is_master:
+                for variant in playlist.variants:
+                    self._own(playlist.absolute(variant.uri), key)
+                return
+
+            for segment in playlist.segments:
+                self._own(playlist.absolute(segment.uri), key, segment.duration)
+            if not playlist.segments or playlist.endlist:
+                return
+
+            # Staleness: how long the last segment has stayed the same, in target durations
+            last_sequence = playlist.segments[-1].sequence
+            playlist_key = channel_key(playlist_url)
+            previous = self._playlists.get(playlist_key)
+            if previous is None or last_sequence is None or last_sequence != previous[0]:
+                self._playlists[playlist_key] = (last_sequence, now)
+                stale_for = 0.0
+            else:
+                stale_for = now - previous[1]
+            target = playlist.target_duration or 6
+            stats = self._stats(key)
+            stats.staleness = _ewma(stats.staleness, stale_for / target)
+
+    def record_segment(self, url, status_code, ttfb, elapsed, size, error=None):
+        """One upstream segment fetch finished (the segment caches' on_fetched hook)"""
+        with self._lock:
+            owner = self._owners.get(url)
+            if owner is None:
+                return
+            key, duration = owner
+            stats = self._stats(key)
+            failed = bool(error) or status_code != 200
+            stats.segments += 1
+            stats.error_rate = _ewma(stats.error_rate, 1.0 if failed else 0.0)
+            if failed:
+                stats.errors += 1
+                return
+            if ttfb is not None:
+                stats.ttfb = _ewma(stats.ttfb, ttfb)
+            if duration and elapsed and elapsed > 0:
+                stats.realtime = _ewma(stats.realtime, min(duration / elapsed, 10.0))
+
+    def record_failure(self, playlist_url):
+        """A channel's playlist couldn't be fetched"""
+        with self._lock:
+            stats = self._stats(self._owner_key(playlist_url))
+            stats.errors += 1
+            stats.error_rate = _ewma(stats.error_rate, 1.0)
+
+    # ---------- Ranking ----------
+
+    def score(self, url):
+        with self._lock:
+            stats = self._channels.get(channel_key(url))
+            return stats.score() if stats else None
+
+    def rank(self, channels, current=None):
+        """Indexes of channels other than current, best score first; ties and
+        unknowns keep list order, counting on from current"""
+        start = current if current is not None else 0
+        with self._lock:
+            scores = []
+            for i, channel in enumerate(channels):
+                if i == current:
+                    continue
+                stats = self._channels.get(channel_key(channel.get('url')))
+                scores.append((-(stats.score() if stats else NEUTRAL_SCORE),
+                               (i - start) % len(channels), i))
+        return [i for _, _, i in sorted(scores)]
+
+    def snapshot(self):
+        with self._lock:
+            return {key: stats.info() for key, stats in self._channels.items()}
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Hot-standby warming for backup channels
+/api/next-channel used to jump to whatever URL came next, dead or expired,
+and the player found out after a full load. A background thread now probes
+the next few alternates of every stream: it fetches their playlists (which
+keeps their referers learned and lets a stale token be re-resolved early) and
+prefetches the segment a switch would start on. Switches then pick the next
+channel known to be alive, and its first segment is already in the cache.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import channel_quality
+
+WARM_INTERVAL = 15       # Seconds between warming rounds
+WARM_TOP_K = 2           # Alternates kept warm per stream (the next K after the current one)
+DEAD_RECHECK = 60        # A failed channel is skipped this long unless a later probe succeeds
+FORGET_AFTER = 600       # Health of channels nobody has probed for this long is dropped
+MAX_WORKERS = 4          # Concurrent probes
+
+
+def channel_key(channel):
+    """Identity of a channel across token refreshes: its URL without the query string"""
+    return channel_quality.channel_key(channel.get('url'))
+
+
+class ChannelHealth:
+    """What the last probes of one channel found"""
+
+    def __init__(self):
+        self.ok = None            # None until probed
+        self.last_checked = 0
+        self.last_ok = 0
+        self.failures = 0
+        self.latency = None
+        self.error = None
+
+    def usable(self, now=None):
+        """Not known to be dead (untested channels count as usable)"""
+        if self.ok is not False:
+            return True
+        return (now or time.time()) - self.last_checked > DEAD_RECHECK
+
+    def info(self):
+        return {
+            'ok': self.ok,
+            'last_checked': round(time.time() - self.last_checked, 1) if self.last_checked else None,
+            'failures': self.failures,
+            'latency_ms': round(self.latency * 1000) if self.latency is not None else None,
+            'error': self.error
+        }
+
+
+class ChannelWarmer:
+    """Probes the top-K alternates of every stream on a timer and tracks their health.
+
+    list_streams() returns (source_url, channels, current_index) for every live
+    stream; probe(source_url, channel) fetches the channel and raises if it's
+    dead. It may update channel['url'] (a re-resolved token) in place.
+    rank(channels, current), if given, orders the other channels best first
+    (QualityTracker.rank); the best ones are kept warm along with the next one.
+    """
+
+    def __init__(self, probe, list_streams, interval=WARM_INTERVAL, top_k=WARM_TOP_K,
+                 max_workers=MAX_WORKERS, rank=None):
+        self.probe = probe
+        self.list_streams = list_streams
+        self.rank = rank
+        self.interval = interval
+        self.top_k = top_k
+        self.max_workers = max_workers
+        self._health = {}             # channel_key -> ChannelHealth
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.rounds = 0
+        self.probes = 0
+
+    # ---- choosing channels --------------------------------------------------
+
+    def _cyclic(self, channels, index):
+        return [(index + i) % len(channels) for i in range(1, len(channels))]
+
+    def alternates(self, channels, index):
+        """The channels kept warm: the next one after index, then the best ranked"""
+        order = self._cyclic(channels, index)
+        if self.rank is not None and order:
+            order = [order[0]] + [i for i in self.rank(channels, index) if i != order[0]]
+        return [channels[i] for i in order[:self.top_k]]
+
+    def health(self, channel):
+        with self._lock:
+            return self._health.get(channel_key(channel))
+
+    def pick_next(self, channels, index, by_quality=False):
+        """Index of the channel to switch to: the next one known alive, else the next
+        not known dead, else simply the next one. by_quality goes through the
+        channels best score first instead of in list order (for failover)."""
+        if not channels:
+            return None
+        now = time.time()
+        if by_quality and self.rank is not None:
+            order = self.rank(channels, index) or [index]
+        else:
+            order = self._cyclic(channels, index) or [index]
+        with self._lock:
+            states = [self._health.get(channel_key(channels[i])) for i in order]
+        for i, health in zip(order, states):
+            if health is not None and health.ok:
+                return i
+        for i, health in zip(order, states):
+            if health is None or health.usable(now):
+                return i
+        return order[0]
+
+    # ---- probing --------------------------------------------------------------
+
+    def warm_once(self):
+        """One round: probe every stream's alternates (each channel once)"""
+        targets = {}
+        for source_url, channels, index in self.list_streams():
+            for channel in self.alternates(channels, index):
+                targets.setdefault(channel_key(channel), (source_url, channel))
+        if not targets:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(lambda target: self._probe(*target), targets.values()))
+
+        now = time.time()
+        with self._lock:
+            for key in [k for k, h in self._health.items() if now - h.last_checked > FORGET_AFTER]:
+                del self._health[key]
+            self.rounds += 1
+        return len(targets)
+
+    def _probe(self, source_url, channel):
+        key = channel_key(channel)
+        start = time.time()
+        try:
+            self.probe(source_url, channel)
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)[:120]
+        now = time.time()
+
+        with self._lock:
+            self.probes += 1
+            health = self._health.get(key)
+            if health is None:
+                health = self._health[key] = ChannelHealth()
+            if channel_key(channel) != key:
+                # The probe re-resolved the channel to a new URL; track it under that
+                # (the old URL's token is dead, nothing will look it up again)
+                self._health[channel_key(channel)] = self._health.pop(key)
+            health.ok = ok
+            health.last_checked = now
+            health.latency = now - start
+            health.error = error
+            if ok:
+                health.last_ok = now
+                health.failures = 0
+            else:
+                health.failures += 1
+        if not ok:
+            print(f"[Warmer] ✗ {channel.get('name', key)}: {error}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='channel-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.warm_once()
+            except Exception as e:
+                print(f"[Warmer] Round failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        with self._lock:
+            healthy = sum(1 for h in self._health.values() if h.ok)
+            dead = sum(1 for h in self._health.values() if h.ok is False)
+            return {
+                'interval': self.interval,
+                'top_k': self.top_k,
+                'rounds': self.rounds,
+                'probes': self.probes,
+                'channels': len(self._health),
+                'healthy': healthy,
+                'dead': dead,
+                'health': {key: health.info() for key, health in self._health.items()}
+            }
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+One continuous live playlist across upstream channel switches
+When a channel dies the proxy fails over to the next one; the player should
+just see a discontinuity, not a new stream. Each stream keeps its own window
+of segments with a media sequence that only ever goes up: segments from a
+new source are numbered after the last one already served, the first of
+them carries #EXT-X-DISCONTINUITY, and #EXT-X-DISCONTINUITY-SEQUENCE counts
+the discontinuities that have slid out of the window.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+from hls_playlist import Playlist, Tag
+from playlist_cache import make_etag
+
+MIN_WINDOW = 3              # Segments kept even if upstream lists fewer
+MAX_WINDOW = 60             # ... and at most this many
+SWITCH_SEGMENTS = 3         # Segments taken from the live edge of a new source
+FAILOVER_COOLDOWN = 10      # Seconds between switches, so concurrent pollers switch once
+
+# Playlist-level tags; everything else before a URI line belongs to that segment
+HEADER_TAGS = frozenset((
+    'EXTM3U', 'EXT-X-VERSION', 'EXT-X-TARGETDURATION', 'EXT-X-MEDIA-SEQUENCE',
+    'EXT-X-DISCONTINUITY-SEQUENCE', 'EXT-X-PLAYLIST-TYPE', 'EXT-X-INDEPENDENT-SEGMENTS',
+    'EXT-X-START', 'EXT-X-ENDLIST', 'EXT-X-ALLOW-CACHE', 'EXT-X-SERVER-CONTROL',
+    'EXT-X-PART-INF', 'EXT-X-I-FRAMES-ONLY',
+))
+# Re-emitted from the segment's effective state instead of copied
+STATE_TAGS = frozenset(('EXT-X-KEY', 'EXT-X-MAP', 'EXT-X-DISCONTINUITY'))
+# LL-HLS tags after the last segment that are carried over from the current source
+# (rendition reports are not: their sequence numbers are the source's, not ours)
+TRAILING_TAGS = frozenset(('EXT-X-PART', 'EXT-X-PRELOAD-HINT'))
+# SERVER-CONTROL attributes passed through; skipping and blocking are up to whoever serves us
+SERVER_CONTROL_ATTRIBUTES = ('HOLD-BACK', 'PART-HOLD-BACK')
+
+
+class _OutSegment:
+    """A segment as served: our sequence number plus the lines to write for it"""
+
+    __slots__ = ('sequence', 'duration', 'lines', 'key', 'map', 'discontinuity')
+
+    def __init__(self, sequence, duration, lines, key, map, discontinuity):
+        self.sequence = sequence
+        self.duration = duration
+        self.lines = lines
+        self.key = key
+        self.map = map
+        self.discontinuity = discontinuity
+
+
+class ContinuousPlaylist:
+    """Splices rewritten media playlists from successive sources into one live window"""
+
+    def __init__(self):
+        self.source = None
+        self.offset = 0                    # Our sequence = upstream sequence + offset
+        self.window = deque()
+        self.discontinuity_sequence = 0
+        self.version = None
+        self.target_duration = None
+        self.endlist = False
+        self.part_inf = None               # EXT-X-PART-INF line of an LL-HLS source
+        self.server_control = None         # Its hold-back attributes, e.g. 'PART-HOLD-BACK=3.0'
+        self.trailing = []                 # Parts / preload hints of the segment in progress
+        self.switches = 0
+        self.last_switch = 0
+        self._last_input = None            # (source, body) the cached output was built from
+        self._output = None                # (body, etag)
+        self._lock = threading.Lock()
+
+    def update(self, content, source):
+        """Fold a rewritten upstream playlist from source (its upstream URL) in; return (body, etag).
+
+        Master playlists and playlists without segments pass through untouched.
+        """
+        with self._lock:
+            if self._last_input == (source, content) and self._output:
+                return self._output
+
+            playlist = Playlist.parse(content)
+            if playlist.is_master or not playlist.segments:
+                return content, make_etag(content)
+
+            self._fold(playlist, source)
+            self._last_input = (source, content)
+            body = self.dumps()
+            self._output = (body, make_etag(body))
+            return self._output
+
+    def last(self):
+        """The last (body, etag) served, or None; kept playing while upstream is down"""
+        with self._lock:
+            return self._output
+
+    def begin_switch(self, now=None):
+        """Claim a failover; False if another poller switched within the cooldown"""
+        now = now or time.time()
+        with self._lock:
+            if now - self.last_switch < FAILOVER_COOLDOWN:
+                return False
+            self.last_switch = now
+            return True
+
+    def _fold(self, playlist, source):
+        # A refreshed token is the same source; a different host or path is a switch
+        source = source.split('?', 1)[0] if source else source
+        segments = playlist.segments
+        for index, segment in enumerate(segments):
+            if segment.sequence is None:
+                segment.sequence = playlist.media_sequence + index
+
+        last_out = self.window[-1].sequence if self.window else None
+        restarted = (source == self.source and last_out is not None
+                     and segments[-1].sequence + self.offset < self.window[0].sequence)
+
+        if source != self.source or restarted:
+            if last_out is None:
+                # First source: keep its numbering and window as-is
+                self.offset = 0
+                self.discontinuity_sequence = playlist.discontinuity_sequence
+                start = segments[0]
+            else:
+                # Join the new source at its live edge, numbered after what we served
+                start = segments[max(len(segments) - SWITCH_SEGMENTS, 0)]
+                self.offset = last_out + 1 - start.sequence
+                self.switches += 1
+                print(f"[Failover] Spliced {'restarted source' if restarted else 'new source'} "
+                      f"at sequence {last_out + 1}")
+            switched = last_out is not None
+            self.source = source
+        else:
+            start = None
+            switched = False
+
+        for segment in segments:
+            if start is not None and segment.sequence < start.sequence:
+                continue
+            sequence = segment.sequence + self.offset
+            if last_out is not None:
+                if sequence <= last_out:
+                    continue
+                if sequence > last_out + 1:
+                    # Upstream slid past segments we never saw; numbering must stay gapless
+                    self.offset -= sequence - last_out - 1
+                    sequence = last_out + 1
+                    switched = True
+            lines = [tag.dumps() for tag in segment.tags
+                     if tag.name not in HEADER_TAGS and tag.name not in STATE_TAGS]
+            lines.append(segment.line.dumps())
+            self.window.append(_OutSegment(
+                sequence, segment.duration, lines,
+                segment.key.dumps() if segment.key is not None else None,
+                segment.map.dumps() if segment.map is not None else None,
+                segment.discontinuity or switched))
+            switched = False
+            last_out = sequence
+
+        window_size = min(max(len(segments), MIN_WINDOW), MAX_WINDOW)
+        while len(self.window) > window_size:
+            if self.window.popleft().discontinuity:
+                self.discontinuity_sequence += 1
+
+        # LL-HLS: parts of the segment upstream is still producing, and their timing
+        part_inf = playlist.tags.get('EXT-X-PART-INF')
+        self.part_inf = part_inf.dumps() if part_inf is not None else None
+        control = playlist.tags.get('EXT-X-SERVER-CONTROL')
+        attributes = control.attributes if control is not None else {}
+        self.server_control = ','.join(f'{name}={attributes[name]}' for name in SERVER_CONTROL_ATTRIBUTES
+                                       if name in attributes) or None
+        self.trailing = [tag.dumps() for tag in playlist.trailing
+                         if isinstance(tag, Tag) and tag.name in TRAILING_TAGS]
+
+        self.version = max(self.version or 0, playlist.version or 0) or None
+        durations = [s.duration for s in self.window if s.duration]
+        self.target_duration = max([playlist.target_duration or 0] +
+                                   [math.ceil(d) for d in durations]) or None
+        self.endlist = playlist.endlist
+
+    def dumps(self):
+        lines = ['#EXTM3U']
+        if self.version:
+            lines.append(f'#EXT-X-VERSION:{self.version}')
+        if self.target_duration:
+            lines.append(f'#EXT-X-TARGETDURATION:{math.ceil(self.target_duration)}')
+        lines.append(f'#EXT-X-MEDIA-SEQUENCE:{self.window[0].sequence if self.window else 0}')
+        if self.discontinuity_sequence:
+            lines.append(f'#EXT-X-DISCONTINUITY-SEQUENCE:{self.discontinuity_sequence}')
+        if self.server_control:
+            lines.append(f'#EXT-X-SERVER-CONTROL:{self.server_control}')
+        if self.part_inf:
+            lines.append(self.part_inf)
+
+        key = map_tag = None
+        for segment in self.window:
+            if segment.discontinuity:
+                lines.append('#EXT-X-DISCONTINUITY')
+            # Keys and init maps in effect, written wherever they change
+            if segment.key != key:
+                lines.append(segment.key or '#EXT-X-KEY:METHOD=NONE')
+                key = segment.key
+            if segment.map != map_tag and segment.map:
+                lines.append(segment.map)
+                map_tag = segment.map
+            lines.extend(segment.lines)
+
+        if self.endlist:
+            lines.append('#EXT-X-ENDLIST')
+        else:
+            lines.extend(self.trailing)
+        return '\n'.join(lines) + '\n'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'source': self.source,
+                'media_sequence': self.window[0].sequence if self.window else None,
+                'segments': len(self.window),
+                'discontinuity_sequence': self.discontinuity_sequence,
+                'switches': self.switches
+            }
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Disk-backed timeshift (DVR) for live streams
+Every segment a stream's pull loop relays is appended to a fixed-size ring
+file for that stream, memory-mapped, with an in-memory index of where each
+segment sits and how long it plays. The proxy serves the index as a sliding
+live playlist covering the last N minutes, so players can pause and seek
+back the whole window from local disk at no upstream cost. The file size is
+fixed up front and the bytes live in the page cache, not the process heap,
+so memory use stays flat however long the window is.
+"""
+
+import math
+import mmap
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+DVR_MINUTES = 30                         # Window served by the DVR playlist
+RING_BYTES = 512 * 1024 * 1024           # Ring file size per stream
+MAX_RINGS = 4                            # Streams recorded at once; the least recently written goes first
+READ_CHUNK_SIZE = 256 * 1024             # Bytes copied out of the map per read
+RECORD_TIMEOUT = 60                      # Seconds the writer waits for a segment download to finish
+MAX_PENDING = 256                        # Segments queued for the writer before new ones are dropped
+
+
+class DvrSegment:
+    """Where one recorded segment sits in the ring and how to list it"""
+
+    __slots__ = ('number', 'sequence', 'offset', 'size', 'duration', 'discontinuity',
+                 'key', 'map', 'content_type', 'recorded')
+
+    def __init__(self, number, sequence, offset, size, duration, discontinuity,
+                 key, map, content_type):
+        self.number = number              # Position in the DVR playlist (contiguous)
+        self.sequence = sequence          # Media sequence it had in the live playlist
+        self.offset = offset
+        self.size = size
+        self.duration = duration
+        self.discontinuity = discontinuity
+        self.key = key                    # EXT-X-KEY line in effect, or None
+        self.map = map                    # EXT-X-MAP line in effect, or None
+        self.content_type = content_type
+        self.recorded = time.time()
+
+
+class DvrRing:
+    """Fixed-size, memory-mapped ring file of one stream's segments plus their index.
+
+    Segments are written one after another and wrap to the start of the file
+    when the next one doesn't fit; whatever they overwrite (and anything older)
+    leaves the index, as do segments older than max_duration.
+    """
+
+    def __init__(self, path, capacity=RING_BYTES, max_duration=DVR_MINUTES * 60):
+        self.path = path
+        self.capacity = capacity
+        self.max_duration = max_duration
+        self._file = open(path, 'w+b')
+        self._file.truncate(capacity)     # Sparse on most filesystems until written
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+        self._index = deque()             # DvrSegment, oldest first
+        self._by_number = {}
+        self._write_pos = 0
+        self._next_number = 0
+        self._last_sequence = None
+        self._duration = 0.0
+        self.discontinuity_sequence = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def append(self, sequence, chunks, size, duration, discontinuity=False, key=None,
+               map=None, content_type='video/mp2t'):
+        """Write one segment's body (an iterable of byte chunks totalling size); return its DvrSegment"""
+        if size <= 0 or size > self.capacity:
+            return None
+        with self._lock:
+            offset = self._write_pos if self._write_pos + size <= self.capacity else 0
+
+            # Drop what the new bytes overwrite, and everything older so the window has no holes
+            overwritten = 0
+            for position, old in enumerate(self._index):
+                if old.offset < offset + size and offset < old.offset + old.size:
+                    overwritten = position + 1
+            for _ in range(overwritten):
+                self._drop_oldest()
+
+            position = offset
+            for chunk in chunks:
+                if position + len(chunk) > offset + size:
+                    raise ValueError("Segment body is larger than its declared size")
+                self._map[position:position + len(chunk)] = chunk
+                position += len(chunk)
+            if position != offset + size:
+                raise ValueError("Segment body is shorter than its declared size")
+
+            # A skipped live segment is a jump in the media timeline
+            gap = self._last_sequence is not None and sequence != self._last_sequence + 1
+            segment = DvrSegment(self._next_number, sequence, offset, size, duration or 0.0,
+                                 discontinuity or gap, key, map, content_type)
+            self._index.append(segment)
+            self._by_number[segment.number] = segment
+            self._next_number += 1
+            self._last_sequence = sequence
+            self._write_pos = offset + size
+            self._duration += segment.duration
+            self.bytes_written += size
+
+            while self._duration > self.max_duration and len(self._index) > 1:
+                self._drop_oldest()
+            return segment
+
+    def _drop_oldest(self):
+        segment = self._index.popleft()
+        del self._by_number[segment.number]
+        self._duration -= segment.duration
+        if segment.discontinuity:
+            self.discontinuity_sequence += 1
+
+    def get(self, number):
+        with self._lock:
+            return self._by_number.get(number)
+
+    def read(self, number, start=0, stop=None):
+        """Yield bytes [start, stop) of a recorded segment; raises IOError once it's overwritten"""
+        segment = self.get(number)
+        if segment is None:
+            raise IOError(f"Segment {number} is not in the DVR window")
+        stop = segment.size if stop is None else min(stop, segment.size)
+        position = start
+        while position < stop:
+            with self._lock:
+                if self._by_number.get(number) is not segment:
+                    raise IOError(f"Segment {number} was overwritten while being read")
+                piece_stop = min(stop, position + READ_CHUNK_SIZE)
+                piece = self._map[segment.offset + position:segment.offset + piece_stop]
+            position = piece_stop
+            yield piece
+
+    def playlist(self, uri_for):
+        """The window as a live media playlist; uri_for(number) gives each segment's URI"""
+        with self._lock:
+            segments = list(self._index)
+            discontinuity_sequence = self.discontinuity_sequence
+        target = max([math.ceil(s.duration) for s in segments] + [1])
+        version = 6 if any(s.map for s in segments) else 3
+        lines = ['#EXTM3U', f'#EXT-X-VERSION:{version}', f'#EXT-X-TARGETDURATION:{target}',
+                 f'#EXT-X-MEDIA-SEQUENCE:{segments[0].number if segments else 0}']
+        if discontinuity_sequence:
+            lines.append(f'#EXT-X-DISCONTINUITY-SEQUENCE:{discontinuity_sequence}')
+
+        # The first segment keeps its tag too: the sequence above only counts it once it slides out
+        key = map_tag = None
+        for segment in segments:
+            if segment.discontinuity:
+                lines.append('#EXT-X-DISCONTINUITY')
+            if segment.key != key:
+                lines.append(segment.key or '#EXT-X-KEY:METHOD=NONE')
+                key = segment.key
+            if segment.map != map_tag and segment.map:
+                lines.append(segment.map)
+                map_tag = segment.map
+            lines.append(f'#EXTINF:{segment.duration:.3f},')
+            lines.append(uri_for(segment.number))
+        return '\n'.join(lines) + '\n'
+
+    def close(self, delete=True):
+        with self._lock:
+            self._index.clear()
+            self._by_number.clear()
+            self._map.close()
+            self._file.close()
+        if delete:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'segments': len(self._index),
+                'seconds': round(self._duration, 1),
+                'bytes': sum(s.size for s in self._index),
+                'capacity': self.capacity,
+                'bytes_written': self.bytes_written,
+                'oldest_age': round(time.time() - self._index[0].recorded, 1) if self._index else None
+            }
+
+
+class DvrStore:
+    """One DvrRing per recorded stream, filled by a writer thread from the pull loops"""
+
+    def __init__(self, directory, ring_bytes=RING_BYTES, max_duration=DVR_MINUTES * 60,
+                 max_rings=MAX_RINGS):
+        self.directory = directory
+        self.ring_bytes = ring_bytes
+        self.max_duration = max_duration
+        self.max_rings = max_rings
+        self._rings = OrderedDict()       # stream key -> DvrRing, least recently written first
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.recorded = 0
+        self.dropped = 0
+
+    def ring(self, key):
+        """The stream's ring, or None if nothing has been recorded for it"""
+        with self._lock:
+            return self._rings.get(key)
+
+    def _ring_for_writing(self, key):
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is not None:
+                self._rings.move_to_end(key)
+                return ring
+            os.makedirs(self.directory, exist_ok=True)
+            ring = self._rings[key] = DvrRing(os.path.join(self.directory, f'{key}.ring'),
+                                              self.ring_bytes, self.max_duration)
+            evicted = []
+            while len(self._rings) > self.max_rings:
+                evicted.append(self._rings.popitem(last=False))
+        for old_key, old_ring in evicted:
+            print(f"[DVR] Dropped recording of {old_key} (least recently written)")
+            old_ring.close()
+        print(f"[DVR] Recording {key} to {ring.path}")
+        return ring
+
+    def record(self, key, sequence, duration, entry, discontinuity=False, key_tag=None, map_tag=None):
+        """Queue a segment whose download (a SegmentEntry) is under way; written once it completes"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='dvr-writer', daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((key, sequence, duration, entry, discontinuity, key_tag, map_tag))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            key, sequence, duration, entry, discontinuity, key_tag, map_tag = self._queue.get()
+            try:
+                if not entry.wait_complete(timeout=RECORD_TIMEOUT) or entry.error \
+                        or entry.status_code != 200:
+                    self.dropped += 1
+                    continue
+                ring = self._ring_for_writing(key)
+                ring.append(sequence, entry.iter_range(), entry.size, duration, discontinuity,
+                            key_tag, map_tag, entry.content_type)
+                self.recorded += 1
+            except Exception as e:
+                self.dropped += 1
+                print(f"[DVR] ✗ Couldn't record segment {sequence} of {key}: {e}")
+
+    def remove(self, key):
+        with self._lock:
+            ring = self._rings.pop(key, None)
+        if ring is not None:
+            ring.close()
+
+    def stats(self):
+        with self._lock:
+            rings = dict(self._rings)
+        return {
+            'directory': self.directory,
+            'window_seconds': self.max_duration,
+            'ring_bytes': self.ring_bytes,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'pending': self._queue.qsize(),
+            'streams': {key: ring.stats() for key, ring in rings.items()}
+        }
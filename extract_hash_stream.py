@@ -5,7 +5,8 @@ Specifically for: https://livetv872.me/enx/eventinfo/332240466_philadelphia_san_
 """
 
 import re
-import requests
+import upstream_client
+from m3u8_scan import find_m3u8
 import urllib.parse
 import urllib3
 import sys
@@ -15,7 +16,9 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Try to import Playwright
 try:
-    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+    from browser_pool import shared_pool
+    from browser_capture import M3u8Capture
     PLAYWRIGHT_AVAILABLE = True
 except ImportError:
     PLAYWRIGHT_AVAILABLE = False
@@ -87,13 +90,11 @@ def extract_stream_with_playwright(webplayer_url, referer_url, timeout=30000):
     print(f"\n[Playwright] Extracting stream from: {webplayer_url}")
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent=HEADERS['User-Agent'],
-                viewport={'width': 1920, 'height': 1080}
-            )
-            page = context.new_page()
+        # Runs on a pooled browser, in a fresh context the pool closes afterwards
+        def capture(context):
+            # Captures .m3u8 requests, with ads, images and popups blocked
+            stream_capture = M3u8Capture(context, log_prefix=' ')
+            page = stream_capture.new_page()
             
             # Set referer
             page.set_extra_http_headers({'Referer': referer_url})
@@ -102,25 +103,18 @@ def extract_stream_with_playwright(webplayer_url, referer_url, timeout=30000):
             headers = HEADERS.copy()
             headers['Referer'] = referer_url
             
-            # Listen for network requests to capture .m3u8 URLs
+            # Stream URLs found in the links iframe
             stream_urls = []
             
-            def handle_response(response):
-                url = response.url
-                if '.m3u8' in url:
-                    if url not in stream_urls:
-                        stream_urls.append(url)
-                        print(f"  ✓ Found stream: {url}")
-            
-            page.on('response', handle_response)
-            
             # Navigate to webplayer
             print(f"  Loading webplayer page...")
             page.goto(webplayer_url, wait_until='domcontentloaded', timeout=timeout)
             
-            # Wait a bit for JavaScript to load streams
+            # Wait for JavaScript to request the stream (returns as soon as it does)
             print(f"  Waiting for stream to load...")
-            page.wait_for_timeout(5000)
+            if stream_capture.wait(page, 5000):
+                page.close()
+                return [hit['url'] for hit in stream_capture.results()]
             
             # Check for iframes - especially cache/links iframes
             iframes = page.query_selector_all('iframe')
@@ -144,7 +138,7 @@ def extract_stream_with_playwright(webplayer_url, referer_url, timeout=30000):
                             print(f"  Fetching: {iframe_src}")
                             try:
                                 # Fetch the links HTML directly
-                                links_response = requests.get(iframe_src, headers=headers, timeout=10, verify=False)
+                                links_response = upstream_client.get(iframe_src, headers=headers, timeout=10, verify=False)
                                 print(f"  Response status: {links_response.status_code}")
                                 
                                 if links_response.status_code == 200:
@@ -152,8 +146,7 @@ def extract_stream_with_playwright(webplayer_url, referer_url, timeout=30000):
                                     print(f"  Content length: {len(links_content)} bytes")
                                     
                                     # Look for .m3u8 URLs in the links HTML
-                                    m3u8_pattern = r'https?://[^\s"\'<>]+\.m3u8[^\s"\'<>]*'
-                                    links_matches = re.findall(m3u8_pattern, links_content)
+                                    links_matches = find_m3u8(links_content, base_url=iframe_src)
                                     if links_matches:
                                         print(f"  ✓ Found {len(links_matches)} stream URL(s) in links HTML:")
                                         for match in links_matches[:5]:
@@ -211,25 +204,23 @@ def extract_stream_with_playwright(webplayer_url, referer_url, timeout=30000):
                                 import traceback
                                 traceback.print_exc()
                         
-                        # Try to access iframe content frame
-                        iframe_frame = iframe.content_frame()
-                        if iframe_frame:
-                            iframe_frame.wait_for_timeout(3000)
-                            # Check iframe's network requests
-                            print(f"    Waiting for iframe content...")
                 except Exception as e:
                     print(f"  ⚠️  Error checking iframe: {e}")
             
-            # Wait a bit more for any delayed requests
-            page.wait_for_timeout(3000)
-            
-            browser.close()
-            
-            if stream_urls:
-                return stream_urls[0]  # Return first stream found
-            else:
-                print("  ⚠️  No .m3u8 URLs captured")
-                return None
+            # Wait a bit more for any delayed requests (the iframes' included)
+            stream_capture.wait(page, 3000, nudge_after_ms=0)
+            page.close()
+            captured = [hit['url'] for hit in stream_capture.results()]
+            return captured + [url for url in stream_urls if url not in captured]
+        
+        stream_urls = shared_pool().run(capture, user_agent=HEADERS['User-Agent'],
+                                        viewport={'width': 1920, 'height': 1080})
+        
+        if stream_urls:
+            return stream_urls[0]  # Return first stream found
+        else:
+            print("  ⚠️  No .m3u8 URLs captured")
+            return None
                 
     except Exception as e:
         print(f"  ❌ Playwright error: {e}")
@@ -246,7 +237,7 @@ def extract_stream_from_apl385_player(player_url, referer_url):
     
     try:
         # First, try to get the HTML
-        response = requests.get(player_url, headers=headers, timeout=10, verify=False)
+        response = upstream_client.get(player_url, headers=headers, timeout=10, verify=False)
         if response.status_code != 200:
             print(f"  ❌ Status code: {response.status_code}")
             return None
@@ -254,41 +245,13 @@ def extract_stream_from_apl385_player(player_url, referer_url):
         content = response.text
         print(f"  Content length: {len(content)} bytes")
         
-        # Look for .m3u8 URLs in the HTML
-        m3u8_pattern = r'(?:https?:)?//[^\s"\'<>]+\.m3u8[^\s"\'<>]*'
-        m3u8_matches = re.findall(m3u8_pattern, content)
-        
-        # Make URLs absolute
-        absolute_matches = []
-        for match in m3u8_matches:
-            if match.startswith('//'):
-                match = 'https:' + match
-            absolute_matches.append(match)
-        
-        if absolute_matches:
-            print(f"  ✓ Found {len(absolute_matches)} .m3u8 URL(s):")
-            for match in absolute_matches[:3]:
+        # Look for .m3u8 URLs in the HTML and inline JS, best first
+        m3u8_matches = find_m3u8(content, base_url=player_url)
+        if m3u8_matches:
+            print(f"  ✓ Found {len(m3u8_matches)} .m3u8 URL(s):")
+            for match in m3u8_matches[:3]:
                 print(f"    {match}")
-            return absolute_matches[0]
-        
-        # Look for JavaScript variables that might contain stream URLs
-        js_patterns = [
-            r'["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'src\s*[:=]\s*["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'url\s*[:=]\s*["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'stream\s*[:=]\s*["\']([^"\']*\.m3u8[^"\']*)["\']',
-        ]
-        
-        for pattern in js_patterns:
-            matches = re.findall(pattern, content, re.I)
-            for match in matches:
-                if '.m3u8' in match:
-                    if match.startswith('//'):
-                        match = 'https:' + match
-                    elif not match.startswith('http'):
-                        continue
-                    print(f"  ✓ Found stream in JS: {match}")
-                    return match
+            return m3u8_matches[0]
         
         # Look for iframe src that might contain the stream
         iframe_pattern = r'<iframe[^>]+src=["\']([^"\']+)["\']'
@@ -323,35 +286,17 @@ def extract_stream_from_apl385_with_playwright(player_url, referer_url, timeout=
     print(f"  [Playwright] Loading player page...")
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent=HEADERS['User-Agent'],
-                viewport={'width': 1920, 'height': 1080}
-            )
-            page = context.new_page()
+        # Runs on a pooled browser, in a fresh context the pool closes afterwards
+        def capture(context):
+            stream_capture = M3u8Capture(context, log_prefix='   ')
+            page = stream_capture.new_page()
             page.set_extra_http_headers({'Referer': referer_url})
             
-            stream_urls = []
-            
-            def handle_response(response):
-                url = response.url
-                if '.m3u8' in url:
-                    if url not in stream_urls:
-                        stream_urls.append(url)
-                        print(f"    ✓ Found stream: {url}")
-            
-            page.on('response', handle_response)
-            
-            # Navigate to player
-            page.goto(player_url, wait_until='domcontentloaded', timeout=timeout)
-            
-            # Wait for ad to potentially close/redirect
-            print(f"  Waiting for page to load (handling ads/redirects)...")
-            page.wait_for_timeout(5000)
-            
-            # Look for close ad button and click it if found
-            try:
+            # Navigate to player; returns as soon as the player requests its playlist
+            page.goto(player_url, wait_until='commit', timeout=timeout)
+            print(f"  Waiting for the player to request its stream...")
+            if stream_capture.wait(page, 5000) is None:
+                # Look for close ad button and click it if found
                 close_selectors = [
                     'button:has-text("close")',
                     'button:has-text("Close")',
@@ -364,35 +309,25 @@ def extract_stream_from_apl385_with_playwright(player_url, referer_url, timeout=
                         close_btn = page.query_selector(selector)
                         if close_btn:
                             print(f"  Clicking close/continue button...")
-                            close_btn.click()
-                            page.wait_for_timeout(2000)
+                            close_btn.click(timeout=2000)
                             break
                     except:
                         pass
-            except:
-                pass
-            
-            # Wait for stream to load
-            page.wait_for_timeout(5000)
-            
-            # Check page content for stream URLs
-            page_content = page.content()
-            m3u8_pattern = r'(?:https?:)?//[^\s"\'<>]+\.m3u8[^\s"\'<>]*'
-            content_matches = re.findall(m3u8_pattern, page_content)
-            for match in content_matches:
-                if match.startswith('//'):
-                    match = 'https:' + match
-                if match not in stream_urls:
-                    stream_urls.append(match)
-                    print(f"    ✓ Found in content: {match}")
-            
-            browser.close()
-            
-            if stream_urls:
-                return stream_urls[0]
-            else:
-                print(f"  ⚠️  No stream URLs captured")
-                return None
+                
+                # Wait for stream to load, then check page content for stream URLs
+                if stream_capture.wait(page, 5000, nudge_after_ms=0) is None:
+                    stream_capture.scan_content(page)
+            page.close()
+            return [hit['url'] for hit in stream_capture.results()]
+        
+        stream_urls = shared_pool().run(capture, user_agent=HEADERS['User-Agent'],
+                                        viewport={'width': 1920, 'height': 1080})
+        
+        if stream_urls:
+            return stream_urls[0]
+        else:
+            print(f"  ⚠️  No stream URLs captured")
+            return None
                 
     except Exception as e:
         print(f"  ❌ Playwright error: {e}")
@@ -407,7 +342,7 @@ def extract_stream_from_html(webplayer_url, referer_url, silent=False):
     headers['Referer'] = referer_url
     
     try:
-        response = requests.get(webplayer_url, headers=headers, timeout=10, verify=False)
+        response = upstream_client.get(webplayer_url, headers=headers, timeout=10, verify=False)
         if response.status_code != 200:
             if not silent:
                 print(f"  ❌ Status code: {response.status_code}")
@@ -447,15 +382,7 @@ def extract_stream_from_html(webplayer_url, referer_url, silent=False):
                     break
         
         # Look for .m3u8 URLs in the HTML (including protocol-relative)
-        m3u8_pattern = r'(?:https?:)?//[^\s"\'<>]+\.m3u8[^\s"\'<>]*'
-        matches = re.findall(m3u8_pattern, response.text)
-        
-        # Make URLs absolute
-        absolute_matches = []
-        for match in matches:
-            if match.startswith('//'):
-                match = 'https:' + match
-            absolute_matches.append(match)
+        absolute_matches = find_m3u8(response.text, base_url=webplayer_url)
         
         if absolute_matches:
             if not silent:
@@ -2,7 +2,9 @@
 """
 Extract stream from rojadirecta URLs using Playwright
 """
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from browser_pool import shared_pool
+from browser_capture import M3u8Capture
 import re
 import sys
 
@@ -24,59 +26,21 @@ def extract_rojadirecta_stream(url, timeout=30000):
     
     stream_info = None
     
+    # Track stream URLs with their referer
+    captured_streams = []
+    
     try:
-        with sync_playwright() as p:
-            # Launch browser
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            page = context.new_page()
-            
-            # Track stream URLs with their referer
-            captured_streams = []
-            
-            def handle_request(request):
-                url = request.url
-                if '.m3u8' in url.lower():
-                    headers = request.headers
-                    referer = headers.get('referer', page.url)
-                    info = {
-                        'url': url,
-                        'referer': referer,
-                        'origin': headers.get('origin', ''),
-                        'user_agent': headers.get('user-agent', '')
-                    }
-                    if info not in captured_streams:
-                        captured_streams.append(info)
-                        print(f"  ✓ Captured .m3u8 request: {url}")
-                        print(f"     Referer: {referer}")
-            
-            def handle_response(response):
-                url = response.url
-                if '.m3u8' in url.lower():
-                    request = response.request
-                    headers = request.headers
-                    referer = headers.get('referer', page.url)
-                    info = {
-                        'url': url,
-                        'referer': referer,
-                        'origin': headers.get('origin', ''),
-                        'user_agent': headers.get('user-agent', '')
-                    }
-                    if info not in captured_streams:
-                        captured_streams.append(info)
-                        print(f"  ✓ Captured .m3u8 response: {url}")
-                        print(f"     Referer: {referer}")
-            
-            page.on('request', handle_request)
-            page.on('response', handle_response)
+        # Runs on a pooled browser, in a fresh context the pool closes afterwards
+        def capture(context):
+            # Ads, images and fonts are blocked, popups closed as they open, and
+            # the first .m3u8 request ends the wait
+            stream_capture = M3u8Capture(context, log_prefix=' ')
+            page = stream_capture.new_page()
             
             # Navigate to rojadirecta page
             print("→ Loading rojadirecta page...")
             try:
                 page.goto(url, wait_until='domcontentloaded', timeout=timeout)
-                page.wait_for_timeout(2000)
                 
                 # Find iframe with player
                 print("→ Looking for player iframe...")
@@ -92,68 +56,46 @@ def extract_rojadirecta_stream(url, timeout=30000):
                             print(f"  ✓ Found player iframe: {src}")
                             break
                 
-                if player_iframe_url:
+                if player_iframe_url and not stream_capture.found.done():
                     # Navigate to the iframe URL in the same page context
                     print(f"→ Loading player iframe...")
-                    page.goto(player_iframe_url, wait_until='domcontentloaded', timeout=timeout)
-                    page.wait_for_timeout(3000)
-                    
-                    # Handle popup overlays
-                    try:
-                        page.evaluate("""
-                            const overlay = document.getElementById('localpp');
-                            if (overlay) overlay.style.display = 'none';
-                        """)
-                    except:
-                        pass
+                    page.goto(player_iframe_url, wait_until='commit', timeout=timeout)
                     
-                    # Close any popup windows
-                    popup_count = 0
-                    while popup_count < 10:
-                        all_pages = context.pages
-                        if len(all_pages) <= 1:
-                            break
-                        
-                        for popup_page in all_pages:
-                            if popup_page != page:
-                                try:
-                                    popup_page.close()
-                                    popup_count += 1
-                                    print(f"  → Closed popup {popup_count}")
-                                except:
-                                    pass
-                        
-                        page.wait_for_timeout(500)
-                    
-                    # Wait for stream to load
+                    # Wait for stream to load (overlays are hidden if it takes a while)
                     print("→ Waiting for stream to load...")
-                    page.wait_for_timeout(5000)
-                    
-                    # Check for nested iframes
-                    nested_iframes = page.query_selector_all('iframe')
-                    if nested_iframes:
-                        print(f"  → Found {len(nested_iframes)} nested iframes")
-                    
-                    # Wait for any delayed requests
-                    page.wait_for_timeout(5000)
+                    stream_capture.wait(page)
+                elif not player_iframe_url:
+                    # The player may be on the page itself
+                    stream_capture.wait(page, 2000, nudge_after_ms=2000)
                 
             except PlaywrightTimeoutError:
                 print("  ⚠ Timeout, but checking captured URLs...")
             
-            browser.close()
-            
-            # Return the first captured stream
-            if captured_streams:
-                stream_info = captured_streams[0]
-                print(f"\n{'='*60}")
-                print("SUCCESS!")
-                print('='*60)
-                print(f"Stream URL: {stream_info['url']}")
-                print(f"Referer: {stream_info['referer']}")
-            else:
-                print(f"\n{'='*60}")
-                print("No stream found")
-                print('='*60)
+            for hit in stream_capture.results():
+                captured_streams.append({
+                    'url': hit['url'],
+                    'referer': hit['referer'] or page.url,
+                    'origin': hit['headers'].get('origin', ''),
+                    'user_agent': hit['headers'].get('user-agent', '')
+                })
+                print(f"  ✓ Captured .m3u8 {hit['source']}: {hit['url']}")
+                print(f"     Referer: {captured_streams[-1]['referer']}")
+            page.close()
+        
+        shared_pool().run(capture, user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        
+        # Return the first captured stream
+        if captured_streams:
+            stream_info = captured_streams[0]
+            print(f"\n{'='*60}")
+            print("SUCCESS!")
+            print('='*60)
+            print(f"Stream URL: {stream_info['url']}")
+            print(f"Referer: {stream_info['referer']}")
+        else:
+            print(f"\n{'='*60}")
+            print("No stream found")
+            print('='*60)
             
     except Exception as e:
         print(f"\n✗ Error: {e}")
@@ -5,16 +5,15 @@ Script to extract stream URL from liveTv.sx and other streaming sites
 """
 import re
 import requests
+import upstream_client
+from m3u8_scan import find_m3u8
 from bs4 import BeautifulSoup
 import json
 from urllib.parse import urljoin, urlparse
 
-# Try to import Playwright for JavaScript-based extraction
-try:
-    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+# Playwright (if installed) for JavaScript-based extraction
+from browser_pool import shared_pool, PLAYWRIGHT_AVAILABLE
+from browser_capture import capture_m3u8
 
 def normalize_url(url, base_url):
     """Normalize a URL, handling protocol-relative URLs"""
@@ -39,7 +38,7 @@ def extract_livetv_events(allupcoming_url, max_events=5):
     }
     
     try:
-        response = requests.get(allupcoming_url, headers=headers, timeout=15)
+        response = upstream_client.get(allupcoming_url, headers=headers, timeout=15)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
         
@@ -78,7 +77,7 @@ def extract_livetv_player_links(event_url):
     }
     
     try:
-        response = requests.get(event_url, headers=headers, timeout=15)
+        response = upstream_client.get(event_url, headers=headers, timeout=15)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
         
@@ -133,27 +132,16 @@ def extract_stream_from_player(player_url, max_depth=5):
         print(f"\n  [Depth {depth}] Fetching: {url}")
         
         try:
-            response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
+            response = upstream_client.get(url, headers=headers, timeout=15, allow_redirects=True)
             response.raise_for_status()
             print(f"  Status: {response.status_code}, Final URL: {response.url}")
             
             html_content = response.text
             soup = BeautifulSoup(html_content, 'html.parser')
             
-            # Look for .m3u8 URLs - be more strict to avoid false positives
-            # Match URLs that start with http/https and end with .m3u8 (with optional query params)
-            m3u8_pattern = r'https?://[^\s"\'\)<>\{\}]+\.m3u8(?:\?[^\s"\'\)<>]*)?'
-            m3u8_urls = re.findall(m3u8_pattern, html_content)
-            # Filter out URLs that look like JavaScript code (contain common JS patterns)
-            valid_m3u8_urls = []
-            for m3u8_url in m3u8_urls:
-                # Skip if it contains JavaScript-like patterns
-                if any(pattern in m3u8_url for pattern in ['const ', 'function', 'return ', 'Math.', 'Date.', 'toString']):
-                    continue
-                # Must be a reasonable length (not too long)
-                if len(m3u8_url) > 500:
-                    continue
-                valid_m3u8_urls.append(m3u8_url)
+            # Look for .m3u8 URLs (player config, string literals and bare URLs; best first,
+            # JavaScript false positives filtered out)
+            valid_m3u8_urls = find_m3u8(html_content)
             
             if valid_m3u8_urls:
                 print(f"  ✓ Found {len(valid_m3u8_urls)} .m3u8 URLs")
@@ -207,9 +195,9 @@ def extract_stream_from_player(player_url, max_depth=5):
                     for api_url in api_endpoints:
                         if api_url not in visited_urls:
                             try:
-                                api_response = requests.get(api_url, headers=headers, timeout=5)
+                                api_response = upstream_client.get(api_url, headers=headers, timeout=5)
                                 if api_response.status_code == 200:
-                                    api_m3u8 = re.findall(r'https?://[^\s"\'\)<>]+\.m3u8[^\s"\'\)<>]*', api_response.text)
+                                    api_m3u8 = find_m3u8(api_response.text)
                                     if api_m3u8:
                                         for m3u8_url in api_m3u8:
                                             if m3u8_url not in stream_urls:
@@ -218,26 +206,6 @@ def extract_stream_from_player(player_url, max_depth=5):
                             except:
                                 pass
             
-            # Look for JavaScript variables with stream URLs - expanded patterns
-            js_patterns = [
-                r'(?:file|source|src|url|stream|hlsUrl|streamUrl|hls\.src|player\.src)\s*[:=]\s*["\'](https?://[^"\']+\.m3u8(?:\?[^"\']*)?)["\']',
-                r'["\'](https?://[^"\']+\.m3u8(?:\?[^"\']*)?)["\']',
-                r'(?:loadSource|load|play)\s*\(["\'](https?://[^"\']+\.m3u8(?:\?[^"\']*)?)["\']',
-                r'\.m3u8["\']?\s*[,\}]',  # Look for .m3u8 at end of strings
-            ]
-            
-            for pattern in js_patterns:
-                matches = re.findall(pattern, html_content, re.I)
-                for match in matches:
-                    # Validate it's a real URL and not JavaScript code
-                    if (match.startswith('http') and 
-                        '.m3u8' in match and 
-                        len(match) < 500 and
-                        not any(js_pattern in match for js_pattern in ['const ', 'function', 'return ', 'Math.', 'Date.', 'toString', 'slice'])):
-                        if match not in stream_urls:
-                            stream_urls.append(match)
-                            print(f"  ✓ Found in JS: {match}")
-            
             # Look for base64 encoded URLs or data URIs
             base64_pattern = r'data:video/[^;]+;base64,[A-Za-z0-9+/=]+'
             base64_matches = re.findall(base64_pattern, html_content)
@@ -293,202 +261,30 @@ def extract_stream_from_player(player_url, max_depth=5):
 
 def extract_stream_with_playwright(player_url, timeout=30000, max_popup_closes=15):
     """Extract stream URL using Playwright to execute JavaScript and intercept network requests.
-    Handles multiple popup windows that need to be closed repeatedly."""
+    Popup windows are closed as they open."""
     if not PLAYWRIGHT_AVAILABLE:
         print("  ✗ Playwright not available. Install with: pip install playwright && playwright install")
         return []
     
-    print(f"\n  [Playwright] Launching browser to extract stream URL...")
-    stream_urls = []
+    print(f"\n  [Playwright] Loading player page to extract stream URL...")
     
     try:
-        with sync_playwright() as p:
-            # Launch browser in headless mode
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            )
-            page = context.new_page()
-            
-            # Store stream URLs with their request info (headers, referer)
-            stream_info = []
-            
-            # Intercept network requests to capture headers
-            def handle_request(request):
-                url = request.url
-                if '.m3u8' in url.lower():
-                    # Capture the request with its headers
-                    headers = request.headers
-                    referer = headers.get('referer', player_url)
-                    info = {
-                        'url': url,
-                        'headers': dict(headers),
-                        'referer': referer
-                    }
-                    if info not in stream_info:
-                        stream_info.append(info)
-                        print(f"  ✓ [Playwright] Captured .m3u8 request: {url}")
-                        print(f"     Referer: {referer}")
-            
-            # Intercept network responses to capture .m3u8 URLs
-            def handle_response(response):
-                url = response.url
-                if '.m3u8' in url.lower():
-                    # Get the request that triggered this response
-                    request = response.request
-                    headers = request.headers
-                    referer = headers.get('referer', player_url)
-                    
-                    info = {
-                        'url': url,
-                        'headers': dict(headers),
-                        'referer': referer
-                    }
-                    
-                    if info not in stream_info:
-                        stream_info.append(info)
-                        print(f"  ✓ [Playwright] Captured .m3u8 URL: {url}")
-                        print(f"     Referer: {referer}")
-                    
-                    # Also add to simple list for backward compatibility
-                    if url not in stream_urls:
-                        stream_urls.append(url)
-                
-                # Also check response body for m3u8 URLs
-                try:
-                    if response.status == 200:
-                        content_type = response.headers.get('content-type', '').lower()
-                        if 'text' in content_type or 'json' in content_type:
-                            body = response.text()
-                            m3u8_pattern = r'https?://[^\s"\'\)<>]+\.m3u8[^\s"\'\)<>]*'
-                            matches = re.findall(m3u8_pattern, body)
-                            for match in matches:
-                                if match not in stream_urls:
-                                    stream_urls.append(match)
-                                    print(f"  ✓ [Playwright] Found .m3u8 URL in response: {match}")
-                except:
-                    pass
-            
-            page.on('request', handle_request)
-            page.on('response', handle_response)
-            
-            # Navigate to the page
-            print(f"  [Playwright] Navigating to: {player_url}")
-            try:
-                page.goto(player_url, wait_until='domcontentloaded', timeout=timeout)
-                
-                # Wait for initial page load
-                page.wait_for_timeout(2000)
-                
-                # Handle popup overlay div (localpp) - hide it if present
-                try:
-                    popup_overlay = page.query_selector('#localpp')
-                    if popup_overlay:
-                        print(f"  [Playwright] Found popup overlay, hiding it...")
-                        # Hide the overlay by setting display to none
-                        page.evaluate("""
-                            const overlay = document.getElementById('localpp');
-                            if (overlay) {
-                                overlay.style.display = 'none';
-                            }
-                        """)
-                        page.wait_for_timeout(500)
-                except:
-                    pass
-                
-                # Handle multiple popup windows - close them repeatedly
-                popup_close_count = 0
-                while popup_close_count < max_popup_closes:
-                    # Get all pages (main page + popups)
-                    all_pages = context.pages
-                    
-                    if len(all_pages) <= 1:
-                        # No popups, break
-                        break
-                    
-                    # Close all popup windows except the main page
-                    closed_any = False
-                    for popup_page in all_pages:
-                        if popup_page != page:
-                            try:
-                                print(f"  [Playwright] Closing popup window {popup_close_count + 1}...")
-                                popup_page.close()
-                                closed_any = True
-                                popup_close_count += 1
-                            except:
-                                pass
-                    
-                    if not closed_any:
-                        break
-                    
-                    # Wait a bit before checking for more popups
-                    page.wait_for_timeout(1000)
-                    
-                    # Check if popup overlay appeared again and hide it
-                    try:
-                        popup_overlay = page.query_selector('#localpp')
-                        if popup_overlay:
-                            page.evaluate("""
-                                const overlay = document.getElementById('localpp');
-                                if (overlay) {
-                                    overlay.style.display = 'none';
-                                }
-                            """)
-                    except:
-                        pass
-                
-                if popup_close_count > 0:
-                    print(f"  ✓ [Playwright] Closed {popup_close_count} popup window(s)")
-                
-                # Wait for any delayed JavaScript execution after popups are closed
-                page.wait_for_timeout(3000)
-                
-                # Follow iframes to find streams in nested pages
-                print(f"  [Playwright] Checking for iframes...")
-                try:
-                    iframes = page.query_selector_all('iframe')
-                    for i, iframe in enumerate(iframes):
-                        try:
-                            iframe_src = iframe.get_attribute('src')
-                            if iframe_src:
-                                print(f"  [Playwright] Found iframe {i+1}: {iframe_src[:80]}...")
-                                # Wait a bit for iframe to load
-                                page.wait_for_timeout(2000)
-                        except:
-                            pass
-                except:
-                    pass
-                
-                # Check all pages (main + iframes) for stream URLs
-                all_pages = context.pages
-                for check_page in all_pages:
-                    try:
-                        page_content = check_page.content()
-                        m3u8_pattern = r'https?://[^\s"\'\)<>]+\.m3u8[^\s"\'\)<>]*'
-                        content_matches = re.findall(m3u8_pattern, page_content)
-                        for match in content_matches:
-                            if match not in stream_urls:
-                                # Filter out false positives
-                                if not any(js_pattern in match for js_pattern in ['const ', 'function', 'return ', 'Math.', 'Date.']):
-                                    stream_urls.append(match)
-                                    print(f"  ✓ [Playwright] Found .m3u8 URL in page content: {match}")
-                    except:
-                        pass
-                
-                # Wait a bit more for any delayed stream requests
-                page.wait_for_timeout(5000)
-                
-            except PlaywrightTimeoutError:
-                print(f"  ⚠ [Playwright] Timeout waiting for page to load, but checking captured URLs...")
-            
-            browser.close()
-            
+        # Ads, images and fonts are blocked, popups closed as they open, and the page is
+        # closed as soon as the player requests its playlist (see browser_capture)
+        hits = shared_pool().run(
+            lambda context: capture_m3u8(context, player_url, timeout=timeout, max_popups=max_popup_closes,
+                                         log_prefix='  [Playwright]'))
     except Exception as e:
         print(f"  ✗ [Playwright] Error: {e}")
         import traceback
         traceback.print_exc()
         return []
     
+    stream_urls = [hit['url'] for hit in hits]
+    # Stream URLs with their request info (headers, referer)
+    stream_info = [{'url': hit['url'], 'headers': hit['headers'], 'referer': hit['referer'] or player_url}
+                   for hit in hits if hit['source'] in ('request', 'response')]
+    
     if stream_urls:
         print(f"  ✓ [Playwright] Successfully extracted {len(stream_urls)} stream URL(s)")
         if stream_info:
@@ -575,7 +371,7 @@ def extract_stream_url(url):
     }
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = upstream_client.get(url, headers=headers, timeout=10)
         response.raise_for_status()
         
         html_content = response.text
@@ -589,8 +385,7 @@ def extract_stream_url(url):
         stream_urls = []
         
         # Pattern 1: Look for .m3u8 URLs (HLS streams)
-        m3u8_pattern = r'https?://[^\s"\'\)]+\.m3u8[^\s"\'\)]*'
-        m3u8_urls = re.findall(m3u8_pattern, html_content)
+        m3u8_urls = find_m3u8(html_content)
         if m3u8_urls:
             print("Found .m3u8 streams (HLS):")
             for stream in m3u8_urls:
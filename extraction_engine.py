@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Concurrent channel extraction
+A game page lists many player channels, and resolving each one (player page,
+scripts, nested iframes, 10 s timeouts apiece) one after another made
+/api/load-stream take minutes. Channels are now resolved by a bounded pool of
+workers, at most a few at a time per host, within a deadline for the whole
+page. The caller gets the first playable stream as soon as any channel yields
+one; the rest keep resolving in the background and are handed over as they
+arrive.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+MAX_WORKERS = 8          # Channels resolved at once, across all extractions
+PER_HOST = 2             # ...and at once per player host
+DEADLINE = 45            # Seconds an extraction may take; channels not started by then are skipped
+FIRST_WAIT = DEADLINE    # Seconds first() waits for a stream by default
+
+
+def channel_host(channel):
+    return urlsplit(channel.get('url') or '').netloc.lower()
+
+
+class ExtractionJob:
+    """The channels of one page being resolved, and the streams found so far.
+
+    Streams are listed in channel order (the order the extractor ranked them),
+    whatever order they were found in.
+    """
+
+    def __init__(self, name, channels, resolve, deadline, fallback=None, group=None, group_limit=None):
+        self.name = name
+        self.group = group                # Jobs of one group (a source) share group_limit workers
+        self.group_limit = group_limit
+        self.channels = channels
+        self.resolve = resolve            # resolve(channel) -> list of stream dicts
+        self.fallback = fallback          # fallback() -> streams, run if no channel yields any
+        self.started = time.time()
+        self.deadline = self.started + deadline
+        self.first_found = None           # Seconds until the first stream
+        self.finished = None
+        self._found = {}                  # channel index -> its streams
+        self._followers = []
+        self._pending = len(channels)
+        self._cancelled = False
+        self._changed = threading.Condition()
+        self.errors = 0
+        self.skipped = 0
+
+    @property
+    def done(self):
+        with self._changed:
+            return self._is_done()
+
+    def _is_done(self):
+        return self.finished is not None or self._cancelled or time.time() >= self.deadline
+
+    def _streams(self):
+        return [stream for index in sorted(self._found) for stream in self._found[index]]
+
+    def streams(self):
+        """Streams found so far"""
+        with self._changed:
+            return self._streams()
+
+    def first(self, timeout=FIRST_WAIT):
+        """Streams found so far, once there is at least one (or the job is over / timeout passes)"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._found or self._is_done(),
+                                   timeout=max(min(timeout, self.deadline - time.time()), 0))
+            return self._streams()
+
+    def wait(self, timeout=None):
+        """Every stream found, once all channels are resolved (or the deadline / timeout passes)"""
+        limit = self.deadline - time.time()
+        with self._changed:
+            self._changed.wait_for(self._is_done,
+                                   timeout=max(min(timeout, limit) if timeout is not None else limit, 0))
+            return self._streams()
+
+    def follow(self, callback, known=()):
+        """Call callback(stream) for every stream found that isn't in known (e.g. what first()
+        returned), now for those already found and later for the rest"""
+        known = {id(stream) for stream in known}
+        with self._changed:
+            missed = [stream for stream in self._streams() if id(stream) not in known]
+            if not self._is_done():
+                self._followers.append(callback)
+        for stream in missed:
+            self._notify(callback, stream)
+
+    def cancel(self):
+        """Skip the channels not started yet (a newer load replaced this one)"""
+        with self._changed:
+            self._cancelled = True
+            self._followers = []
+            self._changed.notify_all()
+
+    def _wanted(self):
+        return not self._cancelled and time.time() < self.deadline
+
+    def _run(self, index):
+        channel = self.channels[index]
+        try:
+            streams = self.resolve(channel) or []
+        except Exception as e:
+            self.errors += 1
+            print(f"[Extract] ✗ {channel.get('name', channel.get('url'))}: {str(e)[:50]}")
+            streams = []
+        self._add(index, streams)
+        self._channel_done()
+
+    def _skip(self):
+        self.skipped += 1
+        self._channel_done()
+
+    def _add(self, index, streams):
+        if not streams:
+            return
+        with self._changed:
+            if not self._wanted():
+                return
+            self._found[index] = streams
+            if self.first_found is None:
+                self.first_found = time.time() - self.started
+            followers = list(self._followers)
+            self._changed.notify_all()
+        for callback in followers:
+            for stream in streams:
+                self._notify(callback, stream)
+
+    def _channel_done(self):
+        with self._changed:
+            self._pending -= 1
+            last = self._pending == 0
+        if last:
+            self._finish()
+
+    def _finish(self):
+        if self.fallback is not None and self._wanted() and not self.streams():
+            try:
+                self._add(len(self.channels), self.fallback() or [])
+            except Exception as e:
+                print(f"[Extract] ✗ {self.name} fallback failed: {str(e)[:50]}")
+        with self._changed:
+            self.finished = time.time()
+            self._followers = []
+            self._changed.notify_all()
+        print(f"[Extract] ✓ {self.name}: {len(self.streams())} stream(s) from "
+              f"{len(self.channels)} channel(s) in {self.finished - self.started:.1f}s")
+
+    def _notify(self, callback, stream):
+        try:
+            callback(stream)
+        except Exception as e:
+            print(f"[Extract] ⚠️  Late stream handler failed: {e}")
+
+    def info(self):
+        with self._changed:
+            return {
+                'name': self.name,
+                'channels': len(self.channels),
+                'pending': self._pending,
+                'streams': sum(len(s) for s in self._found.values()),
+                'errors': self.errors,
+                'skipped': self.skipped,
+                'first_found': round(self.first_found, 2) if self.first_found is not None else None,
+                'elapsed': round((self.finished or time.time()) - self.started, 2)
+            }
+
+
+class ExtractionEngine:
+    """Bounded worker pool resolving the channels of every running extraction.
+
+    Workers take the oldest queued channel whose host has a free slot, so a
+    page whose channels all sit on one host can't occupy every worker.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, per_host=PER_HOST, deadline=DEADLINE):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.deadline = deadline
+        self._queue = []                  # (job, channel index), oldest first
+        self._busy_hosts = {}             # host -> channels being resolved
+        self._busy_groups = {}            # group -> channels being resolved
+        self._workers = 0
+        self._idle = 0
+        self._lock = threading.Condition()
+        self.jobs = 0
+        self.resolved = 0
+
+    def run(self, name, channels, resolve, deadline=None, fallback=None, group=None, group_limit=None):
+        """Start resolving channels with resolve(channel) -> [stream, ...]; returns the ExtractionJob.
+
+        group / group_limit cap the channels resolved at once across every job of
+        the group (e.g. one source's), on top of the per-host limit.
+        """
+        job = ExtractionJob(name, list(channels), resolve,
+                            deadline if deadline is not None else self.deadline, fallback,
+                            group, group_limit)
+        print(f"[Extract] Resolving {len(job.channels)} channel(s) of {name} "
+              f"({self.max_workers} workers, {self.per_host} per host)")
+        with self._lock:
+            self.jobs += 1
+            self._queue.extend((job, index) for index in range(len(job.channels)))
+            # One more worker per queued channel, up to the limit; idle ones are reused
+            wanted = min(self.max_workers - self._workers, max(len(self._queue) - self._idle, 0))
+            for _ in range(wanted):
+                self._workers += 1
+                threading.Thread(target=self._work, name='extract', daemon=True).start()
+            self._lock.notify_all()
+        if not job.channels:
+            job._finish()
+        return job
+
+    def completed(self, name, streams):
+        """A job that is already over with these streams (a page that needed no channel resolving)"""
+        job = ExtractionJob(name, [], None, self.deadline)
+        job._add(0, list(streams))
+        job._finish()
+        return job
+
+    def _take(self):
+        """Next runnable (job, index), dropping channels whose job is over; None if nothing fits"""
+        for position, (job, index) in enumerate(self._queue):
+            if not job._wanted():
+                del self._queue[position]
+                return job, index, False
+            host = channel_host(job.channels[index])
+            if self._busy_hosts.get(host, 0) >= self.per_host:
+                continue
+            if job.group_limit and self._busy_groups.get(job.group, 0) >= job.group_limit:
+                continue
+            del self._queue[position]
+            self._busy_hosts[host] = self._busy_hosts.get(host, 0) + 1
+            self._busy_groups[job.group] = self._busy_groups.get(job.group, 0) + 1
+            return job, index, True
+        return None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                task = self._take()
+                while task is None:
+                    self._idle += 1
+                    woke = self._lock.wait(timeout=30)
+                    self._idle -= 1
+                    task = self._take()
+                    if task is None and not woke and not self._queue:
+                        self._workers -= 1
+                        return
+            job, index, runnable = task
+            if not runnable:
+                job._skip()
+                continue
+            host = channel_host(job.channels[index])
+            try:
+                job._run(index)
+            finally:
+                with self._lock:
+                    for busy, name in ((self._busy_hosts, host), (self._busy_groups, job.group)):
+                        busy[name] -= 1
+                        if not busy[name]:
+                            del busy[name]
+                    self.resolved += 1
+                    self._lock.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self._workers,
+                'max_workers': self.max_workers,
+                'per_host': self.per_host,
+                'deadline': self.deadline,
+                'queued': len(self._queue),
+                'busy_hosts': dict(self._busy_hosts),
+                'busy_sources': {group: count for group, count in self._busy_groups.items() if group},
+                'jobs': self.jobs,
+                'resolved': self.resolved
+            }
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+HLS playlist object model
+Parses master and media playlists into tags, variants, renditions, segments,
+keys and init maps, rewrites every URI (URI lines and URI="..." attributes
+of EXT-X-KEY, EXT-X-MAP, EXT-X-MEDIA, ...) in one pass, and serializes back.
+Tags it doesn't model are kept verbatim, so parse -> dumps round-trips.
+"""
+
+import re
+import urllib.parse
+from urllib.parse import urljoin
+
+# Tags whose attribute list may carry a URI="..." to rewrite, and what it points at
+URI_TAG_KINDS = {
+    'EXT-X-KEY': 'key',
+    'EXT-X-SESSION-KEY': 'key',
+    'EXT-X-MAP': 'map',
+    'EXT-X-MEDIA': 'media',
+    'EXT-X-I-FRAME-STREAM-INF': 'iframe',
+    'EXT-X-PART': 'part',
+    'EXT-X-PRELOAD-HINT': 'part',
+    'EXT-X-RENDITION-REPORT': 'playlist',
+    'EXT-X-SESSION-DATA': 'data',
+}
+
+# Kinds that point at another playlist: fetched and rewritten through /playlist/,
+# not relayed raw like segments (whatever their URL looks like)
+PLAYLIST_KINDS = frozenset(('variant', 'media', 'iframe', 'playlist'))
+PLAYLIST_PREFIX = '/playlist/'
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+_URI_ATTRIBUTE_RE = re.compile(r'((?:^|,)URI=")([^"]*)(")')
+
+
+def parse_attributes(text):
+    """Attribute list -> dict; quoted values come back without their quotes"""
+    attributes = {}
+    for key, value in _ATTRIBUTE_RE.findall(text or ''):
+        if value.startswith('"') and value.endswith('"'):
+            value = value[1:-1]
+        attributes[key] = value
+    return attributes
+
+
+def proxy_path(url, prefix='/proxy/'):
+    """The /proxy/<url> path (or another route prefix) the stream servers expose for an upstream URL"""
+    return prefix + urllib.parse.quote(url, safe='')
+
+
+class Tag:
+    """One #EXT... line: name plus raw value (text after the colon, or None)"""
+
+    __slots__ = ('name', 'value', '_attributes')
+
+    def __init__(self, name, value=None):
+        self.name = name
+        self.value = value
+        self._attributes = None
+
+    @classmethod
+    def parse(cls, line):
+        name, sep, value = line[1:].partition(':')
+        return cls(name, value if sep else None)
+
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = parse_attributes(self.value)
+        return self._attributes
+
+    @property
+    def uri(self):
+        if self.name not in URI_TAG_KINDS or not self.value:
+            return None
+        match = _URI_ATTRIBUTE_RE.search(self.value)
+        return match.group(2) if match else None
+
+    @uri.setter
+    def uri(self, new_uri):
+        self.value = _URI_ATTRIBUTE_RE.sub(
+            lambda m: m.group(1) + new_uri + m.group(3), self.value, count=1)
+        self._attributes = None
+
+    def dumps(self):
+        return '#' + self.name if self.value is None else f'#{self.name}:{self.value}'
+
+
+class Segment:
+    """A media segment: its URI line plus the tags that apply to it"""
+
+    def __init__(self, line, duration=None, title='', tags=None, key=None, map=None,
+                 discontinuity=False, sequence=None):
+        self.line = line
+        self.duration = duration
+        self.title = title
+        self.tags = tags or []      # Tags written directly before this segment
+        self.key = key              # EXT-X-KEY in effect (None when unencrypted)
+        self.map = map              # EXT-X-MAP in effect (fMP4 init section)
+        self.discontinuity = discontinuity
+        self.sequence = sequence    # Media sequence number
+
+    @property
+    def uri(self):
+        return self.line.uri
+
+    @uri.setter
+    def uri(self, value):
+        self.line.uri = value
+
+
+class Variant:
+    """A master playlist entry: EXT-X-STREAM-INF plus its playlist URI"""
+
+    def __init__(self, line, stream_inf):
+        self.line = line
+        self.stream_inf = stream_inf
+
+    @property
+    def uri(self):
+        return self.line.uri
+
+    @uri.setter
+    def uri(self, value):
+        self.line.uri = value
+
+    @property
+    def bandwidth(self):
+        value = self.stream_inf.attributes.get('BANDWIDTH', '')
+        return int(value) if value.isdigit() else None
+
+    @property
+    def resolution(self):
+        return self.stream_inf.attributes.get('RESOLUTION')
+
+    @property
+    def codecs(self):
+        return self.stream_inf.attributes.get('CODECS')
+
+
+class Playlist:
+    """A parsed playlist: an ordered list of items (tags, URI lines, other raw lines)
+
+    Variants, segments, keys and maps are views over the same items, so
+    changing a URI through any of them shows up in dumps().
+    """
+
+    def __init__(self, items, url=None):
+        self.items = items
+        self.url = url
+        self._base_dir = None
+        self._index()
+
+    @classmethod
+    def parse(cls, content, url=None):
+        items = []
+        for line in content.split('\n'):
+            line = line.strip()
+            if line.startswith('#EXT'):
+                items.append(Tag.parse(line))
+            else:
+                items.append(_RawLine(line) if not line or line.startswith('#') else _UriLine(line))
+        return cls(items, url)
+
+    def _index(self):
+        self.tags = {}          # First tag of each name (header lookups)
+        self.segments = []
+        self.variants = []
+        self.media = []         # EXT-X-MEDIA renditions
+        self.iframe_variants = []
+        self.keys = []
+        self.maps = []
+        self.endlist = False
+
+        pending = []
+        key = None
+        map_tag = None
+        discontinuity = False
+        stream_inf = None
+        sequence = None
+
+        for item in self.items:
+            if isinstance(item, Tag):
+                name = item.name
+                self.tags.setdefault(name, item)
+                if name == 'EXT-X-MEDIA-SEQUENCE' and item.value and item.value.isdigit():
+                    sequence = int(item.value)
+                elif name == 'EXT-X-KEY':
+                    self.keys.append(item)
+                    key = None if item.attributes.get('METHOD') == 'NONE' else item
+                elif name == 'EXT-X-MAP':
+                    self.maps.append(item)
+                    map_tag = item
+                elif name == 'EXT-X-MEDIA':
+                    self.media.append(item)
+                elif name == 'EXT-X-I-FRAME-STREAM-INF':
+                    self.iframe_variants.append(item)
+                elif name == 'EXT-X-STREAM-INF':
+                    stream_inf = item
+                elif name == 'EXT-X-DISCONTINUITY':
+                    discontinuity = True
+                elif name == 'EXT-X-ENDLIST':
+                    self.endlist = True
+                if name not in ('EXTM3U', 'EXT-X-STREAM-INF'):
+                    pending.append(item)
+            elif isinstance(item, _UriLine):
+                if stream_inf is not None:
+                    self.variants.append(Variant(item, stream_inf))
+                    stream_inf = None
+                else:
+                    extinf = next((t for t in pending if t.name == 'EXTINF'), None)
+                    duration, title = None, ''
+                    if extinf is not None and extinf.value:
+                        duration_text, _, title = extinf.value.partition(',')
+                        try:
+                            duration = float(duration_text)
+                        except ValueError:
+                            duration = None
+                    self.segments.append(Segment(item, duration, title, pending, key, map_tag,
+                                                 discontinuity, sequence))
+                    if sequence is not None:
+                        sequence += 1
+                pending = []
+                discontinuity = False
+        # Tags after the last URI: LL-HLS parts of the segment in progress, preload hints, ...
+        self.trailing = pending
+
+    # ---------- Header values ----------
+
+    @property
+    def is_master(self):
+        return bool(self.variants) or 'EXT-X-STREAM-INF' in self.tags
+
+    def _tag_number(self, name, cast):
+        tag = self.tags.get(name)
+        try:
+            return cast(tag.value) if tag is not None and tag.value else None
+        except ValueError:
+            return None
+
+    @property
+    def version(self):
+        return self._tag_number('EXT-X-VERSION', int)
+
+    @property
+    def target_duration(self):
+        return self._tag_number('EXT-X-TARGETDURATION', float)
+
+    @property
+    def media_sequence(self):
+        return self._tag_number('EXT-X-MEDIA-SEQUENCE', int) or 0
+
+    @property
+    def discontinuity_sequence(self):
+        return self._tag_number('EXT-X-DISCONTINUITY-SEQUENCE', int) or 0
+
+    @property
+    def part_target(self):
+        """LL-HLS part duration (EXT-X-PART-INF PART-TARGET), None for regular playlists"""
+        tag = self.tags.get('EXT-X-PART-INF')
+        try:
+            return float(tag.attributes['PART-TARGET']) if tag is not None else None
+        except (KeyError, ValueError):
+            return None
+
+    # ---------- Rewriting and output ----------
+
+    def absolute(self, uri):
+        if not uri or not self.url or uri.startswith(('http://', 'https://')):
+            return uri
+        # Plain relative names (the common case) just go after the base directory;
+        # anything with a scheme, leading slash, dot segment or query-only goes to urljoin
+        if uri[0] not in './?#' and ':' not in uri.split('/', 1)[0]:
+            if self._base_dir is None:
+                self._base_dir = urljoin(self.url, '_')[:-1]
+            return self._base_dir + uri
+        return urljoin(self.url, uri)
+
+    def rewrite_uris(self, rewrite):
+        """Replace every URI in one pass: rewrite(absolute_url, kind) -> new URI.
+
+        kind is 'variant' or 'segment' for URI lines, or the URI_TAG_KINDS
+        value for attributes ('key', 'map', 'media', ...).
+        """
+        kind = 'segment'
+        for item in self.items:
+            if isinstance(item, _UriLine):
+                item.uri = rewrite(self.absolute(item.uri), kind)
+                kind = 'segment'
+            elif isinstance(item, Tag):
+                if item.name == 'EXT-X-STREAM-INF':
+                    kind = 'variant'
+                    continue
+                tag_kind = URI_TAG_KINDS.get(item.name)
+                if tag_kind:
+                    uri = item.uri
+                    if uri:     # URI="" has nothing to point at; left as it came
+                        item.uri = rewrite(self.absolute(uri), tag_kind)
+        return self
+
+    def dumps(self):
+        return '\n'.join(item.dumps() for item in self.items)
+
+
+class _UriLine:
+    """A bare URI line (segment or variant playlist)"""
+
+    __slots__ = ('uri',)
+
+    def __init__(self, uri):
+        self.uri = uri
+
+    def __str__(self):
+        return self.uri
+
+    def dumps(self):
+        return self.uri
+
+
+class _RawLine:
+    """Blank line or plain comment, kept as-is"""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def dumps(self):
+        return self.text
+
+
+def proxy_rewrite(url, kind):
+    """Default rewrite: nested playlists through /playlist/<url>, everything else /proxy/<url>"""
+    return proxy_path(url, PLAYLIST_PREFIX if kind in PLAYLIST_KINDS else '/proxy/')
+
+
+def rewrite_playlist(content, playlist_url, rewrite=proxy_rewrite):
+    """Parse, rewrite every URI (default: proxy_rewrite) and serialize"""
+    return Playlist.parse(content, playlist_url).rewrite_uris(rewrite).dumps()
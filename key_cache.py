@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Long-lived cache for AES-128 keys and EXT-X-MAP init segments
+Both are small and referenced from every playlist reload until they rotate,
+so one fetch per URI is shared by every client for up to DEFAULT_TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 3600                     # Seconds; a rotated key or map has a new URI anyway
+MAX_ENTRIES = 256
+MAX_ENTRY_BYTES = 4 * 1024 * 1024      # Init segments are a few KB; refuse to cache anything huge
+
+
+class KeyEntry:
+    """One cached key file or init segment"""
+
+    def __init__(self, url, body, content_type):
+        self.url = url
+        self.body = body
+        self.content_type = content_type
+        self.fetched_at = time.time()
+
+    def expired(self, ttl, now=None):
+        return (now or time.time()) - self.fetched_at > ttl
+
+
+class KeyCache:
+    """Key/init bodies keyed by URI, single-flight, LRU over a fixed entry count"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES, max_entry_bytes=MAX_ENTRY_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()  # url -> KeyEntry
+        self._url_locks = {}           # url -> Lock, so only one client fetches
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _url_lock(self, url):
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+    def _lookup(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            if entry.expired(self.ttl):
+                del self._entries[url]
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return entry
+
+    def get(self, url, fetch):
+        """Return (entry, 'HIT'|'MISS') for url.
+
+        fetch(url) returns (body bytes, content type) or raises; failures are
+        not cached. Concurrent misses for one URI wait for a single fetch.
+        """
+        entry = self._lookup(url)
+        if entry is not None:
+            return entry, 'HIT'
+
+        with self._url_lock(url):
+            entry = self._lookup(url)
+            if entry is not None:
+                return entry, 'HIT'
+
+            body, content_type = fetch(url)
+            entry = KeyEntry(url, body, content_type)
+            with self._lock:
+                self.misses += 1
+                if len(body) <= self.max_entry_bytes:
+                    self._entries[url] = entry
+                    self._entries.move_to_end(url)
+                    while len(self._entries) > self.max_entries:
+                        old_url, _ = self._entries.popitem(last=False)
+                        self._url_locks.pop(old_url, None)
+            return entry, 'MISS'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(len(e.body) for e in self._entries.values()),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+.m3u8 candidate scanner shared by every extractor
+Each extractor used to carry its own list of m3u8 regexes and run them one
+after another (five or more re.findall passes over the same page or script),
+each with its own idea of which matches were JavaScript rather than URLs.
+find_m3u8() makes one pass: it jumps from one ".m3u8" to the next with
+str.find (text without one costs a single substring search), cuts the URL
+around each out of the text, and ranks it by what precedes it. URLs handed
+to a player (file:, source:, loadSource(...)) come first, then quoted URLs,
+then bare ones. Each URL is returned once, with &amp; unescaped.
+"""
+
+import re
+from urllib.parse import urljoin
+
+MAX_URL_LENGTH = 500
+# Text that ends up in a "URL" when a match runs across JavaScript instead of a string
+JS_FALSE_POSITIVES = ('const ', 'function', 'return ', 'Math.', 'Date.', 'toString', 'slice')
+
+RANK_PLAYER = 0    # Assigned to a player key or passed to a load call
+RANK_QUOTED = 1    # A string literal / attribute value
+RANK_BARE = 2      # Anywhere else in the text
+
+_DELIMITER_RE = re.compile(r'[\s"\'<>(){}`]')
+_SCHEME_RE = re.compile(r'(?:https?:)?//', re.I)
+_PLAYER_CONTEXT_RE = re.compile(
+    r'(?:(?:file|source|src|url|stream|hlsUrl|streamUrl|hls\.src|player\.src)["\']?\s*[:=]'
+    r'|(?:loadSource|load|play)\s*\()\s*$', re.I)
+_CONTEXT_CHARS = 40
+
+
+def _candidate(text, hit):
+    """(rank, raw URL, end) for the .m3u8 at index hit, or None"""
+    window_start = max(hit - MAX_URL_LENGTH, 0)
+    before = text[window_start:hit][::-1]
+    delimiter = _DELIMITER_RE.search(before)
+    start = hit - (delimiter.start() if delimiter else len(before))
+    delimiter = _DELIMITER_RE.search(text, hit + 5)
+    end = delimiter.start() if delimiter else len(text)
+
+    raw = text[start:end].replace('\\/', '/')   # JSON-escaped slashes
+    if raw.endswith('\\'):
+        raw = raw[:-1]                # An escaped closing quote (\")
+    opening = text[start - 1] if start > 0 else ''
+    quoted = opening in ('"', "'") and text[end:end + 1] == opening
+    scheme = _SCHEME_RE.search(raw)
+    if scheme:
+        raw = raw[scheme.start():]
+        if scheme.start():
+            quoted = False            # e.g. src=https://... unquoted, or text glued on
+    elif not quoted:
+        return None                   # A relative path is only trusted inside quotes
+    if raw.startswith('.m3u8') or raw[:raw.find('.m3u8')].endswith('/'):
+        return None                   # No file name: a string being concatenated
+    if quoted and _PLAYER_CONTEXT_RE.search(text[max(start - 1 - _CONTEXT_CHARS, 0):start - 1]):
+        return RANK_PLAYER, raw, end
+    return (RANK_QUOTED if quoted else RANK_BARE), raw, end
+
+
+def _clean(url, base_url):
+    """The usable absolute URL for a match, or None"""
+    url = url.replace('&amp;', '&')
+    if len(url) > MAX_URL_LENGTH or any(js in url for js in JS_FALSE_POSITIVES):
+        return None
+    if url.startswith('//'):
+        return 'https:' + url
+    if url.lower().startswith(('http://', 'https://')):
+        return url
+    return urljoin(base_url, url) if base_url else None
+
+
+def scan_m3u8(text, base_url=None):
+    """[(rank, url), ...] for every distinct .m3u8 URL in text, best first (then in text order).
+    Relative URLs are resolved against base_url, or dropped without one."""
+    hit = text.find('.m3u8') if text else -1
+    best = {}
+    while hit != -1:
+        found = _candidate(text, hit)
+        next_from = hit + 5
+        if found is not None:
+            rank, raw, end = found
+            next_from = max(end, next_from)
+            url = _clean(raw, base_url)
+            if url is not None and (url not in best or rank < best[url][0]):
+                best[url] = (rank, best[url][1] if url in best else hit)
+        hit = text.find('.m3u8', next_from)
+    return [(rank, url) for url, (rank, position) in sorted(best.items(), key=lambda item: item[1])]
+
+
+def find_m3u8(text, base_url=None, limit=None):
+    """Distinct .m3u8 URLs in text, best first (see scan_m3u8)"""
+    urls = [url for rank, url in scan_m3u8(text, base_url)]
+    return urls[:limit] if limit is not None else urls
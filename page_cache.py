@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Cache for HTML listing and event pages
+Searches, live-game scans and extractions fetched the same listing pages
+(allupcomingsports/27/, /football) and eventinfo pages on every call. Pages
+are now kept for a per-URL TTL; once it runs out they are revalidated with
+If-None-Match / If-Modified-Since, and a 200 whose body hashes the same as
+before keeps the old entry, so whatever was parsed from it (the soup) is
+reused instead of parsed again. An optional directory keeps pages across
+restarts.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 60      # Seconds a page is served without asking the origin
+MAX_PAGES = 32        # Pages kept in memory (each holds its parsed soup too)
+
+
+def body_digest(content):
+    """Hash of a page body, to tell a changed page from a re-sent one"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+class PageError(Exception):
+    """An origin answered with an error status (raised by PageEntry.raise_for_status)"""
+
+    def __init__(self, url, status_code):
+        super().__init__(f"{status_code} Error for url: {url}")
+        self.url = url
+        self.status_code = status_code
+
+
+class PageEntry:
+    """One fetched page. Quacks like a requests response (status_code, text,
+    raise_for_status) so call sites read it the same way."""
+
+    def __init__(self, url, text, status_code=200, etag=None, last_modified=None,
+                 digest=None, fetched_at=None):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest or body_digest(text)
+        self.fetched_at = fetched_at or time.time()
+        self.fresh_until = 0
+        self._parsed = {}             # key -> what parse(text) returned for this body
+        self._lock = threading.Lock()
+
+    @property
+    def ok(self):
+        return self.status_code == 200
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise PageError(self.url, self.status_code)
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.fresh_until
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def parsed(self, key, parse):
+        """parse(text), computed once per page body (e.g. the BeautifulSoup tree)"""
+        with self._lock:
+            if key not in self._parsed:
+                self._parsed[key] = parse(self.text)
+            return self._parsed[key]
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'digest': self.digest,
+            'fetched_at': self.fetched_at,
+            'text': self.text
+        }
+
+
+class PageCache:
+    """Pages keyed by URL, each fresh for the TTL of the first rule its URL matches.
+
+    ttls is a list of (regex, seconds) checked in order; URLs matching none
+    get default_ttl. directory, if set, keeps a copy of every page on disk.
+    """
+
+    def __init__(self, ttls=(), default_ttl=DEFAULT_TTL, max_pages=MAX_PAGES, directory=None):
+        self.ttls = [(re.compile(pattern), seconds) for pattern, seconds in ttls]
+        self.default_ttl = default_ttl
+        self.max_pages = max_pages
+        self.directory = None
+        self._entries = OrderedDict()  # url -> PageEntry
+        self._url_locks = {}           # url -> Lock, so only one caller refetches
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.fetches = 0
+        self.revalidated = 0           # 304 Not Modified
+        self.unchanged = 0             # 200 with the same body
+        self.changed = 0
+        self.stale_served = 0
+        self.set_directory(directory)
+
+    def set_directory(self, directory):
+        """Keep pages on disk in directory (None: memory only)"""
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def ttl_for(self, url):
+        for pattern, seconds in self.ttls:
+            if pattern.search(url):
+                return seconds
+        return self.default_ttl
+
+    def _url_lock(self, url):
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+    def peek(self, url):
+        """Current entry for url (fresh or not), or None"""
+        with self._lock:
+            return self._entries.get(url)
+
+    def _hit(self, entry):
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def get(self, url, fetch, ttl=None):
+        """Return a PageEntry for url.
+
+        fetch(url, headers) does the request and returns a requests-style
+        response; headers holds the conditional headers for a stale entry.
+        Error statuses come back as an uncached entry; if the origin can't be
+        reached (or fails with a 5xx) a stale copy is served instead.
+        """
+        entry = self.peek(url)
+        if entry is not None and entry.is_fresh():
+            return self._hit(entry)
+
+        with self._url_lock(url):
+            entry = self.peek(url)
+            if entry is not None and entry.is_fresh():
+                return self._hit(entry)
+            ttl = self.ttl_for(url) if ttl is None else ttl
+            if entry is None:
+                entry = self._load(url, ttl)
+                if entry is not None and entry.is_fresh():
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._store(url, entry)
+                    return entry
+
+            headers = {}
+            if entry is not None and entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry is not None and entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+            with self._lock:
+                self.fetches += 1
+            try:
+                response = fetch(url, headers)
+            except Exception:
+                if entry is None:
+                    raise
+                return self._stale(url, entry, 'unreachable')
+
+            now = time.time()
+            if response.status_code == 304 and entry is not None:
+                with self._lock:
+                    self.revalidated += 1
+                entry.fresh_until = now + ttl
+                self._store(url, entry)
+                return entry
+            if response.status_code != 200:
+                if entry is not None and response.status_code >= 500:
+                    return self._stale(url, entry, response.status_code)
+                return PageEntry(url, response.text, response.status_code)
+
+            digest = body_digest(response.content)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if entry is not None and entry.digest == digest:
+                # Same body: keep the entry and whatever was parsed from it
+                with self._lock:
+                    self.unchanged += 1
+                entry.etag, entry.last_modified = etag, last_modified
+            else:
+                with self._lock:
+                    self.changed += 1
+                entry = PageEntry(url, response.text, etag=etag, last_modified=last_modified,
+                                  digest=digest, fetched_at=now)
+            entry.fresh_until = now + ttl
+            self._store(url, entry)
+            self._save(entry)
+            return entry
+
+    def _stale(self, url, entry, reason):
+        with self._lock:
+            self.stale_served += 1
+        print(f"[PageCache] ⚠️  {url[:60]}: origin {reason}, serving copy from {entry.age():.0f}s ago")
+        return entry
+
+    def _store(self, url, entry):
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_pages:
+                old_url, _ = self._entries.popitem(last=False)
+                self._url_locks.pop(old_url, None)
+
+    def _path(self, url):
+        return os.path.join(self.directory, body_digest(url) + '.json')
+
+    def _load(self, url, ttl):
+        """The on-disk copy of url (fresh for ttl from when it was fetched), or None"""
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(url), encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get('url') != url:
+            return None
+        entry = PageEntry(url, saved['text'], etag=saved.get('etag'),
+                          last_modified=saved.get('last_modified'),
+                          digest=saved.get('digest'), fetched_at=saved.get('fetched_at'))
+        entry.fresh_until = entry.fetched_at + ttl
+        return entry
+
+    def _save(self, entry):
+        if not self.directory:
+            return
+        path = self._path(entry.url)
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(entry.to_dict(), f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"[PageCache] ⚠️  Couldn't save {entry.url[:60]}: {e}")
+
+    def invalidate(self, url=None):
+        """Drop one page (or all) from memory so the next request revalidates it"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pages': len(self._entries),
+                'directory': self.directory,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'fetches': self.fetches,
+                'revalidated': self.revalidated,
+                'unchanged': self.unchanged,
+                'changed': self.changed,
+                'stale_served': self.stale_served
+            }
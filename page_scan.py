@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Single-pass page scanner for extraction
+The extractors parsed every event page, channel page and nested iframe into a
+BeautifulSoup tree and then walked it again for each thing they wanted
+(anchors, then iframes, then hidden containers), only ever reading a handful
+of attributes. scan_page() reads the page once, without building a tree, and
+collects everything the extraction methods use: anchors with their text and
+onclick handler, iframe and script sources, and .m3u8 URLs. selectolax is used
+when installed; otherwise the standard library's streaming HTML parser.
+"""
+
+import re
+from html.parser import HTMLParser
+
+from m3u8_scan import find_m3u8
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    try:
+        # Older releases only have the Modest backend (removed in selectolax 1.0)
+        from selectolax.parser import HTMLParser as SelectolaxParser
+        SELECTOLAX_AVAILABLE = True
+    except ImportError:
+        SELECTOLAX_AVAILABLE = False
+
+_HIDDEN_ID_RE = re.compile(r'hidden', re.I)
+# Elements that never get an end tag, so never contain anything
+_VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                        'meta', 'param', 'source', 'track', 'wbr'])
+
+
+class PageScan:
+    """What one page holds for the extractors.
+
+    links: dicts with href, text (stripped, like get_text(strip=True)),
+    onclick and hidden (inside an element whose id contains "hidden"), for
+    every <a href>. iframes: every <iframe>'s src ('' when it has none).
+    scripts: every <script src>. hidden_containers: how many elements have an
+    id containing "hidden". m3u8: .m3u8 URLs anywhere in the page, best first
+    (m3u8_scan.find_m3u8).
+    """
+
+    def __init__(self, html):
+        self.html = html
+        self.links = []
+        self.iframes = []
+        self.scripts = []
+        self.hidden_containers = 0
+        self.m3u8 = find_m3u8(html)
+
+    def iframe_sources(self):
+        """iframe src values, skipping iframes without one"""
+        return [src for src in self.iframes if src]
+
+
+class _StreamingScanner(HTMLParser):
+    """Fills a PageScan from parser events; no tree is built"""
+
+    def __init__(self, scan):
+        super().__init__(convert_charrefs=True)
+        self.scan = scan
+        self._hidden = []     # [tag, depth of same-named tags] for each open hidden container
+        self._link = None     # (link, text parts) of the open <a href>
+        self._raw = 0         # Inside <script>/<style>: not link text
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        inside_hidden = bool(self._hidden)
+        for container in self._hidden:
+            if container[0] == tag:
+                container[1] += 1
+        element_id = attrs.get('id')
+        if element_id and _HIDDEN_ID_RE.search(element_id):
+            self.scan.hidden_containers += 1
+            if tag not in _VOID_TAGS:
+                self._hidden.append([tag, 1])
+
+        if tag == 'a':
+            self._close_link()
+            if 'href' in attrs:
+                link = {'href': attrs['href'] or '', 'text': '', 'onclick': attrs.get('onclick') or '',
+                        'hidden': inside_hidden}
+                self.scan.links.append(link)
+                self._link = (link, [])
+        elif tag == 'iframe':
+            self.scan.iframes.append(attrs.get('src') or '')
+        elif tag == 'script':
+            if attrs.get('src'):
+                self.scan.scripts.append(attrs['src'])
+            self._raw += 1
+        elif tag == 'style':
+            self._raw += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._close_link()
+        elif tag in ('script', 'style'):
+            self._raw = max(self._raw - 1, 0)
+        for container in self._hidden:
+            if container[0] == tag:
+                container[1] -= 1
+        while self._hidden and self._hidden[-1][1] <= 0:
+            self._hidden.pop()
+
+    def handle_data(self, data):
+        if self._link is not None and not self._raw:
+            data = data.strip()
+            if data:
+                self._link[1].append(data)
+
+    def _close_link(self):
+        if self._link is not None:
+            link, parts = self._link
+            link['text'] = ''.join(parts)
+            self._link = None
+
+    def close(self):
+        super().close()
+        self._close_link()
+
+
+def _scan_streaming(html, scan):
+    scanner = _StreamingScanner(scan)
+    scanner.feed(html)
+    scanner.close()
+
+
+def _scan_selectolax(html, scan):
+    tree = SelectolaxParser(html)
+    for node in tree.css('[id]'):
+        if _HIDDEN_ID_RE.search(node.attributes.get('id') or ''):
+            scan.hidden_containers += 1
+    for node in tree.css('a[href], iframe, script[src]'):
+        attrs = node.attributes
+        if node.tag == 'a':
+            hidden = False
+            parent = node.parent
+            # Up to <html>: the document node has no attributes (reading them crashes lexbor 0.3)
+            while parent is not None and parent.tag != '#document' and not hidden:
+                hidden = bool(_HIDDEN_ID_RE.search(parent.attributes.get('id') or ''))
+                parent = parent.parent
+            scan.links.append({'href': attrs.get('href') or '', 'text': node.text(separator='', strip=True),
+                               'onclick': attrs.get('onclick') or '', 'hidden': hidden})
+        elif node.tag == 'iframe':
+            scan.iframes.append(attrs.get('src') or '')
+        else:
+            scan.scripts.append(attrs['src'])
+
+
+def scan_page(html, backend=None):
+    """Scan html once and return its PageScan. backend: 'selectolax' or 'stdlib'
+    (default: selectolax when installed)"""
+    if backend is None:
+        backend = 'selectolax' if SELECTOLAX_AVAILABLE else 'stdlib'
+    scan = PageScan(html)
+    if backend == 'selectolax':
+        _scan_selectolax(html, scan)
+    else:
+        _scan_streaming(html, scan)
+    return scan
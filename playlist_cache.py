@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+TTL cache for already-rewritten live playlists
+Every viewer polling /stream.m3u8 within one freshness window (half a target
+duration by default) gets the same rewritten body, with an ETag for 304s;
+only one of them pays for the upstream fetch.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TARGET_DURATION = 6   # Seconds, until a playlist tells us otherwise
+FRESHNESS_FRACTION = 0.5      # Fresh for half a target duration
+MAX_PLAYLISTS = 32            # Upstream URLs kept (channel switches leave old ones behind)
+
+_TARGET_DURATION_RE = re.compile(r'#EXT-X-TARGETDURATION:\s*(\d+(?:\.\d+)?)')
+_PART_TARGET_RE = re.compile(r'#EXT-X-PART-INF:.*PART-TARGET=(\d+(?:\.\d+)?)')
+
+
+def parse_target_duration(content, default=DEFAULT_TARGET_DURATION):
+    """Read #EXT-X-TARGETDURATION from playlist text"""
+    match = _TARGET_DURATION_RE.search(content)
+    if match:
+        value = float(match.group(1))
+        if value > 0:
+            return value
+    return default
+
+
+def parse_part_target(content):
+    """Read PART-TARGET from an LL-HLS playlist's #EXT-X-PART-INF (None without one)"""
+    match = _PART_TARGET_RE.search(content)
+    if match:
+        value = float(match.group(1))
+        if value > 0:
+            return value
+    return None
+
+
+def make_etag(body):
+    """Strong ETag for a playlist body"""
+    return '"' + hashlib.md5(body.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+class PlaylistEntry:
+    """One rewritten playlist snapshot"""
+
+    def __init__(self, url, body, target_duration, fresh_for):
+        self.url = url
+        self.body = body
+        self.target_duration = target_duration
+        self.etag = make_etag(body)
+        self.fetched_at = time.time()
+        self.fresh_until = self.fetched_at + fresh_for
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.fresh_until
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+def make_entry(url, body, freshness_fraction=FRESHNESS_FRACTION):
+    """PlaylistEntry for a freshly fetched body, fresh for a fraction of its target duration
+    (of its part target for LL-HLS playlists, which change once per part, not once per segment)"""
+    target_duration = parse_target_duration(body)
+    part_target = parse_part_target(body)
+    return PlaylistEntry(url, body, target_duration,
+                         (part_target or target_duration) * freshness_fraction)
+
+
+class PlaylistCache:
+    """Rewritten playlists keyed by upstream URL, refreshed once per freshness window"""
+
+    def __init__(self, freshness_fraction=FRESHNESS_FRACTION, max_playlists=MAX_PLAYLISTS):
+        self.freshness_fraction = freshness_fraction
+        self.max_playlists = max_playlists
+        self._entries = OrderedDict()  # url -> PlaylistEntry
+        self._url_locks = {}           # url -> Lock, so only one viewer refetches
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+
+    def _url_lock(self, url):
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+    def peek(self, url):
+        """Current entry for url (fresh or not), or None"""
+        with self._lock:
+            return self._entries.get(url)
+
+    def get(self, url, fetch_rewritten):
+        """Return a fresh PlaylistEntry for url.
+
+        fetch_rewritten(url) returns the rewritten playlist text (or raises).
+        Concurrent callers that find the entry stale wait for the one caller
+        doing the refetch instead of each hitting upstream.
+        """
+        entry = self.peek(url)
+        if entry is not None and entry.is_fresh():
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        with self._url_lock(url):
+            entry = self.peek(url)
+            if entry is not None and entry.is_fresh():
+                with self._lock:
+                    self.hits += 1
+                return entry
+
+            entry = make_entry(url, fetch_rewritten(url), self.freshness_fraction)
+            with self._lock:
+                self.refreshes += 1
+                self._entries[url] = entry
+                self._entries.move_to_end(url)
+                while len(self._entries) > self.max_playlists:
+                    old_url, _ = self._entries.popitem(last=False)
+                    self._url_locks.pop(old_url, None)
+            return entry
+
+    def invalidate(self, url=None):
+        """Drop one playlist (or all) so the next request refetches"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'playlists': len(self._entries),
+                'hits': self.hits,
+                'refreshes': self.refreshes
+            }
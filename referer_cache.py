@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Learned Referer/Origin negotiation for upstream stream hosts
+Remembers which referer each CDN host accepted so playlists and segments
+are fetched with one upstream request instead of walking the whole list.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+
+import upstream_client
+
+# Referers tried (in order) when a host hasn't been learned yet.
+# The first one is what Playwright captured from the webplayer iframe.
+REFERERS_TO_TRY = [
+    'https://exposestrat.com/',
+    'https://arizonaplay.club/',
+    'https://livetv.sx/',
+    'https://cdn.livetv869.me/'
+]
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+
+
+def host_key(url):
+    """Cache key for a URL: host[:port] of the upstream server"""
+    return urlparse(url).netloc.lower()
+
+
+def build_headers(referer):
+    """Request headers for a referer (Origin is the referer without trailing slash)"""
+    return {
+        'User-Agent': USER_AGENT,
+        'Referer': referer,
+        'Origin': referer.rstrip('/')
+    }
+
+
+class RefererCache:
+    """Per-host cache of the referer that upstream accepted, persisted in SQLite"""
+
+    def __init__(self, db_file=None, defaults=None):
+        self.db_file = db_file
+        self.defaults = list(defaults or REFERERS_TO_TRY)
+        self._learned = {}  # host -> referer
+        self._lock = threading.Lock()
+
+    # ---------- Persistence ----------
+
+    def ensure_table(self, conn):
+        """Create the learned_referers table on an open connection"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS learned_referers (
+                host TEXT PRIMARY KEY,
+                referer TEXT NOT NULL,
+                origin TEXT,
+                success_count INTEGER DEFAULT 0,
+                last_success TEXT
+            )
+        ''')
+
+    def load(self):
+        """Load learned referers from the database into memory"""
+        if not self.db_file:
+            return 0
+        conn = sqlite3.connect(self.db_file)
+        try:
+            self.ensure_table(conn)
+            rows = conn.execute('SELECT host, referer FROM learned_referers').fetchall()
+        except Exception as e:
+            print(f"[Referer] ✗ Error loading learned referers: {e}")
+            rows = []
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._learned.update({host: referer for host, referer in rows})
+        if rows:
+            print(f"[Referer] ✓ Loaded {len(rows)} learned referer(s)")
+        return len(rows)
+
+    def _save(self, host, referer):
+        if not self.db_file:
+            return
+        conn = sqlite3.connect(self.db_file)
+        try:
+            self.ensure_table(conn)
+            conn.execute('''
+                INSERT INTO learned_referers (host, referer, origin, success_count, last_success)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(host) DO UPDATE SET
+                    referer = excluded.referer,
+                    origin = excluded.origin,
+                    success_count = CASE WHEN learned_referers.referer = excluded.referer
+                                         THEN learned_referers.success_count + 1 ELSE 1 END,
+                    last_success = excluded.last_success
+            ''', (host, referer, referer.rstrip('/'), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        except Exception as e:
+            print(f"[Referer] ✗ Error saving learned referer: {e}")
+        finally:
+            conn.close()
+
+    def _delete(self, host):
+        if not self.db_file:
+            return
+        conn = sqlite3.connect(self.db_file)
+        try:
+            self.ensure_table(conn)
+            conn.execute('DELETE FROM learned_referers WHERE host = ?', (host,))
+            conn.commit()
+        except Exception as e:
+            print(f"[Referer] ✗ Error deleting learned referer: {e}")
+        finally:
+            conn.close()
+
+    # ---------- Lookup ----------
+
+    def get(self, url):
+        """Return the learned referer for a URL's host, or None"""
+        with self._lock:
+            return self._learned.get(host_key(url))
+
+    def candidates(self, url, hints=None):
+        """Referers to try for a URL: learned one first, then hints, then defaults"""
+        ordered = []
+        learned = self.get(url)
+        for referer in [learned] + list(hints or []) + self.defaults:
+            if referer and referer not in ordered:
+                ordered.append(referer)
+        return ordered
+
+    def record_success(self, url, referer):
+        """Remember that a host accepted this referer (persisted only when it changes)"""
+        host = host_key(url)
+        with self._lock:
+            changed = self._learned.get(host) != referer
+            self._learned[host] = referer
+        if changed:
+            print(f"[Referer] ✓ Learned {referer} for {host}")
+            self._save(host, referer)
+
+    def invalidate(self, url):
+        """Forget the learned referer for a URL's host (e.g. after a 403)"""
+        host = host_key(url)
+        with self._lock:
+            removed = self._learned.pop(host, None)
+        if removed:
+            print(f"[Referer] ⚠ Invalidated {removed} for {host}")
+            self._delete(host)
+
+    def snapshot(self):
+        """Copy of the host -> referer map"""
+        with self._lock:
+            return dict(self._learned)
+
+    # ---------- Fetching ----------
+
+    def fetch(self, url, hints=None, stream=False, timeout=None, extra_headers=None):
+        """GET url, trying the learned referer first and learning from the result.
+        timeout None uses upstream_client's configured (connect, read) default.
+
+        Returns (response, last_error). response is the first 200 response, or
+        the last non-200 response if every candidate was rejected, or None if
+        every attempt raised. Rejected streamed responses are closed so their
+        connections go back to the pool.
+        """
+        learned = self.get(url)
+        response = None
+        last_error = None
+
+        for referer in self.candidates(url, hints):
+            headers = build_headers(referer)
+            if extra_headers:
+                headers.update(extra_headers)
+            try:
+                if response is not None:
+                    response.close()
+                response = upstream_client.get(url, headers=headers, timeout=timeout,
+                                               stream=stream, verify=False)
+            except Exception as e:
+                last_error = e
+                continue
+
+            if response.status_code in (200, 206):
+                self.record_success(url, referer)
+                return response, None
+
+            if response.status_code == 403 and referer == learned:
+                self.invalidate(url)
+            last_error = f"HTTP {response.status_code} with referer {referer}"
+
+        return response, last_error
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Token-expiry-aware refresh scheduler
+Stream URLs carry their own deadline (md5=...&expires=<unix>), so each stream
+is re-resolved a margin before its token runs out instead of on a fixed
+hourly timer. URLs without one fall back to the lifetime last observed for
+their host (learned from upstream 403s), then to the default interval.
+One thread drives a timer heap for every stream; re-extractions run on a
+small worker pool so a slow extraction doesn't delay the others.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl
+
+DEFAULT_LIFETIME = 3600          # Seconds, for URLs with no expiry and no learned lifetime
+REFRESH_MARGIN = 120             # Re-resolve this long before the token expires
+MIN_DELAY = 15                   # Never schedule sooner than this (and ignore repeat 403 reports)
+MIN_LIFETIME = 60                # Floor for learned lifetimes
+RETRY_DELAY = 30                 # First retry after a failed re-extraction, doubling...
+MAX_RETRY_DELAY = 300            # ...up to this
+MAX_WORKERS = 4                  # Concurrent re-extractions
+
+# Query parameters that hold a unix expiry time, and signed tokens that embed one as exp=
+EXPIRY_PARAMS = ('expires', 'expire', 'expiry', 'exp', 'e', 'validto', 'valid_until')
+TOKEN_PARAMS = ('hdnts', 'hdnea', '__token__', 'token')
+MAX_EXPIRY_AHEAD = 30 * 24 * 3600
+
+
+def _as_timestamp(value, now):
+    """A plausible unix time (seconds or milliseconds) or None"""
+    try:
+        stamp = float(value)
+    except (TypeError, ValueError):
+        return None
+    if stamp > 1e12:
+        stamp /= 1000
+    if now - 24 * 3600 < stamp < now + MAX_EXPIRY_AHEAD:
+        return stamp
+    return None
+
+
+def parse_expiry(url, now=None):
+    """Unix time the URL's token expires at, or None if it doesn't say"""
+    now = now or time.time()
+    try:
+        params = parse_qsl(urlsplit(url).query, keep_blank_values=False)
+    except ValueError:
+        return None
+
+    for name, value in params:
+        if name.lower() in EXPIRY_PARAMS:
+            stamp = _as_timestamp(value, now)
+            if stamp:
+                return stamp
+    for name, value in params:
+        if name.lower() in TOKEN_PARAMS:
+            # Akamai style: st=...~exp=...~acl=...~hmac=...
+            for part in value.replace('~', '&').split('&'):
+                key, _, field = part.partition('=')
+                if key.lower() in ('exp', 'expires'):
+                    stamp = _as_timestamp(field, now)
+                    if stamp:
+                        return stamp
+    return None
+
+
+def _host(url):
+    try:
+        return urlsplit(url).netloc.lower()
+    except ValueError:
+        return ''
+
+
+class RefreshJob:
+    """One stream's refresh: its current URL, when it expires and when to re-resolve"""
+
+    def __init__(self, key, url, refresh, resolved_at):
+        self.key = key
+        self.url = url
+        self.refresh = refresh        # refresh(key) -> fresh URL, or None on failure
+        self.resolved_at = resolved_at
+        self.expires_at = None
+        self.basis = 'default'        # 'expires', 'learned' or 'default'
+        self.due = resolved_at
+        self.generation = 0
+        self.failures = 0
+        self.refreshes = 0
+        self.running = False
+
+    def info(self):
+        return {
+            'key': self.key,
+            'basis': self.basis,
+            'expires_at': _fmt(self.expires_at),
+            'next_refresh': _fmt(self.due),
+            'next_refresh_in': round(max(self.due - time.time(), 0), 1),
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'running': self.running
+        }
+
+
+def _fmt(stamp):
+    return datetime.fromtimestamp(stamp).strftime('%Y-%m-%d %H:%M:%S') if stamp else None
+
+
+class RefreshScheduler:
+    """Timer heap of RefreshJobs keyed by stream, run by one thread"""
+
+    def __init__(self, margin=REFRESH_MARGIN, default_lifetime=DEFAULT_LIFETIME,
+                 max_workers=MAX_WORKERS, min_delay=MIN_DELAY):
+        self.margin = margin
+        self.default_lifetime = default_lifetime
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        self._jobs = {}                # key -> RefreshJob
+        self._heap = []                # (due, seq, key, generation); stale entries skipped
+        self._seq = itertools.count()
+        self._lifetimes = {}           # host -> seconds a token was seen to last
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._stopped = False
+        self.expired_reports = 0
+
+    # ---- scheduling -------------------------------------------------------
+
+    def schedule(self, key, url, refresh=None):
+        """(Re)schedule key for a freshly resolved url; refresh defaults to the existing callback"""
+        now = time.time()
+        with self._cond:
+            job = self._jobs.get(key)
+            if refresh is None:
+                if job is None:
+                    raise ValueError(f"No refresh callback for {key}")
+                refresh = job.refresh
+            new_job = RefreshJob(key, url, refresh, now)
+            if job is not None:
+                new_job.generation = job.generation + 1
+                # A running job being rescheduled is its own refresh callback at work
+                new_job.refreshes = job.refreshes + (1 if job.running else 0)
+            self._plan(new_job, now)
+            self._jobs[key] = new_job
+            self._push(new_job)
+            return new_job
+
+    def cancel(self, key):
+        with self._cond:
+            return self._jobs.pop(key, None) is not None
+
+    def report_expired(self, key):
+        """Upstream rejected key's URL (403/410): learn the host's real lifetime, refresh now"""
+        now = time.time()
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None or job.running or now - job.resolved_at < self.min_delay:
+                return False
+            self.expired_reports += 1
+            host = _host(job.url)
+            if host:
+                self._lifetimes[host] = max(now - job.resolved_at, MIN_LIFETIME)
+            print(f"[Refresh] {key}: upstream rejected the token after "
+                  f"{now - job.resolved_at:.0f}s, re-resolving now")
+            job.generation += 1
+            job.due = now
+            self._push(job)
+            return True
+
+    def _plan(self, job, now):
+        """Set job.due from the URL's expiry, the host's learned lifetime, or the default"""
+        expires_at = parse_expiry(job.url, now)
+        host = _host(job.url)
+        if expires_at:
+            job.expires_at = expires_at
+            job.basis = 'expires'
+            if host:
+                self._lifetimes[host] = max(expires_at - now, MIN_LIFETIME)
+        elif host in self._lifetimes:
+            job.expires_at = now + self._lifetimes[host]
+            job.basis = 'learned'
+        else:
+            job.expires_at = None
+            job.basis = 'default'
+            job.due = now + self.default_lifetime
+            return
+        # Short-lived tokens get a proportionally shorter margin
+        lifetime = job.expires_at - now
+        job.due = max(job.expires_at - min(self.margin, lifetime / 4), now + self.min_delay)
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.due, next(self._seq), job.key, job.generation))
+        self._cond.notify()
+
+    # ---- timer thread ------------------------------------------------------
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='refresh')
+            self._thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next_due_locked()
+                if job is None:
+                    return
+                job.running = True
+            self._executor.submit(self._execute, job)
+
+    def _next_due_locked(self):
+        """Block until a live job is due and return it (None once stopped)"""
+        while not self._stopped:
+            if not self._heap:
+                self._cond.wait()
+                continue
+            due, _, key, generation = self._heap[0]
+            job = self._jobs.get(key)
+            if job is None or job.generation != generation or job.running:
+                heapq.heappop(self._heap)   # Cancelled, rescheduled or already running
+                continue
+            delay = due - time.time()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            heapq.heappop(self._heap)
+            return job
+        return None
+
+    def _execute(self, job):
+        print(f"[Refresh] {job.key}: re-resolving ({job.basis} deadline)")
+        try:
+            url = job.refresh(job.key)
+        except Exception as e:
+            print(f"[Refresh] {job.key}: ✗ {e}")
+            url = None
+
+        now = time.time()
+        with self._cond:
+            job.running = False
+            if self._jobs.get(job.key) is not job:
+                return                      # Cancelled or replaced while we ran
+            if url:
+                job.url = url
+                job.resolved_at = now
+                job.failures = 0
+                job.refreshes += 1
+                self._plan(job, now)
+                print(f"[Refresh] {job.key}: ✓ next refresh at {_fmt(job.due)} ({job.basis})")
+            else:
+                job.failures += 1
+                job.due = now + min(RETRY_DELAY * 2 ** (job.failures - 1), MAX_RETRY_DELAY)
+            job.generation += 1
+            self._push(job)
+
+    # ---- introspection -----------------------------------------------------
+
+    def job(self, key):
+        with self._cond:
+            return self._jobs.get(key)
+
+    def next_refresh(self, key):
+        """Unix time key is next re-resolved, or None if it isn't scheduled"""
+        with self._cond:
+            job = self._jobs.get(key)
+            return job.due if job else None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'streams': len(self._jobs),
+                'margin': self.margin,
+                'default_lifetime': self.default_lifetime,
+                'learned_lifetimes': {host: round(seconds) for host, seconds in self._lifetimes.items()},
+                'expired_reports': self.expired_reports,
+                'jobs': [job.info() for job in sorted(self._jobs.values(), key=lambda j: j.due)]
+            }
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Extraction result cache keyed by event and channel
+Every /api/load-stream call re-crawled the game page and resolved every
+channel from scratch, even when the same game had been resolved a minute
+earlier. The streams each channel resolved to are now kept (with the
+referer and the token's expiry) in memory and in SQLite, so reloads and
+restarts during a game reuse them until the token runs out. Before a cached
+stream is handed out it is revalidated with one playlist GET; one that fails
+is dropped and the channel is resolved again.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from refresh_scheduler import parse_expiry
+
+DEFAULT_TTL = 600        # Seconds a stream without an expiry in its URL is reused
+EXPIRY_MARGIN = 180      # Stop reusing a stream this long before its token expires
+                         # (more than the refresh scheduler's margin, so refreshes re-resolve)
+REVALIDATE_AFTER = 20    # Seconds a successful playlist check is trusted
+
+
+class ResolutionCache:
+    """Streams resolved per (event URL, channel URL), persisted in SQLite.
+
+    validate(stream_url, referer) -> bool checks a cached stream before it is
+    reused (None: trust it until expiry); referer(stream_url) gives the referer
+    stored with a stream that doesn't carry one.
+    """
+
+    def __init__(self, db_file=None, validate=None, referer=None, default_ttl=DEFAULT_TTL,
+                 margin=EXPIRY_MARGIN, revalidate_after=REVALIDATE_AFTER):
+        self.db_file = db_file
+        self.validate = validate
+        self.referer = referer
+        self.default_ttl = default_ttl
+        self.margin = margin
+        self.revalidate_after = revalidate_after
+        self._events = {}        # event URL -> {channel URL -> entry}
+        self._lock = threading.Lock()
+        self._stats = {'event_hits': 0, 'channel_hits': 0, 'misses': 0, 'stored': 0,
+                       'validated': 0, 'validation_failures': 0, 'expired': 0}
+
+    # ---------- Persistence ----------
+
+    def ensure_table(self, conn):
+        """Create the resolved_streams table on an open connection"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS resolved_streams (
+                event_url TEXT NOT NULL,
+                channel_url TEXT NOT NULL,
+                channel_index INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                stream_url TEXT NOT NULL,
+                referer TEXT,
+                stream TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                resolved_at TEXT NOT NULL,
+                PRIMARY KEY (event_url, channel_url, position)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_resolved_expiry ON resolved_streams(expires_at)')
+
+    def _load_event(self, event_url):
+        """The event's unexpired entries from the database (channel URL -> entry)"""
+        entries = {}
+        if not self.db_file:
+            return entries
+        conn = sqlite3.connect(self.db_file)
+        try:
+            self.ensure_table(conn)
+            rows = conn.execute('''
+                SELECT channel_url, channel_index, referer, stream, expires_at
+                FROM resolved_streams
+                WHERE event_url = ? AND expires_at > ?
+                ORDER BY channel_index, position
+            ''', (event_url, time.time() + self.margin)).fetchall()
+        except Exception as e:
+            print(f"[Resolved] ✗ Error loading resolved streams: {e}")
+            rows = []
+        finally:
+            conn.close()
+        for channel_url, channel_index, referer, stream, expires_at in rows:
+            entry = entries.setdefault(channel_url, {'index': channel_index, 'streams': [], 'referers': [],
+                                                     'expires_at': expires_at, 'validated_at': 0})
+            entry['streams'].append(json.loads(stream))
+            entry['referers'].append(referer)
+            entry['expires_at'] = min(entry['expires_at'], expires_at)
+        return entries
+
+    def _save(self, event_url, channel_url, entry):
+        if not self.db_file:
+            return
+        conn = sqlite3.connect(self.db_file)
+        try:
+            self.ensure_table(conn)
+            conn.execute('DELETE FROM resolved_streams WHERE event_url = ? AND channel_url = ?',
+                         (event_url, channel_url))
+            resolved_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            conn.executemany('''
+                INSERT INTO resolved_streams
+                (event_url, channel_url, channel_index, position, stream_url, referer, stream, expires_at, resolved_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(event_url, channel_url, entry['index'], position, stream['url'], referer,
+                   json.dumps(stream), entry['expires_at'], resolved_at)
+                  for position, (stream, referer) in enumerate(zip(entry['streams'], entry['referers']))])
+            # Rows whose tokens ran out are of no use to anyone
+            conn.execute('DELETE FROM resolved_streams WHERE expires_at < ?', (time.time(),))
+            conn.commit()
+        except Exception as e:
+            print(f"[Resolved] ✗ Error saving resolved streams: {e}")
+        finally:
+            conn.close()
+
+    def _delete(self, event_url, channel_url=None):
+        """Delete a channel's rows (every channel's without one)"""
+        if not self.db_file:
+            return
+        conn = sqlite3.connect(self.db_file)
+        try:
+            self.ensure_table(conn)
+            if channel_url is None:
+                conn.execute('DELETE FROM resolved_streams WHERE event_url = ?', (event_url,))
+            else:
+                conn.execute('DELETE FROM resolved_streams WHERE event_url = ? AND channel_url = ?',
+                             (event_url, channel_url))
+            conn.commit()
+        except Exception as e:
+            print(f"[Resolved] ✗ Error deleting resolved streams: {e}")
+        finally:
+            conn.close()
+
+    # ---------- Lookup ----------
+
+    def _entries(self, event_url):
+        """The event's entries, read from the database the first time it is asked for"""
+        with self._lock:
+            entries = self._events.get(event_url)
+        if entries is None:
+            loaded = self._load_event(event_url)
+            with self._lock:
+                entries = self._events.setdefault(event_url, loaded)
+        return entries
+
+    def _usable(self, event_url, channel_url, entry):
+        """Whether an entry may be handed out: unexpired, and its playlist still answers"""
+        now = time.time()
+        if entry['expires_at'] - self.margin <= now:
+            self._count('expired')
+            self._forget(event_url, channel_url)
+            return False
+        if self.validate is None or now - entry['validated_at'] < self.revalidate_after:
+            return True
+        try:
+            ok = self.validate(entry['streams'][0]['url'], entry['referers'][0])
+        except Exception:
+            ok = False
+        if ok:
+            self._count('validated')
+            entry['validated_at'] = now
+            return True
+        self._count('validation_failures')
+        print(f"[Resolved] ⚠ Cached stream no longer answers: {entry['streams'][0]['url'][:60]}")
+        self._forget(event_url, channel_url)
+        return False
+
+    def _forget(self, event_url, channel_url):
+        with self._lock:
+            removed = self._events.get(event_url, {}).pop(channel_url, None)
+        if removed is not None:
+            self._delete(event_url, channel_url)
+
+    def event_streams(self, event_url):
+        """Every cached stream of an event in channel order, or None if there is none to use.
+        The first channel's stream is revalidated (the next one tried if it fails); the
+        others are backups and are checked when they are switched to."""
+        entries = self._entries(event_url)
+        with self._lock:
+            entries = sorted(entries.items(), key=lambda item: item[1]['index'])
+        streams = []
+        checked = False
+        for channel_url, entry in entries:
+            if not checked:
+                if not self._usable(event_url, channel_url, entry):
+                    continue
+                checked = True
+            elif entry['expires_at'] - self.margin <= time.time():
+                continue
+            streams.extend(dict(stream) for stream in entry['streams'])
+        if not streams:
+            self._count('misses')
+            return None
+        self._count('event_hits')
+        return streams
+
+    def channel_streams(self, event_url, channel):
+        """The cached (revalidated) streams of one channel, or None"""
+        entry = self._entries(event_url).get(channel.get('url'))
+        if entry is None or not self._usable(event_url, channel.get('url'), entry):
+            self._count('misses')
+            return None
+        self._count('channel_hits')
+        return [dict(stream) for stream in entry['streams']]
+
+    def store(self, event_url, channel, streams, index=None):
+        """Remember what a channel (index-th on its event page; None: where it was, else last)
+        resolved to"""
+        streams = [stream for stream in streams or [] if stream.get('url')]
+        channel_url = channel.get('url')
+        if not streams or not channel_url:
+            return
+        now = time.time()
+        referers = [stream.get('referer') or (self.referer(stream['url']) if self.referer else None)
+                    for stream in streams]
+        expiry = min(parse_expiry(stream['url'], now) or now + self.default_ttl for stream in streams)
+        entry = {'index': index, 'streams': [dict(stream) for stream in streams], 'referers': referers,
+                 'expires_at': expiry, 'validated_at': now}
+        self._entries(event_url)
+        with self._lock:
+            entries = self._events.setdefault(event_url, {})
+            if index is None:
+                previous = entries.get(channel_url)
+                entry['index'] = previous['index'] if previous else len(entries)
+            entries[channel_url] = entry
+        self._count('stored')
+        self._save(event_url, channel_url, entry)
+
+    def invalidate(self, event_url):
+        """Forget everything cached for an event"""
+        with self._lock:
+            self._events.pop(event_url, None)
+        self._delete(event_url)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['events'] = len(self._events)
+            stats['channels'] = sum(len(entries) for entries in self._events.values())
+        return stats
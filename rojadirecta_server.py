@@ -3,7 +3,9 @@
 Flask server that extracts and serves streams from rojadirecta URLs.
 """
 from flask import Flask, Response, render_template_string, request, jsonify
-import requests
+import upstream_client
+import hls_playlist
+from urllib.parse import quote
 from extract_rojadirecta import extract_rojadirecta_stream
 import time
 import sys
@@ -201,12 +203,18 @@ def fetch_stream_content(url, referer):
     }
     
     try:
-        response = requests.get(url, headers=headers, timeout=10, stream=True)
+        response = upstream_client.get(url, headers=headers, stream=True)
         return response
     except Exception as e:
         print(f"Error fetching stream content: {e}")
         return None
 
+def proxy_url(url, kind=None):
+    """Playlist URI rewriter: route an upstream URL through /proxy?url= (nested playlists flagged)"""
+    if kind in hls_playlist.PLAYLIST_KINDS:
+        return f"/proxy?url={quote(url, safe='')}&playlist=1"
+    return f"/proxy?url={quote(url, safe='')}"
+
 def update_stream():
     """Extract fresh stream URL from rojadirecta"""
     global current_stream
@@ -247,21 +255,9 @@ def stream_m3u8():
     response = fetch_stream_content(current_stream['url'], current_stream['referer'])
     
     if response and response.status_code == 200:
-        content = response.text
-        # Modify relative URLs in playlist to be proxied through our server
-        if current_stream['url']:
-            base_url = current_stream['url'].rsplit('/', 1)[0]
-            # Replace relative URLs with absolute ones
-            lines = content.split('\n')
-            modified_lines = []
-            for line in lines:
-                if line and not line.startswith('#'):
-                    if not line.startswith('http'):
-                        line = f"{base_url}/{line}"
-                    # Proxy through our server
-                    line = f"/proxy?url={line}"
-                modified_lines.append(line)
-            content = '\n'.join(modified_lines)
+        # Every URI (segments, variants, keys, maps) goes through our proxy
+        content = hls_playlist.rewrite_playlist(response.text, response.url or current_stream['url'],
+                                                proxy_url)
         
         return Response(content, mimetype='application/vnd.apple.mpegurl')
     else:
@@ -280,23 +276,14 @@ def proxy():
         # Determine content type
         content_type = response.headers.get('Content-Type', 'application/octet-stream')
         
-        if url.endswith('.m3u8'):
+        if request.args.get('playlist'):
             # Process nested playlists
-            content = response.text
-            base_url = url.rsplit('/', 1)[0]
-            lines = content.split('\n')
-            modified_lines = []
-            for line in lines:
-                if line and not line.startswith('#'):
-                    if not line.startswith('http'):
-                        line = f"{base_url}/{line}"
-                    line = f"/proxy?url={line}"
-                modified_lines.append(line)
-            content = '\n'.join(modified_lines)
+            content = hls_playlist.rewrite_playlist(response.text, response.url or url, proxy_url)
+            response.close()
             return Response(content, mimetype='application/vnd.apple.mpegurl')
         else:
             # Stream video segments
-            return Response(response.iter_content(chunk_size=4096), mimetype=content_type)
+            return Response(upstream_client.iter_and_close(response, chunk_size=4096), mimetype=content_type)
     else:
         return "Content not available", 503
 
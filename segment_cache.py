@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Shared in-memory segment cache for the HLS proxy
+LRU under a byte budget, TTL from the playlist's target duration, and
+single-flight fetches: concurrent misses for one segment share one upstream
+download that every waiter streams from while it is still arriving.
+"""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+DEFAULT_TARGET_DURATION = 6             # Seconds, until a playlist tells us otherwise
+TTL_TARGET_DURATIONS = 6                # Keep a segment ~one live window (6 x target duration)
+FETCH_CHUNK_SIZE = 64 * 1024            # First upstream read; doubles per read...
+MAX_FETCH_CHUNK_SIZE = 1024 * 1024      # ...up to this, so big segments take few, large reads
+HEADER_WAIT_TIMEOUT = 15                # Seconds a waiter waits for upstream status/headers
+MAX_SLICE_SIZE = 256 * 1024             # Cap on one copied partial slice (byte-range edges)
+
+
+def slice_chunks(chunks, offsets, start, stop, max_slice=MAX_SLICE_SIZE):
+    """Pieces of the byte span [start, stop) of a chunk list (offsets[i] = start of chunk i).
+
+    Whole chunks are returned as-is (no copy), so a plain read never copies;
+    only the edges of a byte range are sliced, at most max_slice bytes at a
+    time. Callers loop until the span is covered.
+    """
+    pieces = []
+    index = bisect.bisect_right(offsets, start) - 1
+    while index < len(chunks) and start < stop:
+        chunk = chunks[index]
+        chunk_start = offsets[index]
+        chunk_stop = chunk_start + len(chunk)
+        if start == chunk_start and chunk_stop <= stop:
+            pieces.append(chunk)
+        else:
+            piece_stop = min(chunk_stop, stop, start + max_slice)
+            pieces.append(chunk[start - chunk_start:piece_stop - chunk_start])
+            if piece_stop < min(chunk_stop, stop):
+                break
+        start = min(chunk_stop, stop)
+        index += 1
+    return pieces
+
+
+class SegmentEntry:
+    """One cached (or in-flight) segment body shared by every viewer"""
+
+    def __init__(self, url, ttl):
+        self.url = url
+        self.ttl = ttl
+        self.created = time.time()
+        self.status_code = None
+        self.content_type = None
+        self.content_length = None
+        self.error = None
+        self.complete = False
+        self.cached = False  # True once counted against the cache's byte budget
+        self._chunks = []
+        self._offsets = []  # Byte offset where each chunk starts
+        self._size = 0
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        return self._size
+
+    def expired(self, now=None):
+        return (now or time.time()) - self.created > self.ttl
+
+    # ---------- Writer side (upstream fetch thread) ----------
+
+    def set_headers(self, status_code, content_type, content_length):
+        with self._cond:
+            self.status_code = status_code
+            self.content_type = content_type
+            self.content_length = content_length
+            self._cond.notify_all()
+
+    def append(self, chunk):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._offsets.append(self._size)
+            self._size += len(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.complete = True
+            self._cond.notify_all()
+
+    # ---------- Reader side (one per viewer) ----------
+
+    def wait_headers(self, timeout=HEADER_WAIT_TIMEOUT):
+        """Block until upstream status is known; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.status_code is not None or self.complete, timeout=timeout)
+
+    def wait_complete(self, timeout=HEADER_WAIT_TIMEOUT):
+        """Block until the whole body is in; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.complete, timeout=timeout)
+
+    def body(self):
+        """Whole body of a completed entry"""
+        with self._cond:
+            return b''.join(self._chunks)
+
+    def iter_chunks(self, timeout=HEADER_WAIT_TIMEOUT):
+        """Yield the body as it arrives, from the first byte, for any number of readers"""
+        return self.iter_range(0, None, timeout)
+
+    def iter_range(self, start=0, stop=None, timeout=HEADER_WAIT_TIMEOUT):
+        """Yield bytes [start, stop) of the body (stop=None: to the end) as they arrive"""
+        position = start
+        while stop is None or position < stop:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._size > position or self.complete, timeout=timeout)
+                available = self._size if stop is None else min(self._size, stop)
+                pieces = slice_chunks(self._chunks, self._offsets, position, available)
+                done = self.complete
+                error = self.error
+            if pieces:
+                for piece in pieces:
+                    position += len(piece)
+                    yield piece
+                continue
+            if done:
+                if error:
+                    raise IOError(f"Upstream segment fetch failed: {error}")
+                return
+            raise IOError("Timed out waiting for upstream segment data")
+
+
+class SegmentCache:
+    """LRU segment cache with byte budget, target-duration TTL and single-flight fetches"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, target_duration=DEFAULT_TARGET_DURATION,
+                 on_fetched=None):
+        self.max_bytes = max_bytes
+        self.target_duration = target_duration
+        # on_fetched(url, status_code, ttfb, elapsed, size, error) after each upstream fetch
+        self.on_fetched = on_fetched
+        self._entries = OrderedDict()  # url -> SegmentEntry (completed and in-flight)
+        self._bytes = 0                # Bytes held by completed entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def ttl(self):
+        return self.target_duration * TTL_TARGET_DURATIONS
+
+    def set_target_duration(self, seconds):
+        """Update the TTL basis from a playlist's #EXT-X-TARGETDURATION"""
+        if seconds and seconds > 0:
+            self.target_duration = seconds
+
+    def get_or_fetch(self, url, fetch):
+        """Return (entry, state) for url, starting at most one upstream fetch.
+
+        fetch(url) must return a streamed requests-style response (or raise).
+        state is 'HIT' (completed copy), 'COALESCED' (joined an in-flight fetch)
+        or 'MISS' (this call started the fetch).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry.complete and (
+                    entry.error or entry.status_code != 200 or entry.expired(now)):
+                self._remove(url)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(url)
+                if entry.complete:
+                    self.hits += 1
+                    return entry, 'HIT'
+                self.coalesced += 1
+                return entry, 'COALESCED'
+
+            entry = SegmentEntry(url, self.ttl)
+            self._entries[url] = entry
+            self.misses += 1
+
+        worker = threading.Thread(target=self._fill, args=(entry, fetch), daemon=True)
+        worker.start()
+        return entry, 'MISS'
+
+    def _fill(self, entry, fetch):
+        """Download one segment into its entry (runs on its own thread)"""
+        response = None
+        started = time.time()
+        ttfb = None
+        try:
+            response = fetch(entry.url)
+            ttfb = time.time() - started
+            content_length = response.headers.get('Content-Length')
+            if response.headers.get('Content-Encoding', 'identity') != 'identity':
+                content_length = None  # Length of the compressed body, not what we relay
+            entry.set_headers(
+                response.status_code,
+                response.headers.get('Content-Type', 'video/mp2t'),
+                int(content_length) if content_length and content_length.isdigit() else None
+            )
+            # Start small so viewers see the first bytes quickly, then read big
+            chunk_size = FETCH_CHUNK_SIZE
+            while True:
+                chunk = response.raw.read(chunk_size, decode_content=True)
+                if not chunk:
+                    break
+                entry.append(chunk)
+                chunk_size = min(chunk_size * 2, MAX_FETCH_CHUNK_SIZE)
+            entry.finish()
+        except Exception as e:
+            entry.finish(error=str(e)[:200])
+        finally:
+            if response is not None:
+                response.close()
+
+        if self.on_fetched is not None:
+            self.on_fetched(entry.url, entry.status_code, ttfb, time.time() - started,
+                            entry.size, entry.error)
+
+        with self._lock:
+            if self._entries.get(entry.url) is not entry:
+                return
+            if entry.error or entry.status_code != 200 or entry.size > self.max_bytes:
+                # Don't keep failures or anything that can't fit; next request refetches
+                self._remove(entry.url)
+                return
+            entry.cached = True
+            self._bytes += entry.size
+            self._evict()
+
+    def _remove(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None and entry.cached:
+            entry.cached = False
+            self._bytes -= entry.size
+        return entry
+
+    def _evict(self):
+        """Drop expired entries, then least-recently-used ones, until under budget"""
+        now = time.time()
+        for url in [u for u, e in self._entries.items() if e.complete and e.expired(now)]:
+            self._remove(url)
+            self.evictions += 1
+        while self._bytes > self.max_bytes:
+            victim = next((u for u, e in self._entries.items() if e.cached), None)
+            if victim is None:
+                break
+            self._remove(victim)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(1 for e in self._entries.values() if not e.complete)
+            return {
+                'entries': len(self._entries) - in_flight,
+                'in_flight': in_flight,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions
+            }
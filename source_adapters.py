@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Stream source adapters
+Each entry of STREAM_SOURCES is served by an adapter with three steps:
+search a source for games, list a game page's player channels, and resolve
+one channel to its stream URL(s). An adapter also declares how long the
+source may take (time budget), how many of its channels resolve at once
+(concurrency limit) and how often a failed step is retried (retry policy).
+The registry picks the adapter for a game URL by domain and searches every
+enabled source in parallel, dropping the ones that overrun their budget
+instead of waiting on them.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_TIME_BUDGET = 20     # Seconds a source gets to search, and to resolve a game page
+DEFAULT_CONCURRENCY = 4      # Channels of one source resolved at once (and searches run at once)
+DEFAULT_RETRIES = 1          # Extra attempts after a step raises
+RETRY_BACKOFF = 0.5          # Seconds before the first retry, doubled for each one after
+
+
+class SourceAdapter:
+    """One stream source, built from its STREAM_SOURCES entry.
+
+    search(keywords) -> games, list_channels(event_url) -> channels and
+    resolve(channel, event_url) -> streams do the work; a missing one means
+    the source can't do that step. fallback(channels), if given, runs when no
+    channel of a page resolves. Channels marked 'resolved' already are a
+    stream and aren't resolved again. The entry may override time_budget,
+    max_concurrency, retries, retry_backoff and domains.
+    """
+
+    def __init__(self, config, search=None, list_channels=None, resolve=None, fallback=None,
+                 domains=(), time_budget=DEFAULT_TIME_BUDGET, max_concurrency=DEFAULT_CONCURRENCY,
+                 retries=DEFAULT_RETRIES):
+        self.name = config['name']
+        self.base_url = config.get('base_url', '')
+        self.priority = config.get('priority', 0)
+        self.enabled = config.get('enabled', True)
+        self.domains = tuple(config.get('domains') or domains or (urlsplit(self.base_url).netloc,))
+        self.time_budget = config.get('time_budget', time_budget)
+        self.max_concurrency = config.get('max_concurrency', max_concurrency)
+        self.retries = config.get('retries', retries)
+        self.retry_backoff = config.get('retry_backoff', RETRY_BACKOFF)
+        self._search = search
+        self._list_channels = list_channels
+        self._resolve = resolve
+        self._fallback = fallback
+        self._search_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.searches = 0
+        self.extractions = 0
+        self.retried = 0
+        self.failures = 0
+        self.over_budget = 0
+
+    @property
+    def can_search(self):
+        return self._search is not None
+
+    @property
+    def can_extract(self):
+        return self._list_channels is not None and self._resolve is not None
+
+    def matches(self, url):
+        """How specifically url matches this source: the longest matching domain's length, or 0"""
+        url = (url or '').lower()
+        return max([len(domain) for domain in self.domains if domain and domain.lower() in url] + [0])
+
+    def call(self, step, *args, deadline=None):
+        """step(*args), retried per the retry policy while the deadline allows"""
+        backoff = self.retry_backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return step(*args)
+            except Exception as e:
+                last_try = attempt == self.retries or \
+                    (deadline is not None and time.time() + backoff >= deadline)
+                if last_try:
+                    self.failures += 1
+                    raise
+                self.retried += 1
+                print(f"[Sources] {self.name}: {str(e)[:50]} - retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff *= 2
+
+    def search(self, keywords):
+        if self._search is None:
+            return []
+        deadline = time.time() + self.time_budget
+        with self._search_slots:
+            self.searches += 1
+            games = self.call(self._search, keywords, deadline=deadline) or []
+        for game in games:
+            game.setdefault('source', self.name)
+        return games
+
+    def list_channels(self, event_url):
+        return self.call(self._list_channels, event_url, deadline=time.time() + self.time_budget) or []
+
+    def resolve(self, channel, event_url, deadline=None):
+        if channel.get('resolved'):
+            return [channel]
+        return self.call(self._resolve, channel, event_url, deadline=deadline) or []
+
+    def extract(self, engine, event_url, cache=None, fresh=False):
+        """List the page's channels and resolve them on the engine within the time budget;
+        returns the ExtractionJob. With a cache (a ResolutionCache), channels it holds
+        aren't resolved again unless fresh, and what every channel resolves to is stored."""
+        self.extractions += 1
+        name = f"{self.name} {event_url[:60]}"
+        try:
+            channels = self.list_channels(event_url)
+        except Exception as e:
+            print(f"[Sources] ✗ {self.name} couldn't list channels: {e}")
+            return engine.completed(name, [])
+        deadline = time.time() + self.time_budget
+        fallback = (lambda: self._fallback(channels)) if self._fallback is not None else None
+        resolve = lambda channel: self.resolve(channel, event_url, deadline)
+        if cache is not None:
+            resolve = self._cached(resolve, cache, event_url, channels, fresh)
+        return engine.run(name, channels, resolve,
+                          deadline=self.time_budget, fallback=fallback,
+                          group=self.name, group_limit=self.max_concurrency)
+
+    def _cached(self, resolve, cache, event_url, channels, fresh):
+        """resolve, answered from the cache when it holds the channel, storing what it resolves"""
+        positions = {id(channel): index for index, channel in enumerate(channels)}
+
+        def cached_resolve(channel):
+            if not fresh and not channel.get('resolved'):
+                streams = cache.channel_streams(event_url, channel)
+                if streams:
+                    return streams
+            streams = resolve(channel)
+            if streams:
+                cache.store(event_url, channel, streams, positions.get(id(channel), 0))
+            return streams
+        return cached_resolve
+
+    def info(self):
+        return {
+            'name': self.name,
+            'enabled': self.enabled,
+            'priority': self.priority,
+            'domains': list(self.domains),
+            'search': self.can_search,
+            'extract': self.can_extract,
+            'time_budget': self.time_budget,
+            'max_concurrency': self.max_concurrency,
+            'retries': self.retries,
+            'searches': self.searches,
+            'extractions': self.extractions,
+            'retried': self.retried,
+            'failures': self.failures,
+            'over_budget': self.over_budget
+        }
+
+
+class SourceRegistry:
+    """The adapters of STREAM_SOURCES, in priority order, and the orchestration across them"""
+
+    def __init__(self, engine, default=None, cache=None):
+        self.engine = engine
+        self.default = default            # Adapter name for game URLs no source claims
+        self.cache = cache                # ResolutionCache for resolved channels, or None
+        self._adapters = {}
+
+    @classmethod
+    def from_sources(cls, engine, sources, implementations, default=None, cache=None):
+        """One adapter per STREAM_SOURCES entry; implementations maps a source name to the
+        SourceAdapter keyword arguments (steps, domains, budget...) for it"""
+        registry = cls(engine, default, cache)
+        for config in sources:
+            registry.register(SourceAdapter(config, **implementations.get(config['name'], {})))
+        return registry
+
+    def register(self, adapter):
+        self._adapters[adapter.name] = adapter
+        return adapter
+
+    def get(self, name):
+        return self._adapters.get(name)
+
+    def adapters(self, enabled_only=True):
+        return sorted((a for a in self._adapters.values() if a.enabled or not enabled_only),
+                      key=lambda a: a.priority)
+
+    def for_url(self, url):
+        """The adapter whose domain url matches most specifically (the default if none does)"""
+        best = max(self.adapters(), key=lambda a: (a.can_extract, a.matches(url)), default=None)
+        if best is not None and best.can_extract and best.matches(url):
+            return best
+        return self.get(self.default)
+
+    def extract(self, event_url, fresh=False):
+        """Start resolving a game page with its source's adapter; returns the ExtractionJob.
+        fresh: resolve every channel again rather than reuse cached results."""
+        adapter = self.for_url(event_url)
+        if adapter is None:
+            return self.engine.completed(event_url[:60], [])
+        print(f"[Sources] {adapter.name} handles {event_url[:60]}")
+        return adapter.extract(self.engine, event_url, cache=self.cache, fresh=fresh)
+
+    def resolve(self, event_url, channel, fresh=False):
+        """Streams of one channel of a game page, resolved by its source's adapter without
+        listing the page again ([] if it doesn't resolve). fresh: skip the cache (new token)."""
+        adapter = self.for_url(event_url)
+        if adapter is None or not adapter.can_extract:
+            return []
+        if self.cache is not None and not fresh:
+            streams = self.cache.channel_streams(event_url, channel)
+            if streams:
+                return streams
+        try:
+            streams = adapter.resolve(channel, event_url, deadline=time.time() + adapter.time_budget)
+        except Exception as e:
+            print(f"[Sources] ✗ {adapter.name} couldn't resolve {channel.get('name', channel.get('url'))}: {e}")
+            return []
+        if streams and self.cache is not None:
+            self.cache.store(event_url, channel, streams)
+        return streams
+
+    def search(self, keywords):
+        """Games matching keywords from every enabled source, searched in parallel. A source
+        still searching when its time budget runs out is dropped from this result."""
+        started = time.time()
+        searches = []
+        for adapter in self.adapters():
+            if not adapter.can_search:
+                continue
+            result = {}
+            done = threading.Event()
+            threading.Thread(target=self._search_one, args=(adapter, keywords, result, done),
+                             name=f'search-{adapter.name}', daemon=True).start()
+            searches.append((adapter, result, done))
+
+        games = []
+        for adapter, result, done in searches:
+            if not done.wait(max(started + adapter.time_budget - time.time(), 0)):
+                adapter.over_budget += 1
+                print(f"[Sources] ⏱  {adapter.name} still searching after {adapter.time_budget}s, skipped")
+                continue
+            games.extend(result.get('games', []))
+        print(f"[Sources] ✓ {len(games)} game(s) from {len(searches)} source(s) "
+              f"in {time.time() - started:.1f}s")
+        return games
+
+    def _search_one(self, adapter, keywords, result, done):
+        try:
+            result['games'] = adapter.search(keywords)
+        except Exception as e:
+            print(f"[Sources] ✗ {adapter.name} search failed: {e}")
+        finally:
+            done.set()
+
+    def stats(self):
+        return {
+            'default': self.default,
+            'sources': [adapter.info() for adapter in self.adapters(enabled_only=False)]
+        }
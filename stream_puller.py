@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+One upstream puller per live stream, fanned out to every viewer
+Without it each player drives its own playlist reloads and segment requests,
+so upstream work follows the number of viewers. A StreamPuller reloads its
+stream's playlist on its own cadence (half a target duration), starts the
+download of each new segment once, as soon as it is listed, and pins the
+last few in a ring that every viewer's /proxy request is served from. Playlist
+polls get the puller's latest copy. A puller nobody has asked for within the
+idle timeout stops.
+
+Playlist requests can also wait for the next version instead of polling:
+LL-HLS blocking reloads (_HLS_msn / _HLS_part) are held until the requested
+segment or part is listed, and a plain poll that already has the latest
+version is held until it changes (long poll).
+"""
+
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from hls_playlist import Playlist
+from playlist_cache import DEFAULT_TARGET_DURATION, FRESHNESS_FRACTION, make_etag
+
+RING_SEGMENTS = 12          # Segments pinned per stream (two typical live windows)
+PREFETCH_ON_START = 3       # First load fetches only the live edge, where players join
+IDLE_TIMEOUT = 30           # Seconds without a viewer request before a puller stops
+READY_TIMEOUT = 15          # Seconds the first viewer waits for the first playlist
+MIN_INTERVAL = 1.0          # Floor on the reload cadence...
+MIN_PART_INTERVAL = 0.2     # ...and for LL-HLS sources, which reload once per part
+BLOCKING_TARGET_DURATIONS = 3   # A blocking reload is held at most this many target durations
+MAX_MSN_AHEAD = 2           # Blocking reloads further ahead than this get 400 (per the LL-HLS spec)
+ERROR_BACKOFF = 2.0         # Seconds before retrying a failed reload (doubles...)
+MAX_ERROR_BACKOFF = 10      # ...up to this
+PROXY_PREFIX = '/proxy/'
+
+
+def advertise_blocking_reload(body):
+    """Media playlist body with CAN-BLOCK-RELOAD=YES in its EXT-X-SERVER-CONTROL (added if missing)"""
+    lines = body.split('\n')
+    for index, line in enumerate(lines):
+        if line.startswith('#EXT-X-SERVER-CONTROL:'):
+            if 'CAN-BLOCK-RELOAD=' not in line:
+                lines[index] = line + ',CAN-BLOCK-RELOAD=YES'
+            return '\n'.join(lines)
+        if line and not line.startswith('#'):
+            break
+    lines.insert(1, '#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES')
+    return '\n'.join(lines)
+
+
+def upstream_segment_url(uri):
+    """Upstream URL behind a rewritten /proxy/ segment URI (None for anything else)"""
+    if not uri.startswith(PROXY_PREFIX):
+        return None
+    return urllib.parse.unquote(uri[len(PROXY_PREFIX):])
+
+
+class StreamPuller:
+    """Reloads one stream's playlist and prefetches its new segments into a ring.
+
+    pull() returns the (body, etag) to serve, a rewritten playlist whose
+    segment URIs point at /proxy/, or raises. fetch_segment(url) starts (or
+    joins) the download of an upstream segment and returns its SegmentEntry.
+    on_segment(key, segment, entry), if given, hears about every segment
+    pulled (an hls_playlist.Segment and its SegmentEntry, possibly still
+    downloading), e.g. to record it. While keep_running() is true the
+    puller runs with no viewers.
+    """
+
+    def __init__(self, key, pull, fetch_segment, ring_size=RING_SEGMENTS,
+                 idle_timeout=IDLE_TIMEOUT, on_segment=None, keep_running=None):
+        self.key = key
+        self.pull = pull
+        self.fetch_segment = fetch_segment
+        self.on_segment = on_segment
+        self.keep_running = keep_running
+        self.ring_size = ring_size
+        self.idle_timeout = idle_timeout
+        self._ring = OrderedDict()       # upstream segment URL -> SegmentEntry, oldest first
+        self._last_sequence = None       # Media sequence of the newest segment pulled
+        self._current = None             # (body, etag) served to viewers
+        self._served = (None, 0)         # (last segment's media sequence, parts listed after it)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.error = None
+        self.target_duration = DEFAULT_TARGET_DURATION
+        self.interval = DEFAULT_TARGET_DURATION * FRESHNESS_FRACTION
+        self.started = time.time()
+        self.last_access = self.started
+        self.reloads = 0
+        self.segments_pulled = 0
+        self.ring_hits = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'pull-{self.key}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def reload(self):
+        """Reload now instead of at the next tick (the stream switched channels)"""
+        self._wake.set()
+
+    def touch(self):
+        self.last_access = time.time()
+
+    # ---------- Viewer side ----------
+
+    def playlist(self, timeout=READY_TIMEOUT):
+        """Latest (body, etag), waiting for the first load; None if there is none yet"""
+        self.touch()
+        self._ready.wait(timeout)
+        with self._lock:
+            return self._current
+
+    def blocking_reload(self, msn, part=None, timeout=None):
+        """LL-HLS blocking reload: the (body, etag) listing media sequence msn (part
+        `part` of it, if given), or the latest once timeout (default: a few target
+        durations) passes. Raises ValueError if msn is too far ahead to wait for."""
+        self.touch()
+        self._ready.wait(READY_TIMEOUT)
+        with self._changed:
+            last, _ = self._served
+            if last is not None and msn > last + MAX_MSN_AHEAD:
+                raise ValueError(f"_HLS_msn={msn} is beyond the live edge ({last})")
+            self._changed.wait_for(lambda: self._listed(msn, part) or self._stop.is_set(),
+                                   timeout=timeout or self.target_duration * BLOCKING_TARGET_DURATIONS)
+            return self._current
+
+    def _listed(self, msn, part):
+        last, parts = self._served
+        if last is None or last >= msn:
+            return True
+        # Part `part` of the segment in progress (the one after the last complete one)
+        return part is not None and last == msn - 1 and parts > part
+
+    def wait_change(self, etag, timeout=None):
+        """Long poll: the (body, etag) once it differs from etag, or the latest after
+        timeout (default: one target duration)"""
+        self.touch()
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._current is None or self._current[1] != etag or self._stop.is_set(),
+                timeout=timeout or self.target_duration)
+            return self._current
+
+    def segment(self, url):
+        """The ring's SegmentEntry for an upstream segment URL, or None"""
+        with self._lock:
+            entry = self._ring.get(url)
+            if entry is None:
+                return None
+            if entry.complete and (entry.error or entry.status_code != 200):
+                # Failed download: drop it so the viewer's request fetches again
+                del self._ring[url]
+                return None
+            self.ring_hits += 1
+        self.touch()
+        return entry
+
+    # ---------- Pull loop ----------
+
+    def _run(self):
+        backoff = ERROR_BACKOFF
+        while not self._stop.is_set():
+            idle = time.time() - self.last_access > self.idle_timeout
+            if idle and not (self.keep_running and self.keep_running()):
+                print(f"[Puller] {self.key}: no viewers for {self.idle_timeout}s, stopping")
+                break
+            try:
+                body, etag = self.pull()
+                self._update(body, etag)
+                self.error = None
+                backoff = ERROR_BACKOFF
+                wait = self.interval
+            except Exception as e:
+                self.error = str(e)[:200]
+                print(f"[Puller] {self.key}: reload failed: {self.error[:80]}")
+                wait = backoff
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+            self._ready.set()
+            self._wake.wait(wait)
+            self._wake.clear()
+        self._stop.set()
+        self._ready.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def _update(self, body, etag):
+        playlist = Playlist.parse(body)
+        self.target_duration = playlist.target_duration or DEFAULT_TARGET_DURATION
+        if playlist.part_target:
+            self.interval = max(playlist.part_target, MIN_PART_INTERVAL)
+        else:
+            self.interval = max(self.target_duration * FRESHNESS_FRACTION, MIN_INTERVAL)
+
+        fresh = []
+        served = (None, 0)
+        if not playlist.is_master and playlist.segments and not playlist.endlist:
+            # We answer blocking reloads, so players may use them
+            body = advertise_blocking_reload(body)
+            etag = make_etag(body)
+        if not playlist.is_master:
+            segments = playlist.segments
+            for index, segment in enumerate(segments):
+                if segment.sequence is None:
+                    segment.sequence = playlist.media_sequence + index
+            last = self._last_sequence
+            if last is None or (segments and segments[-1].sequence < last):
+                # First load (or the numbering restarted): only the live edge
+                fresh = segments[-PREFETCH_ON_START:]
+            else:
+                fresh = [s for s in segments if s.sequence > last]
+            if segments:
+                self._last_sequence = segments[-1].sequence
+                served = (segments[-1].sequence,
+                          sum(1 for tag in playlist.trailing if tag.name == 'EXT-X-PART'))
+
+        # Start each new segment's download once; viewers join it from the ring
+        for segment in fresh:
+            url = upstream_segment_url(segment.uri)
+            if url is None:
+                continue
+            entry = self.fetch_segment(url)
+            with self._lock:
+                self._ring[url] = entry
+                self._ring.move_to_end(url)
+                while len(self._ring) > self.ring_size:
+                    self._ring.popitem(last=False)
+            self.segments_pulled += 1
+            if self.on_segment is not None:
+                self.on_segment(self.key, segment, entry)
+
+        with self._changed:
+            changed = self._current is None or self._current[1] != etag
+            self._current = (body, etag)
+            self._served = served
+            self.reloads += 1
+            if changed:
+                self._changed.notify_all()
+
+    def stats(self):
+        with self._lock:
+            ring_bytes = sum(entry.size for entry in self._ring.values())
+            ring = len(self._ring)
+        return {
+            'running': self.running,
+            'interval': round(self.interval, 2),
+            'reloads': self.reloads,
+            'segments_pulled': self.segments_pulled,
+            'ring_segments': ring,
+            'ring_bytes': ring_bytes,
+            'ring_hits': self.ring_hits,
+            'idle_seconds': round(time.time() - self.last_access, 1),
+            'error': self.error
+        }
+
+
+class StreamPullers:
+    """The running StreamPuller of every watched stream, started on first request"""
+
+    def __init__(self, fetch_segment, ring_size=RING_SEGMENTS, idle_timeout=IDLE_TIMEOUT,
+                 on_segment=None):
+        self.fetch_segment = fetch_segment
+        self.on_segment = on_segment
+        self.ring_size = ring_size
+        self.idle_timeout = idle_timeout
+        self._pullers = {}               # stream key -> StreamPuller
+        self._holds = {}                 # stream key -> holders that need it running (recordings)
+        self._lock = threading.Lock()
+        self.started = 0
+
+    def get(self, key, pull):
+        """The stream's running puller, starting one (pull: see StreamPuller) if needed"""
+        with self._lock:
+            puller = self._pullers.get(key)
+            if puller is not None and puller.running:
+                puller.touch()
+                return puller
+            puller = self._pullers[key] = StreamPuller(
+                key, pull, self.fetch_segment, self.ring_size, self.idle_timeout,
+                self.on_segment, lambda: self.held(key))
+            puller.start()
+            self.started += 1
+        print(f"[Puller] {key}: started")
+        return puller
+
+    def segment(self, url):
+        """A segment any running puller holds in its ring, or None"""
+        with self._lock:
+            pullers = [p for p in self._pullers.values() if p.running]
+        for puller in pullers:
+            entry = puller.segment(url)
+            if entry is not None:
+                return entry
+        return None
+
+    def hold(self, key, pull):
+        """Keep a stream pulled while nobody watches it (until release); returns its puller"""
+        with self._lock:
+            self._holds[key] = self._holds.get(key, 0) + 1
+        return self.get(key, pull)
+
+    def release(self, key):
+        with self._lock:
+            if self._holds.get(key, 0) > 1:
+                self._holds[key] -= 1
+            else:
+                self._holds.pop(key, None)
+
+    def held(self, key):
+        with self._lock:
+            return key in self._holds
+
+    def reload(self, key):
+        """Make a running puller reload now (its stream's URL changed)"""
+        with self._lock:
+            puller = self._pullers.get(key)
+        if puller is not None:
+            puller.reload()
+
+    def stop(self, key=None):
+        """Stop one stream's puller (None: all of them)"""
+        with self._lock:
+            pullers = list(self._pullers.values()) if key is None else [self._pullers.get(key)]
+            for puller in pullers:
+                if puller is not None:
+                    puller.stop()
+                    self._pullers.pop(puller.key, None)
+
+    def stats(self):
+        with self._lock:
+            for key in [k for k, p in self._pullers.items() if not p.running]:
+                del self._pullers[key]
+            pullers = dict(self._pullers)
+            held = sorted(self._holds)
+        return {
+            'running': len(pullers),
+            'started': self.started,
+            'held': held,
+            'idle_timeout': self.idle_timeout,
+            'streams': {key: puller.stats() for key, puller in pullers.items()}
+        }
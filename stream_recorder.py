@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Recording live streams to disk while they are watched
+A recording taps the stream's pull loop: every segment it pulls (and would
+relay to viewers anyway) is queued to one writer thread, which saves it as a
+file next to an HLS playlist of the recording, so recording adds no upstream
+segment requests. Writes are not synced one by one: open segment files and
+the playlist are fsynced together every few seconds or segments. The
+playlist is an EVENT playlist while recording and becomes VOD when it stops.
+Keys and init maps are saved alongside so the recording plays on its own.
+"""
+
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from hls_playlist import Tag
+
+FSYNC_INTERVAL = 5.0        # Seconds between batched fsyncs...
+FSYNC_BATCH = 8             # ...or after this many segments, whichever comes first
+RECORD_TIMEOUT = 60         # Seconds the writer waits for a segment download to finish
+MAX_PENDING = 512           # Segments queued for the writer before new ones are dropped
+PLAYLIST_NAME = 'index.m3u8'
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '-', text or '').strip('-')[:40].lower()
+
+
+class Recording:
+    """One recording: its directory, the segments written so far, and their playlist"""
+
+    def __init__(self, recording_id, stream_key, directory, title=''):
+        self.id = recording_id
+        self.stream_key = stream_key
+        self.directory = directory
+        self.title = title
+        self.started = time.time()
+        self.stopped = None
+        self.state = 'recording'           # recording -> stopping -> stopped, or failed
+        self.error = None
+        self.entries = []                  # (filename, duration, discontinuity, key line, map line)
+        self.resources = {}                # Proxied key / init URI -> local filename
+        self.duration = 0.0
+        self.bytes = 0
+        self.dropped = 0
+        self._last_sequence = None
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.directory, PLAYLIST_NAME)
+
+    def add(self, filename, sequence, duration, size, discontinuity, key, map):
+        # A skipped live segment is a jump in the media timeline
+        gap = self._last_sequence is not None and sequence != self._last_sequence + 1
+        self.entries.append((filename, duration or 0.0, discontinuity or gap, key, map))
+        self._last_sequence = sequence
+        self.duration += duration or 0.0
+        self.bytes += size
+
+    def dumps(self):
+        """The recording's playlist: EVENT while recording, VOD with ENDLIST once stopped"""
+        final = self.state == 'stopped'
+        target = max([int(d + 0.999) for _, d, _, _, _ in self.entries] + [1])
+        version = 6 if any(m for _, _, _, _, m in self.entries) else 3
+        lines = ['#EXTM3U', f'#EXT-X-VERSION:{version}', f'#EXT-X-TARGETDURATION:{target}',
+                 '#EXT-X-MEDIA-SEQUENCE:0', f"#EXT-X-PLAYLIST-TYPE:{'VOD' if final else 'EVENT'}"]
+        key = map_tag = None
+        for position, (filename, duration, discontinuity, segment_key, segment_map) in enumerate(self.entries):
+            if discontinuity and position > 0:
+                lines.append('#EXT-X-DISCONTINUITY')
+            if segment_key != key:
+                lines.append(segment_key or '#EXT-X-KEY:METHOD=NONE')
+                key = segment_key
+            if segment_map != map_tag and segment_map:
+                lines.append(segment_map)
+                map_tag = segment_map
+            lines.append(f'#EXTINF:{duration:.3f},')
+            lines.append(filename)
+        if final:
+            lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def info(self):
+        return {
+            'recording_id': self.id,
+            'stream': self.stream_key,
+            'title': self.title,
+            'state': self.state,
+            'directory': self.directory,
+            'playlist': self.playlist_path,
+            'segments': len(self.entries),
+            'seconds': round(self.duration, 1),
+            'bytes': self.bytes,
+            'dropped': self.dropped,
+            'error': self.error,
+            'started': datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S'),
+            'stopped': datetime.fromtimestamp(self.stopped).strftime('%Y-%m-%d %H:%M:%S')
+                       if self.stopped else None
+        }
+
+
+class StreamRecorder:
+    """Recordings of live streams, written by one background thread with batched fsync.
+
+    fetch_resource(uri), if given, returns the bytes behind a proxied
+    /key/ or /init/ URI so recordings keep their own copy. on_failed(recording)
+    is called when a running recording fails, in place of a stop.
+    """
+
+    def __init__(self, directory, fetch_resource=None, fsync_interval=FSYNC_INTERVAL,
+                 fsync_batch=FSYNC_BATCH, on_failed=None):
+        self.directory = directory
+        self.fetch_resource = fetch_resource
+        self.on_failed = on_failed
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self._recordings = {}              # id -> Recording (active and finished)
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._unsynced = []                # (Recording, file) written but not yet fsynced
+        self._dirty = set()                # Recordings whose playlist needs rewriting
+        self._last_sync = time.time()
+        self.syncs = 0
+
+    # ---------- Control (request threads) ----------
+
+    def start(self, stream_key, title=''):
+        """Start recording a stream from its next pulled segment; returns the Recording"""
+        recording_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        name = f"{recording_id}-{_slug(title)}" if _slug(title) else recording_id
+        recording = Recording(recording_id, stream_key, os.path.join(self.directory, name), title)
+        os.makedirs(recording.directory, exist_ok=True)
+        with self._lock:
+            self._recordings[recording_id] = recording
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+                self._thread.start()
+        self._queue.put(('playlist', recording))
+        print(f"[Recorder] ⏺  Recording {stream_key} to {recording.directory}")
+        return recording
+
+    def stop(self, recording_id):
+        """Stop a recording; segments already queued are still written. None if unknown."""
+        with self._lock:
+            recording = self._recordings.get(recording_id)
+            if recording is None or recording.state != 'recording':
+                return recording
+            recording.state = 'stopping'
+        self._queue.put(('stop', recording))
+        return recording
+
+    def get(self, recording_id):
+        with self._lock:
+            return self._recordings.get(recording_id)
+
+    def active(self, stream_key=None):
+        with self._lock:
+            return [r for r in self._recordings.values() if r.state == 'recording'
+                    and (stream_key is None or r.stream_key == stream_key)]
+
+    def record(self, stream_key, segment, entry):
+        """Pull loop hook: queue a pulled segment (its SegmentEntry may still be downloading)
+        for every active recording of the stream. Never blocks."""
+        for recording in self.active(stream_key):
+            try:
+                self._queue.put_nowait(('segment', recording, segment.sequence, segment.duration,
+                                        segment.discontinuity,
+                                        segment.key.dumps() if segment.key is not None else None,
+                                        segment.map.dumps() if segment.map is not None else None,
+                                        entry))
+            except queue.Full:
+                recording.dropped += 1
+
+    # ---------- Writer thread ----------
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                item = None
+            try:
+                if item is not None:
+                    self._handle(item)
+            except Exception as e:
+                print(f"[Recorder] ✗ {item[0]} for {item[1].id} failed: {e}")
+            if self._unsynced or self._dirty:
+                if (len(self._unsynced) >= self.fsync_batch or item is None or item[0] != 'segment'
+                        or time.time() - self._last_sync >= self.fsync_interval):
+                    try:
+                        self._sync()
+                    except Exception as e:
+                        print(f"[Recorder] ✗ Sync failed: {e}")
+                        for recording, handle in self._unsynced:
+                            handle.close()
+                        self._unsynced = []
+                        self._dirty = set()
+
+    def _handle(self, item):
+        kind, recording = item[0], item[1]
+        if recording.state == 'failed':
+            return
+        if kind == 'playlist':
+            self._dirty.add(recording)
+        elif kind == 'stop':
+            recording.state = 'stopped'
+            recording.stopped = time.time()
+            self._dirty.add(recording)
+            print(f"[Recorder] ⏹  {recording.id}: {len(recording.entries)} segments, "
+                  f"{recording.duration:.0f}s")
+        elif kind == 'segment':
+            self._write_segment(recording, *item[2:])
+
+    def _write_segment(self, recording, sequence, duration, discontinuity, key, map, entry):
+        if not entry.wait_complete(timeout=RECORD_TIMEOUT) or entry.error or entry.status_code != 200:
+            recording.dropped += 1
+            return
+        filename = f'segment_{len(recording.entries):06d}.ts'
+        if not self._save(recording, filename, entry.iter_range()):
+            recording.dropped += 1
+            return
+        recording.add(filename, sequence, duration, entry.size, discontinuity,
+                      self._localize(recording, key), self._localize(recording, map))
+        self._dirty.add(recording)
+
+    def _localize(self, recording, line):
+        """Point a KEY / MAP tag at a copy saved in the recording (unchanged if it can't be fetched)"""
+        if line is None:
+            return None
+        tag = Tag.parse(line)
+        uri = tag.uri
+        if not uri or self.fetch_resource is None:
+            return line
+        local = recording.resources.get(uri)
+        if local is None:
+            try:
+                body = self.fetch_resource(uri)
+            except Exception as e:
+                print(f"[Recorder] ⚠️  Couldn't save {uri[:60]}: {e}")
+                return line
+            local = f"{'key' if tag.name == 'EXT-X-KEY' else 'init'}_{len(recording.resources)}.bin"
+            if not self._save(recording, local, (body,)):
+                return line
+            recording.resources[uri] = local
+        tag.uri = local
+        return tag.dumps()
+
+    def _save(self, recording, filename, chunks):
+        """Write a file into the recording, queued for the next sync. The partial file is
+        removed on any error; a write error (disk full, directory gone) fails the recording."""
+        path = os.path.join(recording.directory, filename)
+        handle = None
+        reading = False
+        try:
+            handle = open(path, 'wb')
+            chunks = iter(chunks)
+            while True:
+                reading = True
+                chunk = next(chunks, None)
+                reading = False
+                if chunk is None:
+                    break
+                handle.write(chunk)
+            handle.flush()
+        except Exception as e:
+            if handle is not None:
+                handle.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            if reading or not isinstance(e, OSError):
+                raise
+            self._fail(recording, e)
+            return False
+        self._unsynced.append((recording, handle))
+        return True
+
+    def _sync(self):
+        """fsync every file written since the last sync, then rewrite the dirty playlists.
+        A recording whose files can't be synced or written (disk full, directory gone) fails."""
+        unsynced, self._unsynced = self._unsynced, []
+        dirty, self._dirty = self._dirty, set()
+        for recording, handle in unsynced:
+            try:
+                os.fsync(handle.fileno())
+            except OSError as e:
+                self._fail(recording, e)
+            finally:
+                handle.close()
+
+        for recording in dirty:
+            if recording.state == 'failed':
+                continue
+            temp_path = recording.playlist_path + '.tmp'
+            try:
+                with open(temp_path, 'w') as handle:
+                    handle.write(recording.dumps())
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(temp_path, recording.playlist_path)
+            except OSError as e:
+                self._fail(recording, e)
+                continue
+            _fsync_directory(recording.directory)
+        self._last_sync = time.time()
+        self.syncs += 1
+
+    def _fail(self, recording, error):
+        """Stop a recording that can't be written any more; its queued segments are skipped"""
+        with self._lock:
+            if recording.state == 'failed':
+                return
+            was_recording = recording.state == 'recording'
+            recording.state = 'failed'
+            recording.error = str(error)
+            recording.stopped = time.time()
+        print(f"[Recorder] ✗ {recording.id} failed: {error}")
+        if was_recording and self.on_failed is not None:
+            self.on_failed(recording)
+
+    def stats(self):
+        with self._lock:
+            recordings = list(self._recordings.values())
+        return {
+            'directory': self.directory,
+            'active': sum(1 for r in recordings if r.state == 'recording'),
+            'pending': self._queue.qsize(),
+            'syncs': self.syncs,
+            'recordings': [r.info() for r in recordings]
+        }
+
+
+def _fsync_directory(path):
+    # Makes the rename durable; not possible on every platform
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
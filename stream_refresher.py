@@ -7,6 +7,30 @@ Automatically fetches fresh stream URLs to overcome expiring security tokens
 import re
 import time
 import requests
+import upstream_client
+from referer_cache import RefererCache
+from segment_cache import SegmentCache
+from playlist_cache import PlaylistCache, parse_target_duration, make_etag
+from key_cache import KeyCache
+from page_cache import PageCache
+from browser_pool import BrowserPool, PLAYWRIGHT_AVAILABLE  # Playwright for JavaScript-based extraction
+from browser_capture import capture_m3u8
+from resolution_cache import ResolutionCache
+from page_scan import scan_page
+from m3u8_scan import find_m3u8
+from stream_registry import StreamRegistry
+from refresh_scheduler import RefreshScheduler
+from continuous_playlist import ContinuousPlaylist, SWITCH_SEGMENTS
+from channel_warmer import ChannelWarmer
+from channel_quality import QualityTracker, channel_key
+from stream_puller import StreamPullers
+from dvr_ring import DvrStore
+from stream_recorder import StreamRecorder
+from extraction_engine import ExtractionEngine
+from source_adapters import SourceRegistry
+from refresh_scheduler import parse_expiry
+from async_proxy import ASYNC_PROXY_AVAILABLE
+import hls_playlist
 from datetime import datetime, date
 from flask import Flask, redirect, jsonify, render_template_string, request
 import threading
@@ -15,13 +39,7 @@ from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import sqlite3
 import os
-
-# Try to import Playwright for JavaScript-based extraction
-try:
-    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+import sys
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -30,18 +48,89 @@ app = Flask(__name__)
 
 # Configuration
 MAIN_PAGE_URL = "https://streamsgate.live/hd/hd-6.php"
-REFRESH_INTERVAL = 3600  # Refresh every hour (3600 seconds)
+REFRESH_INTERVAL = 3600  # Fallback when a stream URL carries no expiry (3600 seconds)
+REFRESH_MARGIN = 120  # Re-resolve a stream this many seconds before its token expires
+DEFAULT_STREAM_KEY = 'default'  # Refresh scheduler key of the /stream.m3u8 stream
 current_stream_url = None
 last_refresh_time = None
 stream_info = {}
 available_channels = []  # Store all available channels
 current_channel_index = 0  # Track which channel we're using
+default_channels_lock = threading.Lock()  # Guards URL updates of available_channels' entries
 
 # Database configuration
 DB_FILE = 'streams.db'
 TRACKED_GAMES = ['patriots', 'falcons']  # Games to track in database
 last_run_date = None  # Track last run date to detect new day
 
+# Referer that each upstream host accepted (persisted in the learned_referers table)
+referer_cache = RefererCache(DB_FILE)
+
+# Per-channel delivery quality (TTFB, speed vs. realtime, errors, playlist staleness)
+quality_tracker = QualityTracker()
+
+# Shared segment cache - one upstream pull per segment no matter how many viewers
+SEGMENT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+segment_cache = SegmentCache(max_bytes=SEGMENT_CACHE_MAX_BYTES,
+                             on_fetched=quality_tracker.record_segment)
+
+# Rewritten live playlists, fresh for half a target duration
+playlist_cache = PlaylistCache()
+
+# Timeshift: pulled segments appended to a memory-mapped ring file per stream,
+# served as /dvr/<stream>/stream.m3u8 (off unless DVR_ENABLED or --dvr)
+DVR_ENABLED = False
+DVR_DIR = 'dvr'
+dvr_store = DvrStore(DVR_DIR)
+
+# One pull loop per watched stream: reloads its playlist and downloads each new
+# segment once, into a ring every viewer is served from
+stream_pullers = StreamPullers(lambda url: segment_cache.get_or_fetch(url, fetch_segment_upstream)[0],
+                               on_segment=lambda key, segment, entry: on_segment_pulled(key, segment, entry))
+
+# Recordings (/api/record/start): pulled segments written to disk by a background thread
+RECORDINGS_DIR = 'recordings'
+stream_recorder = StreamRecorder(RECORDINGS_DIR, fetch_resource=lambda uri: fetch_proxied_resource(uri),
+                                 on_failed=lambda recording: stream_pullers.release(recording.stream_key))
+
+# AES-128 keys and EXT-X-MAP init segments, fetched once per URI for every client
+key_cache = KeyCache()
+
+# Per-viewer streams (/s/<id>/stream.m3u8); the globals above are the default stream
+stream_registry = StreamRegistry()
+
+# Re-resolves each stream shortly before its token's expires= deadline
+refresh_scheduler = RefreshScheduler(margin=REFRESH_MARGIN, default_lifetime=REFRESH_INTERVAL)
+
+# What /stream.m3u8 has served, so failing over to the next channel stays one
+# continuous playlist (sessions keep their own on the StreamSession)
+default_playlist = ContinuousPlaylist()
+# Serve /stream.m3u8 and /proxy from the asyncio engine (uvicorn) instead of
+# Flask's threaded server; also enabled with --async. Needs httpx + uvicorn.
+USE_ASYNC_PROXY = False
+async_engine = None  # AsyncProxyEngine once started
+
+# Channels of a game page are resolved concurrently (bounded pool, per-host
+# limit, deadline); /api/load-stream answers with the first stream found
+extraction_engine = ExtractionEngine()
+
+# Playwright extractions share long-lived headless browsers (one launch serves
+# many channels); each extraction gets a fresh context in a pooled browser
+PLAYWRIGHT_CONCURRENCY = 2    # Browsers running extractions at once
+PLAYWRIGHT_JOB_TIMEOUT = 180  # Seconds an extraction may wait for and use a browser
+browser_pool = BrowserPool(max_browsers=PLAYWRIGHT_CONCURRENCY)
+
+# Listing and event pages (searches, live-game scans, channel lists) are kept
+# for a TTL per URL, then revalidated with ETag / Last-Modified; a page that
+# comes back unchanged isn't parsed again. --page-cache keeps them on disk too.
+PAGE_TTLS = [
+    (r'/allupcomingsports/', 120),   # Listing pages: games come and go slowly
+    (r'rojadirectame\.eu/football/?$', 120),
+    (r'/eventinfo/', 30),            # Event pages: channels get added during the game
+]
+PAGE_CACHE_DIR = 'page_cache'
+page_cache = PageCache(ttls=PAGE_TTLS)
+
 # Stream sources to search
 STREAM_SOURCES = [
     {
@@ -49,41 +138,59 @@ STREAM_SOURCES = [
         'base_url': 'https://rojadirectame.eu',
         'search_url': 'https://rojadirectame.eu/football',
         'enabled': True,
-        'priority': 0  # Try first
+        'priority': 0,  # Try first
+        'time_budget': 30,      # Seconds to search / resolve a game page
+        'max_concurrency': 4,   # Channels resolved at once
+        'retries': 1            # Extra attempts when a step fails
     },
     {
         'name': 'LiveTV.sx',
         'base_url': 'https://livetv.sx',
         'search_url': 'https://livetv.sx/enx/',
         'enabled': True,
-        'priority': 1
+        'priority': 1,
+        'time_budget': 45,  # Event pages take many requests to list
+        'max_concurrency': 4,
+        'retries': 1
     },
     {
         'name': 'LiveTV 872',
         'base_url': 'https://livetv872.me',
         'search_url': 'https://livetv872.me/enx/',
         'enabled': True,
-        'priority': 1.5  # Alternative to livetv.sx
+        'priority': 1.5,  # Alternative to livetv.sx
+        'time_budget': 45,
+        'max_concurrency': 4,
+        'retries': 1
     },
     {
         'name': 'StreamEast',
         'base_url': 'https://streameast.app',
         'search_patterns': ['patriots', 'nfl', 'football'],
         'enabled': True,
-        'priority': 2
+        'priority': 2,
+        'time_budget': 15,
+        'max_concurrency': 2,
+        'retries': 0
     },
     {
         'name': 'StreamsGate',
         'base_url': 'https://streamsgate.live',
         'search_url': 'https://streamsgate.live',
         'enabled': True,
-        'priority': 3
+        'priority': 3,
+        'time_budget': 15,
+        'max_concurrency': 2,
+        'retries': 0
     },
     {
         'name': 'CrackStreams',
         'base_url': 'https://crackstreams.biz',
         'enabled': True,
-        'priority': 4
+        'priority': 4,
+        'time_budget': 15,
+        'max_concurrency': 2,
+        'retries': 0
     }
 ]
 
@@ -787,7 +894,7 @@ HTML_TEMPLATE = """
             </div>
             <div class="info-item">
                 <span class="info-label">Auto-Refresh:</span>
-                <span class="info-value">✅ Enabled (every {{ refresh_interval }}s)</span>
+                <span class="info-value">✅ Enabled (before token expiry)</span>
             </div>
         </div>
         
@@ -815,10 +922,11 @@ HTML_TEMPLATE = """
         const status = document.getElementById('status');
         let hls;
         let currentStreamUrl = null;
-        let refreshInterval = {{ refresh_interval }} * 1000;
         let checkInterval;
         let allChannels = [];
         let currentChannelIndex = 0;
+        let currentStreamId = null;  // This viewer's stream in the registry, once loaded
+        let networkRetries = 0;
 
         function updateStatus(message, className) {
             status.textContent = message;
@@ -828,7 +936,7 @@ HTML_TEMPLATE = """
         async function getCurrentStreamUrl() {
             try {
                 // Use the proxied stream URL instead of direct URL
-                return '/stream.m3u8';
+                return currentStreamId ? `/s/${currentStreamId}/stream.m3u8` : '/stream.m3u8';
             } catch (error) {
                 console.error('Error fetching stream URL:', error);
                 return null;
@@ -837,7 +945,7 @@ HTML_TEMPLATE = """
 
         async function updateStreamInfo() {
             try {
-                const response = await fetch('/api/stream-info');
+                const response = await fetch(currentStreamId ? `/api/stream-info?stream=${currentStreamId}` : '/api/stream-info');
                 const data = await response.json();
                 document.getElementById('last-refresh').textContent = data.last_refresh;
                 document.getElementById('next-refresh').textContent = data.next_refresh;
@@ -891,6 +999,7 @@ HTML_TEMPLATE = """
                 hls.attachMedia(video);
                 
                 hls.on(Hls.Events.MANIFEST_PARSED, function() {
+                    networkRetries = 0;
                     updateStatus('✅ Stream ready - Playing...', 'status-playing');
                     video.play().catch(e => {
                         updateStatus('⚠️ Click Play button to start', 'status-paused');
@@ -901,8 +1010,15 @@ HTML_TEMPLATE = """
                     if (data.fatal) {
                         switch(data.type) {
                             case Hls.ErrorTypes.NETWORK_ERROR:
-                                updateStatus('❌ Network error - Refreshing URL...', 'status-error');
-                                setTimeout(() => forceRefresh(), 2000);
+                                // The proxy fails over to the next channel itself, so keep
+                                // the player and reload first; rebuild only if that keeps failing
+                                if (networkRetries++ < 3) {
+                                    updateStatus('⚠️ Network error - Retrying...', 'status-error');
+                                    setTimeout(() => hls.startLoad(), 1000);
+                                } else {
+                                    updateStatus('❌ Network error - Refreshing URL...', 'status-error');
+                                    setTimeout(() => forceRefresh(), 2000);
+                                }
                                 break;
                             case Hls.ErrorTypes.MEDIA_ERROR:
                                 updateStatus('⚠️ Media error - Recovering...', 'status-error');
@@ -1013,6 +1129,7 @@ HTML_TEMPLATE = """
                     const loadData = await loadResponse.json();
                     
                     if (loadData.success) {
+                        currentStreamId = loadData.stream_id;
                         currentStreamUrl = loadData.proxy_url;
                         await initPlayer();
                         updateStatus(`▶️ Playing: ${channel.name.substring(0, 40)}...`, 'status-playing');
@@ -1023,7 +1140,7 @@ HTML_TEMPLATE = """
                     }
                 } else {
                     // It's a channel from same game, use next-channel API
-                    const response = await fetch('/api/next-channel');
+                    const response = await fetch(currentStreamId ? `/api/next-channel?stream=${currentStreamId}` : '/api/next-channel');
                     const data = await response.json();
                     
                     if (data.success) {
@@ -1073,6 +1190,7 @@ HTML_TEMPLATE = """
                     
                     if (loadData.success) {
                         currentChannelIndex = 0;
+                        currentStreamId = loadData.stream_id;
                         currentStreamUrl = loadData.proxy_url;
                         await initPlayer();
                         updateStatus(`▶️ Playing: ${patriotsGame.title.substring(0, 40)}...`, 'status-playing');
@@ -1364,6 +1482,7 @@ HTML_TEMPLATE = """
                     }
                     
                     // Reload player with new stream
+                    currentStreamId = data.stream_id;
                     currentStreamUrl = data.proxy_url;
                     await initPlayer();
                     
@@ -1385,7 +1504,7 @@ HTML_TEMPLATE = """
             updateStatus('⏭️ Switching to next channel...', 'status-loading pulse');
             
             try {
-                const response = await fetch('/api/next-channel');
+                const response = await fetch(currentStreamId ? `/api/next-channel?stream=${currentStreamId}` : '/api/next-channel');
                 const data = await response.json();
                 
                 if (data.success) {
@@ -1673,6 +1792,12 @@ def init_database():
         CREATE INDEX IF NOT EXISTS idx_date_status ON links(date_tested, status)
     ''')
     
+    # Referer each upstream host accepted, so restarts don't relearn it
+    referer_cache.ensure_table(conn)
+    
+    # What each game's channels resolved to, reused until the tokens expire
+    resolution_cache.ensure_table(conn)
+    
     conn.commit()
     conn.close()
     print(f"[Database] ✓ Initialized database: {DB_FILE}")
@@ -1714,12 +1839,12 @@ def test_stream_link(stream_url, timeout=5):
     try:
         # Quick HEAD request to check if URL is accessible
         headers = HEADERS.copy()
-        response = requests.head(stream_url, headers=headers, timeout=timeout, verify=False, allow_redirects=True)
+        response = upstream_client.head(stream_url, headers=headers, timeout=timeout, verify=False, allow_redirects=True)
         
         # If HEAD is not supported, try GET with range
         if response.status_code == 405:
             headers['Range'] = 'bytes=0-1024'
-            response = requests.get(stream_url, headers=headers, timeout=timeout, verify=False, stream=True)
+            response = upstream_client.get(stream_url, headers=headers, timeout=timeout, verify=False, stream=True)
         
         if response.status_code == 200 or response.status_code == 206:
             # Check if it's actually an m3u8 or valid stream
@@ -1955,7 +2080,7 @@ def fetch_fresh_stream_url():
     try:
         # Step 1: Get main page
         print("→ Fetching main page...")
-        response = requests.get(MAIN_PAGE_URL, headers=HEADERS, timeout=10, verify=False)
+        response = upstream_client.get(MAIN_PAGE_URL, headers=HEADERS, timeout=10, verify=False)
         response.raise_for_status()
         
         # Step 2: Extract iframe URL
@@ -1971,7 +2096,7 @@ def fetch_fresh_stream_url():
         headers_with_referrer['Referer'] = MAIN_PAGE_URL
         
         print("→ Fetching iframe content...")
-        iframe_response = requests.get(iframe_url, headers=headers_with_referrer, timeout=10, verify=False)
+        iframe_response = upstream_client.get(iframe_url, headers=headers_with_referrer, timeout=10, verify=False)
         iframe_response.raise_for_status()
         
         # Step 4: Extract stream URL
@@ -1993,6 +2118,7 @@ def fetch_fresh_stream_url():
         print(f"✓ Stream URL updated successfully!")
         print(f"  URL: {stream_url[:80]}...")
         
+        refresh_scheduler.schedule(DEFAULT_STREAM_KEY, stream_url, refresh_default_stream)
         return stream_url
         
     except Exception as e:
@@ -2000,26 +2126,43 @@ def fetch_fresh_stream_url():
         return None
 
 
+def fetch_page(url, ttl=None):
+    """A listing or event page through the page cache (revalidated once its TTL is up)"""
+    return page_cache.get(url, lambda url, headers: upstream_client.get(
+        url, headers=dict(HEADERS, **headers), timeout=10, verify=False), ttl=ttl)
+
+
+def page_soup(page):
+    """The page's BeautifulSoup tree, parsed once per page body"""
+    return page.parsed('soup', lambda text: BeautifulSoup(text, 'html.parser'))
+
+
+def scan_fetched_page(page):
+    """The page's anchors, iframes, scripts and m3u8 URLs (page_scan.py), scanned once per
+    page body; cheaper than page_soup when nothing needs the element tree"""
+    return page.parsed('scan', scan_page)
+
+
 def search_rojadirecta_games(keywords):
     """Search for games on Rojadirecta"""
     try:
         print(f"[Rojadirecta] Searching for: {keywords}")
-        response = requests.get('https://rojadirectame.eu/football', headers=HEADERS, timeout=10, verify=False)
+        response = fetch_page('https://rojadirectame.eu/football')
         
         if response.status_code != 200:
             print(f"[Rojadirecta] Failed to fetch page: {response.status_code}")
             return []
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        scan = scan_fetched_page(response)
         results = []
         
         # Find all game links - Rojadirecta uses <a> tags with /football/ in href
-        all_links = soup.find_all('a', href=True)
+        all_links = scan.links
         print(f"[Rojadirecta] Found {len(all_links)} total links")
         
         for link in all_links:
-            href = link.get('href', '')
-            text = link.get_text(strip=True)
+            href = link['href']
+            text = link['text']
             
             # Look for links to specific games (contains team names and event-like patterns)
             if '/football/' in href and href.count('/') >= 2:
@@ -2068,27 +2211,25 @@ def search_rojadirecta_games(keywords):
         return []
 
 
-def extract_all_streams_from_rojadirecta(event_url):
-    """Extract ALL working stream URLs from a Rojadirecta event page"""
-    working_streams = []
+def list_rojadirecta_channels(event_url):
+    """Player channels (iframes and stream-like links) of a Rojadirecta event page, best first"""
     try:
         print(f"[Rojadirecta] Fetching event page: {event_url}")
-        response = requests.get(event_url, headers=HEADERS, timeout=10, verify=False)
+        response = fetch_page(event_url)
         
         if response.status_code != 200:
             print(f"[Rojadirecta] Failed to fetch event page: {response.status_code}")
             return []
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        scan = scan_fetched_page(response)
         stream_channels = []
         
         # Rojadirecta uses nested iframes - we need to follow them
         # Step 1: Get all iframes from main page
-        iframes = soup.find_all('iframe', src=True)
+        iframes = scan.iframe_sources()
         print(f"[Rojadirecta] Found {len(iframes)} iframe(s) on main page")
         
-        for iframe in iframes:
-            src = iframe.get('src', '')
+        for src in iframes:
             if src:
                 full_url = urljoin(event_url, src) if not src.startswith('http') else src
                 if full_url.startswith('//'):
@@ -2102,12 +2243,12 @@ def extract_all_streams_from_rojadirecta(event_url):
                 })
         
         # Look for all links that might be stream channels
-        all_links = soup.find_all('a', href=True)
+        all_links = scan.links
         print(f"[Rojadirecta] Found {len(all_links)} total links")
         
         for link in all_links:
-            href = link.get('href', '')
-            text = link.get_text(strip=True)
+            href = link['href']
+            text = link['text']
             
             # Skip junk
             if any(skip in href.lower() for skip in ['facebook', 'twitter', 'instagram', 'google.com', 'adobe.com']):
@@ -2140,160 +2281,137 @@ def extract_all_streams_from_rojadirecta(event_url):
         
         print(f"[Rojadirecta] Found {len(unique_channels)} unique channel(s) to try")
         
-        # Try each channel
-        for i, channel in enumerate(unique_channels, 1):
+        return unique_channels
+        
+    except Exception as e:
+        print(f"[Rojadirecta] ✗ Error listing channels: {e}")
+        return []
+
+
+def resolve_rojadirecta_channel(channel, event_url):
+    """Stream URL(s) behind one Rojadirecta channel: m3u8 in its page, or in the iframes it nests"""
+    working_streams = []
+    print(f"[Rojadirecta] Trying {channel['name']}: {channel['url'][:60]}...")
+    headers_with_ref = HEADERS.copy()
+    headers_with_ref['Referer'] = event_url
+
+    channel_response = upstream_client.get(channel['url'], headers=headers_with_ref, timeout=10, verify=False)
+    print(f"[Rojadirecta]   Response: {channel_response.status_code}, Size: {len(channel_response.text)} bytes")
+
+    # One pass over the channel page: its .m3u8 URLs (best first), scripts and iframes
+    channel_scan = scan_page(channel_response.text)
+
+    found_stream = False
+    for stream_url in channel_scan.m3u8[:1]:
+        print(f"[Rojadirecta] ✓ Found stream from {channel['name']}: {stream_url[:60]}...")
+        working_streams.append({
+            'url': stream_url,
+            'name': channel['name'],
+            'source_url': channel['url']
+        })
+        found_stream = True
+
+    # Look for nested iframes and follow them
+    if not found_stream:
+
+        # Check for JavaScript-embedded iframe URLs
+        # Rojadirecta uses: document.write('<iframe ... src="URL"></iframe>')
+        js_iframe_pattern = r'src=["\'](https?://[^"\']+\.php[^"\']*)["\']'
+        js_matches_raw = re.findall(js_iframe_pattern, channel_response.text)
+        # Clean URLs - remove query parameters except hash (complex URLs return empty responses)
+        js_matches = []
+        for url in js_matches_raw:
+            # If it has query params with hash, simplify to just hash param
+            if '?hash=' in url and '&' in url:
+                base_url = url.split('?')[0]
+                hash_match = re.search(r'[?&]hash=([^&]+)', url)
+                if hash_match:
+                    clean_url = f"{base_url}?hash={hash_match.group(1)}"
+                    js_matches.append(clean_url)
+                    print(f"[Rojadirecta]   Cleaned URL: {url[:60]}... -> {clean_url[:60]}...")
+            else:
+                js_matches.append(url)  # Keep as-is if no extra params
+
+        # Also check for regular <script src="..."> tags
+        script_urls = [urljoin(channel['url'], src) for src in channel_scan.scripts]
+
+        # Try to fetch JavaScript files that might contain iframe URLs
+        for script_url in script_urls:
             try:
-                print(f"[Rojadirecta] [{i}/{len(unique_channels)}] Trying {channel['name']}: {channel['url'][:60]}...")
-                headers_with_ref = HEADERS.copy()
-                headers_with_ref['Referer'] = event_url
-                
-                channel_response = requests.get(channel['url'], headers=headers_with_ref, timeout=10, verify=False)
-                print(f"[Rojadirecta]   Response: {channel_response.status_code}, Size: {len(channel_response.text)} bytes")
-                
-                # Look for .m3u8 URLs with multiple patterns
-                patterns = [
-                    r'source["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                    r'file["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                    r'src["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                    r'https?://[^\s"\'\)]+\.m3u8[^\s"\'\)]*',
-                    r'["\'](https?://[^"\']*(?:stream|live|hls)[^"\']*\.m3u8[^"\']*)["\']'
-                ]
-                
-                found_stream = False
-                for pattern in patterns:
-                    m3u8_matches = re.findall(pattern, channel_response.text)
-                    if m3u8_matches:
-                        for match in m3u8_matches[:3]:  # Try first 3 matches
-                            stream_url = match.replace('&amp;', '&')
-                            
-                            # Accept if URL looks valid
-                            if stream_url.startswith('http') and '.m3u8' in stream_url:
-                                print(f"[Rojadirecta] ✓ Found stream from {channel['name']}: {stream_url[:60]}...")
-                                working_streams.append({
-                                    'url': stream_url,
-                                    'name': channel['name'],
-                                    'source_url': channel['url']
-                                })
-                                found_stream = True
-                                break
-                        if found_stream:
-                            break
-                
-                # Look for nested iframes and follow them
-                if not found_stream:
-                    nested_soup = BeautifulSoup(channel_response.text, 'html.parser')
-                    
-                    # Check for JavaScript-embedded iframe URLs
-                    # Rojadirecta uses: document.write('<iframe ... src="URL"></iframe>')
-                    js_iframe_pattern = r'src=["\'](https?://[^"\']+\.php[^"\']*)["\']'
-                    js_matches_raw = re.findall(js_iframe_pattern, channel_response.text)
-                    # Clean URLs - remove query parameters except hash (complex URLs return empty responses)
-                    js_matches = []
-                    for url in js_matches_raw:
-                        # If it has query params with hash, simplify to just hash param
+                print(f"[Rojadirecta]   Checking script: {script_url[:60]}...")
+                script_response = upstream_client.get(script_url, headers=headers_with_ref, timeout=5, verify=False)
+                js_iframe_urls_raw = re.findall(js_iframe_pattern, script_response.text)
+                if js_iframe_urls_raw:
+                    print(f"[Rojadirecta]     Found {len(js_iframe_urls_raw)} iframe URLs in script")
+                    # Clean these URLs too
+                    for url in js_iframe_urls_raw:
                         if '?hash=' in url and '&' in url:
                             base_url = url.split('?')[0]
                             hash_match = re.search(r'[?&]hash=([^&]+)', url)
                             if hash_match:
                                 clean_url = f"{base_url}?hash={hash_match.group(1)}"
                                 js_matches.append(clean_url)
-                                print(f"[Rojadirecta]   Cleaned URL: {url[:60]}... -> {clean_url[:60]}...")
+                                print(f"[Rojadirecta]     Cleaned URL to: {clean_url[:60]}...")
                         else:
-                            js_matches.append(url)  # Keep as-is if no extra params
-                    
-                    # Also check for regular <script src="..."> tags
-                    script_tags = nested_soup.find_all('script', src=True)
-                    script_urls = [urljoin(channel['url'], s.get('src')) for s in script_tags if s.get('src')]
-                    
-                    # Try to fetch JavaScript files that might contain iframe URLs
-                    for script_url in script_urls:
-                        try:
-                            print(f"[Rojadirecta]   Checking script: {script_url[:60]}...")
-                            script_response = requests.get(script_url, headers=headers_with_ref, timeout=5, verify=False)
-                            js_iframe_urls_raw = re.findall(js_iframe_pattern, script_response.text)
-                            if js_iframe_urls_raw:
-                                print(f"[Rojadirecta]     Found {len(js_iframe_urls_raw)} iframe URLs in script")
-                                # Clean these URLs too
-                                for url in js_iframe_urls_raw:
-                                    if '?hash=' in url and '&' in url:
-                                        base_url = url.split('?')[0]
-                                        hash_match = re.search(r'[?&]hash=([^&]+)', url)
-                                        if hash_match:
-                                            clean_url = f"{base_url}?hash={hash_match.group(1)}"
-                                            js_matches.append(clean_url)
-                                            print(f"[Rojadirecta]     Cleaned URL to: {clean_url[:60]}...")
-                                    else:
-                                        js_matches.append(url)
-                        except Exception as e:
-                            print(f"[Rojadirecta]     Script error: {str(e)[:30]}")
-                            pass
-                    
-                    # Follow nested iframes
-                    nested_iframes = nested_soup.find_all('iframe')
-                    all_nested_urls = []
-                    
-                    # Add iframes from HTML
-                    for nested_iframe in nested_iframes:
-                        nested_src = nested_iframe.get('src', '')
-                        if nested_src:
-                            if nested_src.startswith('//'):
-                                nested_src = 'https:' + nested_src
-                            elif nested_src.startswith('/'):
-                                nested_src = urljoin(channel['url'], nested_src)
-                            elif not nested_src.startswith('http'):
-                                nested_src = urljoin(channel['url'], nested_src)
-                            all_nested_urls.append(nested_src)
-                    
-                    # Add iframes from JavaScript
-                    for js_url in js_matches:
-                        if js_url not in all_nested_urls:
-                            all_nested_urls.append(js_url)
-                    
-                    # Follow each nested iframe URL
-                    # Use the immediate parent (channel URL) as Referer for better results
-                    nested_headers = HEADERS.copy()
-                    nested_headers['Referer'] = channel['url']
-                    
-                    for nested_url in all_nested_urls[:5]:  # Limit to 5 levels deep
-                        try:
-                            print(f"[Rojadirecta]   Following nested iframe: {nested_url[:60]}...")
-                            nested_response = requests.get(nested_url, headers=nested_headers, timeout=10, verify=False)
-                            print(f"[Rojadirecta]     Response: {nested_response.status_code}, {len(nested_response.text)} bytes")
-                            
-                            # Look for .m3u8 in the nested page
-                            for pattern in patterns:
-                                m3u8_matches = re.findall(pattern, nested_response.text)
-                                if m3u8_matches:
-                                    print(f"[Rojadirecta]     Pattern matched {len(m3u8_matches)} potential stream(s)")
-                                    for match in m3u8_matches[:2]:
-                                        stream_url = match.replace('&amp;', '&')
-                                        if stream_url.startswith('http') and '.m3u8' in stream_url:
-                                            print(f"[Rojadirecta] ✓ Found stream in nested iframe: {stream_url[:60]}...")
-                                            working_streams.append({
-                                                'url': stream_url,
-                                                'name': channel['name'],
-                                                'source_url': channel['url']
-                                            })
-                                            found_stream = True
-                                            break
-                                if found_stream:
-                                    break
-                            if found_stream:
-                                break
-                        except Exception as e:
-                            print(f"[Rojadirecta]   ✗ Nested iframe failed: {str(e)[:40]}")
-                            continue
-                            
+                            js_matches.append(url)
             except Exception as e:
-                print(f"[Rojadirecta]   ✗ Failed: {str(e)[:50]}")
+                print(f"[Rojadirecta]     Script error: {str(e)[:30]}")
+                pass
+
+        # Follow nested iframes
+        all_nested_urls = []
+
+        # Add iframes from HTML
+        for nested_src in channel_scan.iframes:
+            if nested_src:
+                if nested_src.startswith('//'):
+                    nested_src = 'https:' + nested_src
+                elif nested_src.startswith('/'):
+                    nested_src = urljoin(channel['url'], nested_src)
+                elif not nested_src.startswith('http'):
+                    nested_src = urljoin(channel['url'], nested_src)
+                all_nested_urls.append(nested_src)
+
+        # Add iframes from JavaScript
+        for js_url in js_matches:
+            if js_url not in all_nested_urls:
+                all_nested_urls.append(js_url)
+
+        # Follow each nested iframe URL
+        # Use the immediate parent (channel URL) as Referer for better results
+        nested_headers = HEADERS.copy()
+        nested_headers['Referer'] = channel['url']
+
+        for nested_url in all_nested_urls[:5]:  # Limit to 5 levels deep
+            try:
+                print(f"[Rojadirecta]   Following nested iframe: {nested_url[:60]}...")
+                nested_response = upstream_client.get(nested_url, headers=nested_headers, timeout=10, verify=False)
+                print(f"[Rojadirecta]     Response: {nested_response.status_code}, {len(nested_response.text)} bytes")
+
+                # Look for .m3u8 in the nested page
+                m3u8_matches = find_m3u8(nested_response.text)
+                if m3u8_matches:
+                    print(f"[Rojadirecta]     Found {len(m3u8_matches)} potential stream(s)")
+                    stream_url = m3u8_matches[0]
+                    print(f"[Rojadirecta] ✓ Found stream in nested iframe: {stream_url[:60]}...")
+                    working_streams.append({
+                        'url': stream_url,
+                        'name': channel['name'],
+                        'source_url': channel['url']
+                    })
+                    found_stream = True
+                if found_stream:
+                    break
+            except Exception as e:
+                print(f"[Rojadirecta]   ✗ Nested iframe failed: {str(e)[:40]}")
                 continue
-        
-        print(f"[Rojadirecta] ✓ Found {len(working_streams)} working stream(s)")
-        return working_streams
-        
-    except Exception as e:
-        print(f"[Rojadirecta] ✗ Error extracting streams: {e}")
-        return []
+    
+    return working_streams
+
+
+def extract_all_streams_from_rojadirecta(event_url):
+    """Extract ALL working stream URLs from a Rojadirecta event page"""
+    return source_registry.get('Rojadirecta').extract(extraction_engine, event_url).wait()
 
 
 def search_livetv_games(keywords):
@@ -2329,10 +2447,10 @@ def search_livetv_games(keywords):
             
             print(f"\n[Search] Fetching {source_name} from: {url}")
             
-            response = requests.get(url, headers=HEADERS, timeout=10, verify=False)
+            response = fetch_page(url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = page_soup(response)
             
             # Find all links (not just eventinfo links) to catch all patriots references
             all_links = soup.find_all('a', href=True)
@@ -2689,10 +2807,10 @@ def get_live_nfl_games():
             url = f"{base_url}/enx/allupcomingsports/27/"
             print(f"\n[Live Games] Fetching from {source_name}: {url}")
             
-            response = requests.get(url, headers=HEADERS, timeout=10, verify=False)
+            response = fetch_page(url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = page_soup(response)
             
             # Find all links in the page
             all_links = soup.find_all('a', href=True)
@@ -2806,51 +2924,22 @@ def extract_stream_from_apl385_player(player_url, referer_url):
         headers['Referer'] = referer_url
         
         # First, try to get the HTML
-        response = requests.get(player_url, headers=headers, timeout=10, verify=False)
+        response = upstream_client.get(player_url, headers=headers, timeout=10, verify=False)
         if response.status_code != 200:
             return None
         
         content = response.text
         
-        # Look for .m3u8 URLs in the HTML
-        m3u8_pattern = r'(?:https?:)?//[^\s"\'<>]+\.m3u8[^\s"\'<>]*'
-        m3u8_matches = re.findall(m3u8_pattern, content)
-        
-        # Make URLs absolute
-        absolute_matches = []
-        for match in m3u8_matches:
-            if match.startswith('//'):
-                match = 'https:' + match
-            absolute_matches.append(match)
-        
-        if absolute_matches:
-            return absolute_matches[0]
-        
-        # Look for JavaScript variables that might contain stream URLs
-        js_patterns = [
-            r'["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'src\s*[:=]\s*["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'url\s*[:=]\s*["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'stream\s*[:=]\s*["\']([^"\']*\.m3u8[^"\']*)["\']',
-        ]
-        
-        for pattern in js_patterns:
-            matches = re.findall(pattern, content, re.I)
-            for match in matches:
-                if '.m3u8' in match:
-                    if match.startswith('//'):
-                        match = 'https:' + match
-                    elif not match.startswith('http'):
-                        continue
-                    return match
-        
-        return None
+        # .m3u8 URLs in the HTML and its scripts, best candidate first
+        streams = find_m3u8(content, limit=1)
+        return streams[0] if streams else None
         
     except Exception as e:
         return None
 
-def extract_all_streams_from_livetv(event_url):
-    """Extract ALL working stream URLs from a LiveTV.sx event page"""
+def list_livetv_channels(event_url):
+    """Player channels of a LiveTV.sx event page, best first. When the URL's #webplayer_
+    fragment gives the streams directly they are returned as channels marked resolved."""
     working_streams = []
     
     try:
@@ -2928,7 +3017,7 @@ def extract_all_streams_from_livetv(event_url):
             try:
                 headers = HEADERS.copy()
                 headers['Referer'] = base_event_url
-                iframe_response = requests.get(iframe_url, headers=headers, timeout=10, verify=False)
+                iframe_response = upstream_client.get(iframe_url, headers=headers, timeout=10, verify=False)
                 if iframe_response.status_code == 200:
                     iframe_content = iframe_response.text
                     
@@ -2963,7 +3052,7 @@ def extract_all_streams_from_livetv(event_url):
                                     'referer': base_event_url
                                 })
                                 print(f"[Extract] ✓ Extracted direct stream from APL385 player: {stream_url}")
-                                return working_streams
+                                return [dict(stream, resolved=True) for stream in working_streams]
                             break
             except Exception as e:
                 print(f"[Extract] Error extracting from iframe: {e}")
@@ -2992,30 +3081,29 @@ def extract_all_streams_from_livetv(event_url):
             # Return the streams (prioritized by direct stream > iframe > webplayer2 > webplayer)
             if working_streams:
                 print(f"[Extract] Returning {len(working_streams)} stream(s) from hash fragment")
-                return working_streams
+                return [dict(stream, resolved=True) for stream in working_streams]
         
         # Fetch the page (base_event_url was already defined above)
-        response = requests.get(base_event_url, headers=HEADERS, timeout=10, verify=False)
+        response = fetch_page(base_event_url)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # One pass over the page feeds every method below
+        scan = scan_fetched_page(response)
         
         # First, look for hidden link containers (from "Show all" functionality)
         # These are elements with id containing "hidden" that might be hidden by default
-        hidden_containers = soup.find_all(id=re.compile(r'hidden', re.I))
-        print(f"[Extract] Found {len(hidden_containers)} hidden link container(s)")
+        print(f"[Extract] Found {scan.hidden_containers} hidden link container(s)")
         
         # Method 1: Find all stream channel links (LiveTV.sx structure)
         stream_channels = []
         
         # Look for all links - be more aggressive (includes hidden ones)
-        all_links = soup.find_all('a', href=True)
+        all_links = scan.links
         print(f"[Extract] Found {len(all_links)} total links on page (including hidden)")
         
         for link in all_links:
-            href = link.get('href', '')
-            text = link.get_text(strip=True).lower()
-            onclick = link.get('onclick', '')
+            href = link['href']
+            onclick = link['onclick']
             
             # Skip junk links
             if any(skip in href.lower() for skip in ['lng.php', 'getbanner', 'facebook', 'twitter', 'instagram', 'google.com/share', 'adobe.com', '/enx/', '/eng/']):
@@ -3023,7 +3111,6 @@ def extract_all_streams_from_livetv(event_url):
             
             # LiveTV.sx specific: webplayer.php links (with or without onclick)
             # Also check onclick handlers that might contain webplayer URLs
-            onclick = link.get('onclick', '')
             if 'webplayer.php' in href or ('webplayer.php' in onclick and ('openWin' in onclick or 'window.open' in onclick)):
                 # Extract URL from href or onclick
                 url_to_use = href
@@ -3058,8 +3145,7 @@ def extract_all_streams_from_livetv(event_url):
                 channel_name = f"Channel {channel_match.group(1)}" if channel_match else "Stream Channel"
                 
                 # Check if it's in a hidden container (for logging)
-                parent = link.find_parent(id=re.compile(r'hidden', re.I))
-                if parent:
+                if link['hidden']:
                     print(f"[Extract]   Found hidden link: {channel_name}")
                 
                 stream_channels.append({
@@ -3075,7 +3161,7 @@ def extract_all_streams_from_livetv(event_url):
                 if full_url.startswith('//'):
                     full_url = 'https:' + full_url
                     
-                channel_name = link.get_text(strip=True) or "Channel"
+                channel_name = link['text'] or "Channel"
                 
                 stream_channels.append({
                     'url': full_url,
@@ -3095,14 +3181,12 @@ def extract_all_streams_from_livetv(event_url):
                         
                     stream_channels.append({
                         'url': full_url,
-                        'name': link.get_text(strip=True) or "Channel",
+                        'name': link['text'] or "Channel",
                         'priority': 0
                     })
         
         # Method 2: Look for iframes directly on the page
-        iframes = soup.find_all('iframe')
-        for iframe in iframes:
-            src = iframe.get('src', '')
+        for src in scan.iframes:
             if src:
                 if src.startswith('//'):
                     src = 'https:' + src
@@ -3126,14 +3210,13 @@ def extract_all_streams_from_livetv(event_url):
             try:
                 api_url = f"https://livetv.sx/api/channels?eid={event_id}"
                 api_headers = HEADERS.copy()
-                api_response = requests.get(api_url, headers=api_headers, timeout=5, verify=False)
+                api_response = upstream_client.get(api_url, headers=api_headers, timeout=5, verify=False)
                 if api_response.status_code == 200:
-                    api_soup = BeautifulSoup(api_response.text, 'html.parser')
-                    api_links = api_soup.find_all('a', href=True)
+                    api_links = scan_page(api_response.text).links
                     
                     for link in api_links:
-                        href = link.get('href', '')
-                        onclick = link.get('onclick', '')
+                        href = link['href']
+                        onclick = link['onclick']
                         
                         # Check href for webplayer.php
                         if 'webplayer.php' in href:
@@ -3190,7 +3273,7 @@ def extract_all_streams_from_livetv(event_url):
             if event_id:
                 print(f"[Extract] Searching HTML and JavaScript for channel IDs for event {event_id}...")
                 # Search HTML for patterns that might contain channel IDs
-                html_text = response.text
+                html_text = scan.html
                 
                 # Pattern 1: Find all instances of c=XXXXXXX or c:XXXXXXX in HTML
                 # This catches onclick handlers, JavaScript, etc.
@@ -3238,7 +3321,7 @@ def extract_all_streams_from_livetv(event_url):
                             if isinstance(match, str) and 'eid' in match:
                                 try:
                                     ajax_url = match if match.startswith('http') else urljoin(event_url, match)
-                                    ajax_response = requests.get(ajax_url, headers=HEADERS.copy(), timeout=3, verify=False)
+                                    ajax_response = upstream_client.get(ajax_url, headers=HEADERS.copy(), timeout=3, verify=False)
                                     if ajax_response.status_code == 200:
                                         ajax_channels = re.findall(r'[&?]c=(\d{6,7})', ajax_response.text)
                                         if ajax_channels:
@@ -3255,8 +3338,7 @@ def extract_all_streams_from_livetv(event_url):
                 # Also check nested iframe content for channel IDs
                 if len(valid_channels) < 8:
                     print(f"[Extract] Checking nested iframes for channel IDs...")
-                    for iframe in soup.find_all('iframe')[:5]:  # Check first 5 iframes
-                        iframe_src = iframe.get('src', '')
+                    for iframe_src in scan.iframes[:5]:  # Check first 5 iframes
                         if iframe_src and 'livetv' in iframe_src.lower():
                             try:
                                 if iframe_src.startswith('//'):
@@ -3266,7 +3348,7 @@ def extract_all_streams_from_livetv(event_url):
                                 
                                 iframe_headers = HEADERS.copy()
                                 iframe_headers['Referer'] = event_url
-                                iframe_response = requests.get(iframe_src, headers=iframe_headers, timeout=5, verify=False)
+                                iframe_response = upstream_client.get(iframe_src, headers=iframe_headers, timeout=5, verify=False)
                                 iframe_html = iframe_response.text
                                 
                                 # Search for channel IDs in iframe
@@ -3311,7 +3393,7 @@ def extract_all_streams_from_livetv(event_url):
             
             for alt_url in alt_endpoints:
                 try:
-                    alt_response = requests.get(alt_url, headers=HEADERS.copy(), timeout=3, verify=False)
+                    alt_response = upstream_client.get(alt_url, headers=HEADERS.copy(), timeout=3, verify=False)
                     if alt_response.status_code == 200:
                         # Search for webplayer URLs in response
                         webplayer_urls = re.findall(r'https?://[^\s"\'<>]+webplayer\.php[^\s"\'<>]+', alt_response.text)
@@ -3344,336 +3426,192 @@ def extract_all_streams_from_livetv(event_url):
         
         print(f"[Extract] Found {len(unique_channels)} stream channels to try")
         
-        # Try to extract working streams from ALL channels
-        for i, channel in enumerate(unique_channels, 1):
-            try:
-                print(f"[Extract] [{i}/{len(unique_channels)}] Trying {channel['name']}: {channel['url'][:60]}...")
-                
-                headers_with_ref = HEADERS.copy()
-                headers_with_ref['Referer'] = event_url
-                
-                channel_response = requests.get(channel['url'], headers=headers_with_ref, timeout=10, verify=False)
-                print(f"[Extract]   Response: {channel_response.status_code}, Size: {len(channel_response.text)} bytes")
-                
-                # Look for .m3u8 URLs with multiple patterns
-                patterns = [
-                    r'source["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                    r'file["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                    r'src["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                    r'https?://[^\s"\'\)]+\.m3u8[^\s"\'\)]*',
-                    r'["\'](https?://[^"\']*(?:stream|live|hls)[^"\']*\.m3u8[^"\']*)["\']'
-                ]
-                
-                found_stream = False
-                for pattern in patterns:
-                    m3u8_matches = re.findall(pattern, channel_response.text)
-                    if m3u8_matches:
-                        for match in m3u8_matches[:3]:  # Try first 3 matches
-                            stream_url = match.replace('&amp;', '&')
-                            
-                            # Less strict verification - accept if URL looks valid
-                            if stream_url.startswith('http') and '.m3u8' in stream_url:
-                                print(f"[Extract] ✓ Found stream from {channel['name']}: {stream_url[:60]}...")
-                                working_streams.append({
-                                    'url': stream_url,
-                                    'name': channel['name'],
-                                    'source_url': channel['url']
-                                })
-                                found_stream = True
-                                break
-                        if found_stream:
-                            break
-                
-                # Look for nested iframes and follow them (similar to Rojadirecta)
-                nested_soup = BeautifulSoup(channel_response.text, 'html.parser')
-                nested_iframes = nested_soup.find_all('iframe')
-                
-                if nested_iframes:
-                    print(f"[Extract]   Found {len(nested_iframes)} nested iframe(s), following them...")
-                    
-                for nested_iframe in nested_iframes:
-                    nested_src = nested_iframe.get('src', '')
-                    if nested_src:
-                        # Skip malformed PHP URLs
-                        if '<?php' in nested_src or 'RU_DOMAIN' in nested_src:
-                            continue
-                            
-                        # Make URL absolute
-                        if nested_src.startswith('//'):
-                            nested_src = 'https:' + nested_src
-                        elif nested_src.startswith('/'):
-                            nested_src = urljoin(channel['url'], nested_src)
-                        elif not nested_src.startswith('http'):
-                            nested_src = urljoin(channel['url'], nested_src)
-                        
-                        # If it's directly an m3u8, use it
-                        if '.m3u8' in nested_src:
-                            stream_url = nested_src.replace('&amp;', '&')
-                            working_streams.append({
-                                'url': stream_url,
-                                'name': channel['name'],
-                                'source_url': channel['url']
-                            })
-                            found_stream = True
-                            print(f"[Extract]   ✓ Found .m3u8 in iframe: {stream_url[:60]}...")
-                            break
-                        
-                        # Otherwise, follow the nested iframe recursively (up to 3 levels deep)
-                        try:
-                            print(f"[Extract]   Following nested iframe: {nested_src[:60]}...")
-                            nested_headers = HEADERS.copy()
-                            nested_headers['Referer'] = channel['url']
-                            nested_response = requests.get(nested_src, headers=nested_headers, timeout=10, verify=False)
-                            print(f"[Extract]     Response: {nested_response.status_code}, {len(nested_response.text)} bytes")
-                            
-                            # Look for .m3u8 in nested page
-                            for pattern in patterns:
-                                m3u8_matches = re.findall(pattern, nested_response.text)
-                                if m3u8_matches:
-                                    for match in m3u8_matches[:2]:
-                                        stream_url = match.replace('&amp;', '&')
-                                        if stream_url.startswith('http') and '.m3u8' in stream_url:
-                                            print(f"[Extract]   ✓ Found stream in nested iframe: {stream_url[:60]}...")
-                                            working_streams.append({
-                                                'url': stream_url,
-                                                'name': channel['name'],
-                                                'source_url': channel['url']
-                                            })
-                                            found_stream = True
-                                            break
-                                    if found_stream:
-                                        break
-                            
-                            # If not found, recursively check for deeper iframes (similar to Rojadirecta)
-                            if not found_stream:
-                                deeper_soup = BeautifulSoup(nested_response.text, 'html.parser')
-                                deeper_iframes = deeper_soup.find_all('iframe')
-                                
-                                for deeper_iframe in deeper_iframes[:3]:  # Limit to 3 deeper levels
-                                    deeper_src = deeper_iframe.get('src', '')
-                                    if deeper_src:
-                                        # Skip malformed URLs
-                                        if '<?php' in deeper_src or 'RU_DOMAIN' in deeper_src:
-                                            continue
-                                        
-                                        # Make URL absolute
-                                        if deeper_src.startswith('//'):
-                                            deeper_src = 'https:' + deeper_src
-                                        elif deeper_src.startswith('/'):
-                                            deeper_src = urljoin(nested_src, deeper_src)
-                                        elif not deeper_src.startswith('http'):
-                                            deeper_src = urljoin(nested_src, deeper_src)
-                                        
-                                        try:
-                                            print(f"[Extract]     Following deeper iframe (level 2): {deeper_src[:60]}...")
-                                            deeper_response = requests.get(deeper_src, headers=nested_headers, timeout=8, verify=False)
-                                            print(f"[Extract]       Response: {deeper_response.status_code}, {len(deeper_response.text)} bytes")
-                                            
-                                            # Look for .m3u8 in deeper page
-                                            for pattern in patterns:
-                                                m3u8_matches = re.findall(pattern, deeper_response.text)
-                                                if m3u8_matches:
-                                                    for match in m3u8_matches[:2]:
-                                                        stream_url = match.replace('&amp;', '&')
-                                                        if stream_url.startswith('http') and '.m3u8' in stream_url:
-                                                            print(f"[Extract]     ✓ Found stream in deeper iframe: {stream_url[:60]}...")
-                                                            working_streams.append({
-                                                                'url': stream_url,
-                                                                'name': channel['name'],
-                                                                'source_url': channel['url']
-                                                            })
-                                                            found_stream = True
-                                                            break
-                                                    if found_stream:
-                                                        break
-                                            if found_stream:
-                                                break
-                                        except Exception as e:
-                                            print(f"[Extract]       ✗ Deeper iframe error: {str(e)[:30]}")
-                                            continue
-                            
-                            if found_stream:
-                                break
-                        except Exception as e:
-                            print(f"[Extract]     ✗ Nested iframe error: {str(e)[:40]}")
-                            continue
-                
-                # If no stream found and this is a webplayer.php URL, try Playwright
-                if not found_stream and 'webplayer.php' in channel['url'] and PLAYWRIGHT_AVAILABLE:
-                    print(f"[Extract]   No stream found, trying Playwright for {channel['name']}...")
-                    playwright_streams = extract_stream_with_playwright(channel['url'], channel['name'])
-                    if playwright_streams:
-                        working_streams.extend(playwright_streams)
-                        print(f"[Extract]   ✓ Playwright found {len(playwright_streams)} stream(s)")
-                        found_stream = True
-                        
-            except Exception as e:
-                print(f"[Extract]   ✗ Failed: {str(e)[:50]}")
-                continue
-        
-        # If no streams found with regular extraction, try Playwright for JavaScript-loaded streams
-        if len(working_streams) == 0 and PLAYWRIGHT_AVAILABLE:
-            print(f"[Extract] No streams found with regular extraction, trying Playwright...")
-            for i, channel in enumerate(unique_channels[:5], 1):  # Try first 5 channels with Playwright
-                if 'webplayer.php' in channel['url']:
-                    playwright_streams = extract_stream_with_playwright(channel['url'], channel['name'])
-                    if playwright_streams:
-                        working_streams.extend(playwright_streams)
-                        print(f"[Extract] ✓ Playwright found {len(playwright_streams)} stream(s) from {channel['name']}")
-                        break  # Stop after first successful extraction
-        
-        print(f"[Extract] ✓ Found {len(working_streams)} working stream(s)")
-        return working_streams
+        return unique_channels
         
     except Exception as e:
         print(f"[Extract] ✗ Error extracting streams: {e}")
         return []
 
 
+def resolve_livetv_channel(channel, event_url):
+    """Stream URL(s) behind one LiveTV channel: m3u8 in its page or nested iframes, else Playwright"""
+    working_streams = []
+    print(f"[Extract] Trying {channel['name']}: {channel['url'][:60]}...")
+
+    headers_with_ref = HEADERS.copy()
+    headers_with_ref['Referer'] = event_url
+
+    channel_response = upstream_client.get(channel['url'], headers=headers_with_ref, timeout=10, verify=False)
+    print(f"[Extract]   Response: {channel_response.status_code}, Size: {len(channel_response.text)} bytes")
+
+    # One pass over the channel page: its .m3u8 URLs (best first) and iframes
+    channel_scan = scan_page(channel_response.text)
+
+    found_stream = False
+    for stream_url in channel_scan.m3u8[:1]:
+        print(f"[Extract] ✓ Found stream from {channel['name']}: {stream_url[:60]}...")
+        working_streams.append({
+            'url': stream_url,
+            'name': channel['name'],
+            'source_url': channel['url']
+        })
+        found_stream = True
+
+    # Look for nested iframes and follow them (similar to Rojadirecta)
+    nested_iframes = channel_scan.iframes
+
+    if nested_iframes:
+        print(f"[Extract]   Found {len(nested_iframes)} nested iframe(s), following them...")
+
+    for nested_src in nested_iframes:
+        if nested_src:
+            # Skip malformed PHP URLs
+            if '<?php' in nested_src or 'RU_DOMAIN' in nested_src:
+                continue
+
+            # Make URL absolute
+            if nested_src.startswith('//'):
+                nested_src = 'https:' + nested_src
+            elif nested_src.startswith('/'):
+                nested_src = urljoin(channel['url'], nested_src)
+            elif not nested_src.startswith('http'):
+                nested_src = urljoin(channel['url'], nested_src)
+
+            # If it's directly an m3u8, use it
+            if '.m3u8' in nested_src:
+                stream_url = nested_src.replace('&amp;', '&')
+                working_streams.append({
+                    'url': stream_url,
+                    'name': channel['name'],
+                    'source_url': channel['url']
+                })
+                found_stream = True
+                print(f"[Extract]   ✓ Found .m3u8 in iframe: {stream_url[:60]}...")
+                break
+
+            # Otherwise, follow the nested iframe recursively (up to 3 levels deep)
+            try:
+                print(f"[Extract]   Following nested iframe: {nested_src[:60]}...")
+                nested_headers = HEADERS.copy()
+                nested_headers['Referer'] = channel['url']
+                nested_response = upstream_client.get(nested_src, headers=nested_headers, timeout=10, verify=False)
+                print(f"[Extract]     Response: {nested_response.status_code}, {len(nested_response.text)} bytes")
+
+                # Look for .m3u8 in nested page
+                nested_scan = scan_page(nested_response.text)
+                for stream_url in nested_scan.m3u8[:1]:
+                    print(f"[Extract]   ✓ Found stream in nested iframe: {stream_url[:60]}...")
+                    working_streams.append({
+                        'url': stream_url,
+                        'name': channel['name'],
+                        'source_url': channel['url']
+                    })
+                    found_stream = True
+
+                # If not found, recursively check for deeper iframes (similar to Rojadirecta)
+                if not found_stream:
+                    deeper_iframes = nested_scan.iframes
+
+                    for deeper_src in deeper_iframes[:3]:  # Limit to 3 deeper levels
+                        if deeper_src:
+                            # Skip malformed URLs
+                            if '<?php' in deeper_src or 'RU_DOMAIN' in deeper_src:
+                                continue
+
+                            # Make URL absolute
+                            if deeper_src.startswith('//'):
+                                deeper_src = 'https:' + deeper_src
+                            elif deeper_src.startswith('/'):
+                                deeper_src = urljoin(nested_src, deeper_src)
+                            elif not deeper_src.startswith('http'):
+                                deeper_src = urljoin(nested_src, deeper_src)
+
+                            try:
+                                print(f"[Extract]     Following deeper iframe (level 2): {deeper_src[:60]}...")
+                                deeper_response = upstream_client.get(deeper_src, headers=nested_headers, timeout=8, verify=False)
+                                print(f"[Extract]       Response: {deeper_response.status_code}, {len(deeper_response.text)} bytes")
+
+                                # Look for .m3u8 in deeper page
+                                for stream_url in find_m3u8(deeper_response.text, limit=1):
+                                    print(f"[Extract]     ✓ Found stream in deeper iframe: {stream_url[:60]}...")
+                                    working_streams.append({
+                                        'url': stream_url,
+                                        'name': channel['name'],
+                                        'source_url': channel['url']
+                                    })
+                                    found_stream = True
+                                if found_stream:
+                                    break
+                            except Exception as e:
+                                print(f"[Extract]       ✗ Deeper iframe error: {str(e)[:30]}")
+                                continue
+
+                if found_stream:
+                    break
+            except Exception as e:
+                print(f"[Extract]     ✗ Nested iframe error: {str(e)[:40]}")
+                continue
+
+    # If no stream found and this is a webplayer.php URL, try Playwright
+    if not found_stream and 'webplayer.php' in channel['url'] and PLAYWRIGHT_AVAILABLE:
+        print(f"[Extract]   No stream found, trying Playwright for {channel['name']}...")
+        playwright_streams = extract_stream_with_playwright(channel['url'], channel['name'])
+        if playwright_streams:
+            working_streams.extend(playwright_streams)
+            print(f"[Extract]   ✓ Playwright found {len(playwright_streams)} stream(s)")
+            found_stream = True
+    
+    return working_streams
+
+
+def extract_livetv_with_playwright(channels):
+    """Last resort when no channel yielded a stream: Playwright on the first webplayer channels"""
+    if not PLAYWRIGHT_AVAILABLE:
+        return []
+    print(f"[Extract] No streams found with regular extraction, trying Playwright...")
+    for channel in channels[:5]:  # Try first 5 channels with Playwright
+        if 'webplayer.php' in channel['url']:
+            playwright_streams = extract_stream_with_playwright(channel['url'], channel['name'])
+            if playwright_streams:
+                print(f"[Extract] ✓ Playwright found {len(playwright_streams)} stream(s) from {channel['name']}")
+                return playwright_streams  # Stop after first successful extraction
+    return []
+
+
+def extract_all_streams_from_livetv(event_url):
+    """Extract ALL working stream URLs from a LiveTV.sx event page"""
+    return source_registry.get('LiveTV.sx').extract(extraction_engine, event_url).wait()
+
+
 def extract_stream_with_playwright(webplayer_url, channel_name, timeout=30000, max_popup_closes=15):
     """Extract stream URL using Playwright to execute JavaScript and intercept network requests.
-    Handles multiple popup windows that need to be closed repeatedly."""
+    Ads, images and fonts are blocked, popups closed as they open, and the page is closed as
+    soon as the player requests its playlist (see browser_capture)."""
     if not PLAYWRIGHT_AVAILABLE:
         return []
     
     print(f"[Extract] [Playwright] Extracting from {channel_name}...")
-    stream_urls = []
+    started = time.time()
     
     try:
-        with sync_playwright() as p:
-            # Launch browser in headless mode
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            )
-            page = context.new_page()
-            
-            # Intercept network responses to capture .m3u8 URLs
-            def handle_response(response):
-                url = response.url
-                if '.m3u8' in url.lower():
-                    if url not in stream_urls:
-                        stream_urls.append(url)
-                        print(f"[Extract] [Playwright] ✓ Captured .m3u8 URL: {url[:80]}...")
-                # Also check response body for m3u8 URLs
-                try:
-                    if response.status == 200:
-                        content_type = response.headers.get('content-type', '').lower()
-                        if 'text' in content_type or 'json' in content_type:
-                            body = response.text()
-                            m3u8_pattern = r'https?://[^\s"\'\)<>]+\.m3u8[^\s"\'\)<>]*'
-                            matches = re.findall(m3u8_pattern, body)
-                            for match in matches:
-                                if match not in stream_urls and not any(js_pattern in match for js_pattern in ['const ', 'function', 'return ', 'Math.', 'Date.']):
-                                    stream_urls.append(match)
-                                    print(f"[Extract] [Playwright] ✓ Found .m3u8 in response: {match[:80]}...")
-                except:
-                    pass
-            
-            page.on('response', handle_response)
-            
-            # Navigate to the page
-            try:
-                page.goto(webplayer_url, wait_until='domcontentloaded', timeout=timeout)
-                
-                # Wait for initial page load
-                page.wait_for_timeout(2000)
-                
-                # Handle popup overlay div (localpp) - hide it if present
-                try:
-                    popup_overlay = page.query_selector('#localpp')
-                    if popup_overlay:
-                        print(f"[Extract] [Playwright] Found popup overlay, hiding it...")
-                        # Hide the overlay by setting display to none
-                        page.evaluate("""
-                            const overlay = document.getElementById('localpp');
-                            if (overlay) {
-                                overlay.style.display = 'none';
-                            }
-                        """)
-                        page.wait_for_timeout(500)
-                except:
-                    pass
-                
-                # Handle multiple popup windows - close them repeatedly
-                popup_close_count = 0
-                while popup_close_count < max_popup_closes:
-                    # Get all pages (main page + popups)
-                    all_pages = context.pages
-                    
-                    if len(all_pages) <= 1:
-                        # No popups, break
-                        break
-                    
-                    # Close all popup windows except the main page
-                    closed_any = False
-                    for popup_page in all_pages:
-                        if popup_page != page:
-                            try:
-                                print(f"[Extract] [Playwright] Closing popup window {popup_close_count + 1}...")
-                                popup_page.close()
-                                closed_any = True
-                                popup_close_count += 1
-                            except:
-                                pass
-                    
-                    if not closed_any:
-                        break
-                    
-                    # Wait a bit before checking for more popups
-                    page.wait_for_timeout(1000)
-                    
-                    # Check if popup overlay appeared again and hide it
-                    try:
-                        popup_overlay = page.query_selector('#localpp')
-                        if popup_overlay:
-                            page.evaluate("""
-                                const overlay = document.getElementById('localpp');
-                                if (overlay) {
-                                    overlay.style.display = 'none';
-                                }
-                            """)
-                    except:
-                        pass
-                
-                if popup_close_count > 0:
-                    print(f"[Extract] [Playwright] ✓ Closed {popup_close_count} popup window(s)")
-                
-                # Wait for any delayed JavaScript execution after popups are closed
-                page.wait_for_timeout(3000)
-                
-                # Also check the page content for any m3u8 URLs
-                page_content = page.content()
-                m3u8_pattern = r'https?://[^\s"\'\)<>]+\.m3u8[^\s"\'\)<>]*'
-                content_matches = re.findall(m3u8_pattern, page_content)
-                for match in content_matches:
-                    if match not in stream_urls:
-                        # Filter out false positives
-                        if not any(js_pattern in match for js_pattern in ['const ', 'function', 'return ', 'Math.', 'Date.']):
-                            stream_urls.append(match)
-                            print(f"[Extract] [Playwright] ✓ Found .m3u8 in page: {match[:80]}...")
-                
-            except PlaywrightTimeoutError:
-                print(f"[Extract] [Playwright] ⚠ Timeout, but checking captured URLs...")
-            
-            browser.close()
-            
+        # Runs on a pooled browser, in a fresh context the pool closes afterwards
+        hits = browser_pool.run(
+            lambda context: capture_m3u8(context, webplayer_url, timeout=timeout, max_popups=max_popup_closes,
+                                         log_prefix='[Extract] [Playwright]'),
+            timeout=PLAYWRIGHT_JOB_TIMEOUT)
     except Exception as e:
         print(f"[Extract] [Playwright] ✗ Error: {e}")
-        import traceback
-        traceback.print_exc()
         return []
     
-    # Convert to the format expected by working_streams
-    result = []
-    for stream_url in stream_urls:
-        result.append({
-            'url': stream_url,
-            'name': channel_name,
-            'source_url': webplayer_url
-        })
+    if hits:
+        print(f"[Extract] [Playwright] ✓ {len(hits)} stream URL(s) in {time.time() - started:.1f}s")
     
-    return result
+    # Convert to the format expected by working_streams
+    return [{
+        'url': hit['url'],
+        'name': channel_name,
+        'source_url': webplayer_url
+    } for hit in hits]
 
 def extract_stream_from_livetv(event_url):
     """Extract first working stream URL from a LiveTV.sx event page"""
@@ -3681,6 +3619,120 @@ def extract_stream_from_livetv(event_url):
     return streams[0]['url'] if streams else None
 
 
+def search_source_links(source, keywords):
+    """Generic search: links on a source's listing page whose text or URL has a keyword"""
+    page_url = source.get('search_url') or source['base_url']
+    print(f"[Search] Fetching {source['name']} from: {page_url}")
+    response = fetch_page(page_url)
+    response.raise_for_status()
+    
+    keywords_lower = [k.lower() for k in keywords.split() if k]
+    results = []
+    seen_urls = set()
+    for link in scan_fetched_page(response).links:
+        url = urljoin(page_url, link['href'])
+        title = link['text']
+        if url in seen_urls or not url.startswith('http') or url.rstrip('/') == page_url.rstrip('/'):
+            continue
+        match_score = sum(1 for kw in keywords_lower if kw in title.lower() or kw in url.lower())
+        if match_score:
+            seen_urls.add(url)
+            results.append({
+                'title': title or url.rstrip('/').rsplit('/', 1)[-1].replace('-', ' ').title(),
+                'url': url,
+                'source': source['name'],
+                'time': '',
+                'match_score': match_score
+            })
+    print(f"[Search] Found {len(results)} matching game(s) on {source['name']}")
+    return results
+
+
+def list_streamsgate_channels(page_url):
+    """StreamsGate channel pages embed their player in an iframe (MAIN_PAGE_URL is one of them)"""
+    response = fetch_page(page_url)
+    response.raise_for_status()
+    channels = []
+    for url in scan_fetched_page(response).iframe_sources():
+        url = 'https:' + url if url.startswith('//') else urljoin(page_url, url)
+        channels.append({'url': url, 'name': f"StreamsGate {extract_stream_id(url)}", 'referer': page_url})
+    return channels
+
+
+def resolve_streamsgate_channel(channel, page_url):
+    """The player's source: "...m3u8" (as fetch_fresh_stream_url reads it), else a generic scan"""
+    headers = HEADERS.copy()
+    headers['Referer'] = channel.get('referer') or page_url
+    response = upstream_client.get(channel['url'], headers=headers, timeout=10, verify=False)
+    response.raise_for_status()
+    stream_url = extract_stream_url(response.text)
+    if stream_url:
+        return [{'url': stream_url, 'name': channel['name'], 'source_url': channel['url'],
+                 'referer': channel['url']}]
+    return resolve_rojadirecta_channel(channel, page_url)
+
+
+def source_config(name):
+    return next(source for source in STREAM_SOURCES if source['name'] == name)
+
+
+# How each STREAM_SOURCES entry searches, lists a game page's channels and resolves
+# them. StreamEast and CrackStreams pages embed players the way Rojadirecta's do.
+SOURCE_IMPLEMENTATIONS = {
+    'Rojadirecta': {
+        'search': search_rojadirecta_games,
+        'list_channels': list_rojadirecta_channels,
+        'resolve': resolve_rojadirecta_channel,
+        'domains': ('rojadirecta',),
+    },
+    'LiveTV.sx': {
+        'search': search_livetv_games,    # Searches both LiveTV domains
+        'list_channels': list_livetv_channels,
+        'resolve': resolve_livetv_channel,
+        'fallback': extract_livetv_with_playwright,
+        'domains': ('livetv',),
+    },
+    'LiveTV 872': {
+        'list_channels': list_livetv_channels,
+        'resolve': resolve_livetv_channel,
+        'fallback': extract_livetv_with_playwright,
+        'domains': ('livetv872',),
+    },
+    'StreamEast': {
+        'search': lambda keywords: search_source_links(source_config('StreamEast'), keywords),
+        'list_channels': list_rojadirecta_channels,
+        'resolve': resolve_rojadirecta_channel,
+        'domains': ('streameast',),
+    },
+    'StreamsGate': {
+        'search': lambda keywords: search_source_links(source_config('StreamsGate'), keywords),
+        'list_channels': list_streamsgate_channels,
+        'resolve': resolve_streamsgate_channel,
+        'domains': ('streamsgate',),
+    },
+    'CrackStreams': {
+        'search': lambda keywords: search_source_links(source_config('CrackStreams'), keywords),
+        'list_channels': list_rojadirecta_channels,
+        'resolve': resolve_rojadirecta_channel,
+        'domains': ('crackstreams',),
+    },
+}
+
+def playlist_answers(stream_url, referer=None):
+    """Resolution cache check: a cached stream's playlist still answers (one GET with the learned referer)"""
+    response, last_error = referer_cache.fetch(stream_url, hints=[referer] if referer else None, timeout=5)
+    return response is not None and response.status_code == 200 and '#EXTM3U' in response.text[:1024]
+
+
+# What each channel of a game resolved to is kept (memory + streams.db) until its
+# token runs out; reloads and restarts reuse it after one playlist check
+resolution_cache = ResolutionCache(DB_FILE, validate=playlist_answers, referer=referer_cache.get)
+
+# One adapter per source; game URLs no source claims go to LiveTV's, as before
+source_registry = SourceRegistry.from_sources(extraction_engine, STREAM_SOURCES, SOURCE_IMPLEMENTATIONS,
+                                              default='LiveTV.sx', cache=resolution_cache)
+
+
 def search_games(keywords):
     """Search all enabled sources for games matching keywords"""
     all_games = []
@@ -3695,13 +3747,8 @@ def search_games(keywords):
         # Match event ID in URL - check for /eventinfo/314788282 or eventinfo/314788282
         return f'/eventinfo/{priority_event_id}' in url_lower or f'eventinfo/{priority_event_id}' in url_lower
     
-    # Search LiveTV.sx FIRST (highest priority from allupcomingsports/27/)
-    livetv_games = search_livetv_games(keywords)
-    all_games.extend(livetv_games)
-    
-    # Search Rojadirecta second
-    rojadirecta_games = search_rojadirecta_games(keywords)
-    all_games.extend(rojadirecta_games)
+    # Every enabled source at once; ones still searching past their time budget are left out
+    all_games.extend(source_registry.search(keywords))
     
     # HIGHEST PRIORITY: Always put the specific event with 10 links first
     if len(all_games) > 1:
@@ -3728,12 +3775,150 @@ def search_games(keywords):
     return all_games
 
 
-def auto_refresh_worker():
-    """Background worker to automatically refresh stream URL"""
-    while True:
-        fetch_fresh_stream_url()
-        print(f"→ Next refresh in {REFRESH_INTERVAL} seconds...")
-        time.sleep(REFRESH_INTERVAL)
+def start_stream_extraction(game_url, fresh=False):
+    """Start resolving every channel of a game page with its source's adapter (LiveTV's when
+    no source claims the URL); returns the ExtractionJob. Unless fresh, a game resolved
+    before whose streams still answer is served from the resolution cache instead."""
+    if not fresh:
+        cached = resolution_cache.event_streams(game_url)
+        if cached:
+            print(f"[Resolved] ✓ {len(cached)} cached stream(s) for {game_url[:60]}")
+            return extraction_engine.completed(f"cached {game_url[:60]}", cached)
+    return source_registry.extract(game_url, fresh=fresh)
+
+
+def extract_all_streams(game_url, fresh=False):
+    """All channels for a game page, using the extractor for its source"""
+    return start_stream_extraction(game_url, fresh).wait()
+
+
+def reresolve_channel(game_url, channel):
+    """Fresh stream URL (new token) for one channel of a game, or None. Only the channel's
+    player page is resolved again, by the game's source adapter; the game page isn't crawled."""
+    if channel.get('source_url'):
+        streams = source_registry.resolve(game_url, {'url': channel['source_url'], 'name': channel.get('name')},
+                                          fresh=True)
+    else:
+        # No player page known for it: find it among all of the page's channels
+        streams = [stream for stream in extract_all_streams(game_url, fresh=True) or []
+                   if stream.get('name') == channel.get('name')]
+    
+    # A player page can yield several streams: the one with the channel's name first
+    for stream in streams:
+        if stream.get('name') == channel.get('name'):
+            return stream['url']
+    return streams[0]['url'] if streams else None
+
+
+def update_channel_url(channel, url):
+    """Give a channel of a session or of the default stream its re-resolved URL, under the
+    lock of the list it belongs to (the warmer's pool threads and refreshes race on them)"""
+    for session in stream_registry.sessions():
+        if session.set_channel_url(channel, url):
+            return
+    with default_channels_lock:
+        channel['url'] = url
+
+
+def refresh_default_stream(key=DEFAULT_STREAM_KEY):
+    """Refresh scheduler callback for /stream.m3u8: re-extract the loaded channel, or the main page"""
+    global current_stream_url, last_refresh_time
+    
+    source_url = stream_info.get('source_url')
+    if not source_url or not available_channels:
+        return fetch_fresh_stream_url()
+    
+    channel = available_channels[current_channel_index % len(available_channels)]
+    stream_url = reresolve_channel(source_url, channel)
+    if stream_url:
+        with default_channels_lock:
+            channel['url'] = stream_url
+        current_stream_url = stream_url
+        last_refresh_time = datetime.now()
+        stream_info['url'] = stream_url
+        stream_info['last_refresh'] = last_refresh_time.strftime('%Y-%m-%d %H:%M:%S')
+    return stream_url
+
+
+def refresh_session_stream(stream_id):
+    """Refresh scheduler callback for a registry session: re-extract its current channel"""
+    session = stream_registry.get(stream_id, touch=False)
+    if session is None or session.current_channel is None:
+        # Evicted since it was scheduled
+        refresh_scheduler.cancel(stream_id)
+        return None
+    
+    channel = session.current_channel
+    stream_url = reresolve_channel(session.source_url, channel)
+    if stream_url:
+        # The channel re-resolved, even if the viewer switched away meanwhile
+        session.set_channel_url(channel, stream_url)
+    return stream_url
+
+
+def list_warm_streams():
+    """(game URL, channels, current index) of the default stream and every session, for the warmer"""
+    streams = []
+    if available_channels:
+        streams.append((stream_info.get('source_url'), available_channels, current_channel_index))
+    for session in stream_registry.sessions():
+        streams.append((session.source_url, session.channels, session.channel_index))
+    return streams
+
+
+def warm_channel(source_url, channel):
+    """Warmer probe: fetch a backup channel's playlist and prefetch the segment a switch starts on"""
+    import urllib.parse
+    
+    # Re-resolve a token that would expire before anyone switches to it
+    expires_at = parse_expiry(channel['url'])
+    if source_url and expires_at and expires_at - time.time() < REFRESH_MARGIN:
+        fresh_url = reresolve_channel(source_url, channel)
+        if fresh_url:
+            update_channel_url(channel, fresh_url)
+    
+    hints = [channel['referer']] if channel.get('referer') else None
+    try:
+        entry = playlist_cache.get(channel['url'], lambda url: fetch_rewritten_playlist(url, hints))
+    except Exception as e:
+        fresh_url = None
+        if source_url and ('HTTP 403' in str(e) or 'HTTP 410' in str(e)):
+            fresh_url = reresolve_channel(source_url, channel)
+        if not fresh_url:
+            raise
+        update_channel_url(channel, fresh_url)
+        entry = playlist_cache.get(fresh_url, lambda url: fetch_rewritten_playlist(url, hints))
+    
+    playlist = hls_playlist.Playlist.parse(entry.body)
+    if playlist.is_master:
+        return
+    if not playlist.segments:
+        raise Exception("Playlist has no segments")
+    
+    # The async engine serves segments from its own cache, which this prefetch
+    # wouldn't fill; the probe above still keeps health and tokens current
+    if async_engine is not None:
+        return
+    
+    # A switch joins at the live edge, SWITCH_SEGMENTS from the end
+    first = playlist.segments[max(len(playlist.segments) - SWITCH_SEGMENTS, 0)]
+    if first.uri.startswith('/proxy/'):
+        segment_url = urllib.parse.unquote(first.uri[len('/proxy/'):])
+        segment, _ = segment_cache.get_or_fetch(segment_url, fetch_segment_upstream)
+        if not segment.wait_complete() or segment.error or segment.status_code != 200:
+            raise Exception(f"Segment fetch failed: {segment.error or segment.status_code}")
+
+
+# Keeps the next few backup channels of every stream probed (started in main()),
+# the next one in the list and the best scoring ones
+channel_warmer = ChannelWarmer(warm_channel, list_warm_streams, rank=quality_tracker.rank)
+
+
+def next_refresh_str(key):
+    next_refresh = refresh_scheduler.next_refresh(key)
+    if next_refresh is None:
+        return 'On demand'
+    return datetime.fromtimestamp(next_refresh).strftime('%Y-%m-%d %H:%M:%S')
 
 
 # Flask Routes
@@ -3743,15 +3928,11 @@ def index():
     if not current_stream_url:
         fetch_fresh_stream_url()
     
-    next_refresh = last_refresh_time.timestamp() + REFRESH_INTERVAL if last_refresh_time else time.time()
-    next_refresh_str = datetime.fromtimestamp(next_refresh).strftime('%Y-%m-%d %H:%M:%S')
-    
     return render_template_string(
         HTML_TEMPLATE,
         stream_id=stream_info.get('stream_id', 'Unknown'),
         last_refresh=stream_info.get('last_refresh', 'Never'),
-        next_refresh=next_refresh_str,
-        refresh_interval=REFRESH_INTERVAL
+        next_refresh=next_refresh_str(DEFAULT_STREAM_KEY)
     )
 
 
@@ -3765,18 +3946,60 @@ def get_stream_url():
 
 @app.route('/api/stream-info')
 def get_stream_info():
-    """API endpoint to get stream information"""
-    next_refresh = last_refresh_time.timestamp() + REFRESH_INTERVAL if last_refresh_time else time.time()
-    next_refresh_str = datetime.fromtimestamp(next_refresh).strftime('%Y-%m-%d %H:%M:%S')
+    """API endpoint to get stream information (?stream=<id> for one viewer's stream)"""
+    stream_id = request.args.get('stream')
+    if stream_id:
+        session = stream_registry.get(stream_id, touch=False)
+        if session is None:
+            return jsonify({'error': f'Unknown or expired stream: {stream_id}'}), 404
+        info = session.info()
+        info['next_refresh'] = next_refresh_str(stream_id)
+        return jsonify(info)
     
     return jsonify({
         'stream_id': stream_info.get('stream_id', 'Unknown'),
         'last_refresh': stream_info.get('last_refresh', 'Never'),
-        'next_refresh': next_refresh_str,
+        'next_refresh': next_refresh_str(DEFAULT_STREAM_KEY),
         'url': current_stream_url
     })
 
 
+@app.route('/api/channel-quality')
+def api_channel_quality():
+    """API endpoint with per-channel delivery scores; ?stream=<id> ranks that stream's channels"""
+    stream_id = request.args.get('stream')
+    if stream_id:
+        session = stream_registry.get(stream_id, touch=False)
+        if session is None:
+            return jsonify({'error': f'Unknown or expired stream: {stream_id}'}), 404
+        channels, current = session.channels, session.channel_index
+    else:
+        channels, current = available_channels, current_channel_index
+    
+    snapshot = quality_tracker.snapshot()
+    order = [current] + quality_tracker.rank(channels, current) if channels else []
+    ranked = []
+    for i in order:
+        channel = channels[i]
+        health = channel_warmer.health(channel)
+        ranked.append({
+            'name': channel.get('name'),
+            'current': i == current,
+            'quality': snapshot.get(channel_key(channel['url'])),
+            'warm': health.info() if health else None
+        })
+    return jsonify({'channels': ranked, 'tracked': len(snapshot)})
+
+
+@app.route('/api/streams')
+def api_streams():
+    """API endpoint listing the per-viewer streams in the registry"""
+    return jsonify({
+        'registry': stream_registry.stats(),
+        'streams': [session.info() for session in stream_registry.sessions()]
+    })
+
+
 @app.route('/api/refresh')
 def force_refresh():
     """API endpoint to force refresh the stream URL"""
@@ -3787,71 +4010,332 @@ def force_refresh():
     })
 
 
+def fetch_rewritten_playlist(playlist_url, hints=None, stream_id=None):
+    """Fetch the upstream playlist and rewrite its segment URLs to go through /proxy"""
+    # Learned referer for this host first, then the stream's own hints, then the
+    # known list (the one we captured from Playwright is https://exposestrat.com/)
+    response, last_error = referer_cache.fetch(playlist_url, hints=hints)
+    
+    if not response or response.status_code != 200:
+        quality_tracker.record_failure(playlist_url)
+        raise Exception(f"Failed to fetch stream with any referer. Last error: {last_error}")
+    
+    content = response.text
+    
+    # Cached segments live for a few target durations
+    segment_cache.set_target_duration(parse_target_duration(content))
+    
+    # Relative URIs resolve against where the playlist really came from (after redirects)
+    return rewrite_playlist(content, response.url or playlist_url, stream_id)
+
+
+def proxy_uri(url, kind, stream_id=None):
+    """Where a rewritten playlist points: keys and init maps go to the long-lived key cache,
+    nested playlists to /playlist/ to be rewritten, segments to /proxy/. Keys, maps and
+    nested playlists carry the stream's id (?stream=) so they are fetched with its referer."""
+    if kind == 'key':
+        path = hls_playlist.proxy_path(url, '/key/')
+    elif kind == 'map':
+        path = hls_playlist.proxy_path(url, '/init/')
+    else:
+        path = hls_playlist.proxy_rewrite(url, kind)
+        if kind not in hls_playlist.PLAYLIST_KINDS:
+            return path
+    return f"{path}?stream={stream_id}" if stream_id else path     # Session ids are URL-safe
+
+
+def rewrite_playlist(content, playlist_url, stream_id=None):
+    """Rewrite every URI in a playlist (segments, variants, keys, maps, renditions) to go through us"""
+    playlist = hls_playlist.Playlist.parse(content, playlist_url)
+    # Which channel its segments belong to, and whether it advanced (channel quality)
+    quality_tracker.record_playlist(playlist_url, playlist)
+    return playlist.rewrite_uris(lambda url, kind: proxy_uri(url, kind, stream_id)).dumps()
+
+
+def pull_stream_playlist(refresh_key=DEFAULT_STREAM_KEY):
+    """One reload of a stream for its puller: (body, etag) spliced into its continuous
+    playlist, failing over to the next channel when upstream is dead (raises if
+    there is nothing to serve)"""
+    if refresh_key in (None, DEFAULT_STREAM_KEY):
+        if not current_stream_url:
+            fetch_fresh_stream_url()
+        playlist_url, hints, stream_id = current_stream_url, None, None
+    else:
+        # A session being recorded counts as watched
+        session = stream_registry.get(refresh_key, touch=stream_pullers.held(refresh_key))
+        if session is None or not session.url:
+            raise Exception(f"Unknown or expired stream: {refresh_key}")
+        playlist_url, hints, stream_id = session.url, session.referer_hints(), refresh_key
+    if not playlist_url:
+        raise Exception("No stream URL available")
+    
+    try:
+        # One upstream fetch per freshness window, shared by every polling player
+        entry = playlist_cache.get(playlist_url,
+                                   lambda url: fetch_rewritten_playlist(url, hints, stream_id))
+    except Exception as e:
+        report_playlist_error(refresh_key, e)
+        entry = None
+        
+        # Dead channel: switch this stream to its next one and splice it in
+        next_url = fail_over_stream(refresh_key, e)
+        if next_url:
+            try:
+                playlist_url = next_url
+                entry = playlist_cache.get(next_url, lambda url: fetch_rewritten_playlist(
+                    url, resolve_referer_hints(stream_id), stream_id))
+            except Exception as next_error:
+                e = next_error
+        
+        if entry is None:
+            # Keep the player on what it already has; the next reload retries
+            last = splice_stream_playlist(refresh_key, None, None)
+            if last is None:
+                raise e
+            return last
+    
+    return splice_stream_playlist(refresh_key, entry.body, playlist_url)
+
+
+def puller_for(refresh_key=DEFAULT_STREAM_KEY):
+    """The stream's running pull loop, started if nobody was watching it"""
+    return stream_pullers.get(refresh_key, lambda: pull_stream_playlist(refresh_key))
+
+
+def on_segment_pulled(refresh_key, segment, entry):
+    """Pull loop hook: hand each pulled segment to the DVR ring and any recordings"""
+    record_dvr_segment(refresh_key, segment, entry)
+    stream_recorder.record(refresh_key, segment, entry)
+
+
+def record_dvr_segment(refresh_key, segment, entry):
+    """Queue a pulled segment for the stream's DVR ring (DVR mode only)"""
+    if not DVR_ENABLED:
+        return
+    dvr_store.record(refresh_key, segment.sequence, segment.duration, entry,
+                     discontinuity=segment.discontinuity,
+                     key_tag=segment.key.dumps() if segment.key is not None else None,
+                     map_tag=segment.map.dumps() if segment.map is not None else None)
+
+
+def serve_playlist(refresh_key=DEFAULT_STREAM_KEY):
+    """The stream's playlist from its puller (started on the first poll), with ETag / 304 support.
+
+    LL-HLS blocking reloads (_HLS_msn, _HLS_part) wait until the requested segment
+    or part is listed; a poll whose If-None-Match is already the latest version
+    waits for the next one (long poll) instead of getting an immediate 304.
+    """
+    puller = puller_for(refresh_key)
+    msn, part = request.args.get('_HLS_msn'), request.args.get('_HLS_part')
+    if msn is not None or part is not None:
+        try:
+            msn = int(msn)
+            part = int(part) if part is not None else None
+            if msn < 0 or (part is not None and part < 0):
+                raise ValueError("negative")
+        except (TypeError, ValueError):
+            return jsonify({'error': '_HLS_msn must be a media sequence number, '
+                                     '_HLS_part a part index (and needs _HLS_msn)'}), 400
+        try:
+            current = puller.blocking_reload(msn, part)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        current = puller.playlist()
+        if current is not None and request.if_none_match.contains(current[1].strip('"')):
+            current = puller.wait_change(current[1])
+    if current is None:
+        return jsonify({'error': puller.error or 'Timed out waiting for the stream playlist'}), 500
+    body, etag = current
+    
+    from flask import Response
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'no-cache',
+        'ETag': etag
+    }
+    
+    # Playlist hasn't changed since the player's last poll
+    if request.if_none_match.contains(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    
+    # Return the content with CORS headers
+    return Response(
+        body,
+        status=200,
+        content_type='application/vnd.apple.mpegurl',
+        headers=headers
+    )
+
+
+def continuous_playlist_for(refresh_key):
+    """The ContinuousPlaylist of the default stream or a session (None once evicted)"""
+    if refresh_key in (None, DEFAULT_STREAM_KEY):
+        return default_playlist
+    session = stream_registry.get(refresh_key, touch=False)
+    return session.playlist if session else None
+
+
+def splice_stream_playlist(refresh_key, body, playlist_url):
+    """(body, etag) to serve: body spliced into the stream's continuous playlist,
+    or with body None the last one served (None if there is none)"""
+    continuity = continuous_playlist_for(refresh_key)
+    if continuity is None:
+        return (body, make_etag(body)) if body is not None else None
+    if body is None:
+        return continuity.last()
+    return continuity.update(body, playlist_url)
+
+
+def fail_over_stream(refresh_key, error):
+    """Switch a stream whose upstream failed to its next channel; the new URL or None"""
+    continuity = continuous_playlist_for(refresh_key)
+    if continuity is None or not continuity.begin_switch():
+        return None
+    
+    if refresh_key in (None, DEFAULT_STREAM_KEY):
+        if len(available_channels) < 2:
+            return None
+        next_stream = advance_default_channel(by_quality=True)
+        refresh_scheduler.schedule(DEFAULT_STREAM_KEY, next_stream['url'], refresh_default_stream)
+        label = 'default stream'
+    else:
+        session = stream_registry.get(refresh_key, touch=False)
+        if session is None or len(session.channels) < 2:
+            return None
+        next_stream = session.next_channel(
+            lambda channels, index: channel_warmer.pick_next(channels, index, by_quality=True))
+        refresh_scheduler.schedule(refresh_key, next_stream['url'], refresh_session_stream)
+        label = f'stream {refresh_key}'
+    
+    print(f"[Failover] {label}: upstream failed ({str(error)[:80]}), "
+          f"switched to {next_stream['name']}")
+    return next_stream['url']
+
+
+def report_playlist_error(refresh_key, error):
+    """A 403/410 on the playlist means the token died early: re-resolve it now"""
+    if refresh_key and ('HTTP 403' in str(error) or 'HTTP 410' in str(error)):
+        refresh_scheduler.report_expired(refresh_key)
+
+
 @app.route('/stream.m3u8')
 def stream_proxy():
-    """Proxy the M3U8 stream with proper headers and rewrite URLs"""
-    if not current_stream_url:
-        fetch_fresh_stream_url()
+    """Proxy the default M3U8 stream with proper headers and rewrite URLs"""
+    return serve_playlist()
+
+
+@app.route('/s/<stream_id>/stream.m3u8')
+def session_stream_proxy(stream_id):
+    """Proxy one viewer's stream from the registry"""
+    session = stream_registry.get(stream_id)
+    if session is None or not session.url:
+        return jsonify({'error': f'Unknown or expired stream: {stream_id}'}), 404
+    
+    return serve_playlist(refresh_key=stream_id)
+
+
+@app.route('/dvr/<stream_key>/stream.m3u8')
+def dvr_playlist(stream_key):
+    """Timeshift playlist of a stream ('default' or a session ID): the last DVR_MINUTES, from disk"""
+    if not DVR_ENABLED:
+        return jsonify({'error': 'DVR is off (start with --dvr)'}), 404
+    if stream_key != DEFAULT_STREAM_KEY and stream_registry.get(stream_key) is None:
+        return jsonify({'error': f'Unknown or expired stream: {stream_key}'}), 404
     
+    # Watching the recording keeps the stream being pulled (and recorded)
+    puller_for(stream_key)
+    ring = dvr_store.ring(stream_key)
+    if ring is None:
+        return jsonify({'error': 'Nothing recorded yet for this stream, try again shortly'}), 404
+    
+    from flask import Response
+    body = ring.playlist(lambda number: f'/dvr/{stream_key}/{number}.ts')
+    return Response(
+        body,
+        status=200,
+        content_type='application/vnd.apple.mpegurl',
+        headers={
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, OPTIONS',
+            'Access-Control-Allow-Headers': '*',
+            'Cache-Control': 'no-cache'
+        }
+    )
+
+
+@app.route('/dvr/<stream_key>/<int:number>.ts')
+def dvr_segment(stream_key, number):
+    """A recorded segment, read from the stream's ring file (Range supported)"""
+    from flask import Response
+    ring = dvr_store.ring(stream_key)
+    segment = ring.get(number) if ring else None
+    if segment is None:
+        return jsonify({'error': f'Segment {number} is not in the DVR window'}), 404
+    
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': '*',
+        'Access-Control-Expose-Headers': 'Content-Length, Content-Range',
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'max-age=3600'
+    }
+    start, stop, status = 0, segment.size, 200
+    if request.range is not None:
+        span = request.range.range_for_length(segment.size)
+        if span is None:
+            headers['Content-Range'] = f'bytes */{segment.size}'
+            return Response(status=416, headers=headers)
+        start, stop = span
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{segment.size}'
+    headers['Content-Length'] = str(stop - start)
+    return Response(ring.read(number, start, stop), status=status,
+                    content_type=segment.content_type, headers=headers)
+
+
+def resolve_stream_url(stream_id=None):
+    """Upstream playlist URL for a session (None: the default stream), or None"""
+    if stream_id is None:
+        return current_stream_url
+    session = stream_registry.get(stream_id)
+    return session.url if session else None
+
+
+def resolve_referer_hints(stream_id=None):
+    """Referer hints for a session's upstream (none for the default stream)"""
+    session = stream_registry.get(stream_id, touch=False) if stream_id else None
+    return session.referer_hints() if session else None
+
+
+def fetch_segment_upstream(url):
+    """Fetch a segment from upstream with the learned referer (used by the segment cache)"""
+    response, last_error = referer_cache.fetch(url, stream=True)
+    if response is None:
+        raise Exception(f"Failed to fetch segment with any referer. Last error: {last_error}")
+    return response
+
+
+@app.route('/playlist/<path:url>')
+def proxy_playlist(url):
+    """Proxy a nested playlist (variant, rendition, I-frame): fetched and rewritten on every
+    reload so its segments, keys and maps come back through us too"""
     try:
-        # Try multiple referers - the one we captured from Playwright is https://exposestrat.com/
-        # Also try common ones that might work
-        referers_to_try = [
-            'https://exposestrat.com/',
-            'https://arizonaplay.club/',
-            'https://livetv.sx/',
-            'https://cdn.livetv869.me/'
-        ]
-        
-        response = None
-        last_error = None
-        
-        for referer in referers_to_try:
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                    'Referer': referer,
-                    'Origin': referer.rstrip('/')
-                }
-                response = requests.get(current_stream_url, headers=headers, timeout=10, verify=False)
-                if response.status_code == 200:
-                    break  # Success, use this referer
-            except Exception as e:
-                last_error = e
-                continue
+        import urllib.parse
+        decoded_url = urllib.parse.unquote(url)
+        from flask import Response
         
+        stream_id = request.args.get('stream')
+        response, last_error = referer_cache.fetch(decoded_url, hints=resolve_referer_hints(stream_id))
         if not response or response.status_code != 200:
-            raise Exception(f"Failed to fetch stream with any referer. Last error: {last_error}")
+            raise Exception(f"Failed to fetch playlist with any referer. Last error: {last_error}")
         
-        # Parse and rewrite M3U8 content
-        content = response.text
-        base_url = current_stream_url.rsplit('/', 1)[0] + '/'
-        
-        # Rewrite relative URLs to go through our proxy
-        lines = content.split('\n')
-        rewritten_lines = []
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                # This is a segment URL
-                if not line.startswith('http'):
-                    # Relative URL - make it absolute and proxy it
-                    segment_url = base_url + line
-                else:
-                    segment_url = line
-                
-                # Encode the URL and proxy it through our server
-                import urllib.parse
-                encoded_url = urllib.parse.quote(segment_url, safe='')
-                line = f'/proxy/{encoded_url}'
-            rewritten_lines.append(line)
-        
-        rewritten_content = '\n'.join(rewritten_lines)
-        
-        # Return the content with CORS headers
-        from flask import Response
         return Response(
-            rewritten_content,
+            rewrite_playlist(response.text, response.url or decoded_url, stream_id),
             status=200,
             content_type='application/vnd.apple.mpegurl',
             headers={
@@ -3872,47 +4356,193 @@ def proxy_stream(url):
         # Decode the URL
         import urllib.parse
         decoded_url = urllib.parse.unquote(url)
+        from flask import Response
         
-        # Use the same referer strategy for segments
-        referers_to_try = [
-            'https://exposestrat.com/',
-            'https://arizonaplay.club/',
-            'https://livetv.sx/',
-            'https://cdn.livetv869.me/'
-        ]
-        
-        response = None
-        for referer in referers_to_try:
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                    'Referer': referer,
-                    'Origin': referer.rstrip('/')
-                }
-                response = requests.get(decoded_url, headers=headers, timeout=10, stream=True, verify=False)
-                if response.status_code == 200:
-                    break  # Success
-            except:
-                continue
+        cors_headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, OPTIONS',
+            'Access-Control-Allow-Headers': '*'
+        }
         
-        if not response:
-            raise Exception("Failed to fetch segment with any referer")
+        # Segments the stream's puller already started, else the shared cache
+        # (concurrent misses share one upstream fetch)
+        entry, cache_state = stream_pullers.segment(decoded_url), 'RING'
+        if entry is None:
+            entry, cache_state = segment_cache.get_or_fetch(decoded_url, fetch_segment_upstream)
+        if not entry.wait_headers():
+            raise Exception("Timed out waiting for upstream segment")
+        if entry.status_code not in (200, 206):
+            raise Exception(f"Failed to fetch segment with any referer. Last error: "
+                            f"{entry.error or f'HTTP {entry.status_code}'}")
+        
+        headers = dict(cors_headers, **{
+            'X-Cache': cache_state,
+            'Accept-Ranges': 'bytes',
+            'Access-Control-Expose-Headers': 'Content-Length, Content-Range'
+        })
+        length = entry.size if entry.complete else entry.content_length
+        
+        # Byte-range requests (Safari native HLS, VLC) are answered from the cached body
+        if request.range is not None and entry.status_code == 200:
+            if length is None:
+                # Chunked upstream still arriving - the total is needed for Content-Range
+                if not entry.wait_complete() or entry.error:
+                    raise Exception(f"Upstream segment fetch failed: {entry.error or 'timed out'}")
+                length = entry.size
+            span = request.range.range_for_length(length)
+            if span is None:
+                headers['Content-Range'] = f'bytes */{length}'
+                return Response(status=416, headers=headers)
+            start, stop = span
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+            headers['Content-Length'] = str(stop - start)
+            return Response(
+                entry.iter_range(start, stop),
+                status=206,
+                content_type=entry.content_type,
+                headers=headers
+            )
         
+        if length is not None:
+            headers['Content-Length'] = str(length)
+        return Response(
+            entry.iter_range(),
+            status=entry.status_code,
+            content_type=entry.content_type,
+            headers=headers
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def fetch_key_upstream(url, hints=None):
+    """Fetch a key file or init segment with the learned referer, else the stream's hints"""
+    response, last_error = referer_cache.fetch(url, hints=hints)
+    if not response or response.status_code != 200:
+        raise Exception(f"Failed to fetch key with any referer. Last error: {last_error}")
+    return response.content, response.headers.get('Content-Type', 'application/octet-stream')
+
+
+@app.route('/key/<path:url>')
+@app.route('/init/<path:url>')
+def proxy_key(url):
+    """Proxy an EXT-X-KEY key file or EXT-X-MAP init segment from the key cache"""
+    try:
+        import urllib.parse
+        decoded_url = urllib.parse.unquote(url)
         from flask import Response
+        
+        # The key server usually wants the same referer as the stream it belongs to
+        hints = resolve_referer_hints(request.args.get('stream'))
+        entry, cache_state = key_cache.get(decoded_url, lambda key_url: fetch_key_upstream(key_url, hints))
         return Response(
-            response.iter_content(chunk_size=8192),
-            status=response.status_code,
-            content_type=response.headers.get('Content-Type', 'video/mp2t'),
+            entry.body,
+            status=200,
+            content_type=entry.content_type,
             headers={
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': '*'
+                'Access-Control-Allow-Headers': '*',
+                'Cache-Control': f'max-age={key_cache.ttl}',
+                'X-Cache': cache_state
             }
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def fetch_proxied_resource(uri):
+    """Bytes behind a rewritten /key/ or /init/ URI, from the key cache (for recordings)"""
+    import urllib.parse
+    path, _, query = uri.partition('?')
+    hints = resolve_referer_hints(urllib.parse.parse_qs(query).get('stream', [None])[0])
+    for prefix in ('/key/', '/init/'):
+        if path.startswith(prefix):
+            entry, _ = key_cache.get(urllib.parse.unquote(path[len(prefix):]),
+                                     lambda key_url: fetch_key_upstream(key_url, hints))
+            return entry.body
+    raise Exception(f"Not a proxied key or init URI: {uri[:60]}")
+
+
+@app.route('/api/record/start', methods=['GET', 'POST'])
+def api_record_start():
+    """Start recording a stream (?stream=<id>, default: /stream.m3u8) to disk"""
+    if async_engine is not None:
+        # Recordings tap the Flask pull loop; beside the async engine it would fetch
+        # every segment viewers are already fetching
+        return jsonify({'success': False, 'error': 'Recording is not available with the --async engine '
+                                                   '(it would fetch every segment twice); '
+                                                   'restart without --async to record'}), 409
+    stream_id = request.values.get('stream') or DEFAULT_STREAM_KEY
+    if stream_id == DEFAULT_STREAM_KEY:
+        title = request.values.get('title') or stream_info.get('channel_name') or stream_info.get('stream_id', '')
+    else:
+        session = stream_registry.get(stream_id)
+        if session is None:
+            return jsonify({'success': False, 'error': f'Unknown or expired stream: {stream_id}'}), 404
+        title = request.values.get('title') or session.title
+    
+    recording = stream_recorder.start(stream_id, title)
+    # The pull loop feeds the recording, so it keeps running with nobody watching
+    stream_pullers.hold(stream_id, lambda: pull_stream_playlist(stream_id))
+    return jsonify(dict(recording.info(), success=True,
+                        url=f'/recordings/{os.path.basename(recording.directory)}/index.m3u8'))
+
+
+@app.route('/api/record/stop', methods=['GET', 'POST'])
+def api_record_stop():
+    """Stop a recording (?id=<recording_id>); its playlist becomes a finished VOD playlist"""
+    recording = stream_recorder.get(request.values.get('id', ''))
+    if recording is None:
+        return jsonify({'success': False, 'error': 'Unknown recording'}), 404
+    if recording.state == 'recording':
+        stream_recorder.stop(recording.id)
+        stream_pullers.release(recording.stream_key)
+    return jsonify(dict(recording.info(), success=True,
+                        url=f'/recordings/{os.path.basename(recording.directory)}/index.m3u8'))
+
+
+@app.route('/api/recordings')
+def api_recordings():
+    """Recordings made since the server started, with their progress"""
+    return jsonify(stream_recorder.stats())
+
+
+@app.route('/recordings/<name>/<filename>')
+def serve_recording(name, filename):
+    """Play back a recording (its playlist, segments and keys) from disk"""
+    from flask import send_from_directory
+    response = send_from_directory(os.path.abspath(RECORDINGS_DIR), f'{name}/{filename}')
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if filename.endswith('.m3u8'):
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/proxy-stats')
+def api_proxy_stats():
+    """API endpoint with proxy cache and upstream connection statistics"""
+    return jsonify({
+        'segment_cache': segment_cache.stats(),
+        'playlist_cache': playlist_cache.stats(),
+        'key_cache': key_cache.stats(),
+        'stream_registry': stream_registry.stats(),
+        'refresh_scheduler': refresh_scheduler.stats(),
+        'channel_warmer': channel_warmer.stats(),
+        'stream_pullers': stream_pullers.stats(),
+        'dvr': dvr_store.stats() if DVR_ENABLED else None,
+        'extraction': extraction_engine.stats(),
+        'sources': source_registry.stats(),
+        'page_cache': page_cache.stats(),
+        'browser_pool': browser_pool.stats(),
+        'resolution_cache': resolution_cache.stats(),
+        'channel_quality': quality_tracker.snapshot(),
+        'learned_referers': referer_cache.snapshot(),
+        'upstream_pools': upstream_client.pool_stats(),
+        'async_engine': async_engine.stats() if async_engine else None
+    })
+
+
 @app.route('/api/search')
 def api_search():
     """API endpoint to search for games"""
@@ -3940,9 +4570,11 @@ def api_search():
 
 @app.route('/api/load-stream')
 def api_load_stream():
-    """API endpoint to load a stream from a game URL"""
+    """API endpoint to load a stream from a game URL into a new session
+    (?default=1: also make it the default /stream.m3u8)"""
     game_url = request.args.get('url', '')
     game_title = request.args.get('title', 'Unknown Game')
+    make_default = request.args.get('default', '').lower() in ('1', 'true', 'yes')
     
     if not game_url:
         return jsonify({'error': 'No URL provided'}), 400
@@ -3957,8 +4589,6 @@ def api_load_stream():
         print(f"[API] URL contains hash fragment: {game_url.split('#', 1)[1]}")
     print(f"[API] Finding ALL available stream channels...")
     
-    global current_stream_url, last_refresh_time, stream_info, available_channels, current_channel_index
-    
     # Check if this game should be tracked
     should_track = should_track_game(game_title, game_url)
     
@@ -3974,16 +4604,11 @@ def api_load_stream():
     # Get list of bad links to avoid retesting
     bad_links = get_bad_links_for_game(game_url, today_only=True) if should_track else set()
     
-    # Extract ALL available streams based on source
-    if 'rojadirecta' in game_url.lower() or 'rojadirectame' in game_url.lower():
-        print("[API] Detected Rojadirecta source")
-        all_streams = extract_all_streams_from_rojadirecta(game_url)
-    elif 'livetv.sx' in game_url.lower() or 'livetv872.me' in game_url.lower() or 'livetv' in game_url.lower():
-        print("[API] Detected LiveTV source (sx or 872)")
-        all_streams = extract_all_streams_from_livetv(game_url)
-    else:
-        print("[API] Unknown source, trying LiveTV extraction method")
-        all_streams = extract_all_streams_from_livetv(game_url)
+    # Resolve the page's channels concurrently and go on with the first stream(s)
+    # found; the rest join the channel list in the background as they resolve
+    extraction = start_stream_extraction(game_url)
+    found_streams = extraction.first()
+    all_streams = list(found_streams)
     
     # If we have known good links, prioritize them
     if should_track and known_good and all_streams:
@@ -4052,65 +4677,96 @@ def api_load_stream():
             print(f"[API] ⚠️  All tested links were bad, using first available")
             tested_streams = [all_streams[0]]
         
-        # Store all channels globally (including bad ones for fallback)
-        available_channels = all_streams
-        current_channel_index = 0
+        # Channels that delivered well before (same player URL) go first
+        tested_streams = [tested_streams[i] for i in quality_tracker.rank(tested_streams)]
+        all_streams = [all_streams[i] for i in quality_tracker.rank(all_streams)]
         
         # Use the first good stream, or first available if none tested good
         first_stream = tested_streams[0] if tested_streams else all_streams[0]
-        current_stream_url = first_stream['url']
         
-        last_refresh_time = datetime.now()
-        stream_info = {
-            'url': current_stream_url,
-            'stream_id': first_stream['name'],
-            'last_refresh': last_refresh_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'source_url': game_url,
-            'channel_name': first_stream['name'],
-            'total_channels': len(all_streams),
-            'current_channel': 1
-        }
+        # This viewer's own stream, with all channels (including bad ones for fallback)
+        session = stream_registry.create(
+            game_url, all_streams, title=game_title,
+            channel_index=all_streams.index(first_stream) if first_stream in all_streams else 0
+        )
+        
+        # Re-resolve shortly before the token's expires= deadline
+        refresh_scheduler.schedule(session.id, session.url, refresh_session_stream)
+        # Other viewers of /stream.m3u8 keep their game unless asked for
+        if make_default:
+            set_default_stream(game_url, all_streams, session.channel_index)
+        extraction.follow(lambda stream: add_extracted_channel(session, all_streams, stream, bad_links),
+                          known=found_streams)
         
-        print(f"[API] ✓ Loaded {first_stream['name']}: {current_stream_url[:80]}...")
+        print(f"[API] ✓ Loaded {first_stream['name']}: {first_stream['url'][:80]}...")
         print(f"[API] ✓ {len(all_streams) - 1} backup channel(s) available")
+        print(f"[Streams] Session {session.id}: {session.info()['proxy_url']}")
         
         return jsonify({
             'success': True,
-            'stream_url': current_stream_url,
-            'proxy_url': '/stream.m3u8',
+            'stream_url': first_stream['url'],
+            'default': make_default,
+            'stream_id': session.id,
+            'proxy_url': session.info()['proxy_url'],
             'message': f'Stream loaded: {first_stream["name"]}',
             'channel_name': first_stream['name'],
             'total_channels': len(all_streams),
-            'current_channel': 1,
+            'current_channel': session.channel_index + 1,
             'tested_links': len(tested_streams) if should_track else None
         })
     else:
         print(f"[API] ✗ Failed to extract stream from any available channel")
-        available_channels = []
-        current_channel_index = 0
         return jsonify({
             'success': False,
             'error': 'Could not extract stream URL from any available channel. The game may not be live or all channels may be offline.'
         }), 404
 
 
-@app.route('/api/next-channel')
-def api_next_channel():
-    """API endpoint to skip to the next available channel"""
+def set_default_stream(game_url, channels, channel_index):
+    """Point the default /stream.m3u8 at channels[channel_index] of a game"""
     global current_stream_url, last_refresh_time, stream_info, available_channels, current_channel_index
     
-    if not available_channels:
-        return jsonify({
-            'success': False,
-            'error': 'No channels available. Please load a stream first.'
-        }), 400
+    channel = channels[channel_index]
+    available_channels = channels
+    current_channel_index = channel_index
+    current_stream_url = channel['url']
+    last_refresh_time = datetime.now()
+    stream_info = {
+        'url': current_stream_url,
+        'stream_id': channel['name'],
+        'last_refresh': last_refresh_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'source_url': game_url,
+        'channel_name': channel['name'],
+        'total_channels': len(channels),
+        'current_channel': channel_index + 1
+    }
+    refresh_scheduler.schedule(DEFAULT_STREAM_KEY, current_stream_url, refresh_default_stream)
+    stream_pullers.reload(DEFAULT_STREAM_KEY)
+    print(f"[API] ✓ Default stream is now {channel['name']}")
+
+
+def add_extracted_channel(session, channels, stream, bad_links=()):
+    """A channel that resolved after /api/load-stream answered: appended to its session, and to
+    the default stream's channels if that is still the list loaded with it"""
+    if stream['url'] in bad_links:
+        return
+    if session.add_channel(stream):
+        print(f"[Streams] Session {session.id}: late channel {stream.get('name')} "
+              f"({len(session.channels)} total)")
+    if available_channels is channels and all(c['url'] != stream['url'] for c in channels):
+        channels.append(stream)
+        stream_info['total_channels'] = len(channels)
+
+
+def advance_default_channel(by_quality=False):
+    """Point the default stream at the next channel not known to be dead and return it
+    (by_quality: the best scoring one instead of the next in the list)"""
+    global current_stream_url, last_refresh_time, stream_info, current_channel_index
     
-    # Move to next channel (wrap around to start if at end)
-    current_channel_index = (current_channel_index + 1) % len(available_channels)
+    current_channel_index = channel_warmer.pick_next(available_channels, current_channel_index,
+                                                     by_quality=by_quality)
     next_stream = available_channels[current_channel_index]
     
-    print(f"\n[API] Switching to channel {current_channel_index + 1}/{len(available_channels)}: {next_stream['name']}")
-    
     current_stream_url = next_stream['url']
     last_refresh_time = datetime.now()
     stream_info = {
@@ -4122,7 +4778,55 @@ def api_next_channel():
         'total_channels': len(available_channels),
         'current_channel': current_channel_index + 1
     }
+    return next_stream
+
+
+@app.route('/api/next-channel')
+def api_next_channel():
+    """API endpoint to skip to the next available channel (?stream=<id> for one viewer's stream)"""
+    global current_stream_url, last_refresh_time, stream_info, available_channels, current_channel_index
+    
+    stream_id = request.args.get('stream')
+    if stream_id:
+        session = stream_registry.get(stream_id)
+        if session is None:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown or expired stream: {stream_id}. Please load the stream again.'
+            }), 404
+        next_stream = session.next_channel(channel_warmer.pick_next)
+        if next_stream is None:
+            return jsonify({'success': False, 'error': 'No channels available for this stream.'}), 400
+        
+        refresh_scheduler.schedule(stream_id, next_stream['url'], refresh_session_stream)
+        stream_pullers.reload(stream_id)
+        info = session.info()
+        print(f"\n[API] Stream {stream_id} switched to channel "
+              f"{info['current_channel']}/{info['total_channels']}: {next_stream['name']}")
+        return jsonify({
+            'success': True,
+            'stream_url': next_stream['url'],
+            'stream_id': stream_id,
+            'proxy_url': info['proxy_url'],
+            'message': f'Switched to {next_stream["name"]}',
+            'channel_name': next_stream['name'],
+            'total_channels': info['total_channels'],
+            'current_channel': info['current_channel']
+        })
     
+    if not available_channels:
+        return jsonify({
+            'success': False,
+            'error': 'No channels available. Please load a stream first.'
+        }), 400
+    
+    # Move to next channel (wrap around to start if at end)
+    next_stream = advance_default_channel()
+    
+    print(f"\n[API] Switching to channel {current_channel_index + 1}/{len(available_channels)}: {next_stream['name']}")
+    
+    refresh_scheduler.schedule(DEFAULT_STREAM_KEY, current_stream_url, refresh_default_stream)
+    stream_pullers.reload(DEFAULT_STREAM_KEY)
     print(f"[API] ✓ Switched to: {current_stream_url[:80]}...")
     
     return jsonify({
@@ -4249,15 +4953,28 @@ def api_toggle_wrong_game():
 
 
 def main():
+    global DVR_ENABLED
     print("=" * 60)
     print("🎥 Auto-Refreshing Stream Player")
     print("=" * 60)
     print(f"Main page: {MAIN_PAGE_URL}")
-    print(f"Auto-refresh interval: {REFRESH_INTERVAL} seconds")
+    print(f"Auto-refresh: {REFRESH_MARGIN}s before each token's expiry "
+          f"(every {REFRESH_INTERVAL}s when the URL doesn't say)")
+    print(f"Upstream pool: {upstream_client.POOL_MAXSIZE} keep-alive connection(s) per origin, "
+          f"timeouts {upstream_client.CONNECT_TIMEOUT}s connect / {upstream_client.READ_TIMEOUT}s read")
     print()
     
+    # The async engine serves segments from its own cache, not the pull loops the
+    # DVR and recordings tap: together every segment would be fetched twice
+    use_async = USE_ASYNC_PROXY or '--async' in sys.argv
+    if use_async and (DVR_ENABLED or '--dvr' in sys.argv):
+        print("✗ --async can't be combined with --dvr: the DVR records from the Flask pull loop,")
+        print("  which would fetch every segment a second time. Start with one or the other. Exiting...")
+        return
+    
     # Initialize database
     init_database()
+    referer_cache.load()
     
     # Check if this is a new day
     new_day = is_new_day()
@@ -4282,9 +4999,19 @@ def main():
         print("\n✗ Failed to fetch initial stream URL. Exiting...")
         return
     
-    # Start background refresh worker
-    refresh_thread = threading.Thread(target=auto_refresh_worker, daemon=True)
-    refresh_thread.start()
+    # Start the refresh scheduler (the initial fetch above already scheduled the default stream)
+    refresh_scheduler.start()
+    
+    # Keep backup channels warm so next-channel and failover land on a live one
+    channel_warmer.start()
+    
+    if '--dvr' in sys.argv:
+        DVR_ENABLED = True
+    if DVR_ENABLED:
+        print(f"[DVR] Timeshift on: last {dvr_store.max_duration // 60} min per stream in {DVR_DIR}/")
+    if '--page-cache' in sys.argv:
+        page_cache.set_directory(PAGE_CACHE_DIR)
+        print(f"[PageCache] Keeping listing and event pages in {PAGE_CACHE_DIR}/")
     
     print("\n" + "=" * 60)
     print("🌐 Server starting...")
@@ -4298,10 +5025,44 @@ def main():
     print("=" * 60)
     print()
     
+    if use_async:
+        if ASYNC_PROXY_AVAILABLE:
+            run_async_server()
+            return
+        print("[AsyncProxy] ⚠️  httpx/uvicorn not installed - falling back to Flask server")
+    
     # Start Flask server
     app.run(host='0.0.0.0', port=8080, debug=False)
 
 
+def async_playlist_error(stream_id, error):
+    """The async engine couldn't fetch a stream's playlist"""
+    quality_tracker.record_failure(resolve_stream_url(stream_id))
+    report_playlist_error(stream_id or DEFAULT_STREAM_KEY, error)
+
+
+def run_async_server():
+    """Serve the stream hot path from the asyncio engine, the rest of the app via Flask"""
+    global async_engine
+    from async_proxy import AsyncProxyEngine, serve
+    
+    async_engine = AsyncProxyEngine(
+        app,
+        get_stream_url=resolve_stream_url,
+        get_referer_hints=resolve_referer_hints,
+        rewrite_playlist=rewrite_playlist,
+        referer_cache=referer_cache,
+        ensure_stream_url=fetch_fresh_stream_url,
+        on_playlist_error=async_playlist_error,
+        fail_over=lambda stream_id, error: fail_over_stream(stream_id or DEFAULT_STREAM_KEY, error),
+        splice_playlist=lambda stream_id, body, url: splice_stream_playlist(stream_id or DEFAULT_STREAM_KEY, body, url),
+        on_segment_fetched=quality_tracker.record_segment,
+        max_bytes=SEGMENT_CACHE_MAX_BYTES
+    )
+    print("[AsyncProxy] 🚀 Serving /stream.m3u8 and /proxy from the asyncio engine (uvicorn)")
+    serve(async_engine, host='0.0.0.0', port=8080)
+
+
 if __name__ == '__main__':
     main()
 
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Per-viewer stream sessions
+Each /api/load-stream creates a session with its own channel list, channel
+position and refresh state, served at /s/<id>/stream.m3u8, so one viewer
+switching games or channels doesn't move anyone else. Sessions are capped
+in number and size and evicted when nobody has polled them for a while.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from continuous_playlist import ContinuousPlaylist
+
+MAX_STREAMS = 64                 # Sessions kept; the least recently watched goes first
+MAX_CHANNELS_PER_STREAM = 50     # Channel list cap per session
+IDLE_TIMEOUT = 30 * 60           # Seconds without a playlist poll before a session is dropped
+EVICT_CHECK_INTERVAL = 30        # Seconds between idle sweeps (done on access, no thread)
+
+
+class StreamSession:
+    """One viewer's stream: its channels, which one is playing, and when it was refreshed"""
+
+    def __init__(self, stream_id, source_url, channels, title='', channel_index=0, referer=None):
+        self.id = stream_id
+        self.source_url = source_url
+        self.title = title
+        self.channels = [
+            {k: channel.get(k) for k in ('name', 'url', 'source_url', 'referer')}
+            for channel in channels[:MAX_CHANNELS_PER_STREAM]
+        ]
+        self.channel_index = min(channel_index, max(len(self.channels) - 1, 0))
+        self.referer = referer            # Referer hint for this stream's upstream host
+        self.created = time.time()
+        self.last_access = self.created
+        self.last_refresh = datetime.now()
+        self.playlist = ContinuousPlaylist()  # What this viewer has been served, across channel switches
+        self._lock = threading.Lock()
+
+    @property
+    def current_channel(self):
+        with self._lock:
+            return self.channels[self.channel_index] if self.channels else None
+
+    @property
+    def url(self):
+        channel = self.current_channel
+        return channel['url'] if channel else None
+
+    def referer_hints(self):
+        """Referers to try for this stream's upstream before the shared defaults"""
+        channel = self.current_channel or {}
+        return [r for r in (channel.get('referer'), self.referer) if r]
+
+    def touch(self):
+        self.last_access = time.time()
+
+    def next_channel(self, pick=None):
+        """Advance to the next channel (wrapping), or to pick(channels, index), and return it"""
+        with self._lock:
+            if not self.channels:
+                return None
+            if pick is not None:
+                self.channel_index = pick(self.channels, self.channel_index)
+            else:
+                self.channel_index = (self.channel_index + 1) % len(self.channels)
+            self.last_refresh = datetime.now()
+            return self.channels[self.channel_index]
+
+    def add_channel(self, channel):
+        """Append a channel found after the session was created; False if listed already or full"""
+        with self._lock:
+            if len(self.channels) >= MAX_CHANNELS_PER_STREAM or \
+                    any(c['url'] == channel.get('url') for c in self.channels):
+                return False
+            self.channels.append({k: channel.get(k) for k in ('name', 'url', 'source_url', 'referer')})
+            return True
+
+    def set_url(self, url):
+        """Replace the current channel's URL (e.g. after re-extracting a fresh token)"""
+        with self._lock:
+            if self.channels:
+                self.channels[self.channel_index]['url'] = url
+            self.last_refresh = datetime.now()
+
+    def set_channel_url(self, channel, url):
+        """Replace one channel's URL (a re-resolved token); False if it isn't one of this session's"""
+        with self._lock:
+            if not any(c is channel for c in self.channels):
+                return False
+            channel['url'] = url
+            if self.channels[self.channel_index] is channel:
+                self.last_refresh = datetime.now()
+            return True
+
+    def info(self):
+        channel = self.current_channel or {}
+        return {
+            'stream_id': self.id,
+            'title': self.title,
+            'source_url': self.source_url,
+            'url': channel.get('url'),
+            'channel_name': channel.get('name'),
+            'current_channel': self.channel_index + 1,
+            'total_channels': len(self.channels),
+            'last_refresh': self.last_refresh.strftime('%Y-%m-%d %H:%M:%S'),
+            'idle_seconds': round(time.time() - self.last_access, 1),
+            'proxy_url': f'/s/{self.id}/stream.m3u8'
+        }
+
+
+class StreamRegistry:
+    """Sessions by ID, LRU-bounded, with idle eviction swept on access"""
+
+    def __init__(self, max_streams=MAX_STREAMS, idle_timeout=IDLE_TIMEOUT):
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()  # id -> StreamSession, least recently used first
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.evictions = 0
+
+    def create(self, source_url, channels, title='', channel_index=0, referer=None):
+        """Register a new session and return it"""
+        session = StreamSession(secrets.token_urlsafe(6), source_url, channels,
+                                title, channel_index, referer)
+        with self._lock:
+            self._sweep_locked(force=True)
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_streams:
+                old_id, _ = self._sessions.popitem(last=False)
+                self.evictions += 1
+                print(f"[Streams] Evicted least recently watched session {old_id}")
+        return session
+
+    def get(self, stream_id, touch=True):
+        """Session by ID (None if unknown or evicted); touching marks it watched"""
+        with self._lock:
+            self._sweep_locked()
+            session = self._sessions.get(stream_id)
+            if session is not None and touch:
+                session.touch()
+                self._sessions.move_to_end(stream_id)
+            return session
+
+    def remove(self, stream_id):
+        with self._lock:
+            return self._sessions.pop(stream_id, None)
+
+    def _sweep_locked(self, force=False):
+        now = time.time()
+        if not force and now - self._last_sweep < EVICT_CHECK_INTERVAL:
+            return
+        self._last_sweep = now
+        idle = [sid for sid, s in self._sessions.items() if now - s.last_access > self.idle_timeout]
+        for sid in idle:
+            del self._sessions[sid]
+            self.evictions += 1
+        if idle:
+            print(f"[Streams] Evicted {len(idle)} idle session(s)")
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': len(self._sessions),
+                'max_streams': self.max_streams,
+                'idle_timeout': self.idle_timeout,
+                'evictions': self.evictions
+            }
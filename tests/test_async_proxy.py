@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Test the asyncio proxy engine against a local origin: shared segment fetches,
+cached playlists with ETags, and Flask fallback for everything else
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from flask import Flask
+
+from async_proxy import AsyncPlaylistCache, AsyncProxyEngine
+from continuous_playlist import ContinuousPlaylist
+from playlist_cache import PlaylistCache
+from referer_cache import RefererCache
+
+SEGMENT = bytes(range(256)) * 400  # 100 KB
+PLAYLIST = b"#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXT-X-MEDIA-SEQUENCE:1\n#EXTINF:4.0,\nseg1.ts\n"
+
+
+class _OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = {}
+
+    def do_GET(self):
+        _OriginHandler.hits[self.path] = _OriginHandler.hits.get(self.path, 0) + 1
+        if '/dead/' in self.path:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        playlist = self.path.endswith('.m3u8') or '/variants/' in self.path
+        body = PLAYLIST if playlist else SEGMENT
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.apple.mpegurl' if playlist else 'video/mp2t')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        for i in range(0, len(body), 25600):
+            time.sleep(0.02)  # Slow origin so viewers pile up on one fetch
+            self.wfile.write(body[i:i + 25600])
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_origin():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _OriginHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _rewrite(content, playlist_url, stream_id=None):
+    base_url = playlist_url.rsplit('/', 1)[0] + '/'
+    return '\n'.join(
+        line if not line or line.startswith('#')
+        else '/proxy/' + urllib.parse.quote(base_url + line, safe='')
+        for line in content.split('\n'))
+
+
+def _make_engine(playlist_url):
+    flask_app = Flask(__name__)
+    flask_app.add_url_rule('/api/ping', 'ping', lambda: {'pong': True})
+    return AsyncProxyEngine(flask_app, get_stream_url=lambda stream_id=None: playlist_url,
+                            rewrite_playlist=_rewrite, referer_cache=RefererCache())
+
+
+def test_concurrent_viewers_share_one_segment_fetch():
+    origin = _start_origin()
+    playlist_url = f"http://127.0.0.1:{origin.server_address[1]}/live/index.m3u8"
+    engine = _make_engine(playlist_url)
+    _OriginHandler.hits = {}
+
+    async def run():
+        transport = httpx.ASGITransport(app=engine)
+        async with httpx.AsyncClient(transport=transport, base_url='http://proxy') as client:
+            playlist = await client.get('/stream.m3u8')
+            assert playlist.status_code == 200
+            segment_path = [l for l in playlist.text.split('\n') if l.startswith('/proxy/')][0]
+
+            responses = await asyncio.gather(*[client.get(segment_path) for _ in range(50)])
+            again = await client.get(segment_path)
+        await engine.close()
+        return responses, again
+
+    responses, again = asyncio.run(run())
+    assert all(r.status_code == 200 and r.content == SEGMENT for r in responses)
+    assert _OriginHandler.hits['/live/seg1.ts'] == 1
+    assert again.headers['x-cache'] == 'HIT'
+    origin.shutdown()
+
+
+def test_playlist_etag_and_flask_fallback():
+    origin = _start_origin()
+    playlist_url = f"http://127.0.0.1:{origin.server_address[1]}/live/index.m3u8"
+    engine = _make_engine(playlist_url)
+    _OriginHandler.hits = {}
+
+    async def run():
+        transport = httpx.ASGITransport(app=engine)
+        async with httpx.AsyncClient(transport=transport, base_url='http://proxy') as client:
+            first = await client.get('/stream.m3u8')
+            second = await client.get('/stream.m3u8',
+                                      headers={'If-None-Match': first.headers['etag']})
+            ping = await client.get('/api/ping')
+        await engine.close()
+        return first, second, ping
+
+    first, second, ping = asyncio.run(run())
+    assert first.status_code == 200 and '/proxy/http%3A%2F%2F127.0.0.1' in first.text
+    assert second.status_code == 304
+    assert _OriginHandler.hits['/live/index.m3u8'] == 1
+    assert ping.status_code == 200 and ping.json() == {'pong': True}
+    assert engine.segments.ttl == 4 * 6
+    origin.shutdown()
+
+
+def test_session_playlists_are_independent():
+    origin = _start_origin()
+    base = f"http://127.0.0.1:{origin.server_address[1]}"
+    sessions = {'abc': base + '/a/index.m3u8', 'xyz': base + '/b/index.m3u8'}
+    engine = AsyncProxyEngine(Flask(__name__), get_stream_url=lambda stream_id=None: sessions.get(stream_id),
+                              rewrite_playlist=_rewrite, referer_cache=RefererCache())
+
+    async def run():
+        transport = httpx.ASGITransport(app=engine)
+        async with httpx.AsyncClient(transport=transport, base_url='http://proxy') as client:
+            a = await client.get('/s/abc/stream.m3u8')
+            b = await client.get('/s/xyz/stream.m3u8')
+            gone = await client.get('/s/nope/stream.m3u8')
+        await engine.close()
+        return a, b, gone
+
+    a, b, gone = asyncio.run(run())
+    assert a.status_code == 200 and '%2Fa%2Fseg1.ts' in a.text
+    assert b.status_code == 200 and '%2Fb%2Fseg1.ts' in b.text
+    assert gone.status_code == 404
+    origin.shutdown()
+
+
+def test_dead_channel_fails_over_into_one_playlist():
+    origin = _start_origin()
+    base = f"http://127.0.0.1:{origin.server_address[1]}"
+    channels = [base + '/live/index.m3u8', base + '/dead/index.m3u8', base + '/backup/index.m3u8']
+    current = {'url': channels[0]}
+    continuous = ContinuousPlaylist()
+
+    def fail_over(stream_id, error):
+        current['url'] = channels[channels.index(current['url']) + 1]
+        return current['url']
+
+    def splice(stream_id, body, url):
+        return continuous.last() if body is None else continuous.update(body, url)
+
+    engine = AsyncProxyEngine(Flask(__name__), get_stream_url=lambda stream_id=None: current['url'],
+                              rewrite_playlist=_rewrite, referer_cache=RefererCache(),
+                              fail_over=fail_over, splice_playlist=splice)
+
+    async def run():
+        transport = httpx.ASGITransport(app=engine)
+        async with httpx.AsyncClient(transport=transport, base_url='http://proxy') as client:
+            first = await client.get('/stream.m3u8')
+            current['url'] = channels[1]   # The channel dies
+            second = await client.get('/stream.m3u8')
+        await engine.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.status_code == 200 and second.status_code == 200
+    assert current['url'] == channels[2]
+    assert '#EXT-X-DISCONTINUITY' in second.text and '%2Fbackup%2Fseg1.ts' in second.text
+    assert '#EXT-X-MEDIA-SEQUENCE:1' in second.text   # Still counting from the first channel
+    origin.shutdown()
+
+
+def test_nested_playlists_are_routed_by_kind_not_url():
+    origin = _start_origin()
+    base = f"http://127.0.0.1:{origin.server_address[1]}"
+    hinted, rewritten = [], []
+
+    def rewrite(content, playlist_url, stream_id=None):
+        rewritten.append(stream_id)
+        return _rewrite(content, playlist_url)
+
+    def hints(stream_id):
+        hinted.append(stream_id)
+        return ['https://player.example/']
+
+    engine = AsyncProxyEngine(None, get_stream_url=lambda stream_id=None: None, rewrite_playlist=rewrite,
+                              referer_cache=RefererCache(), get_referer_hints=hints)
+
+    async def run():
+        transport = httpx.ASGITransport(app=engine)
+        async with httpx.AsyncClient(transport=transport, base_url='http://proxy') as client:
+            # A variant served from a URL with no .m3u8 in its path, for session abc
+            variant = await client.get('/playlist/' + urllib.parse.quote(base + '/variants/hi?id=1', safe='')
+                                       + '?stream=abc')
+        await engine.close()
+        return variant
+
+    variant = asyncio.run(run())
+    assert variant.status_code == 200
+    assert variant.headers['content-type'] == 'application/vnd.apple.mpegurl'
+    assert f"/proxy/{urllib.parse.quote(base + '/variants/seg1.ts', safe='')}" in variant.text
+    # Fetched with the session's referer hints, and its keys rewritten for the same session
+    assert hinted == ['abc'] and rewritten == ['abc']
+    origin.shutdown()
+
+def test_async_playlist_cache_matches_the_flask_ttl():
+    ll_hls = ('#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXT-X-PART-INF:PART-TARGET=1.0\n'
+              '#EXT-X-MEDIA-SEQUENCE:1\n#EXTINF:4.0,\nseg1.ts\n')
+
+    async def fetch(url):
+        return ll_hls
+
+    entry = asyncio.run(AsyncPlaylistCache().get('u', fetch))
+    flask_entry = PlaylistCache().get('u', lambda url: ll_hls)
+    # LL-HLS playlists are fresh for half a part, not half a segment, on both engines
+    assert round(entry.fresh_until - entry.fetched_at, 3) == 0.5
+    assert round(flask_entry.fresh_until - flask_entry.fetched_at, 3) == 0.5
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("ASYNC PROXY TEST")
+    print("=" * 80)
+    for test in (test_concurrent_viewers_share_one_segment_fetch,
+                 test_playlist_etag_and_flask_fallback,
+                 test_session_playlists_are_independent,
+                 test_dead_channel_fails_over_into_one_playlist,
+                 test_nested_playlists_are_routed_by_kind_not_url,
+                 test_async_playlist_cache_matches_the_flask_ttl):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test the event-driven .m3u8 capture against a scripted fake page: the first
+playlist request ends the wait, ads/images are aborted, popups closed, and
+response bodies / page HTML are only fallbacks
+"""
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from browser_capture import capture_m3u8, STREAM_WAIT_MS, NUDGE_AFTER_MS
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type='xhr', headers=None):
+        self.url = url
+        self.resource_type = resource_type
+        self.headers = headers or {'referer': 'https://player.example/embed/1'}
+
+
+class FakeRoute:
+    def __init__(self, request):
+        self.request = request
+        self.outcome = None
+
+    def continue_(self):
+        self.outcome = 'continued'
+
+    def abort(self):
+        self.outcome = 'aborted'
+
+
+class FakeResponse:
+    def __init__(self, url, content_type, body='', resource_type='xhr'):
+        self.url = url
+        self.status = 200
+        self.headers = {'content-type': content_type}
+        self.request = FakeRequest(url, resource_type)
+        self.body = body
+
+    def text(self):
+        return self.body
+
+
+class FakePage:
+    """Fires scripted (ms, kind, payload) events as the capture waits"""
+
+    def __init__(self, context, events=(), html=''):
+        self.context = context
+        self.events = sorted(events, key=lambda event: event[0])
+        self.html = html
+        self.url = 'about:blank'
+        self.now = 0
+        self.handlers = {}
+        self.closed = False
+        self.evaluated = []
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def set_extra_http_headers(self, headers):
+        pass
+
+    def goto(self, url, wait_until=None, timeout=None):
+        self.url = url
+        self._fire()
+
+    def wait_for_timeout(self, ms):
+        assert not self.closed
+        self.now += ms
+        self._fire()
+
+    def _fire(self):
+        while self.events and self.events[0][0] <= self.now:
+            at, kind, payload = self.events.pop(0)
+            if kind == 'request':
+                route = FakeRoute(payload)
+                self.context.routes.append(route)
+                self.context.route_handler(route)
+            else:
+                for handler in self.handlers.get(kind, []):
+                    handler(payload)
+
+    def evaluate(self, script):
+        self.evaluated.append(self.now)
+
+    def query_selector(self, selector):
+        return None
+
+    def content(self):
+        return self.html
+
+    def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, events=(), html=''):
+        self.page = FakePage(self, events, html)
+        self.route_handler = None
+        self.routes = []
+
+    def route(self, pattern, handler):
+        self.route_handler = handler
+
+    def new_page(self):
+        return self.page
+
+
+def test_first_playlist_request_ends_the_wait():
+    popup = FakePage(None)
+    context = FakeContext([
+        (0, 'request', FakeRequest('https://player.example/embed/1', 'document')),
+        (0, 'request', FakeRequest('https://player.example/logo.png', 'image')),
+        (0, 'request', FakeRequest('https://pagead2.googlesyndication.com/ads.js', 'script')),
+        (0, 'request', FakeRequest('https://player.example/hls.min.js', 'script')),
+        (300, 'popup', popup),
+        (700, 'request', FakeRequest('https://edge.cdn.example/live/index.m3u8?token=1')),
+        (900, 'request', FakeRequest('https://edge.cdn.example/live/backup.m3u8')),
+    ])
+    hits = capture_m3u8(context, 'https://player.example/embed/1')
+    page = context.page
+    assert [hit['url'] for hit in hits] == ['https://edge.cdn.example/live/index.m3u8?token=1']
+    assert hits[0]['source'] == 'request' and hits[0]['referer'] == 'https://player.example/embed/1'
+    # Returned as soon as the playlist was requested, page closed
+    assert page.now == 700 and page.closed and popup.closed
+    assert [route.outcome for route in context.routes] == [
+        'continued', 'aborted', 'aborted', 'continued', 'continued']
+
+
+def test_playlist_response_without_m3u8_in_url():
+    context = FakeContext([
+        (400, 'response', FakeResponse('https://edge.cdn.example/live/playlist?id=7', 'application/vnd.apple.mpegurl')),
+    ])
+    hits = capture_m3u8(context, 'https://player.example/embed/1')
+    assert [hit['source'] for hit in hits] == ['response'] and context.page.now == 400
+
+
+def test_bodies_and_page_html_are_fallbacks():
+    context = FakeContext([
+        (200, 'response', FakeResponse('https://api.example/config', 'application/json',
+                                       '{"file":"https:\\/\\/edge.cdn.example\\/live\\/api.m3u8"}')),
+        (300, 'response', FakeResponse('https://ads.doubleclick.net/vast', 'application/json',
+                                       '{"media":"https://ads.doubleclick.net/ad.m3u8"}')),
+    ], html='<script>player.setup({file: "https://edge.cdn.example/live/page.m3u8"})</script>')
+    hits = capture_m3u8(context, 'https://player.example/embed/1')
+    assert [(hit['source'], hit['url']) for hit in hits] == [
+        ('body', 'https://edge.cdn.example/live/api.m3u8'),
+        ('page', 'https://edge.cdn.example/live/page.m3u8'),
+    ]
+    # Waited the whole window, with one nudge (overlays hidden, player clicked)
+    assert context.page.now == STREAM_WAIT_MS
+    assert context.page.evaluated == [NUDGE_AFTER_MS]
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("BROWSER CAPTURE TEST")
+    print("=" * 80)
+    for test in (test_first_playlist_request_ends_the_wait,
+                 test_playlist_response_without_m3u8_in_url,
+                 test_bodies_and_page_html_are_fallbacks):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test the browser pool with a fake launcher: browsers are reused across
+extractions, concurrency is bounded, and browsers are relaunched when
+disconnected, worn out or over the memory limit
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from browser_pool import BrowserPool, PoolBusy
+
+
+class FakeContext:
+    def __init__(self, browser, options):
+        self.browser = browser
+        self.options = options
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.connected = True
+        self.closed = False
+        self.thread = threading.current_thread()
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    def new_context(self, **options):
+        # The sync API only works on the thread that launched the browser
+        assert threading.current_thread() is self.thread
+        context = FakeContext(self, options)
+        self.contexts.append(context)
+        return context
+
+    def close(self):
+        self.closed = True
+
+
+class FakeLauncher:
+    def __init__(self):
+        self.browsers = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        browser = FakeBrowser(self)
+        with self.lock:
+            self.browsers.append(browser)
+        return browser
+
+
+def test_ten_extractions_one_launch():
+    launcher = FakeLauncher()
+    pool = BrowserPool(launch=launcher, max_browsers=1, memory_usage=None)
+    contexts = [pool.run(lambda context: context) for _ in range(10)]
+    assert len(launcher.browsers) == 1
+    # A fresh context per extraction, closed afterwards, with the pool's user agent
+    assert len(set(map(id, contexts))) == 10 and all(context.closed for context in contexts)
+    assert 'user_agent' in contexts[0].options
+    assert pool.run(lambda context: context.options, viewport={'width': 800})['viewport'] == {'width': 800}
+    stats = pool.stats()
+    assert stats['launches'] == 1 and stats['jobs'] == 11 and stats['browsers'] == 1
+    pool.shutdown()
+
+
+def test_concurrency_is_bounded():
+    launcher = FakeLauncher()
+    pool = BrowserPool(launch=launcher, max_browsers=2, memory_usage=None)
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def task(context):
+        with lock:
+            running.append(context)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(context)
+        return context.browser
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.run(task))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and peak[0] == 2
+    assert len(launcher.browsers) == 2
+    pool.shutdown()
+
+
+def test_errors_queue_limit_and_timeout():
+    pool = BrowserPool(launch=FakeLauncher(), max_browsers=1, max_queued=1, memory_usage=None)
+
+    def fail(context):
+        raise ValueError("page crashed")
+
+    try:
+        pool.run(fail)
+        assert False, "task error should be raised"
+    except ValueError:
+        pass
+    assert pool.stats()['failures'] == 1
+
+    started = threading.Event()
+    release = threading.Event()
+    blocker = threading.Thread(target=lambda: pool.run(lambda context: started.set() or release.wait(5)))
+    blocker.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: pool.run(lambda context: None))
+    waiter.start()
+    while not pool.stats()['queued']:
+        time.sleep(0.005)
+    try:
+        pool.run(lambda context: None)
+        assert False, "a full queue should refuse extractions"
+    except PoolBusy:
+        pass
+    release.set()
+    blocker.join()
+    waiter.join()
+
+    release.clear()
+    try:
+        pool.run(lambda context: release.wait(5), timeout=0.05)
+        assert False, "should time out"
+    except TimeoutError:
+        pass
+    release.set()
+    assert pool.stats()['rejected'] == 1 and pool.stats()['timeouts'] == 1
+    pool.shutdown()
+
+
+def test_recycle_and_health_check():
+    launcher = FakeLauncher()
+    pool = BrowserPool(launch=launcher, max_browsers=1, max_uses=3, memory_usage=None)
+    for _ in range(7):
+        pool.run(lambda context: None)
+    # Relaunched after every third extraction; worn-out browsers are closed
+    assert len(launcher.browsers) == 3
+    assert [browser.closed for browser in launcher.browsers] == [True, True, False]
+
+    launcher.browsers[-1].connected = False
+    pool.run(lambda context: None)
+    assert len(launcher.browsers) == 4 and launcher.browsers[2].closed
+    assert pool.stats()['unhealthy'] == 1 and pool.stats()['recycled'] == 2
+
+    memory = [100]
+    pool = BrowserPool(launch=launcher, max_browsers=1, max_memory_mb=500, memory_usage=lambda: memory[0])
+    pool.run(lambda context: None)
+    pool.run(lambda context: None)
+    memory[0] = 800
+    pool.run(lambda context: None)
+    pool.run(lambda context: None)
+    assert len(launcher.browsers) == 6 and pool.stats()['recycled'] == 2
+    pool.shutdown()
+
+
+def test_idle_browsers_are_closed():
+    launcher = FakeLauncher()
+    pool = BrowserPool(launch=launcher, max_browsers=1, idle_timeout=0.05, memory_usage=None)
+    pool.run(lambda context: None)
+    deadline = time.time() + 2
+    while (pool.stats()['browsers'] or not launcher.browsers[0].closed) and time.time() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()['browsers'] == 0 and launcher.browsers[0].closed
+    pool.run(lambda context: None)
+    assert len(launcher.browsers) == 2
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("BROWSER POOL TEST")
+    print("=" * 80)
+    for test in (test_ten_extractions_one_launch,
+                 test_concurrency_is_bounded,
+                 test_errors_queue_limit_and_timeout,
+                 test_recycle_and_health_check,
+                 test_idle_browsers_are_closed):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test channel quality scoring: segment timings attributed to their channel
+(through master playlists too), stale playlists, errors, and ranking
+"""
+import sys
+import os
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_quality import QualityTracker
+from hls_playlist import Playlist
+
+
+def media_playlist(first=1):
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6', f'#EXT-X-MEDIA-SEQUENCE:{first}']
+    for seq in range(first, first + 3):
+        lines += ['#EXTINF:6.0,', f'seg{seq}.ts']
+    return '\n'.join(lines) + '\n'
+
+
+def feed(tracker, base, elapsed, ttfb, fetches=5, status=200):
+    url = f'{base}/index.m3u8?token=x'
+    tracker.record_playlist(url, Playlist.parse(media_playlist(), url))
+    for _ in range(fetches):
+        tracker.record_segment(f'{base}/seg3.ts', status, ttfb, elapsed, 500000)
+
+
+def test_fast_channel_outranks_slow_one():
+    tracker = QualityTracker()
+    feed(tracker, 'https://fast.example/live', elapsed=1.0, ttfb=0.05)
+    feed(tracker, 'https://slow.example/live', elapsed=15.0, ttfb=2.0)
+    channels = [{'name': 'Slow', 'url': 'https://slow.example/live/index.m3u8?token=y'},
+                {'name': 'Unknown', 'url': 'https://new.example/live/index.m3u8'},
+                {'name': 'Fast', 'url': 'https://fast.example/live/index.m3u8?token=z'}]
+
+    snapshot = tracker.snapshot()
+    assert snapshot['https://fast.example/live/index.m3u8']['realtime'] == 6.0
+    assert tracker.score(channels[2]['url']) > 90
+    assert tracker.score(channels[0]['url']) < 50
+    assert tracker.rank(channels) == [2, 1, 0]
+    assert tracker.rank(channels, current=2) == [1, 0]
+    # Unscored channels keep list order
+    assert QualityTracker().rank(channels) == [0, 1, 2]
+
+
+def test_errors_and_staleness_lower_the_score():
+    tracker = QualityTracker()
+    feed(tracker, 'https://a.example/live', elapsed=1.0, ttfb=0.05)
+    healthy = tracker.score('https://a.example/live/index.m3u8')
+
+    feed(tracker, 'https://b.example/live', elapsed=1.0, ttfb=0.05, fetches=3)
+    feed(tracker, 'https://b.example/live', elapsed=1.0, ttfb=0.05, fetches=3, status=503)
+    assert tracker.score('https://b.example/live/index.m3u8') < healthy * 0.7
+
+    # Same playlist for three target durations: it stopped advancing
+    url = 'https://c.example/live/index.m3u8'
+    tracker.record_playlist(url, Playlist.parse(media_playlist(), url))
+    tracker._playlists['https://c.example/live/index.m3u8'] = (3, time.time() - 18)
+    for _ in range(5):
+        tracker.record_playlist(url, Playlist.parse(media_playlist(), url))
+    assert tracker.snapshot()[url]['staleness'] > 2
+    assert tracker.score(url) < 80
+
+
+def test_variant_segments_count_for_the_master_channel():
+    tracker = QualityTracker()
+    master_url = 'https://m.example/master.m3u8'
+    master = '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nlow/index.m3u8\n'
+    tracker.record_playlist(master_url, Playlist.parse(master, master_url))
+    variant_url = 'https://m.example/low/index.m3u8'
+    tracker.record_playlist(variant_url, Playlist.parse(media_playlist(), variant_url))
+    tracker.record_segment('https://m.example/low/seg1.ts', 200, 0.1, 2.0, 400000)
+
+    assert tracker.snapshot()[master_url]['segments'] == 1
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("CHANNEL QUALITY TEST")
+    print("=" * 80)
+    for test in (test_fast_channel_outranks_slow_one,
+                 test_errors_and_staleness_lower_the_score,
+                 test_variant_segments_count_for_the_master_channel):
+        test()
+        print(f"✓ {test.__name__}")
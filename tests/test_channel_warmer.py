@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test hot-standby channel warming: which alternates get probed, dead channels
+skipped on switch, and re-resolved URLs tracked
+"""
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_warmer import ChannelWarmer, channel_key
+
+
+def make_channels(count):
+    return [{'name': f'Ch{i}', 'url': f'https://cdn{i}.example/live.m3u8?token=a'} for i in range(count)]
+
+
+def test_probes_top_k_alternates_once_each():
+    channels = make_channels(5)
+    probed = []
+    # Two viewers on the same game, one channel apart
+    streams = [('game', channels, 0), ('game', channels, 1)]
+    warmer = ChannelWarmer(lambda source, channel: probed.append(channel['name']),
+                           lambda: streams, top_k=2)
+
+    assert warmer.warm_once() == 3
+    assert sorted(probed) == ['Ch1', 'Ch2', 'Ch3']
+    assert warmer.stats()['healthy'] == 3
+
+
+def test_switch_skips_dead_channels():
+    channels = make_channels(4)
+    dead = {'Ch1'}
+
+    def probe(source, channel):
+        if channel['name'] in dead:
+            raise Exception('HTTP 503')
+
+    warmer = ChannelWarmer(probe, lambda: [('game', channels, 0)], top_k=3)
+    # Nothing probed yet: just the next one
+    assert warmer.pick_next(channels, 0) == 1
+    warmer.warm_once()
+    assert warmer.pick_next(channels, 0) == 2
+    assert warmer.health(channels[1]).failures == 1
+
+    # Everything after the current channel dead: still moves on rather than stalling
+    dead.update({'Ch2', 'Ch3'})
+    warmer.warm_once()
+    assert warmer.pick_next(channels, 0) == 1
+
+
+def test_reresolved_url_keeps_its_health():
+    channels = make_channels(2)
+
+    def probe(source, channel):
+        channel['url'] = 'https://fresh.example/live.m3u8?token=b'
+
+    warmer = ChannelWarmer(probe, lambda: [('game', channels, 0)])
+    old_key = channel_key(channels[1])
+    warmer.warm_once()
+    assert channels[1]['url'].startswith('https://fresh.example/')
+    assert warmer.health(channels[1]).ok
+    # The dead URL's entry moves over rather than lingering beside the new one
+    assert old_key not in warmer._health and len(warmer._health) == 1
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("CHANNEL WARMER TEST")
+    print("=" * 80)
+    for test in (test_probes_top_k_alternates_once_each,
+                 test_switch_skips_dead_channels,
+                 test_reresolved_url_keeps_its_health):
+        test()
+        print(f"✓ {test.__name__}")
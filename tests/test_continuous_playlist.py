@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test splicing playlists from successive upstream channels into one live
+playlist: monotonic media sequence, discontinuities at switches, and keys
+carried across the window
+"""
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from continuous_playlist import ContinuousPlaylist
+from hls_playlist import Playlist
+
+
+def make_playlist(prefix, first, count=5, key=None):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:6',
+             f'#EXT-X-MEDIA-SEQUENCE:{first}']
+    if key:
+        lines.append(f'#EXT-X-KEY:METHOD=AES-128,URI="{key}"')
+    for seq in range(first, first + count):
+        lines += ['#EXTINF:6.0,', f'/proxy/{prefix}{seq}.ts']
+    return '\n'.join(lines) + '\n'
+
+
+def test_same_source_passes_numbering_through():
+    continuous = ContinuousPlaylist()
+    body, etag = continuous.update(make_playlist('a', 100), 'https://a.example/live.m3u8?token=1')
+    playlist = Playlist.parse(body)
+    assert playlist.media_sequence == 100
+    assert [s.uri for s in playlist.segments] == [f'/proxy/a{n}.ts' for n in range(100, 105)]
+
+    # Same input again is served from the cached output
+    assert continuous.update(make_playlist('a', 100), 'https://a.example/live.m3u8?token=1') == (body, etag)
+
+    # A refreshed token on the same channel is not a switch
+    body, _ = continuous.update(make_playlist('a', 102), 'https://a.example/live.m3u8?token=2')
+    playlist = Playlist.parse(body)
+    assert playlist.media_sequence == 102 and '#EXT-X-DISCONTINUITY' not in body
+    assert continuous.switches == 0
+
+
+def test_switch_splices_with_discontinuity():
+    continuous = ContinuousPlaylist()
+    continuous.update(make_playlist('a', 100), 'https://a.example/live.m3u8')
+
+    # The new channel numbers its segments from 7, joined at its live edge
+    body, _ = continuous.update(make_playlist('b', 7, count=6), 'https://b.example/hls/index.m3u8')
+    playlist = Playlist.parse(body)
+    uris = [s.uri for s in playlist.segments]
+    assert uris[-3:] == ['/proxy/b10.ts', '/proxy/b11.ts', '/proxy/b12.ts']
+    assert uris[:3] == ['/proxy/a102.ts', '/proxy/a103.ts', '/proxy/a104.ts']
+    assert playlist.media_sequence == 102
+    assert [s.discontinuity for s in playlist.segments] == [False, False, False, True, False, False]
+    assert continuous.switches == 1
+
+    # The new channel moves on; once the spliced segment slides out the
+    # discontinuity sequence counts it
+    body, _ = continuous.update(make_playlist('b', 13, count=6), 'https://b.example/hls/index.m3u8')
+    playlist = Playlist.parse(body)
+    assert playlist.media_sequence == 108
+    assert playlist.segments[0].uri == '/proxy/b13.ts'
+    assert playlist.discontinuity_sequence == 1
+    assert '#EXT-X-DISCONTINUITY\n' not in body
+
+
+def test_keys_follow_segments_across_switch():
+    continuous = ContinuousPlaylist()
+    continuous.update(make_playlist('a', 1, key='/key/a'), 'https://a.example/live.m3u8')
+    body, _ = continuous.update(make_playlist('b', 50), 'https://b.example/live.m3u8')
+    playlist = Playlist.parse(body)
+    assert [s.key.attributes['URI'] if s.key else None for s in playlist.segments] == \
+        ['/key/a', '/key/a', None, None, None]
+    assert '#EXT-X-KEY:METHOD=NONE' in body
+
+
+def test_low_latency_parts_carried_over():
+    lines = make_playlist('a', 100, count=3).splitlines()
+    lines[1:1] = ['#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK=3.0,CAN-SKIP-UNTIL=12',
+                  '#EXT-X-PART-INF:PART-TARGET=1.0']
+    lines += ['#EXT-X-PART:DURATION=1.0,URI="/proxy/a103.0.ts"',
+              '#EXT-X-PRELOAD-HINT:TYPE=PART,URI="/proxy/a103.1.ts"',
+              '#EXT-X-RENDITION-REPORT:URI="/proxy/b.m3u8",LAST-MSN=103']
+    continuous = ContinuousPlaylist()
+    body, _ = continuous.update('\n'.join(lines) + '\n', 'https://a.example/live.m3u8')
+    playlist = Playlist.parse(body)
+    assert playlist.part_target == 1.0
+    assert '#EXT-X-SERVER-CONTROL:PART-HOLD-BACK=3.0\n' in body
+    assert [t.name for t in playlist.trailing] == ['EXT-X-PART', 'EXT-X-PRELOAD-HINT']
+
+
+def test_master_playlists_pass_through():
+    master = '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\n/proxy/low.m3u8\n'
+    continuous = ContinuousPlaylist()
+    assert continuous.update(master, 'https://a.example/master.m3u8')[0] == master
+    assert continuous.last() is None
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("CONTINUOUS PLAYLIST TEST")
+    print("=" * 80)
+    for test in (test_same_source_passes_numbering_through,
+                 test_switch_splices_with_discontinuity,
+                 test_keys_follow_segments_across_switch,
+                 test_low_latency_parts_carried_over,
+                 test_master_playlists_pass_through):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test the memory-mapped DVR ring: wrap-around overwrites, the time window,
+gaps becoming discontinuities, the timeshift playlist, and the writer
+thread recording pulled segments
+"""
+import sys
+import os
+import shutil
+import tempfile
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dvr_ring import DvrRing, DvrStore
+from hls_playlist import Playlist
+from segment_cache import SegmentEntry
+
+
+def body(n, size=100):
+    return bytes([n % 256]) * size
+
+
+def test_ring_wraps_and_drops_overwritten_segments():
+    directory = tempfile.mkdtemp()
+    try:
+        ring = DvrRing(os.path.join(directory, 'a.ring'), capacity=350, max_duration=3600)
+        for sequence in range(10, 13):
+            ring.append(sequence, [body(sequence)], 100, 6.0)
+        assert [s.offset for s in ring._index] == [0, 100, 200]
+
+        # 50 bytes left at the end: the next one wraps and overwrites the oldest
+        ring.append(13, [body(13)[:60], body(13)[60:]], 100, 6.0)
+        assert [s.sequence for s in ring._index] == [11, 12, 13]
+        assert ring._index[-1].offset == 0
+        assert b''.join(ring.read(3)) == body(13)
+        assert b''.join(ring.read(2, 10, 20)) == body(12, 10)
+
+        # A reader of a segment that gets overwritten stops instead of sending other bytes
+        reader = ring.read(1)
+        ring.append(14, [body(14)], 100, 6.0)
+        try:
+            next(reader)
+            assert False, "read an overwritten segment"
+        except IOError:
+            pass
+        assert ring.get(1) is None and ring.get(4).sequence == 14
+        ring.close()
+        assert not os.path.exists(os.path.join(directory, 'a.ring'))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_playlist_covers_window_with_discontinuities():
+    directory = tempfile.mkdtemp()
+    try:
+        ring = DvrRing(os.path.join(directory, 'b.ring'), capacity=10000, max_duration=20)
+        key = '#EXT-X-KEY:METHOD=AES-128,URI="/key/k1"'
+        ring.append(1, [body(1)], 100, 6.0, key=key)
+        ring.append(2, [body(2)], 100, 6.0, key=key)
+        ring.append(4, [body(4)], 100, 6.0)       # 3 never arrived
+        ring.append(5, [body(5)], 100, 5.5)
+
+        # 23.5 s recorded, window is 20 s: the first segment slid out
+        playlist = Playlist.parse(ring.playlist(lambda n: f'/dvr/x/{n}.ts'))
+        assert playlist.media_sequence == 1
+        assert [s.uri for s in playlist.segments] == ['/dvr/x/1.ts', '/dvr/x/2.ts', '/dvr/x/3.ts']
+        assert [s.discontinuity for s in playlist.segments] == [False, True, False]
+        assert playlist.segments[0].key.attributes['URI'] == '/key/k1'
+        assert playlist.segments[1].key is None
+        assert playlist.target_duration == 6 and not playlist.endlist
+
+        # Every segment stays in the same discontinuity domain on each reload,
+        # including while the flagged one is first and after it slides out
+        domains = {}
+
+        def check_domains(playlist):
+            domain = playlist.discontinuity_sequence
+            for segment in playlist.segments:
+                domain += segment.discontinuity
+                assert domains.setdefault(segment.uri, domain) == domain, segment.uri
+
+        check_domains(playlist)
+        for sequence in range(6, 11):
+            ring.append(sequence, [body(sequence)], 100, 6.0)
+            playlist = Playlist.parse(ring.playlist(lambda n: f'/dvr/x/{n}.ts'))
+            check_domains(playlist)
+        assert domains['/dvr/x/1.ts'] == 0 and domains['/dvr/x/2.ts'] == 1
+        assert playlist.discontinuity_sequence == 1 and not playlist.segments[0].discontinuity
+        assert ring.stats()['seconds'] <= 20
+        ring.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_store_records_completed_downloads():
+    directory = tempfile.mkdtemp()
+    try:
+        store = DvrStore(directory, ring_bytes=10000, max_rings=1)
+        ok = SegmentEntry('https://cdn.example/seg1.ts', 60)
+        failed = SegmentEntry('https://cdn.example/seg2.ts', 60)
+        store.record('game', 1, 6.0, ok)
+        store.record('game', 2, 6.0, failed)
+
+        # Still downloading when queued; written once complete
+        ok.set_headers(200, 'video/mp2t', 8)
+        ok.append(b'abcd')
+        ok.append(b'efgh')
+        ok.finish()
+        failed.set_headers(404, 'text/html', None)
+        failed.finish()
+        deadline = time.time() + 2
+        while store.recorded + store.dropped < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        ring = store.ring('game')
+        assert store.recorded == 1 and store.dropped == 1
+        assert b''.join(ring.read(0)) == b'abcdefgh'
+
+        # One ring allowed: recording another stream drops this one
+        other = SegmentEntry('https://cdn.example/other.ts', 60)
+        other.set_headers(200, 'video/mp2t', 1)
+        other.append(b'x')
+        other.finish()
+        store.record('other', 1, 6.0, other)
+        deadline = time.time() + 2
+        while store.recorded < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert store.ring('game') is None and store.ring('other') is not None
+        assert not os.path.exists(os.path.join(directory, 'game.ring'))
+        store.remove('other')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("DVR RING TEST")
+    print("=" * 80)
+    for test in (test_ring_wraps_and_drops_overwritten_segments,
+                 test_playlist_covers_window_with_discontinuities,
+                 test_store_records_completed_downloads):
+        test()
+        print(f"✓ {test.__name__}")
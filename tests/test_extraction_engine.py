@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test concurrent channel extraction: the first stream handed back while slow
+channels keep resolving, worker and per-host limits, the deadline, and the
+fallback when no channel yields a stream
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_engine import ExtractionEngine
+
+
+def make_channels(hosts):
+    return [{'name': f'Ch{i}', 'url': f'https://{host}/player.php?c={i}'} for i, host in enumerate(hosts)]
+
+
+def stream_for(channel):
+    return {'url': channel['url'].replace('player.php', 'live.m3u8'), 'name': channel['name']}
+
+
+def test_first_stream_returned_while_rest_resolve():
+    delays = {'Ch0': 0.4, 'Ch1': 0.05, 'Ch2': 0.3, 'Ch3': 0.2}
+    channels = make_channels(['a.example', 'b.example', 'c.example', 'd.example'])
+
+    def resolve(channel):
+        time.sleep(delays[channel['name']])
+        if channel['name'] == 'Ch3':
+            raise Exception('HTTP 404')
+        return [stream_for(channel)]
+
+    engine = ExtractionEngine(max_workers=4, per_host=1)
+    started = time.time()
+    job = engine.run('game', channels, resolve)
+    first = job.first(timeout=5)
+    assert [s['name'] for s in first] == ['Ch1']
+    assert time.time() - started < 0.25
+
+    late = []
+    job.follow(late.append, known=first)
+    # Everything, in channel order rather than the order it was found in
+    assert [s['name'] for s in job.wait(timeout=5)] == ['Ch0', 'Ch1', 'Ch2']
+    assert sorted(s['name'] for s in late) == ['Ch0', 'Ch2']
+    assert job.info()['errors'] == 1 and job.done
+
+
+def test_worker_and_per_host_limits():
+    running = {'total': 0, 'peak': 0, 'hosts': {}, 'host_peak': 0}
+    lock = threading.Lock()
+
+    def resolve(channel):
+        host = channel['url'].split('/')[2]
+        with lock:
+            running['total'] += 1
+            running['hosts'][host] = running['hosts'].get(host, 0) + 1
+            running['peak'] = max(running['peak'], running['total'])
+            running['host_peak'] = max(running['host_peak'], running['hosts'][host])
+        time.sleep(0.05)
+        with lock:
+            running['total'] -= 1
+            running['hosts'][host] -= 1
+        return []
+
+    # Eight channels on one host ahead of two on another: the other host isn't starved
+    channels = make_channels(['cdn.example'] * 8 + ['other.example'] * 2)
+    engine = ExtractionEngine(max_workers=3, per_host=2)
+    job = engine.run('game', channels, resolve)
+    assert job.wait(timeout=5) == []
+    assert running['peak'] <= 3 and running['host_peak'] <= 2
+    assert engine.stats()['resolved'] == 10
+
+
+def test_deadline_skips_channels_not_started():
+    engine = ExtractionEngine(max_workers=1, per_host=1, deadline=0.25)
+    channels = make_channels(['a.example'] * 5)
+    job = engine.run('game', channels, lambda channel: time.sleep(0.1) or [stream_for(channel)])
+
+    started = time.time()
+    streams = job.wait()
+    assert time.time() - started < 0.4
+    assert 1 <= len(streams) < 5
+    deadline = time.time() + 2
+    while job.info()['pending'] and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.info()['skipped'] >= 1
+
+
+def test_fallback_when_no_channel_yields_a_stream():
+    engine = ExtractionEngine(max_workers=2)
+    fallback = {'url': 'https://cdn.example/playwright.m3u8', 'name': 'Browser'}
+    job = engine.run('game', make_channels(['a.example', 'b.example']), lambda channel: [],
+                     fallback=lambda: [fallback])
+    assert job.first(timeout=5) == [fallback]
+
+    done = engine.completed('hash', [fallback])
+    assert done.done and done.wait() == [fallback]
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("EXTRACTION ENGINE TEST")
+    print("=" * 80)
+    for test in (test_first_stream_returned_while_rest_resolve,
+                 test_worker_and_per_host_limits,
+                 test_deadline_skips_channels_not_started,
+                 test_fallback_when_no_channel_yields_a_stream):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test the HLS playlist model: master/variant parsing, segment keys and maps,
+and single-pass rewriting of URI lines and URI="..." attributes
+"""
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hls_playlist import Playlist, rewrite_playlist, parse_attributes, proxy_path
+
+MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="English",URI="audio/en.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aud"
+low/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720
+https://other.cdn/hi/index.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:4
+#EXT-X-MEDIA-SEQUENCE:100
+#EXT-X-MAP:URI="init.mp4"
+#EXT-X-KEY:METHOD=AES-128,URI="https://keys.example/k?id=1",IV=0x1
+#EXTINF:4.000,
+s100.m4s
+#EXT-X-DISCONTINUITY
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:3.5,live
+/abs/s101.m4s
+"""
+
+
+def test_parse_attributes_keeps_commas_inside_quotes():
+    attributes = parse_attributes('BANDWIDTH=1,CODECS="avc1,mp4a",URI="a.m3u8"')
+    assert attributes == {'BANDWIDTH': '1', 'CODECS': 'avc1,mp4a', 'URI': 'a.m3u8'}
+
+
+def test_master_playlist_variants_and_renditions():
+    playlist = Playlist.parse(MASTER, 'https://cdn.example/live/master.m3u8')
+    assert playlist.is_master
+    assert [(v.uri, v.bandwidth, v.resolution) for v in playlist.variants] == [
+        ('low/index.m3u8', 800000, '640x360'),
+        ('https://other.cdn/hi/index.m3u8', 2500000, '1280x720')]
+    assert playlist.variants[0].codecs == 'avc1.4d401e,mp4a.40.2'
+    assert playlist.media[0].uri == 'audio/en.m3u8'
+    assert not playlist.segments
+
+
+def test_media_playlist_segments_keys_and_maps():
+    playlist = Playlist.parse(MEDIA, 'https://cdn.example/live/v.m3u8')
+    assert not playlist.is_master
+    assert (playlist.version, playlist.target_duration, playlist.media_sequence) == (7, 4.0, 100)
+    first, second = playlist.segments
+    assert (first.sequence, first.duration, first.key.uri, first.map.uri) == (
+        100, 4.0, 'https://keys.example/k?id=1', 'init.mp4')
+    assert (second.sequence, second.duration, second.title) == (101, 3.5, 'live')
+    assert second.discontinuity and second.key is None
+
+
+def test_round_trip_is_lossless():
+    assert Playlist.parse(MEDIA).dumps() == MEDIA
+    assert Playlist.parse(MASTER).dumps() == MASTER
+
+
+def test_rewrite_covers_every_uri():
+    seen = []
+
+    def rewrite(url, kind):
+        seen.append((kind, url))
+        return proxy_path(url)
+
+    master = rewrite_playlist(MASTER, 'https://cdn.example/live/master.m3u8', rewrite)
+    media = rewrite_playlist(MEDIA, 'https://cdn.example/live/v.m3u8', rewrite)
+
+    assert seen == [
+        ('media', 'https://cdn.example/live/audio/en.m3u8'),
+        ('variant', 'https://cdn.example/live/low/index.m3u8'),
+        ('variant', 'https://other.cdn/hi/index.m3u8'),
+        ('map', 'https://cdn.example/live/init.mp4'),
+        ('key', 'https://keys.example/k?id=1'),
+        ('segment', 'https://cdn.example/live/s100.m4s'),
+        ('segment', 'https://cdn.example/abs/s101.m4s'),
+    ]
+    assert 'URI="/proxy/https%3A%2F%2Fkeys.example%2Fk%3Fid%3D1",IV=0x1' in media
+    assert 'CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aud"' in master
+    assert all(line.startswith('#') or line.startswith('/proxy/') or not line
+               for line in master.split('\n') + media.split('\n'))
+
+
+def test_empty_key_and_map_uris_are_left_alone():
+    content = ('#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXT-X-MAP:URI=""\n'
+               '#EXT-X-KEY:METHOD=AES-128,URI=""\n#EXTINF:6.0,\ns1.ts')
+    rewritten = rewrite_playlist(content, 'https://cdn.example/live/v.m3u8')
+    assert '#EXT-X-MAP:URI=""' in rewritten and 'METHOD=AES-128,URI=""' in rewritten
+    assert rewritten.endswith('/proxy/https%3A%2F%2Fcdn.example%2Flive%2Fs1.ts')
+
+
+def test_nested_playlists_route_by_kind():
+    master = rewrite_playlist(MASTER, 'https://cdn.example/live/master.m3u8')
+    media = rewrite_playlist(MEDIA, 'https://cdn.example/live/v.m3u8')
+
+    # Variants and renditions go to /playlist/ whatever their URL; segments and keys to /proxy/
+    assert 'URI="/playlist/https%3A%2F%2Fcdn.example%2Flive%2Faudio%2Fen.m3u8"' in master
+    assert '/playlist/https%3A%2F%2Fother.cdn%2Fhi%2Findex.m3u8' in master.split('\n')
+    assert not any(line.startswith('/proxy/') for line in master.split('\n'))
+    assert 'URI="/proxy/https%3A%2F%2Fkeys.example%2Fk%3Fid%3D1"' in media
+    assert not any(line.startswith('/playlist/') for line in media.split('\n'))
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("HLS PLAYLIST TEST")
+    print("=" * 80)
+    for test in (test_parse_attributes_keeps_commas_inside_quotes,
+                 test_master_playlist_variants_and_renditions,
+                 test_media_playlist_segments_keys_and_maps,
+                 test_round_trip_is_lossless,
+                 test_rewrite_covers_every_uri,
+                 test_empty_key_and_map_uris_are_left_alone,
+                 test_nested_playlists_route_by_kind):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the key / init-segment cache: one fetch per URI across clients and
+playlist reloads, rotation, expiry, and uncached failures
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from key_cache import KeyCache
+
+
+def test_clients_share_one_fetch_per_key_rotation():
+    cache = KeyCache()
+    calls = []
+
+    def fetch(url):
+        calls.append(url)
+        time.sleep(0.05)  # Slow key server so clients pile up
+        return b'0123456789abcdef', 'application/octet-stream'
+
+    def client(reloads):
+        for reload in range(reloads):
+            # Key rotates every 5 playlist reloads
+            entry, _ = cache.get(f'https://keys.example/key/{reload // 5}', fetch)
+            assert entry.body == b'0123456789abcdef'
+
+    threads = [threading.Thread(target=client, args=(10,)) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(calls) == ['https://keys.example/key/0', 'https://keys.example/key/1']
+    assert cache.stats()['hits'] == 20 * 10 - 2
+
+
+def test_expiry_and_failures():
+    cache = KeyCache(ttl=0.1)
+    cache.get('init.mp4', lambda url: (b'ftyp', 'video/mp4'))
+    assert cache.get('init.mp4', lambda url: (b'moov', 'video/mp4'))[1] == 'HIT'
+    time.sleep(0.15)
+    entry, state = cache.get('init.mp4', lambda url: (b'moov', 'video/mp4'))
+    assert state == 'MISS' and entry.body == b'moov'
+
+    def failing(url):
+        raise Exception('HTTP 403')
+
+    try:
+        cache.get('bad.key', failing)
+        assert False, 'expected the fetch error to propagate'
+    except Exception as e:
+        assert 'HTTP 403' in str(e)
+    assert cache.get('bad.key', lambda url: (b'k' * 16, 'application/octet-stream'))[1] == 'MISS'
+
+
+def test_lru_bound():
+    cache = KeyCache(max_entries=3)
+    for i in range(5):
+        cache.get(f'key{i}', lambda url: (url.encode(), 'application/octet-stream'))
+    assert cache.stats()['entries'] == 3
+    assert cache.get('key0', lambda url: (b'new', 'application/octet-stream'))[1] == 'MISS'
+    assert cache.get('key4', lambda url: (b'new', 'application/octet-stream'))[1] == 'HIT'
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("KEY CACHE TEST")
+    print("=" * 80)
+    for test in (test_clients_share_one_fetch_per_key_rotation,
+                 test_expiry_and_failures,
+                 test_lru_bound):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test the shared .m3u8 scanner: ranking, deduplication, &amp; and JSON
+unescaping, relative URLs, and the JavaScript false-positive filter
+"""
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from m3u8_scan import find_m3u8, scan_m3u8, RANK_PLAYER, RANK_QUOTED, RANK_BARE
+
+PLAYER_PAGE = r"""<html><head><script src="/js/clappr.min.js"></script></head><body>
+<a href="https://ads.example/promo.m3u8">promo</a>
+<script>
+var backup = "https://edge2.cdn.example/live/backup.m3u8?token=abc&amp;expires=1900000000";
+var player = new Clappr.Player({source: "https://edge1.cdn.example/live/index.m3u8?token=abc", parentId: "#p"});
+hls.loadSource('/hls/relative.m3u8');
+var cfg = {"file":"https:\/\/json.cdn.example\/live\/escaped.m3u8"};
+var u = "https://" + host + ".m3u8";
+function build(a){return a.slice(0,3)+".m3u8"}
+</script>
+Mirror: https://mirror.example/live/bare.m3u8 (or //proto.example/relative-scheme.m3u8)
+<p>player.setup({file: "https://edge1.cdn.example/live/index.m3u8?token=abc"})</p>
+</body></html>"""
+
+
+def test_ranked_and_deduplicated():
+    ranked = scan_m3u8(PLAYER_PAGE, base_url='https://player.example/embed/1')
+    assert ranked == [
+        (RANK_PLAYER, 'https://edge1.cdn.example/live/index.m3u8?token=abc'),
+        (RANK_PLAYER, 'https://player.example/hls/relative.m3u8'),
+        (RANK_PLAYER, 'https://json.cdn.example/live/escaped.m3u8'),
+        (RANK_QUOTED, 'https://ads.example/promo.m3u8'),
+        (RANK_QUOTED, 'https://edge2.cdn.example/live/backup.m3u8?token=abc&expires=1900000000'),
+        (RANK_BARE, 'https://mirror.example/live/bare.m3u8'),
+        (RANK_BARE, 'https://proto.example/relative-scheme.m3u8'),
+    ]
+
+
+def test_relative_urls_need_a_base():
+    assert 'https://player.example/hls/relative.m3u8' not in find_m3u8(PLAYER_PAGE)
+    assert find_m3u8(PLAYER_PAGE, limit=1) == ['https://edge1.cdn.example/live/index.m3u8?token=abc']
+
+
+def test_false_positives_and_empty_text():
+    assert find_m3u8('') == [] and find_m3u8(None) == []
+    assert find_m3u8('<p>no playlists here, only .ts segments</p>') == []
+    # A URL pattern running across JavaScript, and an over-long match
+    assert find_m3u8('x = "https://a.example/" + function(){return 1}() + "/live.m3u8"') == []
+    assert find_m3u8('https://a.example/' + 'a' * 600 + '.m3u8') == []
+    # Unquoted attribute values are found, without the attribute name
+    assert find_m3u8('<source src=https://b.example/v.m3u8?x=1>') == ['https://b.example/v.m3u8?x=1']
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("M3U8 SCAN TEST")
+    print("=" * 80)
+    for test in (test_ranked_and_deduplicated,
+                 test_relative_urls_need_a_base,
+                 test_false_positives_and_empty_text):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test the page cache: per-URL TTLs, revalidation with ETag / Last-Modified,
+reusing what was parsed from an unchanged body, stale copies when the origin
+fails, and the on-disk tier
+"""
+import sys
+import os
+import shutil
+import tempfile
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_cache import PageCache, PageError
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = headers or {}
+
+
+class FakeOrigin:
+    """Serves one page body, answering conditional requests like a real server"""
+
+    def __init__(self, body, etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+        self.fail = None
+
+    def __call__(self, url, headers):
+        self.requests.append(dict(headers))
+        if self.fail is not None:
+            if isinstance(self.fail, Exception):
+                raise self.fail
+            return FakeResponse(self.fail)
+        if self.etag and headers.get('If-None-Match') == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.body, {'ETag': self.etag} if self.etag else {})
+
+
+def test_ttl_per_url():
+    cache = PageCache(ttls=[(r'/eventinfo/', 0), (r'/allupcomingsports/', 60)], default_ttl=30)
+    assert cache.ttl_for('https://livetv.sx/enx/eventinfo/1_a/') == 0
+    assert cache.ttl_for('https://livetv.sx/enx/allupcomingsports/27/') == 60
+    assert cache.ttl_for('https://rojadirectame.eu/football') == 30
+
+    origin = FakeOrigin('<a href="/enx/eventinfo/1">A vs B</a>')
+    listing = 'https://livetv.sx/enx/allupcomingsports/27/'
+    first = cache.get(listing, origin)
+    assert cache.get(listing, origin) is first
+    assert len(origin.requests) == 1 and cache.stats()['hits'] == 1
+
+    event = 'https://livetv.sx/enx/eventinfo/1_a/'
+    cache.get(event, origin)
+    cache.get(event, origin)
+    assert len(origin.requests) == 3
+
+
+def test_revalidation_keeps_parsed_result():
+    cache = PageCache(default_ttl=0)
+    origin = FakeOrigin('<html>listing</html>')
+    url = 'https://livetv.sx/enx/'
+    parses = []
+    parse = lambda text: parses.append(text) or text.upper()
+
+    page = cache.get(url, origin)
+    assert page.parsed('soup', parse) == '<HTML>LISTING</HTML>'
+
+    # 304: same entry, nothing parsed again
+    assert cache.get(url, origin) is page
+    assert origin.requests[-1] == {'If-None-Match': '"v1"'}
+    assert page.parsed('soup', parse) == '<HTML>LISTING</HTML>'
+
+    # A server without validators resends the same body: still not parsed again
+    origin.etag = None
+    assert cache.get(url, origin) is page
+    page.parsed('soup', parse)
+    assert len(parses) == 1
+
+    origin.body = '<html>new game</html>'
+    changed = cache.get(url, origin)
+    assert changed is not page and changed.parsed('soup', parse) == '<HTML>NEW GAME</HTML>'
+    stats = cache.stats()
+    assert (stats['revalidated'], stats['unchanged'], stats['changed']) == (1, 1, 2)
+
+
+def test_errors_and_stale_copies():
+    cache = PageCache(default_ttl=0)
+    origin = FakeOrigin('<html>ok</html>')
+    url = 'https://rojadirectame.eu/football'
+
+    origin.fail = 404
+    missing = cache.get(url, origin)
+    assert missing.status_code == 404 and cache.peek(url) is None
+    try:
+        missing.raise_for_status()
+        assert False, "a 404 should raise"
+    except PageError as e:
+        assert e.status_code == 404
+
+    origin.fail = None
+    page = cache.get(url, origin)
+    origin.fail = ConnectionError('timed out')
+    assert cache.get(url, origin) is page
+    origin.fail = 503
+    assert cache.get(url, origin) is page
+    assert cache.stats()['stale_served'] == 2
+
+
+def test_disk_tier_survives_restart():
+    directory = tempfile.mkdtemp()
+    try:
+        url = 'https://livetv.sx/enx/eventinfo/1_a/'
+        origin = FakeOrigin('<html>event</html>')
+        PageCache(default_ttl=60, directory=directory).get(url, origin)
+
+        # A new process finds the page on disk, fresh: no request at all
+        restarted = PageCache(default_ttl=60, directory=directory)
+        assert restarted.get(url, origin).text == '<html>event</html>'
+        assert len(origin.requests) == 1 and restarted.stats()['disk_hits'] == 1
+
+        # Once its TTL is up, the disk copy's ETag is used to revalidate
+        time.sleep(0.01)
+        expired = PageCache(default_ttl=0.001, directory=directory)
+        assert expired.get(url, origin).text == '<html>event</html>'
+        assert origin.requests[-1] == {'If-None-Match': '"v1"'}
+        assert expired.stats()['revalidated'] == 1
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("PAGE CACHE TEST")
+    print("=" * 80)
+    for test in (test_ttl_per_url,
+                 test_revalidation_keeps_parsed_result,
+                 test_errors_and_stale_copies,
+                 test_disk_tier_survives_restart):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test the single-pass page scanner against what the BeautifulSoup passes it
+replaced found on a LiveTV-style event page
+"""
+import sys
+import os
+import re
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from page_scan import scan_page, SELECTOLAX_AVAILABLE
+
+EVENT_PAGE = """<html><head>
+<script src="/js/jquery.js"></script>
+<script>var channels = [2661185, 2867208]; if (a < b) { document.write('<a href="x">'); }</script>
+<style>a { color: red }</style>
+</head><body>
+<div id="links">
+  <a href="//cdn.livetv869.me/webplayer.php?t=ifr&amp;c=2661185&amp;eid=1">
+    <img src="flag.png"> <b>Channel</b> 1 </a>
+  <a href="/enx/eventinfo/2/">Other game</a>
+  <a href="#" onclick="openWin('//cdn.livetv869.me/webplayer.php?c=2867208')">Popup</a>
+</div>
+<div id="hidden_links" style="display:none">
+  <div><p>Kbps<a href="//cdn.livetv869.me/webplayer.php?c=3000001">Hidden &amp; HD</a></p></div>
+  <br>
+  <a href="https://player.example/live/1.php">Player</a>
+</div>
+<a href="https://after.example/watch">After hidden</a>
+<a name="anchor-without-href">no href</a>
+<iframe src="//embed.example/stream/1"></iframe>
+<iframe></iframe>
+<iframe src="https://ads.example/banner"/>
+<script>player.setup({file: "https://cdn.example/hls/live.m3u8?token=a&amp;b=1"})</script>
+</body></html>"""
+
+
+def soup_view(html):
+    """What the extractors read from BeautifulSoup before the scanner"""
+    soup = BeautifulSoup(html, 'html.parser')
+    hidden = re.compile(r'hidden', re.I)
+    links = [{'href': a.get('href', ''), 'text': a.get_text(strip=True), 'onclick': a.get('onclick', ''),
+              'hidden': a.find_parent(id=hidden) is not None} for a in soup.find_all('a', href=True)]
+    return {
+        'links': links,
+        'iframes': [iframe.get('src', '') for iframe in soup.find_all('iframe')],
+        'scripts': [script['src'] for script in soup.find_all('script', src=True)],
+        'hidden_containers': len(soup.find_all(id=hidden))
+    }
+
+
+def test_scan_matches_soup_passes():
+    scan = scan_page(EVENT_PAGE, backend='stdlib')
+    expected = soup_view(EVENT_PAGE)
+    assert scan.links == expected['links']
+    assert scan.iframes == expected['iframes']
+    assert scan.scripts == expected['scripts']
+    assert scan.hidden_containers == expected['hidden_containers'] == 1
+
+
+def test_scan_details():
+    scan = scan_page(EVENT_PAGE, backend='stdlib')
+    first = scan.links[0]
+    assert first['href'] == '//cdn.livetv869.me/webplayer.php?t=ifr&c=2661185&eid=1'
+    assert first['text'] == 'Channel1' and not first['hidden']
+    assert [link['text'] for link in scan.links if link['hidden']] == ['Hidden & HD', 'Player']
+    assert 'openWin' in scan.links[2]['onclick']
+    # The <a> written by the inline script isn't a link
+    assert 'x' not in [link['href'] for link in scan.links]
+    assert scan.iframe_sources() == ['//embed.example/stream/1', 'https://ads.example/banner']
+    assert scan.m3u8 == ['https://cdn.example/hls/live.m3u8?token=a&b=1']
+
+
+def test_void_hidden_elements_hide_nothing():
+    html = """<form><input type="hidden" id="hidden_ids" value="1,2">
+<img id="hiddenimg" src="pixel.gif"><br id="hidden-break"></form>
+<a href="https://player.example/live/1.php">Player</a>
+<div id="hidden"><a href="https://player.example/live/2.php">Hidden</a></div>
+<a href="https://player.example/live/3.php">After</a>"""
+    scan = scan_page(html, backend='stdlib')
+    assert [link['hidden'] for link in scan.links] == [False, True, False]
+    assert scan.links == soup_view(html)['links'] and scan.hidden_containers == 4
+
+
+def test_backends_agree():
+    if not SELECTOLAX_AVAILABLE:
+        print("  (selectolax not installed, skipped)")
+        return
+    for html in (EVENT_PAGE.replace('<iframe src="https://ads.example/banner"/>',
+                                    '<iframe src="https://ads.example/banner"></iframe>'),
+                 '<input id="hidden_ids"><a href="/1">One</a><div id="hidden"><a href="/2">Two</a></div>'):
+        fast, stdlib = scan_page(html, backend='selectolax'), scan_page(html, backend='stdlib')
+        assert fast.links == stdlib.links
+        assert fast.iframes == stdlib.iframes and fast.scripts == stdlib.scripts
+        assert fast.hidden_containers == stdlib.hidden_containers
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("PAGE SCAN TEST")
+    print("=" * 80)
+    for test in (test_scan_matches_soup_passes,
+                 test_scan_details,
+                 test_void_hidden_elements_hide_nothing,
+                 test_backends_agree):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the rewritten-playlist cache: one upstream fetch per freshness window,
+ETags that change only when the playlist does
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist_cache import PlaylistCache, parse_part_target, parse_target_duration
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:{target}
+#EXT-X-MEDIA-SEQUENCE:{sequence}
+#EXTINF:2.0,
+/proxy/seg{sequence}.ts
+"""
+
+
+def test_parse_target_duration():
+    assert parse_target_duration(PLAYLIST.format(target=4, sequence=1)) == 4
+    assert parse_target_duration('#EXTM3U\n', default=6) == 6
+    assert parse_part_target('#EXTM3U\n#EXT-X-PART-INF:PART-TARGET=1.004\n') == 1.004
+    assert parse_part_target(PLAYLIST.format(target=4, sequence=1)) is None
+
+
+def test_concurrent_pollers_share_one_fetch():
+    cache = PlaylistCache()
+    calls = []
+
+    def fetch(url):
+        calls.append(url)
+        time.sleep(0.1)  # Slow upstream so pollers pile up
+        return PLAYLIST.format(target=6, sequence=100)
+
+    entries = []
+    threads = [threading.Thread(target=lambda: entries.append(cache.get('u', fetch)))
+               for _ in range(25)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len({e.etag for e in entries}) == 1
+
+
+def test_refetch_after_half_target_duration():
+    cache = PlaylistCache()
+    sequence = [100]
+
+    def fetch(url):
+        return PLAYLIST.format(target=0.2, sequence=sequence[0])
+
+    first = cache.get('u', fetch)
+    assert cache.get('u', fetch) is first  # Still fresh
+
+    time.sleep(0.15)  # Past half of the 0.2 s target duration
+    sequence[0] = 101
+    second = cache.get('u', fetch)
+    assert second is not first and second.etag != first.etag
+    assert cache.stats()['refreshes'] == 2
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("PLAYLIST CACHE TEST")
+    print("=" * 80)
+    for test in (test_parse_target_duration,
+                 test_concurrent_pollers_share_one_fetch,
+                 test_refetch_after_half_target_duration):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test the learned per-host referer cache against a local server that only
+accepts one of the known referers
+"""
+import sys
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import upstream_client
+from referer_cache import RefererCache, REFERERS_TO_TRY
+
+
+class _PickyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    accepted_referer = REFERERS_TO_TRY[3]
+    hits = 0
+
+    def do_GET(self):
+        _PickyHandler.hits += 1
+        if '/slow/' in self.path:
+            time.sleep(1)
+        ok = self.headers.get('Referer') == _PickyHandler.accepted_referer
+        body = b'#EXTM3U\n' if ok else b'forbidden'
+        self.send_response(200 if ok else 403)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _PickyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_learns_and_persists_referer():
+    server = _start_server()
+    db_file = tempfile.mktemp(suffix='.db')
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/hls/stream.m3u8"
+        _PickyHandler.accepted_referer = REFERERS_TO_TRY[3]
+
+        cache = RefererCache(db_file)
+        _PickyHandler.hits = 0
+        response, error = cache.fetch(url)
+        assert response.status_code == 200 and error is None
+        assert _PickyHandler.hits == 4  # First request walks the whole list
+
+        _PickyHandler.hits = 0
+        for _ in range(5):
+            response, _ = cache.fetch(url.replace('stream.m3u8', 'seg1.ts'))
+            assert response.status_code == 200
+        assert _PickyHandler.hits == 5  # Steady state: one request per segment
+
+        restarted = RefererCache(db_file)
+        assert restarted.load() == 1
+        assert restarted.get(url) == REFERERS_TO_TRY[3]
+    finally:
+        server.shutdown()
+        if os.path.exists(db_file):
+            os.remove(db_file)
+
+
+def test_403_invalidates_learned_referer():
+    server = _start_server()
+    db_file = tempfile.mktemp(suffix='.db')
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/hls/stream.m3u8"
+        cache = RefererCache(db_file)
+        _PickyHandler.accepted_referer = REFERERS_TO_TRY[3]
+        cache.fetch(url)
+
+        # Upstream changes which referer it accepts
+        _PickyHandler.accepted_referer = REFERERS_TO_TRY[1]
+        response, _ = cache.fetch(url)
+        assert response.status_code == 200
+        assert cache.get(url) == REFERERS_TO_TRY[1]
+
+        restarted = RefererCache(db_file)
+        restarted.load()
+        assert restarted.get(url) == REFERERS_TO_TRY[1]
+    finally:
+        server.shutdown()
+        if os.path.exists(db_file):
+            os.remove(db_file)
+
+
+def test_fetch_uses_configured_timeouts():
+    server = _start_server()
+    previous = upstream_client.READ_TIMEOUT
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/slow/stream.m3u8"
+        upstream_client.configure(read_timeout=0.2)
+        started = time.time()
+        response, error = RefererCache().fetch(url, hints=[REFERERS_TO_TRY[3]])
+        # Every candidate gave up after the configured read timeout, not a hard-coded 10s
+        assert response is None and error is not None
+        assert time.time() - started < 0.2 * len(REFERERS_TO_TRY) + 1
+    finally:
+        upstream_client.configure(read_timeout=previous)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("LEARNED REFERER CACHE TEST")
+    print("=" * 80)
+    for test in (test_learns_and_persists_referer, test_403_invalidates_learned_referer,
+                 test_fetch_uses_configured_timeouts):
+        test()
+        print(f"✓ {test.__name__}")
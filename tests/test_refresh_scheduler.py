@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the token-expiry refresh scheduler: expiry parsing, deadline planning,
+learned host lifetimes, and the timer heap running many streams in order
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from refresh_scheduler import RefreshScheduler, parse_expiry
+
+
+def test_parse_expiry():
+    now = 1762700000
+    assert parse_expiry('https://d15.example.com:999/hls/x.m3u8?md5=41cH&expires=1762721841', now) == 1762721841
+    assert parse_expiry('https://cdn.example/index.m3u8?st=abc&e=1762703600', now) == 1762703600
+    assert parse_expiry('https://cdn.example/index.m3u8?exp=1762703600000', now) == 1762703600
+    assert parse_expiry('https://cdn.example/i.m3u8?hdnts=st=1762700000~exp=1762703600~hmac=ab', now) == 1762703600
+    # Missing, or numbers that aren't plausible deadlines
+    assert parse_expiry('https://cdn.example/index.m3u8?token=abc', now) is None
+    assert parse_expiry('https://cdn.example/index.m3u8?e=42', now) is None
+
+
+def test_deadline_from_expiry_then_learned_lifetime():
+    scheduler = RefreshScheduler(margin=120, default_lifetime=3600)
+    now = time.time()
+    job = scheduler.schedule('a', f'https://cdn.example/a.m3u8?expires={int(now) + 1200}', lambda key: None)
+    assert job.basis == 'expires'
+    assert abs(job.due - (now + 1200 - 120)) < 2
+
+    # Same host, URL without an expiry: use what the last one said
+    job = scheduler.schedule('b', 'https://cdn.example/b.m3u8', lambda key: None)
+    assert job.basis == 'learned' and abs(job.due - (now + 1200 - 120)) < 2
+
+    job = scheduler.schedule('c', 'https://other.example/c.m3u8', lambda key: None)
+    assert job.basis == 'default' and abs(job.due - (now + 3600)) < 2
+
+    # A 403 teaches the host's real lifetime and makes the stream due now
+    scheduler.min_delay = 0
+    assert scheduler.report_expired('c')
+    assert scheduler.job('c').due <= time.time()
+    assert 'other.example' in scheduler.stats()['learned_lifetimes']
+
+
+def test_timer_heap_runs_streams_in_deadline_order():
+    scheduler = RefreshScheduler(margin=0, min_delay=0.05, max_workers=2)
+    ran = []
+    done = threading.Event()
+
+    def refresh(key):
+        ran.append(key)
+        if len(ran) == 4:
+            done.set()
+        return None if key == 'flaky' else f'https://other.example/{key}.m3u8?fresh=1'
+
+    now = time.time()
+    scheduler.start()
+    for key, lifetime in (('late', 0.6), ('early', 0.2), ('middle', 0.4)):
+        scheduler.schedule(key, f'https://cdn.example/{key}.m3u8?expires={now + lifetime}', refresh)
+    scheduler.schedule('gone', f'https://cdn.example/gone.m3u8?expires={now + 0.3}', refresh)
+    scheduler.cancel('gone')
+    scheduler.schedule('flaky', f'https://cdn.example/flaky.m3u8?expires={now + 0.8}', refresh)
+
+    assert done.wait(5)
+    scheduler.stop()
+    assert ran == ['early', 'middle', 'late', 'flaky']
+    assert scheduler.job('early').refreshes == 1
+    assert scheduler.job('early').basis == 'default'  # Fresh URL carries no expiry
+    assert scheduler.job('flaky').failures == 1
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("REFRESH SCHEDULER TEST")
+    print("=" * 80)
+    for test in (test_parse_expiry,
+                 test_deadline_from_expiry_then_learned_lifetime,
+                 test_timer_heap_runs_streams_in_deadline_order):
+        test()
+        print(f"✓ {test.__name__}")
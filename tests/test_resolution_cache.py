@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test the extraction result cache: streams kept per event and channel across
+restarts, revalidated before reuse, dropped at token expiry, and used by the
+source registry instead of resolving a channel again
+"""
+import sys
+import os
+import shutil
+import tempfile
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_engine import ExtractionEngine
+from resolution_cache import ResolutionCache, DEFAULT_TTL
+from source_adapters import SourceRegistry
+
+EVENT = 'https://livetv.sx/enx/eventinfo/1_a_b/'
+
+
+def stream(n, expires=None):
+    url = f'https://edge{n}.cdn.example/live/{n}.m3u8'
+    if expires:
+        url += f'?md5=abc&expires={int(expires)}'
+    return {'url': url, 'name': f'Channel {n}', 'source_url': f'https://player.example/{n}'}
+
+
+def channel(n):
+    return {'url': f'https://player.example/{n}', 'name': f'Channel {n}'}
+
+
+def test_streams_survive_a_restart():
+    directory = tempfile.mkdtemp()
+    try:
+        db_file = os.path.join(directory, 'streams.db')
+        cache = ResolutionCache(db_file, referer=lambda url: 'https://exposestrat.com/')
+        assert cache.event_streams(EVENT) is None
+        cache.store(EVENT, channel(2), [stream(2)], index=1)
+        live = stream(1, time.time() + 3600)
+        cache.store(EVENT, channel(1), [live], index=0)
+        assert [s['name'] for s in cache.event_streams(EVENT)] == ['Channel 1', 'Channel 2']
+
+        checked = []
+        restarted = ResolutionCache(db_file, validate=lambda url, referer: checked.append((url, referer)) or True)
+        streams = restarted.event_streams(EVENT)
+        assert [s['url'] for s in streams] == [live['url'], stream(2)['url']]
+        # Only the stream handed out first is checked, with the stored referer
+        assert checked == [(live['url'], 'https://exposestrat.com/')]
+        assert restarted.channel_streams(EVENT, channel(2))[0]['url'] == stream(2)['url']
+        # A second load within REVALIDATE_AFTER doesn't GET again
+        restarted.event_streams(EVENT)
+        assert len(checked) == 2 and restarted.stats()['event_hits'] == 2
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_dead_and_expired_streams_are_dropped():
+    directory = tempfile.mkdtemp()
+    try:
+        db_file = os.path.join(directory, 'streams.db')
+        dead = stream(1)['url']
+        cache = ResolutionCache(db_file, validate=lambda url, referer: url != dead, revalidate_after=0)
+        cache.store(EVENT, channel(1), [stream(1)], index=0)
+        cache.store(EVENT, channel(2), [stream(2)], index=1)
+        # Channel 1's playlist no longer answers: the next channel goes first
+        assert [s['name'] for s in cache.event_streams(EVENT)] == ['Channel 2']
+        assert cache.channel_streams(EVENT, channel(1)) is None
+        assert ResolutionCache(db_file).channel_streams(EVENT, channel(1)) is None
+
+        # A token about to expire isn't reused; one without expiry lasts DEFAULT_TTL
+        cache.store(EVENT, channel(3), [stream(3, time.time() + 60)], index=2)
+        assert cache.channel_streams(EVENT, channel(3)) is None
+        cache.store(EVENT, channel(4), [stream(4)], index=3)
+        expires_at = cache._entries(EVENT)[channel(4)['url']]['expires_at']
+        assert abs(expires_at - (time.time() + DEFAULT_TTL)) < 5
+
+        cache.invalidate(EVENT)
+        assert cache.event_streams(EVENT) is None and ResolutionCache(db_file).event_streams(EVENT) is None
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_registry_reuses_resolved_channels():
+    resolved = []
+
+    def resolve(ch, event_url):
+        resolved.append(ch['url'])
+        return [stream(int(ch['url'].rsplit('/', 1)[1]))]
+
+    cache = ResolutionCache()
+    registry = SourceRegistry.from_sources(
+        ExtractionEngine(), [{'name': 'LiveTV.sx', 'base_url': 'https://livetv.sx'}],
+        {'LiveTV.sx': {'list_channels': lambda event_url: [channel(1), channel(2)], 'resolve': resolve}},
+        cache=cache)
+    first = registry.extract(EVENT).wait()
+    assert sorted(resolved) == [channel(1)['url'], channel(2)['url']]
+    # Listed again, but neither channel is resolved again
+    again = registry.extract(EVENT).wait()
+    assert [s['url'] for s in again] == [s['url'] for s in first] and len(resolved) == 2
+    assert cache.stats()['channel_hits'] == 2
+    # A refresh resolves every channel again (new tokens) and stores the results
+    registry.extract(EVENT, fresh=True).wait()
+    assert len(resolved) == 4 and cache.stats()['stored'] == 4
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("RESOLUTION CACHE TEST")
+    print("=" * 80)
+    for test in (test_streams_survive_a_restart,
+                 test_dead_and_expired_streams_are_dropped,
+                 test_registry_reuses_resolved_channels):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test the shared segment cache: single-flight fetches, byte budget and TTL
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import segment_cache
+from segment_cache import SegmentCache
+
+
+class _FakeResponse:
+    """Streamed upstream response that trickles its body out slowly"""
+
+    def __init__(self, body, status_code=200, delay=0.0):
+        self.body = body
+        self.status_code = status_code
+        self.delay = delay
+        self.headers = {'Content-Type': 'video/mp2t', 'Content-Length': str(len(body))}
+        self.raw = self
+        self._position = 0
+
+    def read(self, amt=None, decode_content=True):
+        # Trickle out 1000 bytes per read whatever amt asks for
+        time.sleep(self.delay)
+        chunk = self.body[self._position:self._position + 1000]
+        self._position += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = SegmentCache(max_bytes=1024 * 1024)
+    calls = []
+    body = bytes(range(256)) * 40
+
+    def fetch(url):
+        calls.append(url)
+        return _FakeResponse(body, delay=0.01)
+
+    results = []
+
+    def viewer():
+        entry, _ = cache.get_or_fetch('https://cdn.example/seg1.ts', fetch)
+        assert entry.wait_headers()
+        results.append(b''.join(entry.iter_chunks()))
+
+    threads = [threading.Thread(target=viewer) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 20 and all(r == body for r in results)
+
+    entry, state = cache.get_or_fetch('https://cdn.example/seg1.ts', fetch)
+    assert state == 'HIT' and len(calls) == 1
+    assert cache.stats()['bytes'] == len(body)
+
+
+def test_lru_eviction_under_byte_budget():
+    cache = SegmentCache(max_bytes=25000)
+
+    def fetch(url):
+        return _FakeResponse(b'x' * 10000)
+
+    for i in range(3):
+        entry, _ = cache.get_or_fetch(f'seg{i}.ts', fetch)
+        b''.join(entry.iter_chunks())
+        time.sleep(0.05)  # Let the fill thread account the entry
+        if i == 1:
+            cache.get_or_fetch('seg0.ts', fetch)  # Touch seg0 so seg1 is least recent
+
+    stats = cache.stats()
+    assert stats['bytes'] <= 25000
+    assert cache.get_or_fetch('seg0.ts', fetch)[1] == 'HIT'
+    assert cache.get_or_fetch('seg1.ts', fetch)[1] == 'MISS'
+
+
+def test_ttl_follows_target_duration_and_failures_are_not_cached():
+    cache = SegmentCache()
+    cache.set_target_duration(2)
+    assert cache.ttl == 2 * segment_cache.TTL_TARGET_DURATIONS
+
+    entry, _ = cache.get_or_fetch('bad.ts', lambda url: _FakeResponse(b'', status_code=403))
+    assert entry.wait_headers() and entry.status_code == 403
+    list(entry.iter_chunks())
+    time.sleep(0.05)
+    assert cache.get_or_fetch('bad.ts', lambda url: _FakeResponse(b'ok'))[1] == 'MISS'
+
+
+def test_byte_ranges_from_cached_and_in_flight_entries():
+    cache = SegmentCache()
+    body = bytes(range(256)) * 40
+
+    entry, _ = cache.get_or_fetch('seg.ts', lambda url: _FakeResponse(body, delay=0.01))
+    assert entry.wait_headers() and entry.content_length == len(body)
+    # Read a range while the body is still trickling in, then again once complete
+    assert b''.join(entry.iter_range(2500, 7001)) == body[2500:7001]
+    assert entry.wait_complete()
+    assert b''.join(entry.iter_range(9000)) == body[9000:]
+
+    # Whole chunks come back as the cached objects themselves, not copies
+    chunks = list(entry.iter_range())
+    assert b''.join(chunks) == body
+    assert all(a is b for a, b in zip(chunks, entry._chunks))
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("SEGMENT CACHE TEST")
+    print("=" * 80)
+    for test in (test_concurrent_misses_share_one_fetch,
+                 test_lru_eviction_under_byte_budget,
+                 test_ttl_follows_target_duration_and_failures_are_not_cached,
+                 test_byte_ranges_from_cached_and_in_flight_entries):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test the source adapter registry: picking the adapter for a game URL,
+retrying failed steps, searching sources in parallel within their time
+budgets, and extracting through the engine with a per-source limit
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_engine import ExtractionEngine
+from resolution_cache import ResolutionCache
+from source_adapters import SourceAdapter, SourceRegistry
+
+SOURCES = [
+    {'name': 'Fast', 'base_url': 'https://fast.example', 'enabled': True, 'priority': 0, 'time_budget': 1},
+    {'name': 'Slow', 'base_url': 'https://slow.example', 'enabled': True, 'priority': 1, 'time_budget': 0.2},
+    {'name': 'Off', 'base_url': 'https://off.example', 'enabled': False, 'priority': 2},
+    {'name': 'Listed', 'base_url': 'https://listed.example', 'enabled': True, 'priority': 3},
+]
+
+
+def make_registry(implementations, engine=None):
+    return SourceRegistry.from_sources(engine or ExtractionEngine(), SOURCES, implementations, default='Fast')
+
+
+def test_adapter_for_url_by_most_specific_domain():
+    step = lambda *args: []
+    registry = make_registry({
+        'Fast': {'list_channels': step, 'resolve': step, 'domains': ('livetv',)},
+        'Slow': {'list_channels': step, 'resolve': step, 'domains': ('livetv872',)},
+        'Off': {'list_channels': step, 'resolve': step, 'domains': ('off.example',)},
+    })
+    assert registry.for_url('https://livetv872.me/enx/eventinfo/1').name == 'Slow'
+    assert registry.for_url('https://livetv.sx/enx/eventinfo/1').name == 'Fast'
+    # Disabled sources and sources without an extractor don't claim URLs
+    assert registry.for_url('https://off.example/game').name == 'Fast'
+    assert registry.for_url('https://listed.example/game').name == 'Fast'
+    assert [a.name for a in registry.adapters()] == ['Fast', 'Slow', 'Listed']
+
+
+def test_failed_steps_are_retried():
+    calls = []
+
+    def flaky(keywords):
+        calls.append(keywords)
+        if len(calls) == 1:
+            raise Exception('HTTP 502')
+        return [{'title': 'A vs B', 'url': 'https://fast.example/a-b'}]
+
+    adapter = SourceAdapter(dict(SOURCES[0], retry_backoff=0.01), search=flaky, retries=1)
+    assert adapter.search('a')[0]['source'] == 'Fast'
+    assert adapter.retried == 1 and len(calls) == 2
+
+    broken = SourceAdapter(dict(SOURCES[0], retries=2, retry_backoff=0.01), search=lambda keywords: 1 / 0)
+    try:
+        broken.search('a')
+        assert False, "a step that keeps failing should raise"
+    except ZeroDivisionError:
+        pass
+    assert broken.retried == 2 and broken.failures == 1
+
+
+def test_slow_source_dropped_from_search():
+    release = threading.Event()
+
+    def slow(keywords):
+        release.wait(5)
+        return [{'title': 'late', 'url': 'https://slow.example/late'}]
+
+    registry = make_registry({
+        'Fast': {'search': lambda keywords: [{'title': keywords, 'url': 'https://fast.example/g'}]},
+        'Slow': {'search': slow},
+        'Off': {'search': lambda keywords: [{'title': 'off', 'url': 'https://off.example/g'}]},
+    })
+    started = time.time()
+    games = registry.search('patriots')
+    release.set()
+    assert time.time() - started < 0.5
+    assert [(g['title'], g['source']) for g in games] == [('patriots', 'Fast')]
+    assert registry.get('Slow').over_budget == 1
+
+
+def test_extract_limits_channels_per_source():
+    running = {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def resolve(channel, event_url):
+        with lock:
+            running['now'] += 1
+            running['peak'] = max(running['peak'], running['now'])
+        time.sleep(0.05)
+        with lock:
+            running['now'] -= 1
+        return [{'url': channel['url'] + '.m3u8', 'name': channel['name']}]
+
+    channels = [{'name': f'Ch{i}', 'url': f'https://host{i}.example/p'} for i in range(6)]
+    channels.append({'name': 'Direct', 'url': 'https://cdn.example/live.m3u8', 'resolved': True})
+    registry = make_registry({'Fast': {'list_channels': lambda url: channels, 'resolve': resolve,
+                                       'max_concurrency': 2}},
+                             engine=ExtractionEngine(max_workers=6))
+    streams = registry.extract('https://fast.example/game').wait(timeout=5)
+    assert len(streams) == 7 and streams[-1]['name'] == 'Direct'
+    assert running['peak'] == 2
+
+
+def test_resolve_one_channel_without_listing_the_page():
+    listed, resolved = [], []
+
+    def resolve(channel, event_url):
+        resolved.append(channel['url'])
+        return [{'url': f"{channel['url']}/{len(resolved)}.m3u8", 'name': channel['name']}]
+
+    cache = ResolutionCache()
+    registry = SourceRegistry.from_sources(ExtractionEngine(), SOURCES, {
+        'Fast': {'list_channels': lambda url: listed.append(url) or [], 'resolve': resolve}},
+        default='Fast', cache=cache)
+    game = 'https://fast.example/game'
+    cache.store(game, {'url': 'https://host0.example/p'}, [{'url': 'https://cdn.example/0.m3u8'}], index=0)
+    cache.store(game, {'url': 'https://host1.example/p'}, [{'url': 'https://cdn.example/1.m3u8'}], index=1)
+    channel = {'url': 'https://host1.example/p', 'name': 'Ch1'}
+
+    # Served from the cache, then a fresh token from that channel's page alone
+    assert registry.resolve(game, channel)[0]['url'] == 'https://cdn.example/1.m3u8' and not resolved
+    assert registry.resolve(game, channel, fresh=True)[0]['url'] == 'https://host1.example/p/1.m3u8'
+    assert resolved == ['https://host1.example/p'] and not listed
+    # Stored in the channel's place on the page
+    assert cache.channel_streams(game, channel)[0]['url'] == 'https://host1.example/p/1.m3u8'
+    assert [s['url'] for s in cache.event_streams(game)] == [
+        'https://cdn.example/0.m3u8', 'https://host1.example/p/1.m3u8']
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("SOURCE ADAPTERS TEST")
+    print("=" * 80)
+    for test in (test_adapter_for_url_by_most_specific_domain,
+                 test_failed_steps_are_retried,
+                 test_slow_source_dropped_from_search,
+                 test_extract_limits_channels_per_source,
+                 test_resolve_one_channel_without_listing_the_page):
+        test()
+        print(f"✓ {test.__name__}")
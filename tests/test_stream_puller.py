@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Test the per-stream pull loop: one playlist reload per tick whatever the
+number of viewers, each new segment started once into a bounded ring,
+wake-ups on channel switches, stopping when nobody watches, and holding
+blocking (LL-HLS) and long-poll playlist requests until the playlist advances
+"""
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist_cache import make_etag
+from segment_cache import SegmentEntry
+from stream_puller import StreamPuller, StreamPullers, advertise_blocking_reload
+
+
+def make_playlist(first, count=5):
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:2', f'#EXT-X-MEDIA-SEQUENCE:{first}']
+    for seq in range(first, first + count):
+        lines += ['#EXTINF:2.0,', f'/proxy/https%3A%2F%2Fcdn.example%2Fseg{seq}.ts']
+    return '\n'.join(lines) + '\n'
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.first = 100
+        self.reloads = 0
+        self.fetched = []
+
+    def pull(self):
+        self.reloads += 1
+        body = make_playlist(self.first)
+        return body, make_etag(body)
+
+    def fetch_segment(self, url):
+        self.fetched.append(url)
+        entry = SegmentEntry(url, 60)
+        entry.set_headers(503 if 'seg104' in url else 200, 'video/mp2t', 4)
+        entry.append(b'data')
+        entry.finish()
+        return entry
+
+
+def test_new_segments_pulled_once_into_bounded_ring():
+    upstream = FakeUpstream()
+    puller = StreamPuller('a', upstream.pull, upstream.fetch_segment, ring_size=4)
+
+    # First load: only the live edge
+    puller._update(*upstream.pull())
+    assert [u.rsplit('seg', 1)[1] for u in upstream.fetched] == ['102.ts', '103.ts', '104.ts']
+    assert puller.interval == 1.0
+
+    # Same playlist again: nothing new; then two new segments
+    puller._update(*upstream.pull())
+    upstream.first = 102
+    puller._update(*upstream.pull())
+    assert [u.rsplit('seg', 1)[1] for u in upstream.fetched][3:] == ['105.ts', '106.ts']
+    assert len(puller._ring) == 4
+    assert puller.segment('https://cdn.example/seg102.ts') is None  # Slid out of the ring
+    assert puller.segment('https://cdn.example/seg106.ts').body() == b'data'
+
+    # A failed download isn't served from the ring
+    assert puller.segment('https://cdn.example/seg104.ts') is None
+    assert 'https://cdn.example/seg104.ts' not in puller._ring
+    assert puller.playlist(timeout=0)[0] == advertise_blocking_reload(make_playlist(102))
+    assert '#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES' in puller.playlist(timeout=0)[0]
+
+
+def test_many_viewers_share_one_pull_loop():
+    upstream = FakeUpstream()
+    pullers = StreamPullers(upstream.fetch_segment, idle_timeout=5)
+    results = []
+
+    def viewer():
+        puller = pullers.get('game', upstream.pull)
+        results.append(puller.playlist(timeout=5))
+
+    threads = [threading.Thread(target=viewer) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pullers.started == 1
+    assert upstream.reloads == 1
+    assert all(result == results[0] for result in results)
+    assert pullers.segment('https://cdn.example/seg103.ts') is not None
+    assert pullers.segment('https://cdn.example/seg100.ts') is None
+
+    # A channel switch reloads right away instead of at the next tick
+    upstream.first = 101
+    pullers.reload('game')
+    deadline = time.time() + 2
+    while upstream.reloads < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert upstream.reloads == 2
+    pullers.stop()
+    assert pullers.stats()['running'] == 0
+
+
+def test_idle_puller_stops_and_restarts_on_demand():
+    upstream = FakeUpstream()
+    pullers = StreamPullers(upstream.fetch_segment, idle_timeout=0.2)
+    first = pullers.get('game', upstream.pull)
+    first.playlist(timeout=5)
+    time.sleep(0.3)
+    first.reload()  # Skip the rest of the reload interval so the idle check runs
+    deadline = time.time() + 2
+    while first.running and time.time() < deadline:
+        time.sleep(0.01)
+    assert not first.running
+
+    second = pullers.get('game', upstream.pull)
+    assert second is not first and second.running
+    assert pullers.started == 2
+    pullers.stop()
+
+
+def test_held_puller_runs_without_viewers():
+    upstream = FakeUpstream()
+    pullers = StreamPullers(upstream.fetch_segment, idle_timeout=0.1)
+    puller = pullers.hold('game', upstream.pull)
+    puller.playlist(timeout=5)
+    time.sleep(0.2)
+    puller.reload()
+    time.sleep(0.1)
+    assert puller.running and upstream.reloads == 2
+
+    pullers.release('game')
+    puller.reload()
+    deadline = time.time() + 2
+    while puller.running and time.time() < deadline:
+        time.sleep(0.01)
+    assert not puller.running
+
+
+def test_blocking_reload_waits_for_segment_or_part():
+    upstream = FakeUpstream()
+    puller = StreamPuller('a', upstream.pull, upstream.fetch_segment)
+    puller._update(*upstream.pull())                       # Lists 100..104
+    puller._ready.set()
+
+    # Already listed: answered right away; too far ahead: refused
+    assert puller.blocking_reload(104, timeout=5) == puller.playlist(timeout=0)
+    try:
+        puller.blocking_reload(107)
+        assert False, "waited for a segment too far ahead"
+    except ValueError:
+        pass
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(puller.blocking_reload(105, timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    assert not results
+    upstream.first = 101                                   # Now lists 105
+    puller._update(*upstream.pull())
+    waiter.join(2)
+    assert results and 'seg105.ts' in results[0][0]
+
+    # A part of the segment in progress wakes a part request
+    part_waiter = threading.Thread(target=lambda: results.append(puller.blocking_reload(106, 0, timeout=5)))
+    part_waiter.start()
+    time.sleep(0.1)
+    body = make_playlist(101) + '#EXT-X-PART:DURATION=0.5,URI="/proxy/part106.0.ts"\n'
+    puller._update(body, make_etag(body))
+    part_waiter.join(2)
+    assert len(results) == 2 and 'part106.0.ts' in results[1][0]
+
+    # Gives up after the timeout with whatever is current
+    started = time.time()
+    assert puller.blocking_reload(107, timeout=0.2)[0] == results[1][0]
+    assert time.time() - started >= 0.2
+
+
+def test_long_poll_returns_when_playlist_changes():
+    upstream = FakeUpstream()
+    puller = StreamPuller('a', upstream.pull, upstream.fetch_segment)
+    puller._update(*upstream.pull())
+    etag = puller.playlist(timeout=0)[1]
+
+    started = time.time()
+    assert puller.wait_change(etag, timeout=0.2)[1] == etag   # Unchanged: held, then the same
+    assert time.time() - started >= 0.2
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(puller.wait_change(etag, timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    puller._update(*upstream.pull())                       # Same playlist: keeps waiting
+    time.sleep(0.1)
+    assert not results
+    upstream.first = 101
+    puller._update(*upstream.pull())
+    waiter.join(2)
+    assert results and results[0][1] != etag
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("STREAM PULLER TEST")
+    print("=" * 80)
+    for test in (test_new_segments_pulled_once_into_bounded_ring,
+                 test_many_viewers_share_one_pull_loop,
+                 test_idle_puller_stops_and_restarts_on_demand,
+                 test_held_puller_runs_without_viewers,
+                 test_blocking_reload_waits_for_segment_or_part,
+                 test_long_poll_returns_when_playlist_changes):
+        test()
+        print(f"✓ {test.__name__}")
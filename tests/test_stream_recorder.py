@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test recording pulled segments to disk: files and playlist written by the
+writer thread, fsyncs batched, keys saved alongside, failed downloads
+skipped, and the playlist finished as VOD on stop
+"""
+import sys
+import errno
+import os
+import shutil
+import tempfile
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hls_playlist import Playlist
+from segment_cache import SegmentEntry
+import stream_recorder
+from stream_recorder import StreamRecorder
+
+
+def pulled_segments(first, count, key=True):
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6', f'#EXT-X-MEDIA-SEQUENCE:{first}']
+    if key:
+        lines.append('#EXT-X-KEY:METHOD=AES-128,URI="/key/https%3A%2F%2Fcdn.example%2Fk1"')
+    for seq in range(first, first + count):
+        lines += ['#EXTINF:6.0,', f'/proxy/seg{seq}.ts']
+    playlist = Playlist.parse('\n'.join(lines) + '\n')
+    for index, segment in enumerate(playlist.segments):
+        segment.sequence = first + index
+    return playlist.segments
+
+
+def downloaded(data, status=200):
+    entry = SegmentEntry('https://cdn.example/seg.ts', 60)
+    entry.set_headers(status, 'video/mp2t', len(data))
+    entry.append(data)
+    entry.finish()
+    return entry
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_recording_writes_segments_and_finishes_as_vod():
+    directory = tempfile.mkdtemp()
+    fetched = []
+
+    def fetch_resource(uri):
+        fetched.append(uri)
+        return b'k' * 16
+
+    try:
+        recorder = StreamRecorder(directory, fetch_resource, fsync_interval=30, fsync_batch=3)
+        recording = recorder.start('game', 'Patriots @ Falcons')
+        assert os.path.basename(recording.directory).endswith('patriots-falcons')
+
+        segments = pulled_segments(10, 5)
+        for segment in segments[:3]:
+            recorder.record('game', segment, downloaded(b'ts%d' % segment.sequence))
+        recorder.record('other', segments[3], downloaded(b'not ours'))
+        recorder.record('game', segments[3], downloaded(b'', status=503))   # Failed: skipped
+        recorder.record('game', segments[4], downloaded(b'ts14'))
+
+        # Three files (the key and two segments) make a batch: synced and listed
+        # together; the rest wait for the next batch. The playlist stays EVENT
+        assert wait_for(lambda: len(recording.entries) == 4 and recorder.syncs == 2)
+        with open(recording.playlist_path) as handle:
+            playlist = Playlist.parse(handle.read())
+        assert not playlist.endlist
+        assert [s.uri for s in playlist.segments] == ['segment_000000.ts', 'segment_000001.ts']
+        assert len(recorder._unsynced) == 2
+
+        recorder.stop(recording.id)
+        assert wait_for(lambda: recording.state == 'stopped' and not recorder._dirty)
+        with open(recording.playlist_path) as handle:
+            text = handle.read()
+        playlist = Playlist.parse(text)
+        assert playlist.endlist and '#EXT-X-PLAYLIST-TYPE:VOD' in text
+        assert [s.discontinuity for s in playlist.segments] == [False, False, False, True]
+        assert playlist.segments[0].key.attributes['URI'] == 'key_0.bin'
+        assert fetched == ['/key/https%3A%2F%2Fcdn.example%2Fk1']
+        with open(os.path.join(recording.directory, 'segment_000003.ts'), 'rb') as handle:
+            assert handle.read() == b'ts14'
+        assert recording.dropped == 1
+        assert recording.info()['seconds'] == 24.0
+
+        # Stopped recordings take no more segments
+        recorder.record('game', pulled_segments(15, 1)[0], downloaded(b'late'))
+        time.sleep(0.1)
+        assert len(recording.entries) == 4
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_sync_failures_fail_the_recording_not_the_writer():
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = StreamRecorder(directory, fsync_interval=30, fsync_batch=100)
+        gone = recorder.start('game', 'gone')
+        assert wait_for(lambda: recorder.syncs == 1)
+        recorder.record('game', pulled_segments(1, 1, key=False)[0], downloaded(b'ts1'))
+        assert wait_for(lambda: len(gone.entries) == 1)
+        # Its directory disappears: the playlist can't be written on stop
+        shutil.rmtree(gone.directory)
+        recorder.stop(gone.id)
+        assert wait_for(lambda: gone.state == 'failed')
+        assert gone.info()['error'] and not recorder._unsynced and not recorder._dirty
+
+        # An unexpected error in a sync doesn't end the writer thread either
+        real_sync = recorder._sync
+        failures = []
+
+        def failing_sync():
+            if not failures:
+                failures.append(1)
+                raise RuntimeError("boom")
+            real_sync()
+
+        recorder._sync = failing_sync
+        kept = recorder.start('other', 'kept')
+        assert wait_for(lambda: failures and not recorder._dirty)
+        recorder.record('other', pulled_segments(1, 1, key=False)[0], downloaded(b'ts1'))
+        recorder.stop(kept.id)
+        assert wait_for(lambda: kept.state == 'stopped' and not recorder._dirty)
+        assert recorder._thread.is_alive()
+        with open(kept.playlist_path) as handle:
+            assert [s.uri for s in Playlist.parse(handle.read()).segments] == ['segment_000000.ts']
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_write_failures_remove_the_partial_file_and_fail_the_recording():
+    directory = tempfile.mkdtemp()
+
+    class FullDisk:
+        """A file that takes one write and then runs out of space"""
+        def __init__(self, path, mode):
+            self._handle = open(path, mode)
+            self._writes = 0
+
+        def write(self, data):
+            self._writes += 1
+            if self._writes > 1:
+                raise OSError(errno.ENOSPC, 'No space left on device')
+            return self._handle.write(data)
+
+        def __getattr__(self, name):
+            return getattr(self._handle, name)
+
+    def fetch_resource(uri):
+        # The key arrives after its recording's directory has gone
+        shutil.rmtree(gone.directory)
+        return b'k' * 16
+
+    try:
+        recorder = StreamRecorder(directory, fetch_resource, fsync_interval=30, fsync_batch=100)
+        full = recorder.start('game', 'full')
+        assert wait_for(lambda: recorder.syncs == 1)
+        entry = downloaded(b'ts1')
+        entry.iter_range = lambda: iter([b'ts', b'1'])
+        stream_recorder.open = FullDisk
+        try:
+            recorder.record('game', pulled_segments(1, 1, key=False)[0], entry)
+            assert wait_for(lambda: full.state == 'failed')
+        finally:
+            del stream_recorder.open
+        assert full.dropped == 1 and not full.entries and 'No space' in full.error
+        assert not os.path.exists(os.path.join(full.directory, 'segment_000000.ts'))
+        assert wait_for(lambda: not recorder._unsynced)
+
+        # A key that can't be saved fails the recording too
+        gone = recorder.start('other', 'gone')
+        assert wait_for(lambda: not recorder._dirty)
+        recorder.record('other', pulled_segments(1, 1)[0], downloaded(b'ts1'))
+        assert wait_for(lambda: gone.state == 'failed')
+        assert not gone.resources and 'key_0.bin' in gone.error and recorder._thread.is_alive()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("STREAM RECORDER TEST")
+    print("=" * 80)
+    for test in (test_recording_writes_segments_and_finishes_as_vod,
+                 test_sync_failures_fail_the_recording_not_the_writer,
+                 test_write_failures_remove_the_partial_file_and_fail_the_recording):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test per-viewer stream sessions: isolation between viewers, per-session
+channel switching, the LRU cap and idle eviction
+"""
+import sys
+import os
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_registry import StreamRegistry
+
+CHANNELS_A = [{'name': 'A1', 'url': 'https://a.example/1.m3u8', 'referer': 'https://a.example/'},
+              {'name': 'A2', 'url': 'https://a.example/2.m3u8'}]
+CHANNELS_B = [{'name': 'B1', 'url': 'https://b.example/1.m3u8'}]
+
+
+def test_sessions_are_isolated():
+    registry = StreamRegistry()
+    a = registry.create('https://games.example/a', CHANNELS_A, title='A')
+    b = registry.create('https://games.example/b', CHANNELS_B, title='B')
+    assert a.id != b.id
+
+    assert registry.get(a.id).next_channel()['name'] == 'A2'
+    assert registry.get(a.id).url == 'https://a.example/2.m3u8'
+    assert registry.get(b.id).url == 'https://b.example/1.m3u8'
+
+    # Wraps around, and the channel list is a copy of what was passed in
+    assert a.next_channel()['name'] == 'A1'
+    a.set_url('https://a.example/1.m3u8?token=new')
+    assert CHANNELS_A[0]['url'] == 'https://a.example/1.m3u8'
+    assert a.referer_hints() == ['https://a.example/']
+    assert a.info()['proxy_url'] == f'/s/{a.id}/stream.m3u8'
+    assert registry.get('missing') is None
+
+    # Channels that resolve after the session was created are appended once
+    assert b.add_channel({'name': 'B2', 'url': 'https://b.example/2.m3u8'})
+    assert not b.add_channel({'name': 'B2', 'url': 'https://b.example/2.m3u8'})
+    assert [c['name'] for c in b.channels] == ['B1', 'B2'] and len(CHANNELS_B) == 1
+
+    # A re-resolved backup channel is updated only in the session that holds it
+    backup = a.channels[1]
+    assert a.set_channel_url(backup, 'https://a.example/2.m3u8?token=new')
+    assert not b.set_channel_url(backup, 'https://b.example/x.m3u8')
+    assert backup['url'] == 'https://a.example/2.m3u8?token=new' and a.current_channel is not backup
+
+
+def test_lru_cap_keeps_recently_watched():
+    registry = StreamRegistry(max_streams=2)
+    first = registry.create('s1', CHANNELS_B)
+    second = registry.create('s2', CHANNELS_B)
+    registry.get(first.id)  # first is now the most recently watched
+    registry.create('s3', CHANNELS_B)
+
+    assert registry.get(first.id) is first
+    assert registry.get(second.id) is None
+    assert registry.stats()['evictions'] == 1
+
+
+def test_idle_sessions_are_evicted():
+    registry = StreamRegistry(idle_timeout=0.05)
+    idle = registry.create('s1', CHANNELS_B)
+    time.sleep(0.1)
+    active = registry.create('s2', CHANNELS_B)  # Creating forces a sweep
+
+    assert registry.get(idle.id) is None
+    assert registry.get(active.id) is active
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("STREAM REGISTRY TEST")
+    print("=" * 80)
+    for test in (test_sessions_are_isolated,
+                 test_lru_cap_keeps_recently_watched,
+                 test_idle_sessions_are_evicted):
+        test()
+        print(f"✓ {test.__name__}")
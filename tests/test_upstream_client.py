@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test that the shared upstream client reuses keep-alive connections per origin
+"""
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import upstream_client
+
+
+class _SegmentHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_GET(self):
+        _SegmentHandler.connections.add(self.client_address)
+        body = b'\x47' * 1880  # Ten fake TS packets
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SegmentHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_sequential_requests_share_one_connection():
+    _SegmentHandler.connections = set()
+    server = _start_server()
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        for i in range(10):
+            response = upstream_client.get(f"{base}/seg{i}.ts")
+            assert response.status_code == 200
+            assert len(response.content) == 1880
+        assert len(_SegmentHandler.connections) == 1
+    finally:
+        server.shutdown()
+
+
+def test_streamed_body_releases_connection():
+    _SegmentHandler.connections = set()
+    server = _start_server()
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        for i in range(5):
+            response = upstream_client.get(f"{base}/seg{i}.ts", stream=True)
+            generator = upstream_client.iter_and_close(response, chunk_size=512)
+            next(generator)
+            generator.close()  # Viewer disconnected after the first chunk
+        stats = upstream_client.pool_stats()
+        origin = [s for s in stats if s['origin'].endswith(f":{server.server_address[1]}")]
+        assert origin and origin[0]['requests'] == 5
+    finally:
+        server.shutdown()
+
+
+def test_configure_rebuilds_pools():
+    upstream_client.configure(pool_maxsize=4, read_timeout=3)
+    try:
+        assert upstream_client.default_timeout() == (upstream_client.CONNECT_TIMEOUT, 3)
+        adapter = upstream_client.get_session().get_adapter('https://example.com/')
+        assert adapter._pool_maxsize == 4
+    finally:
+        upstream_client.configure(pool_maxsize=64, read_timeout=10)
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("UPSTREAM CLIENT CONNECTION REUSE TEST")
+    print("=" * 80)
+    for test in (test_sequential_requests_share_one_connection,
+                 test_streamed_body_releases_connection,
+                 test_configure_rebuilds_pools):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Shared upstream HTTP client
+Pooled keep-alive connections for playlists, segments and extractor page fetches
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+
+# Disable SSL warnings for self-signed certificates
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Pool configuration
+POOL_CONNECTIONS = 32  # Number of distinct origins (scheme, host, port) kept pooled
+POOL_MAXSIZE = 64      # Keep-alive connections kept per origin
+POOL_BLOCK = False     # Open extra (unpooled) connections instead of blocking when a pool is full
+CONNECT_TIMEOUT = 5    # Seconds to establish TCP+TLS
+READ_TIMEOUT = 10      # Seconds between bytes from upstream
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+_generation = 0
+
+
+def _build_adapter():
+    """Create the shared adapter that owns the per-origin connection pools"""
+    return HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=POOL_BLOCK,
+        max_retries=0
+    )
+
+
+def _get_adapter():
+    """Return the process-wide adapter, creating it on first use"""
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                _adapter = _build_adapter()
+    return _adapter
+
+
+def get_session():
+    """Return this thread's session, backed by the shared connection pools.
+
+    Sessions are per thread (cookies and default headers are not shared between
+    viewers), but every session mounts the same adapter, so keep-alive
+    connections and their TLS state are reused across threads.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None or getattr(_local, 'generation', None) != _generation:
+        if session is not None:
+            session.close()
+        adapter = _get_adapter()
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+        _local.generation = _generation
+    return session
+
+
+def configure(pool_connections=None, pool_maxsize=None, pool_block=None,
+              connect_timeout=None, read_timeout=None):
+    """Change pool sizes and default timeouts; existing pools are drained and rebuilt"""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK, CONNECT_TIMEOUT, READ_TIMEOUT
+    global _adapter, _generation
+
+    with _adapter_lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if pool_block is not None:
+            POOL_BLOCK = pool_block
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = connect_timeout
+        if read_timeout is not None:
+            READ_TIMEOUT = read_timeout
+
+        old_adapter = _adapter
+        _adapter = _build_adapter()
+        _generation += 1
+
+    if old_adapter is not None:
+        old_adapter.close()
+
+
+def default_timeout():
+    """(connect, read) timeout tuple used when a caller doesn't pass one"""
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+def request(method, url, **kwargs):
+    """Send a request through the pooled session (same arguments as requests.request)"""
+    if kwargs.get('timeout') is None:
+        kwargs['timeout'] = default_timeout()
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    """Pooled equivalent of requests.get"""
+    kwargs.setdefault('allow_redirects', True)
+    return request('GET', url, **kwargs)
+
+
+def head(url, **kwargs):
+    """Pooled equivalent of requests.head"""
+    kwargs.setdefault('allow_redirects', False)
+    return request('HEAD', url, **kwargs)
+
+
+def iter_and_close(response, chunk_size=8192):
+    """Yield a streamed response body and always hand the connection back to the pool.
+
+    Flask closes the generator when a viewer disconnects mid-segment; closing
+    the upstream response here releases its connection instead of leaking it
+    until garbage collection.
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+def pool_stats():
+    """Return a snapshot of the open per-origin pools (for debugging/monitoring)"""
+    adapter = _get_adapter()
+    stats = []
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats.append({
+            'origin': f"{key.key_scheme}://{key.key_host}:{key.key_port}",
+            'connections_opened': pool.num_connections,
+            'requests': pool.num_requests
+        })
+    return stats
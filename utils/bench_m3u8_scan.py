@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the shared .m3u8 scanner against the extractors' regex loops
+
+legacy-resolve  = the five `patterns` run one after another by the LiveTV and
+                  Rojadirecta channel resolvers (first match wins)
+legacy-player   = extract_stream's strict pattern + its four js_patterns, with
+                  the JavaScript false-positive filter
+find_m3u8       = m3u8_scan.find_m3u8 (pre-check, one combined pass, filter)
+
+Pages: a large player page whose stream URL sits near the end, and a large
+page with no stream at all (what most nested iframes and scripts are).
+
+Usage:
+    python utils/bench_m3u8_scan.py
+    python utils/bench_m3u8_scan.py --kb 100 500 2000 --repeat 20
+    python utils/bench_m3u8_scan.py player_page.html
+"""
+import argparse
+import sys
+import os
+import re
+import timeit
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from m3u8_scan import find_m3u8
+
+RESOLVE_PATTERNS = [
+    r'source["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+    r'file["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+    r'src["\']?\s*:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+    r'https?://[^\s"\'\)]+\.m3u8[^\s"\'\)]*',
+    r'["\'](https?://[^"\']*(?:stream|live|hls)[^"\']*\.m3u8[^"\']*)["\']'
+]
+STRICT_PATTERN = r'https?://[^\s"\'\)<>\{\}]+\.m3u8(?:\?[^\s"\'\)<>]*)?'
+JS_PATTERNS = [
+    r'(?:file|source|src|url|stream|hlsUrl|streamUrl|hls\.src|player\.src)\s*[:=]\s*["\'](https?://[^"\']+\.m3u8(?:\?[^"\']*)?)["\']',
+    r'["\'](https?://[^"\']+\.m3u8(?:\?[^"\']*)?)["\']',
+    r'(?:loadSource|load|play)\s*\(["\'](https?://[^"\']+\.m3u8(?:\?[^"\']*)?)["\']',
+    r'\.m3u8["\']?\s*[,\}]',
+]
+JS_FALSE_POSITIVES = ['const ', 'function', 'return ', 'Math.', 'Date.', 'toString', 'slice']
+
+
+def legacy_resolve(text):
+    for pattern in RESOLVE_PATTERNS:
+        for match in re.findall(pattern, text)[:3]:
+            stream_url = match.replace('&amp;', '&')
+            if stream_url.startswith('http') and '.m3u8' in stream_url:
+                return [stream_url]
+    return []
+
+
+def legacy_player(text):
+    found = []
+    for url in re.findall(STRICT_PATTERN, text):
+        if not any(js in url for js in JS_FALSE_POSITIVES[:6]) and len(url) <= 500 and url not in found:
+            found.append(url)
+    for pattern in JS_PATTERNS:
+        for match in re.findall(pattern, text, re.I):
+            if (match.startswith('http') and '.m3u8' in match and len(match) < 500 and
+                    not any(js in match for js in JS_FALSE_POSITIVES) and match not in found):
+                found.append(match)
+    return found
+
+
+def make_page(kb, with_stream):
+    """Minified-player-like text: scripts, config objects, links and markup"""
+    chunk = ('<div class="row"><a href="https://site.example/watch/123?ref=home">Watch</a></div>'
+             '<script>var cfg={autoplay:true,src:"https://cdn.example/img/poster.jpg",ads:["//ads.example/v.js"]};'
+             'function f(a){return a.slice(0,3)+Math.random().toString(36)}</script>\n')
+    body = chunk * max(kb * 1024 // len(chunk), 1)
+    if with_stream:
+        body += ('<script>player.setup({file: "https://edge1.cdn.example/live/hls/stream_720/index.m3u8'
+                 '?token=abc&amp;expires=1900000000"});</script>')
+    return body
+
+
+def bench(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='.m3u8 scanner micro-benchmark')
+    parser.add_argument('pages', nargs='*', help='Saved pages/scripts (default: generated pages)')
+    parser.add_argument('--kb', type=int, nargs='+', default=[50, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append((os.path.basename(path)[:22], f.read()))
+    else:
+        pages = [(f'{kb} KB {kind}', make_page(kb, kind == 'stream'))
+                 for kb in args.kb for kind in ('stream', 'none')]
+
+    print("=" * 80)
+    print(".M3U8 SCANNER BENCHMARK")
+    print("=" * 80)
+    print(f"{'page':>22}{'resolve ms':>12}{'player ms':>11}{'find_m3u8 ms':>14}{'x resolve':>11}{'x player':>10}")
+    for name, text in pages:
+        resolve = bench(lambda: legacy_resolve(text), args.repeat)
+        player = bench(lambda: legacy_player(text), args.repeat)
+        scanned = bench(lambda: find_m3u8(text), args.repeat)
+        print(f"{name:>22}{resolve:>12.2f}{player:>11.2f}{scanned:>14.3f}"
+              f"{resolve / scanned:>11.1f}{player / scanned:>10.1f}")
+        found = find_m3u8(text)
+        if found:
+            print(f"{'':>22}best: {found[0][:70]}")
+
+
+if __name__ == '__main__':
+    main()
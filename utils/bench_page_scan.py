@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark event page parsing: the BeautifulSoup passes vs the single-pass scanner
+
+The old LiveTV extraction built a soup with html.parser, then walked it for
+hidden containers, for every <a href> (text, and find_parent for webplayer
+links), and twice for iframes. page_scan.scan_page() reads the page once.
+Runs on saved pages given on the command line (e.g. a LiveTV event page saved
+from the browser), or on generated LiveTV-style pages of growing size.
+
+Usage:
+    python utils/bench_page_scan.py
+    python utils/bench_page_scan.py livetv_event.html rojadirecta_event.html
+    python utils/bench_page_scan.py --links 200 2000 --repeat 5
+"""
+import argparse
+import sys
+import os
+import re
+import timeit
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from page_scan import scan_page, SELECTOLAX_AVAILABLE
+
+
+def make_event_page(links):
+    """A LiveTV-style event page: navigation, a table of player links (a third of
+    them in a hidden "show all" container), inline scripts and a few iframes"""
+    parts = ['<html><head><title>Patriots vs Falcons</title>']
+    parts += [f'<script src="/js/lib{i}.js"></script>' for i in range(10)]
+    parts.append('<script>var lng = {};' + 'lng["k"] = "v";' * 500 + '</script></head><body>')
+    parts += [f'<a href="/enx/allupcomingsports/{i}/">Sport {i}</a>' for i in range(links // 4)]
+    parts.append('<table id="links_block">')
+    for i in range(links):
+        if i == links * 2 // 3:
+            parts.append('</table><div id="hidden_links" style="display:none"><table>')
+        channel = 2600000 + i
+        parts.append(
+            f'<tr><td><img src="/img/flag{i % 20}.gif"></td><td class="lnk">'
+            f'<a href="//cdn.livetv869.me/webplayer.php?t=ifr&amp;c={channel}&amp;lang=en&amp;eid=314788282'
+            f'&amp;lid={channel}&amp;ci=142&amp;si=27" onclick="openWin(this.href); return false;">'
+            f'<span>Channel</span> {i} <b>HD</b></a></td><td>{1000 + i} kbps</td></tr>')
+    parts.append('</table></div>')
+    parts += [f'<iframe src="//cdn.livetv869.me/banner.php?id={i}" width="300"></iframe>' for i in range(5)]
+    parts.append('</body></html>')
+    return '\n'.join(parts)
+
+
+def legacy_passes(html):
+    """The BeautifulSoup passes list_livetv_channels made before the scanner"""
+    soup = BeautifulSoup(html, 'html.parser')
+    hidden = re.compile(r'hidden', re.I)
+    soup.find_all(id=hidden)
+    for link in soup.find_all('a', href=True):
+        link.get('href', '')
+        link.get_text(strip=True)
+        if 'webplayer.php' in link.get('href', ''):
+            link.find_parent(id=hidden)
+    [iframe.get('src', '') for iframe in soup.find_all('iframe')]
+    [iframe.get('src', '') for iframe in soup.find_all('iframe')[:5]]
+
+
+def bench(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event page parsing benchmark')
+    parser.add_argument('pages', nargs='*', help='Saved HTML pages (default: generated pages)')
+    parser.add_argument('--links', type=int, nargs='+', default=[100, 500, 2000],
+                        help='Player links per generated page')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append((os.path.basename(path)[:20], f.read()))
+    else:
+        pages = [(f'{count} links', make_event_page(count)) for count in args.links]
+
+    backends = ['stdlib'] + (['selectolax'] if SELECTOLAX_AVAILABLE else [])
+    print("=" * 80)
+    print("EVENT PAGE PARSING BENCHMARK")
+    print("=" * 80)
+    print(f"{'page':>20}{'KB':>7}{'links':>7}{'soup ms':>10}" +
+          ''.join(f"{backend + ' ms':>15}{'x':>6}" for backend in backends))
+
+    for name, html in pages:
+        legacy = bench(lambda: legacy_passes(html), args.repeat)
+        row = f"{name:>20}{len(html) / 1024:>7.0f}{len(scan_page(html).links):>7}{legacy:>10.1f}"
+        for backend in backends:
+            scanned = bench(lambda: scan_page(html, backend=backend), args.repeat)
+            row += f"{scanned:>15.1f}{legacy / scanned:>6.1f}"
+        print(row)
+
+    print()
+    print("soup   = BeautifulSoup(html.parser) + hidden, link, find_parent and iframe passes")
+    print("stdlib = page_scan streaming scanner (install selectolax for the faster backend)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark playlist parsing and rewriting on large sliding-window playlists
+
+Compares the old line loop from stream_proxy (segment lines only) with
+hls_playlist's parse, and parse + rewrite of every URI + serialize.
+
+Usage:
+    python utils/bench_playlist.py
+    python utils/bench_playlist.py --segments 500 20000 --key-every 10
+"""
+import argparse
+import sys
+import os
+import timeit
+import urllib.parse
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hls_playlist import Playlist, rewrite_playlist
+
+PLAYLIST_URL = 'https://cdn.example.com/live/hd/chunklist_w12345.m3u8?token=abc123&expires=1900000000'
+
+
+def make_playlist(segments, key_every):
+    """A live window of `segments` segments with an init map and periodic key rotation"""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-TARGETDURATION:6',
+             '#EXT-X-MEDIA-SEQUENCE:500000', '#EXT-X-MAP:URI="init.mp4"']
+    for i in range(segments):
+        if key_every and i % key_every == 0:
+            lines.append(f'#EXT-X-KEY:METHOD=AES-128,URI="https://keys.example.com/key/{i}",'
+                         f'IV=0x{i:032x}')
+        lines.append('#EXT-X-PROGRAM-DATE-TIME:2024-01-01T00:00:00.000Z')
+        lines.append('#EXTINF:6.006,')
+        lines.append(f'media_w12345_{500000 + i}.m4s?token=abc123')
+    return '\n'.join(lines) + '\n'
+
+
+def legacy_rewrite(content, playlist_url):
+    """The loop stream_proxy used before the playlist model (segment lines only)"""
+    base_url = playlist_url.rsplit('/', 1)[0] + '/'
+    rewritten_lines = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            segment_url = line if line.startswith('http') else base_url + line
+            line = f'/proxy/{urllib.parse.quote(segment_url, safe="")}'
+        rewritten_lines.append(line)
+    return '\n'.join(rewritten_lines)
+
+
+def bench(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Playlist parse/rewrite benchmark')
+    parser.add_argument('--segments', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--key-every', type=int, default=5,
+                        help='Rotate the EXT-X-KEY every N segments (0 = unencrypted)')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("PLAYLIST PARSE/REWRITE BENCHMARK")
+    print("=" * 80)
+    print(f"{'segments':>9}{'KB':>8}{'legacy ms':>11}{'parse ms':>10}"
+          f"{'rewrite ms':>12}{'seg/s (rewrite)':>17}")
+
+    for count in args.segments:
+        content = make_playlist(count, args.key_every)
+        legacy = bench(lambda: legacy_rewrite(content, PLAYLIST_URL), args.repeat)
+        parse = bench(lambda: Playlist.parse(content, PLAYLIST_URL), args.repeat)
+        rewrite = bench(lambda: rewrite_playlist(content, PLAYLIST_URL), args.repeat)
+        print(f"{count:>9}{len(content) / 1024:>8.0f}{legacy:>11.2f}{parse:>10.2f}"
+              f"{rewrite:>12.2f}{count / (rewrite / 1000):>17,.0f}")
+
+    print()
+    print("legacy  = old stream_proxy loop; leaves EXT-X-KEY/MAP URIs pointing upstream")
+    print("rewrite = parse + rewrite every URI (segments, keys, map) + serialize")
+
+
+if __name__ == '__main__':
+    main()
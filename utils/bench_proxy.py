@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Concurrent-client capacity benchmark: Flask proxy path vs asyncio engine
+
+Starts a slow local origin (segments trickle out over --segment-seconds),
+then the stream_refresher proxy twice - Flask's threaded server and the
+asyncio engine under uvicorn - each in its own process, and fires N
+concurrent segment downloads at /proxy/<url> on each. Reports completed and
+failed downloads, latency, the server process's peak threads and RSS, and
+its CPU seconds per GB relayed.
+
+Usage:
+    python utils/bench_proxy.py                       # 250, 1000 and 2000 clients
+    python utils/bench_proxy.py --clients 500 3000 --segment-seconds 3
+    python utils/bench_proxy.py --engines async --distinct 16
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEGMENT_BYTES = 256 * 1024
+SEGMENT_PIECES = 8
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+# ---------- Server roles (each runs in its own process) ----------
+
+def run_origin(port, segment_seconds):
+    """Slow CDN stand-in: every segment takes segment_seconds to arrive"""
+    import uvicorn
+
+    piece = b'\x47' * (SEGMENT_BYTES // SEGMENT_PIECES)  # MPEG-TS sync bytes
+
+    async def origin(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        if scope['path'].endswith('.m3u8'):
+            body = b'#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nseg0.ts\n'
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'application/vnd.apple.mpegurl')]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'video/mp2t'),
+            (b'content-length', str(len(piece) * SEGMENT_PIECES).encode())]})
+        for _ in range(SEGMENT_PIECES):
+            await asyncio.sleep(segment_seconds / SEGMENT_PIECES)
+            await send({'type': 'http.response.body', 'body': piece, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    uvicorn.run(origin, host='127.0.0.1', port=port, log_level='error', backlog=8192)
+
+
+def _load_refresher(origin):
+    import stream_refresher
+    stream_refresher.referer_cache.db_file = None  # Don't touch streams.db
+    stream_refresher.current_stream_url = f'{origin}/live/index.m3u8'
+    return stream_refresher
+
+
+def run_flask(port, origin):
+    """The current path: Flask's threaded development server"""
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stream_refresher = _load_refresher(origin)
+    stream_refresher.app.run(host='127.0.0.1', port=port, debug=False, threaded=True)
+
+
+def run_async(port, origin, max_fetches):
+    """The asyncio engine under uvicorn"""
+    from async_proxy import AsyncProxyEngine, serve
+    stream_refresher = _load_refresher(origin)
+    engine = AsyncProxyEngine(
+        stream_refresher.app,
+        get_stream_url=stream_refresher.resolve_stream_url,
+        rewrite_playlist=stream_refresher.rewrite_playlist,
+        referer_cache=stream_refresher.referer_cache,
+        max_concurrent_fetches=max_fetches
+    )
+    serve(engine, host='127.0.0.1', port=port)
+
+
+# ---------- Load generator ----------
+
+async def _download(port, path, timeout):
+    """One viewer: raw HTTP/1.1 GET with Connection: close, timed to the last byte"""
+    start = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(-1), timeout)
+        # Bodies may be chunk-encoded, so "at least a segment's worth" is the check
+        body = data.partition(b'\r\n\r\n')[2]
+        ok = data[9:12] == b'200' and len(body) >= SEGMENT_BYTES
+        return ok, time.monotonic() - start
+    except (OSError, asyncio.TimeoutError):
+        return False, time.monotonic() - start
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _proc_cpu(pid):
+    """User+system CPU seconds used by a process so far, or None off Linux"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _proc_status(pid):
+    """(threads, rss_mb) of a process from /proc, or (None, None) off Linux"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['Threads']), int(fields['VmRSS'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+async def _run_load(port, pid, origin, clients, distinct, timeout):
+    paths = ['/proxy/' + urllib.parse.quote(f'{origin}/live/seg{i % distinct}.ts', safe='')
+             for i in range(clients)]
+    peak = {'threads': 0, 'rss': 0.0}
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            threads, rss = _proc_status(pid)
+            if threads is not None:
+                peak['threads'] = max(peak['threads'], threads)
+                peak['rss'] = max(peak['rss'], rss)
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample())
+    cpu_before = _proc_cpu(pid)
+    start = time.monotonic()
+    results = await asyncio.gather(*[_download(port, p, timeout) for p in paths])
+    wall = time.monotonic() - start
+    cpu_after = _proc_cpu(pid)
+    done.set()
+    await sampler
+
+    latencies = sorted(t for ok, t in results if ok)
+    ok_count = len(latencies)
+    relayed_gb = ok_count * SEGMENT_BYTES / 1e9
+    cpu_per_gb = ((cpu_after - cpu_before) / relayed_gb
+                  if cpu_before is not None and cpu_after is not None and relayed_gb else 0.0)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    return {
+        'ok': ok_count,
+        'failed': clients - ok_count,
+        'wall': wall,
+        'p50': pct(0.50),
+        'p95': pct(0.95),
+        'threads': peak['threads'],
+        'rss': peak['rss'],
+        'cpu_per_gb': cpu_per_gb
+    }
+
+
+def _start(args):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)] + args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _wait_listening(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main():
+    global SEGMENT_BYTES
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clients', type=int, nargs='+', default=[250, 1000, 2000],
+                        help='Concurrent downloads per round')
+    parser.add_argument('--engines', nargs='+', default=['flask', 'async'],
+                        choices=['flask', 'async'])
+    parser.add_argument('--segment-kb', type=int, default=SEGMENT_BYTES // 1024,
+                        help='Segment size the origin serves')
+    parser.add_argument('--segment-seconds', type=float, default=2.0,
+                        help='Time the origin takes to deliver one segment')
+    parser.add_argument('--distinct', type=int, default=4,
+                        help='Distinct segments requested (viewers share the live edge)')
+    parser.add_argument('--max-fetches', type=int, default=128,
+                        help='Async engine cap on concurrent upstream fetches')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Per-download deadline in seconds')
+    # Internal: run one server role
+    parser.add_argument('--role', choices=['origin', 'flask', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--origin', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    SEGMENT_BYTES = args.segment_kb * 1024
+    _raise_fd_limit()
+    if args.role == 'origin':
+        return run_origin(args.port, args.segment_seconds)
+    if args.role == 'flask':
+        return run_flask(args.port, args.origin)
+    if args.role == 'async':
+        return run_async(args.port, args.origin, args.max_fetches)
+
+    print("=" * 80)
+    print("PROXY CAPACITY BENCHMARK")
+    print("=" * 80)
+    print(f"Segment: {SEGMENT_BYTES // 1024} KB over {args.segment_seconds}s, "
+          f"{args.distinct} distinct segment(s), timeout {args.timeout}s")
+    print()
+
+    origin_port = _free_port()
+    origin_proc = _start(['--role', 'origin', '--port', str(origin_port),
+                          '--segment-seconds', str(args.segment_seconds),
+                          '--segment-kb', str(args.segment_kb)])
+    origin = f'http://127.0.0.1:{origin_port}'
+    rows = []
+    try:
+        if not _wait_listening(origin_port):
+            print("✗ Origin failed to start")
+            return
+        for clients in args.clients:
+            for engine in args.engines:
+                port = _free_port()
+                server = _start(['--role', engine, '--port', str(port), '--origin', origin,
+                                 '--max-fetches', str(args.max_fetches)])
+                try:
+                    if not _wait_listening(port):
+                        print(f"✗ {engine} server failed to start")
+                        continue
+                    result = asyncio.run(_run_load(port, server.pid, origin, clients,
+                                                   args.distinct, args.timeout))
+                    rows.append((engine, clients, result))
+                    print(f"  {engine:<6} {clients:>5} clients: {result['ok']} ok, "
+                          f"{result['failed']} failed in {result['wall']:.1f}s")
+                finally:
+                    server.terminate()
+                    server.wait()
+    finally:
+        origin_proc.terminate()
+        origin_proc.wait()
+
+    print()
+    print(f"{'engine':<8}{'clients':>8}{'ok':>7}{'failed':>8}{'wall s':>8}"
+          f"{'p50 s':>8}{'p95 s':>8}{'threads':>9}{'rss MB':>8}{'cpu s/GB':>10}")
+    for engine, clients, r in rows:
+        print(f"{engine:<8}{clients:>8}{r['ok']:>7}{r['failed']:>8}{r['wall']:>8.2f}"
+              f"{r['p50']:>8.2f}{r['p95']:>8.2f}{r['threads']:>9}{r['rss']:>8.1f}"
+              f"{r['cpu_per_gb']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
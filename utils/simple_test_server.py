@@ -3,7 +3,6 @@
 Simplified test server focused on the one webplayer link we've been debugging
 """
 import re
-import requests
 from flask import Flask, jsonify, render_template_string, Response, request
 import urllib3
 from urllib.parse import urljoin, quote, unquote
@@ -14,6 +13,9 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import upstream_client
+import hls_playlist
+
 # Try to import Playwright
 try:
     from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
@@ -450,7 +452,7 @@ def extract_player_links(event_url):
                 'channel_id': channel_id
             }]
         
-        response = requests.get(event_url, headers=headers, timeout=15, verify=False)
+        response = upstream_client.get(event_url, headers=headers, timeout=15, verify=False)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
         
@@ -656,29 +658,16 @@ def stream_proxy():
             'Referer': extracted_referer,
             'Origin': extracted_referer.rstrip('/')
         }
-        response = requests.get(extracted_stream_url, headers=headers, timeout=10, verify=False)
+        response = upstream_client.get(extracted_stream_url, headers=headers, verify=False)
         
         if response.status_code != 200:
             return jsonify({'error': f'Failed to fetch stream: {response.status_code}'}), response.status_code
         
-        content = response.text
-        base_url = extracted_stream_url.rsplit('/', 1)[0] + '/'
-        lines = content.split('\n')
-        rewritten_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                if not line.startswith('http'):
-                    segment_url = base_url + line
-                else:
-                    segment_url = line
-                encoded_url = quote(segment_url, safe='')
-                line = f'/proxy/{encoded_url}'
-            rewritten_lines.append(line)
+        # Every URI (segments, variants, keys, maps) goes through /proxy
+        content = hls_playlist.rewrite_playlist(response.text, response.url or extracted_stream_url)
         
         return Response(
-            '\n'.join(rewritten_lines),
+            content,
             status=200,
             content_type='application/vnd.apple.mpegurl',
             headers={
@@ -693,8 +682,9 @@ def stream_proxy():
 
 
 @app.route('/proxy/<path:url>')
+@app.route('/playlist/<path:url>')
 def proxy_segment(url):
-    """Proxy stream segments"""
+    """Proxy stream segments (and, under /playlist/, nested playlists)"""
     global extracted_referer
     
     try:
@@ -704,10 +694,26 @@ def proxy_segment(url):
             'Referer': extracted_referer,
             'Origin': extracted_referer.rstrip('/')
         }
-        response = requests.get(decoded_url, headers=headers, timeout=10, stream=True, verify=False)
+        response = upstream_client.get(decoded_url, headers=headers, stream=True, verify=False)
+        
+        # Nested playlists get the same rewrite as the top-level one
+        if request.path.startswith(hls_playlist.PLAYLIST_PREFIX) and response.status_code == 200:
+            content = hls_playlist.rewrite_playlist(response.text, response.url or decoded_url)
+            response.close()
+            return Response(
+                content,
+                status=200,
+                content_type='application/vnd.apple.mpegurl',
+                headers={
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                    'Access-Control-Allow-Headers': '*',
+                    'Cache-Control': 'no-cache'
+                }
+            )
         
         return Response(
-            response.iter_content(chunk_size=8192),
+            upstream_client.iter_and_close(response, chunk_size=8192),
             status=response.status_code,
             content_type=response.headers.get('Content-Type', 'video/mp2t'),
             headers={
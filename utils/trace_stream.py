@@ -1,12 +1,9 @@
 #!/usr/bin/env python3
 """Standalone script to trace a stream URL through the iframe chain"""
 
-import requests
 from bs4 import BeautifulSoup
 import urllib3
-import re
 import json
-from playwright.sync_api import sync_playwright
 import time
 import sys
 import os
@@ -14,6 +11,10 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import upstream_client
+from browser_pool import shared_pool
+from m3u8_scan import find_m3u8
+
 urllib3.disable_warnings()
 
 def trace_stream(webplayer_url):
@@ -27,11 +28,8 @@ def trace_stream(webplayer_url):
     referer = None
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            )
+        # Runs on a pooled browser, in a fresh context the pool closes afterwards
+        def capture(context):
             page = context.new_page()
             
             def handle_response(response):
@@ -112,16 +110,14 @@ def trace_stream(webplayer_url):
             for i, check_page in enumerate(all_pages, 1):
                 try:
                     page_content = check_page.content()
-                    m3u8_pattern = r'https?://[^\s"\'\)<>]+\.m3u8[^\s"\'\)<>]*'
-                    content_matches = re.findall(m3u8_pattern, page_content)
-                    for match in content_matches:
-                        if match not in stream_urls and not any(js_pattern in match for js_pattern in ['const ', 'function', 'return ']):
+                    for match in find_m3u8(page_content, base_url=check_page.url):
+                        if match not in stream_urls:
                             stream_urls.append(match)
                             print(f'  ✓ Found .m3u8 in page {i} content: {match[:100]}...')
                 except:
                     pass
-            
-            browser.close()
+        
+        shared_pool().run(capture)
     
     except Exception as e:
         print(f'✗ Error: {e}')
@@ -142,7 +138,7 @@ def trace_stream(webplayer_url):
                     'Referer': referer or 'https://exposestrat.com/',
                     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
                 }
-                r = requests.get(url, headers=headers, timeout=10, verify=False, stream=True)
+                r = upstream_client.get(url, headers=headers, timeout=10, verify=False, stream=True)
                 print(f'  Status: {r.status_code}')
                 if r.status_code == 200:
                     print(f'  ✓ Stream is accessible!')